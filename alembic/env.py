@@ -8,12 +8,30 @@ from app.core.database import Base
 
 from app.apps.auditoria.models import AuditLog  # noqa: F401
 from app.apps.ecommerce.models import EcommerceOrderEvent  # noqa: F401
-from app.apps.integraciones.models import APIKey, WebhookDelivery, WebhookEndpoint  # noqa: F401
-from app.apps.movimientos.models import Movimiento  # noqa: F401
-from app.apps.notificaciones.models import Notificacion  # noqa: F401
+from app.apps.integraciones.models import (  # noqa: F401
+    APIKey,
+    APIRateLimitBucket,
+    WebhookBatch,
+    WebhookDelivery,
+    WebhookEndpoint,
+    WebhookEvent,
+    WebhookReplay,
+)
+from app.apps.movimientos.models import Movimiento, MovimientoCambio  # noqa: F401
+from app.apps.notificaciones.models import (  # noqa: F401
+    ContadorNotificacionesOrganizacion,
+    ContadorNotificacionesUsuario,
+    Notificacion,
+)
 from app.apps.organizaciones.models import Organizacion  # noqa: F401
 from app.apps.planes.models import Plan  # noqa: F401
-from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa  # noqa: F401
+from app.apps.recompensas.models import (  # noqa: F401
+    AplicacionRecompensa,
+    EjecucionVencimientoPuntos,
+    ReglaRecompensa,
+    TotalRecompensaRegla,
+    TotalRecompensaUsuario,
+)
 from app.apps.usuarios.models import Usuario  # noqa: F401
 from app.apps.wallets.models import Wallet  # noqa: F401
 
@@ -0,0 +1,49 @@
+"""api_rate_limits
+
+Revision ID: 20260601_0004
+Revises: 20260517_0003
+Create Date: 2026-06-01 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260601_0004"
+down_revision: Union[str, None] = "20260517_0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BASE_PLAN_REQUEST_LIMITS = {
+    "free": 60,
+    "starter": 300,
+    "pro": 1200,
+}
+
+
+def upgrade() -> None:
+    op.add_column("planes", sa.Column("limite_requests_minuto", sa.Integer(), nullable=True))
+    op.add_column("api_keys", sa.Column("limite_requests_minuto", sa.Integer(), nullable=True))
+    for codigo, limite in BASE_PLAN_REQUEST_LIMITS.items():
+        op.execute(
+            sa.text("UPDATE planes SET limite_requests_minuto = :limite WHERE codigo = :codigo").bindparams(
+                limite=limite,
+                codigo=codigo,
+            )
+        )
+
+    op.create_table(
+        "api_rate_limit_buckets",
+        sa.Column("bucket_key", sa.String(length=120), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("fecha_actualizacion", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("bucket_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("api_rate_limit_buckets")
+    op.drop_column("api_keys", "limite_requests_minuto")
+    op.drop_column("planes", "limite_requests_minuto")
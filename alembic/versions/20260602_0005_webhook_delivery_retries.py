@@ -0,0 +1,32 @@
+"""webhook_delivery_retries
+
+Revision ID: 20260602_0005
+Revises: 20260601_0004
+Create Date: 2026-06-02 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260602_0005"
+down_revision: Union[str, None] = "20260601_0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("webhook_deliveries", sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE webhook_deliveries SET next_attempt_at = fecha_creacion WHERE status = 'pendiente'")
+    op.create_index(
+        "ix_webhook_deliveries_status_next_attempt_at",
+        "webhook_deliveries",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_webhook_deliveries_status_next_attempt_at", table_name="webhook_deliveries")
+    op.drop_column("webhook_deliveries", "next_attempt_at")
@@ -0,0 +1,35 @@
+"""webhook_circuit_breaker
+
+Revision ID: 20260603_0006
+Revises: 20260602_0005
+Create Date: 2026-06-03 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260603_0006"
+down_revision: Union[str, None] = "20260602_0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "webhook_endpoints",
+        sa.Column("circuito_estado", sa.String(length=20), nullable=False, server_default="cerrado"),
+    )
+    op.add_column(
+        "webhook_endpoints",
+        sa.Column("fallos_consecutivos", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("webhook_endpoints", sa.Column("circuito_abierto_hasta", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.execute("UPDATE webhook_deliveries SET status = 'pendiente' WHERE status = 'diferido'")
+    op.drop_column("webhook_endpoints", "circuito_abierto_hasta")
+    op.drop_column("webhook_endpoints", "fallos_consecutivos")
+    op.drop_column("webhook_endpoints", "circuito_estado")
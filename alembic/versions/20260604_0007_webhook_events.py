@@ -0,0 +1,123 @@
+"""webhook_events
+
+Revision ID: 20260604_0007
+Revises: 20260603_0006
+Create Date: 2026-06-04 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260604_0007"
+down_revision: Union[str, None] = "20260603_0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "webhook_events",
+        sa.Column("id", uuid_pk, server_default=sa.text("gen_random_uuid()"), nullable=False),
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("evento", sa.String(length=120), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_webhook_events_organizacion_id", "webhook_events", ["organizacion_id"], unique=False)
+    op.add_column("webhook_deliveries", sa.Column("webhook_event_id", uuid_pk, nullable=True))
+
+    # Las deliveries de un mismo encolado comparten payload identico (incluida la fecha): un evento por grupo.
+    # El evento conserva el ``id`` del payload, que es el que ya recibieron los partners, y el payload queda
+    # intacto. Solo los grupos sin un ``id`` uuid propio (o con uno repetido) reciben un id nuevo en el payload.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE webhook_events_backfill ON COMMIT DROP AS
+        SELECT
+            CASE WHEN conserva_id THEN (payload->>'id')::uuid ELSE gen_random_uuid() END AS id,
+            conserva_id,
+            organizacion_id,
+            evento,
+            payload,
+            fecha_creacion
+        FROM (
+            SELECT
+                organizacion_id,
+                evento,
+                payload,
+                fecha_creacion,
+                payload->>'id' ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+                    AND count(*) OVER (PARTITION BY payload->>'id') = 1 AS conserva_id
+            FROM (
+                SELECT organizacion_id, evento, payload, min(fecha_creacion) AS fecha_creacion
+                FROM webhook_deliveries
+                GROUP BY organizacion_id, evento, payload
+            ) AS grupos
+        ) AS candidatos
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO webhook_events (id, organizacion_id, evento, payload, fecha_creacion)
+        SELECT
+            id,
+            organizacion_id,
+            evento,
+            CASE WHEN conserva_id THEN payload ELSE payload || jsonb_build_object('id', id::text) END,
+            fecha_creacion
+        FROM webhook_events_backfill
+        """
+    )
+    op.execute(
+        """
+        UPDATE webhook_deliveries AS d
+        SET webhook_event_id = b.id
+        FROM webhook_events_backfill AS b
+        WHERE d.organizacion_id = b.organizacion_id AND d.evento = b.evento AND d.payload = b.payload
+        """
+    )
+
+    op.alter_column("webhook_deliveries", "webhook_event_id", nullable=False)
+    op.create_foreign_key(
+        "fk_webhook_deliveries_webhook_event_id",
+        "webhook_deliveries",
+        "webhook_events",
+        ["webhook_event_id"],
+        ["id"],
+        ondelete="RESTRICT",
+    )
+    op.create_index(
+        "ix_webhook_deliveries_webhook_event_id",
+        "webhook_deliveries",
+        ["webhook_event_id"],
+        unique=False,
+    )
+    op.drop_column("webhook_deliveries", "payload")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "webhook_deliveries",
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE webhook_deliveries AS d
+        SET payload = e.payload
+        FROM webhook_events AS e
+        WHERE d.webhook_event_id = e.id
+        """
+    )
+    op.alter_column("webhook_deliveries", "payload", nullable=False)
+    op.drop_index("ix_webhook_deliveries_webhook_event_id", table_name="webhook_deliveries")
+    op.drop_constraint("fk_webhook_deliveries_webhook_event_id", "webhook_deliveries", type_="foreignkey")
+    op.drop_column("webhook_deliveries", "webhook_event_id")
+    op.drop_index("ix_webhook_events_organizacion_id", table_name="webhook_events")
+    op.drop_table("webhook_events")
@@ -0,0 +1,97 @@
+"""webhook_batches
+
+Revision ID: 20260605_0008
+Revises: 20260604_0007
+Create Date: 2026-06-05 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260605_0008"
+down_revision: Union[str, None] = "20260604_0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "webhook_endpoints",
+        sa.Column("modo_lote", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.add_column(
+        "webhook_endpoints",
+        sa.Column("lote_max_eventos", sa.Integer(), nullable=False, server_default="100"),
+    )
+    op.add_column(
+        "webhook_endpoints",
+        sa.Column("lote_max_segundos", sa.Integer(), nullable=False, server_default="5"),
+    )
+    op.create_table(
+        "webhook_batches",
+        sa.Column("id", uuid_pk, nullable=False),
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("webhook_endpoint_id", uuid_pk, nullable=False),
+        sa.Column("cantidad_eventos", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=30), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("respuesta_body", sa.Text(), nullable=True),
+        sa.Column("intentos", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fecha_ultimo_intento", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.ForeignKeyConstraint(["webhook_endpoint_id"], ["webhook_endpoints.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_webhook_batches_organizacion_id", "webhook_batches", ["organizacion_id"], unique=False)
+    op.create_index(
+        "ix_webhook_batches_webhook_endpoint_id", "webhook_batches", ["webhook_endpoint_id"], unique=False
+    )
+    op.create_index(
+        "ix_webhook_batches_status_next_attempt_at", "webhook_batches", ["status", "next_attempt_at"], unique=False
+    )
+    op.add_column("webhook_deliveries", sa.Column("webhook_batch_id", uuid_pk, nullable=True))
+    op.create_foreign_key(
+        "fk_webhook_deliveries_webhook_batch_id",
+        "webhook_deliveries",
+        "webhook_batches",
+        ["webhook_batch_id"],
+        ["id"],
+        ondelete="RESTRICT",
+    )
+    op.create_index(
+        "ix_webhook_deliveries_webhook_batch_id", "webhook_deliveries", ["webhook_batch_id"], unique=False
+    )
+    # Las deliveries que esperan lote se buscan por endpoint y antiguedad.
+    op.create_index(
+        "ix_webhook_deliveries_acumulando",
+        "webhook_deliveries",
+        ["webhook_endpoint_id", "fecha_creacion"],
+        unique=False,
+        postgresql_where=sa.text("status = 'acumulando'"),
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "UPDATE webhook_deliveries SET status = 'pendiente', next_attempt_at = now() "
+        "WHERE status IN ('acumulando', 'en_lote')"
+    )
+    op.drop_index("ix_webhook_deliveries_acumulando", table_name="webhook_deliveries")
+    op.drop_index("ix_webhook_deliveries_webhook_batch_id", table_name="webhook_deliveries")
+    op.drop_constraint("fk_webhook_deliveries_webhook_batch_id", "webhook_deliveries", type_="foreignkey")
+    op.drop_column("webhook_deliveries", "webhook_batch_id")
+    op.drop_index("ix_webhook_batches_status_next_attempt_at", table_name="webhook_batches")
+    op.drop_index("ix_webhook_batches_webhook_endpoint_id", table_name="webhook_batches")
+    op.drop_index("ix_webhook_batches_organizacion_id", table_name="webhook_batches")
+    op.drop_table("webhook_batches")
+    op.drop_column("webhook_endpoints", "lote_max_segundos")
+    op.drop_column("webhook_endpoints", "lote_max_eventos")
+    op.drop_column("webhook_endpoints", "modo_lote")
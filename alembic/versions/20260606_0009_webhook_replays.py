@@ -0,0 +1,63 @@
+"""webhook_replays
+
+Revision ID: 20260606_0009
+Revises: 20260605_0008
+Create Date: 2026-06-06 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260606_0009"
+down_revision: Union[str, None] = "20260605_0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "webhook_replays",
+        sa.Column("id", uuid_pk, nullable=False),
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("solicitado_por_id", uuid_pk, nullable=True),
+        sa.Column("filtros", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("tasa_por_segundo", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("encoladas", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("status", sa.String(length=30), nullable=False),
+        sa.Column("fecha_creacion", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fecha_ultima_alimentacion", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("fecha_finalizacion", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.ForeignKeyConstraint(["solicitado_por_id"], ["usuarios.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_webhook_replays_organizacion_id", "webhook_replays", ["organizacion_id"], unique=False)
+    op.create_index("ix_webhook_replays_status", "webhook_replays", ["status"], unique=False)
+    op.add_column("webhook_deliveries", sa.Column("webhook_replay_id", uuid_pk, nullable=True))
+    op.create_foreign_key(
+        "fk_webhook_deliveries_webhook_replay_id",
+        "webhook_deliveries",
+        "webhook_replays",
+        ["webhook_replay_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+    op.create_index(
+        "ix_webhook_deliveries_webhook_replay_id", "webhook_deliveries", ["webhook_replay_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE webhook_deliveries SET status = 'pendiente', next_attempt_at = now() WHERE status = 'reenvio'")
+    op.drop_index("ix_webhook_deliveries_webhook_replay_id", table_name="webhook_deliveries")
+    op.drop_constraint("fk_webhook_deliveries_webhook_replay_id", "webhook_deliveries", type_="foreignkey")
+    op.drop_column("webhook_deliveries", "webhook_replay_id")
+    op.drop_index("ix_webhook_replays_status", table_name="webhook_replays")
+    op.drop_index("ix_webhook_replays_organizacion_id", table_name="webhook_replays")
+    op.drop_table("webhook_replays")
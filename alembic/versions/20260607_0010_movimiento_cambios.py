@@ -0,0 +1,50 @@
+"""movimiento_cambios
+
+Revision ID: 20260607_0010
+Revises: 20260606_0009
+Create Date: 2026-06-07 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260607_0010"
+down_revision: Union[str, None] = "20260606_0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "movimiento_cambios",
+        sa.Column("id", sa.BigInteger(), sa.Identity(always=False), nullable=False),
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("movimiento_id", uuid_pk, nullable=False),
+        sa.Column("tipo", sa.String(length=20), nullable=False),
+        sa.Column("fecha", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.ForeignKeyConstraint(["movimiento_id"], ["movimientos.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_movimiento_cambios_organizacion_id_id", "movimiento_cambios", ["organizacion_id", "id"], unique=False
+    )
+    # Los movimientos existentes entran al feed una vez, en orden de fecha, con su estado actual.
+    op.execute(
+        """
+        INSERT INTO movimiento_cambios (organizacion_id, movimiento_id, tipo, fecha)
+        SELECT organizacion_id, id, 'creado', fecha
+        FROM movimientos
+        ORDER BY fecha, id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_movimiento_cambios_organizacion_id_id", table_name="movimiento_cambios")
+    op.drop_table("movimiento_cambios")
@@ -0,0 +1,54 @@
+"""ecommerce_procesamiento_asincrono
+
+Revision ID: 20260608_0011
+Revises: 20260607_0010
+Create Date: 2026-06-08 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260608_0011"
+down_revision: Union[str, None] = "20260607_0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.add_column("ecommerce_order_events", sa.Column("api_key_id", uuid_pk, nullable=True))
+    op.add_column(
+        "ecommerce_order_events",
+        sa.Column("intentos_procesamiento", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "ecommerce_order_events",
+        sa.Column("fecha_proximo_intento", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_foreign_key(
+        "fk_ecommerce_order_events_api_key_id",
+        "ecommerce_order_events",
+        "api_keys",
+        ["api_key_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+    op.create_index(
+        "ix_ecommerce_order_events_pendientes",
+        "ecommerce_order_events",
+        ["fecha_proximo_intento"],
+        unique=False,
+        postgresql_where=sa.text("procesado = false"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ecommerce_order_events_pendientes", table_name="ecommerce_order_events")
+    op.drop_constraint("fk_ecommerce_order_events_api_key_id", "ecommerce_order_events", type_="foreignkey")
+    op.drop_column("ecommerce_order_events", "fecha_proximo_intento")
+    op.drop_column("ecommerce_order_events", "intentos_procesamiento")
+    op.drop_column("ecommerce_order_events", "api_key_id")
@@ -0,0 +1,30 @@
+"""wallet_principal_unica
+
+Revision ID: 20260609_0012
+Revises: 20260608_0011
+Create Date: 2026-06-09 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260609_0012"
+down_revision: Union[str, None] = "20260608_0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ux_wallets_principal_usuario",
+        "wallets",
+        ["usuario_id"],
+        unique=True,
+        postgresql_where=sa.text("es_principal AND estado <> 'cerrada'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_wallets_principal_usuario", table_name="wallets")
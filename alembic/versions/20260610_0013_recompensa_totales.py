@@ -0,0 +1,86 @@
+"""recompensa_totales
+
+Revision ID: 20260610_0013
+Revises: 20260609_0012
+Create Date: 2026-06-10 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260610_0013"
+down_revision: Union[str, None] = "20260609_0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+moneda_recompensa = postgresql.ENUM("ARS", "USD", "PUNTOS", name="moneda_recompensa", create_type=False)
+
+
+def _columnas_acumuladas() -> list[sa.Column]:
+    return [
+        sa.Column("cantidad_aplicaciones", sa.Integer(), nullable=False),
+        sa.Column("monto_compra_total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("monto_recompensa_total", sa.Numeric(18, 2), nullable=False),
+        sa.Column("fecha_ultima_aplicacion", sa.DateTime(timezone=True), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "recompensa_totales_usuario",
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("usuario_id", uuid_pk, nullable=False),
+        sa.Column("moneda_recompensa", moneda_recompensa, nullable=False),
+        *_columnas_acumuladas(),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("organizacion_id", "usuario_id", "moneda_recompensa"),
+    )
+    op.create_table(
+        "recompensa_totales_regla",
+        sa.Column("regla_id", uuid_pk, nullable=False),
+        sa.Column("moneda_recompensa", moneda_recompensa, nullable=False),
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        *_columnas_acumuladas(),
+        sa.ForeignKeyConstraint(["regla_id"], ["reglas_recompensa.id"], ondelete="RESTRICT"),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("regla_id", "moneda_recompensa"),
+    )
+    op.create_index(
+        "ix_recompensa_totales_regla_organizacion_id", "recompensa_totales_regla", ["organizacion_id"], unique=False
+    )
+    # Las aplicaciones existentes se suman una vez; desde aca las acumula cada transaccion que aplica.
+    op.execute(
+        """
+        INSERT INTO recompensa_totales_usuario (
+            organizacion_id, usuario_id, moneda_recompensa, cantidad_aplicaciones,
+            monto_compra_total, monto_recompensa_total, fecha_ultima_aplicacion
+        )
+        SELECT organizacion_id, usuario_id, moneda_recompensa, count(*),
+               sum(monto_compra), sum(monto_recompensa), max(fecha_creacion)
+        FROM aplicaciones_recompensa
+        GROUP BY organizacion_id, usuario_id, moneda_recompensa
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO recompensa_totales_regla (
+            regla_id, moneda_recompensa, organizacion_id, cantidad_aplicaciones,
+            monto_compra_total, monto_recompensa_total, fecha_ultima_aplicacion
+        )
+        SELECT regla_id, moneda_recompensa, organizacion_id, count(*),
+               sum(monto_compra), sum(monto_recompensa), max(fecha_creacion)
+        FROM aplicaciones_recompensa
+        GROUP BY regla_id, moneda_recompensa, organizacion_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_recompensa_totales_regla_organizacion_id", table_name="recompensa_totales_regla")
+    op.drop_table("recompensa_totales_regla")
+    op.drop_table("recompensa_totales_usuario")
@@ -0,0 +1,52 @@
+"""vencimiento_puntos
+
+Revision ID: 20260611_0014
+Revises: 20260610_0013
+Create Date: 2026-06-11 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260611_0014"
+down_revision: Union[str, None] = "20260610_0013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_aplicaciones_recompensa_fecha_creacion_moneda",
+        "aplicaciones_recompensa",
+        ["fecha_creacion", "moneda_recompensa"],
+        unique=False,
+    )
+    op.create_table(
+        "ejecuciones_vencimiento_puntos",
+        sa.Column("id", uuid_pk, nullable=False),
+        sa.Column("corte", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("desde", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("procesado_hasta", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("wallets_vencidas", sa.Integer(), nullable=False),
+        sa.Column("puntos_vencidos", sa.Numeric(18, 2), nullable=False),
+        sa.Column("fecha_inicio", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("fecha_fin", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_ejecuciones_vencimiento_puntos_procesado_hasta",
+        "ejecuciones_vencimiento_puntos",
+        ["procesado_hasta"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ejecuciones_vencimiento_puntos_procesado_hasta", table_name="ejecuciones_vencimiento_puntos")
+    op.drop_table("ejecuciones_vencimiento_puntos")
+    op.drop_index("ix_aplicaciones_recompensa_fecha_creacion_moneda", table_name="aplicaciones_recompensa")
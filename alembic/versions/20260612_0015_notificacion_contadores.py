@@ -0,0 +1,62 @@
+"""notificacion_contadores
+
+Revision ID: 20260612_0015
+Revises: 20260611_0014
+Create Date: 2026-06-12 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "20260612_0015"
+down_revision: Union[str, None] = "20260611_0014"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+uuid_pk = postgresql.UUID(as_uuid=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notificacion_contadores_usuario",
+        sa.Column("usuario_id", uuid_pk, nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("no_leidas", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["usuario_id"], ["usuarios.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("usuario_id"),
+    )
+    op.create_table(
+        "notificacion_contadores_organizacion",
+        sa.Column("organizacion_id", uuid_pk, nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("no_leidas", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["organizacion_id"], ["organizaciones.id"], ondelete="RESTRICT"),
+        sa.PrimaryKeyConstraint("organizacion_id"),
+    )
+    # Las notificaciones existentes se cuentan una vez; desde aca los contadores se mantienen en cada cambio.
+    op.execute(
+        """
+        INSERT INTO notificacion_contadores_usuario (usuario_id, total, no_leidas)
+        SELECT usuario_id, count(*), count(*) FILTER (WHERE NOT leida)
+        FROM notificaciones
+        WHERE canal = 'interna' AND usuario_id IS NOT NULL
+        GROUP BY usuario_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO notificacion_contadores_organizacion (organizacion_id, total, no_leidas)
+        SELECT organizacion_id, count(*), count(*) FILTER (WHERE NOT leida)
+        FROM notificaciones
+        WHERE canal = 'interna'
+        GROUP BY organizacion_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("notificacion_contadores_organizacion")
+    op.drop_table("notificacion_contadores_usuario")
@@ -0,0 +1,39 @@
+"""movimiento_cambios_txid
+
+Revision ID: 20260613_0016
+Revises: 20260612_0015
+Create Date: 2026-06-13 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260613_0016"
+down_revision: Union[str, None] = "20260612_0015"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Los cambios existentes ya estan confirmados: con txid 0 quedan antes de cualquier transaccion nueva.
+    op.add_column(
+        "movimiento_cambios",
+        sa.Column("txid", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+    )
+    op.drop_index("ix_movimiento_cambios_organizacion_id_id", table_name="movimiento_cambios")
+    op.create_index(
+        "ix_movimiento_cambios_organizacion_id_txid_id",
+        "movimiento_cambios",
+        ["organizacion_id", "txid", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_movimiento_cambios_organizacion_id_txid_id", table_name="movimiento_cambios")
+    op.create_index(
+        "ix_movimiento_cambios_organizacion_id_id", "movimiento_cambios", ["organizacion_id", "id"], unique=False
+    )
+    op.drop_column("movimiento_cambios", "txid")
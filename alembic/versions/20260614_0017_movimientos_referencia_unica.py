@@ -0,0 +1,50 @@
+"""movimientos_referencia_unica
+
+Revision ID: 20260614_0017
+Revises: 20260613_0016
+Create Date: 2026-06-14 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260614_0017"
+down_revision: Union[str, None] = "20260613_0016"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REFERENCIA_UNICA_WHERE = "referencia_externa IS NOT NULL AND tipo IN ('deposito', 'cashback')"
+
+
+def upgrade() -> None:
+    # Los duplicados previos se revisan a mano (reversar o corregir la referencia) antes de migrar.
+    duplicados = op.get_bind().execute(
+        sa.text(
+            f"""
+            SELECT count(*) FROM (
+                SELECT 1 FROM movimientos
+                WHERE {REFERENCIA_UNICA_WHERE}
+                GROUP BY organizacion_id, tipo, referencia_externa
+                HAVING count(*) > 1
+            ) AS repetidas
+            """
+        )
+    ).scalar_one()
+    if duplicados:
+        raise RuntimeError(
+            f"Hay {duplicados} referencias externas repetidas en depositos o cashbacks de una misma organizacion; "
+            "corregirlas antes de crear uq_movimientos_organizacion_tipo_referencia."
+        )
+    op.create_index(
+        "uq_movimientos_organizacion_tipo_referencia",
+        "movimientos",
+        ["organizacion_id", "tipo", "referencia_externa"],
+        unique=True,
+        postgresql_where=sa.text(REFERENCIA_UNICA_WHERE),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_movimientos_organizacion_tipo_referencia", table_name="movimientos")
@@ -0,0 +1,52 @@
+"""notificacion_contadores_fragmentos
+
+Revision ID: 20260615_0018
+Revises: 20260614_0017
+Create Date: 2026-06-15 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20260615_0018"
+down_revision: Union[str, None] = "20260614_0017"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Los contadores existentes quedan en el fragmento 0; las lecturas suman todos los fragmentos.
+    op.add_column(
+        "notificacion_contadores_organizacion",
+        sa.Column("fragmento", sa.SmallInteger(), nullable=False, server_default="0"),
+    )
+    op.alter_column("notificacion_contadores_organizacion", "fragmento", server_default=None)
+    op.drop_constraint("notificacion_contadores_organizacion_pkey", "notificacion_contadores_organizacion")
+    op.create_primary_key(
+        "notificacion_contadores_organizacion_pkey",
+        "notificacion_contadores_organizacion",
+        ["organizacion_id", "fragmento"],
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        INSERT INTO notificacion_contadores_organizacion (organizacion_id, fragmento, total, no_leidas)
+        SELECT organizacion_id, 0, sum(total), sum(no_leidas)
+        FROM notificacion_contadores_organizacion
+        GROUP BY organizacion_id
+        ON CONFLICT (organizacion_id, fragmento)
+        DO UPDATE SET total = EXCLUDED.total, no_leidas = EXCLUDED.no_leidas
+        """
+    )
+    op.execute("DELETE FROM notificacion_contadores_organizacion WHERE fragmento <> 0")
+    op.drop_constraint("notificacion_contadores_organizacion_pkey", "notificacion_contadores_organizacion")
+    op.drop_column("notificacion_contadores_organizacion", "fragmento")
+    op.create_primary_key(
+        "notificacion_contadores_organizacion_pkey",
+        "notificacion_contadores_organizacion",
+        ["organizacion_id"],
+    )
@@ -30,7 +30,7 @@ def _normalizar_actor(
     return "sistema", None, None
 
 
-def registrar_evento(
+def agregar_evento(
     db: Session,
     *,
     organizacion_id: UUID | None,
@@ -43,7 +43,8 @@ def registrar_evento(
     endpoint: str | None = None,
     ip: str | None = None,
     metadata: dict[str, Any] | None = None,
-) -> AuditLogResponse:
+) -> AuditLog:
+    """Agrega el evento a la transaccion en curso, sin confirmar."""
     tipo, usuario_id, api_key_id = _normalizar_actor(actor_tipo, actor_usuario_id, actor_api_key_id)
     log = AuditLog(
         evento=evento,
@@ -58,6 +59,36 @@ def registrar_evento(
         metadata_log=metadata,
     )
     db.add(log)
+    return log
+
+
+def registrar_evento(
+    db: Session,
+    *,
+    organizacion_id: UUID | None,
+    evento: str,
+    mensaje: str,
+    nivel: str = "INFO",
+    actor_tipo: AuditActorTipo | None = None,
+    actor_usuario_id: UUID | None = None,
+    actor_api_key_id: UUID | None = None,
+    endpoint: str | None = None,
+    ip: str | None = None,
+    metadata: dict[str, Any] | None = None,
+) -> AuditLogResponse:
+    log = agregar_evento(
+        db,
+        organizacion_id=organizacion_id,
+        evento=evento,
+        mensaje=mensaje,
+        nivel=nivel,
+        actor_tipo=actor_tipo,
+        actor_usuario_id=actor_usuario_id,
+        actor_api_key_id=actor_api_key_id,
+        endpoint=endpoint,
+        ip=ip,
+        metadata=metadata,
+    )
     db.commit()
     db.refresh(log)
     return AuditLogResponse.model_validate(log)
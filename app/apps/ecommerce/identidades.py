@@ -0,0 +1,129 @@
+"""Cache en memoria de identidades de clientes ecommerce: (organizacion, email) -> usuario y wallets.
+
+La mayoria de las ordenes son de clientes que ya compraron; el cache evita resolver email -> usuario
+-> wallet principal -> wallet de recompensa en cada orden. Se carga despues de confirmar una orden y
+se invalida al cerrar, congelar o reasignar una wallet o al desactivar un usuario en este proceso;
+``ECOMMERCE_IDENTITY_CACHE_SECONDS`` acota cuanto tarda otro proceso en ver el cambio. El uso del cache
+nunca acredita en una wallet inactiva: la wallet cacheada se bloquea verificando su estado y el del
+cliente en la misma consulta.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import event, inspect
+
+from app.apps.usuarios.models import Usuario
+from app.apps.wallets.models import Wallet
+from app.core.config import settings
+from app.shared.enums import MonedaWallet
+
+
+CAMPOS_WALLET_IDENTIDAD = ("estado", "es_principal", "moneda", "usuario_id", "organizacion_id")
+CAMPOS_USUARIO_IDENTIDAD = ("es_activo", "email", "organizacion_id")
+
+
+class IdentidadCliente(NamedTuple):
+    usuario_id: UUID
+    wallet_principal_id: UUID | None = None
+    wallets_recompensa: tuple[tuple[MonedaWallet, UUID], ...] = ()
+
+    def wallet_recompensa(self, moneda: MonedaWallet) -> UUID | None:
+        return next((wallet_id for clave, wallet_id in self.wallets_recompensa if clave == moneda), None)
+
+    def con_wallet_recompensa(self, moneda: MonedaWallet, wallet_id: UUID) -> IdentidadCliente:
+        otras = tuple(item for item in self.wallets_recompensa if item[0] != moneda)
+        return self._replace(wallets_recompensa=(*otras, (moneda, wallet_id)))
+
+
+class IdentidadCache:
+    def __init__(self) -> None:
+        self._entradas: OrderedDict[tuple[UUID, str], tuple[float, IdentidadCliente]] = OrderedDict()
+        self._claves_por_usuario: dict[UUID, tuple[UUID, str]] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, organizacion_id: UUID, email: str) -> IdentidadCliente | None:
+        clave = (organizacion_id, email)
+        with self._lock:
+            cached = self._entradas.get(clave)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[0] >= settings.ECOMMERCE_IDENTITY_CACHE_SECONDS:
+                self._quitar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return cached[1]
+
+    def guardar(self, organizacion_id: UUID, email: str, identidad: IdentidadCliente) -> None:
+        if settings.ECOMMERCE_IDENTITY_CACHE_SECONDS <= 0:
+            return
+        clave = (organizacion_id, email)
+        with self._lock:
+            anterior = self._entradas.get(clave)
+            if anterior is not None and anterior[1].usuario_id == identidad.usuario_id:
+                # Se conservan las wallets de otras monedas ya resueltas para el mismo cliente.
+                for moneda, wallet_id in anterior[1].wallets_recompensa:
+                    if identidad.wallet_recompensa(moneda) is None:
+                        identidad = identidad.con_wallet_recompensa(moneda, wallet_id)
+            self._entradas[clave] = (time.monotonic(), identidad)
+            self._entradas.move_to_end(clave)
+            self._claves_por_usuario[identidad.usuario_id] = clave
+            while len(self._entradas) > settings.ECOMMERCE_IDENTITY_CACHE_SIZE:
+                self._quitar(next(iter(self._entradas)))
+
+    def invalidar_usuario(self, usuario_id: UUID) -> None:
+        with self._lock:
+            clave = self._claves_por_usuario.get(usuario_id)
+            if clave is not None:
+                self._quitar(clave)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._claves_por_usuario.clear()
+
+    def _quitar(self, clave: tuple[UUID, str]) -> None:
+        cached = self._entradas.pop(clave, None)
+        if cached is not None and self._claves_por_usuario.get(cached[1].usuario_id) == clave:
+            del self._claves_por_usuario[cached[1].usuario_id]
+
+
+identidades_clientes = IdentidadCache()
+
+
+def _cambio_alguno(target: object, campos: tuple[str, ...]) -> bool:
+    attrs = inspect(target).attrs
+    return any(getattr(attrs, campo).history.has_changes() for campo in campos)
+
+
+@event.listens_for(Wallet, "after_insert")
+@event.listens_for(Wallet, "after_delete")
+def _invalidar_por_wallet(mapper, connection, target: Wallet) -> None:
+    if target.usuario_id is not None:
+        identidades_clientes.invalidar_usuario(target.usuario_id)
+
+
+@event.listens_for(Wallet, "after_update")
+def _invalidar_por_cambio_wallet(mapper, connection, target: Wallet) -> None:
+    # El saldo cambia en cada recompensa: solo invalidan los campos que deciden que wallet se usa.
+    if not _cambio_alguno(target, CAMPOS_WALLET_IDENTIDAD):
+        return
+    historial = inspect(target).attrs.usuario_id.history
+    for usuario_id in (target.usuario_id, *historial.deleted):
+        if usuario_id is not None:
+            identidades_clientes.invalidar_usuario(usuario_id)
+
+
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_por_baja_usuario(mapper, connection, target: Usuario) -> None:
+    identidades_clientes.invalidar_usuario(target.id)
+
+
+@event.listens_for(Usuario, "after_update")
+def _invalidar_por_usuario(mapper, connection, target: Usuario) -> None:
+    if _cambio_alguno(target, CAMPOS_USUARIO_IDENTIDAD):
+        identidades_clientes.invalidar_usuario(target.id)
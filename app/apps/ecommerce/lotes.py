@@ -0,0 +1,632 @@
+"""Ingesta masiva de ordenes pagadas (backfills de tiendas).
+
+Cada tramo de ``ECOMMERCE_LOTE_CHUNK_SIZE`` ordenes es una transaccion: los duplicados se resuelven
+con un ``INSERT ... ON CONFLICT DO NOTHING RETURNING``, los clientes se buscan y crean por email en
+bloque, las reglas se evaluan en memoria y las wallets, movimientos, recompensas, notificaciones y
+auditorias se escriben con un solo flush. Un error de una orden no afecta al resto del tramo.
+"""
+from __future__ import annotations
+
+import json
+import secrets
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, NamedTuple
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.apps.auditoria.models import AuditLog
+from app.apps.ecommerce.models import EcommerceOrderEvent
+from app.apps.ecommerce.schemas import (
+    EcommerceOrderEventResponse,
+    EcommerceOrderLoteItemResultado,
+    EcommerceOrderLoteResponse,
+    EcommerceOrderPaidRequest,
+    EcommerceOrderPaidResponse,
+)
+from app.apps.ecommerce.services import (
+    NO_REWARD_RULE_MESSAGE,
+    _amount,
+    _as_utc,
+    _insert,
+    _json_metadata,
+    _movement_type_for_reward,
+    _now,
+    _raw_payload,
+    _reward_currency_to_wallet_currency,
+)
+from app.apps.integraciones.dependencies import APIKeyContext
+from app.apps.movimientos.models import Movimiento
+from app.apps.movimientos.schemas import MovimientoResponse
+from app.apps.notificaciones.contadores import sumar_notificaciones
+from app.apps.notificaciones.models import Notificacion
+from app.apps.planes.limit_service import (
+    cupo_movimientos_mes,
+    cupo_usuarios,
+    cupo_wallets,
+    validar_limite_movimientos_mes,
+    validar_limite_usuarios,
+    validar_limite_wallets,
+)
+from app.apps.recompensas.models import AplicacionRecompensa
+from app.apps.recompensas.motor import a_centavos, a_microsegundos, reglas_organizacion
+from app.apps.recompensas.schemas import AplicacionRecompensaResponse
+from app.apps.recompensas.totales import acumular_totales
+from app.apps.usuarios.models import Usuario
+from app.apps.wallets.models import Wallet
+from app.core.config import settings
+from app.core.security import hash_password
+from app.shared.enums import (
+    CanalNotificacion,
+    EstadoMovimiento,
+    EstadoOrganizacion,
+    EstadoWallet,
+    MonedaWallet,
+    OwnerTypeWallet,
+    RolUsuario,
+    TipoNotificacion,
+    TipoWallet,
+)
+
+
+ERROR_TRAMO = "No se pudo procesar la orden."
+
+
+@dataclass
+class _Orden:
+    indice: int
+    datos: EcommerceOrderPaidRequest
+    resultado: EcommerceOrderLoteItemResultado
+    event: dict[str, Any] = field(default_factory=dict)
+    aplicacion: AplicacionRecompensa | None = None
+    movimiento: Movimiento | None = None
+
+
+class ResultadoLoteOrdenes(NamedTuple):
+    respuesta: EcommerceOrderLoteResponse
+    ordenes: list[EcommerceOrderPaidResponse]
+
+
+def leer_ordenes_lote(body: bytes, content_type: str | None) -> list[EcommerceOrderPaidRequest | str]:
+    """Parsea un arreglo JSON o NDJSON. Cada orden invalida queda como el texto de su error."""
+    if "ndjson" in (content_type or "") or "jsonl" in (content_type or ""):
+        crudos: list[Any] = []
+        for linea in body.decode("utf-8").splitlines():
+            if not linea.strip():
+                continue
+            try:
+                crudos.append(json.loads(linea))
+            except ValueError:
+                crudos.append(None)
+    else:
+        try:
+            crudos = json.loads(body or b"null")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo no es JSON valido.")
+        if not isinstance(crudos, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Se espera un arreglo de ordenes.")
+    if not crudos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El lote no tiene ordenes.")
+    if len(crudos) > settings.ECOMMERCE_LOTE_MAX_ORDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote admite hasta {settings.ECOMMERCE_LOTE_MAX_ORDERS} ordenes.",
+        )
+    ordenes: list[EcommerceOrderPaidRequest | str] = []
+    for crudo in crudos:
+        if not isinstance(crudo, dict):
+            ordenes.append("Orden invalida.")
+            continue
+        try:
+            ordenes.append(EcommerceOrderPaidRequest.model_validate(crudo))
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            campo = ".".join(str(parte) for parte in error["loc"])
+            ordenes.append(f"{campo}: {error['msg']}" if campo else error["msg"])
+    return ordenes
+
+
+def registrar_orders_paid_lote(
+    ordenes: list[EcommerceOrderPaidRequest | str],
+    context: APIKeyContext,
+    db: Session,
+) -> ResultadoLoteOrdenes:
+    organizacion = context.organizacion
+    if organizacion.estado != EstadoOrganizacion.activa:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Organizacion inactiva.")
+    organizacion_id = organizacion.id
+    api_key_id = context.api_key.id
+
+    resultados: list[EcommerceOrderLoteItemResultado] = []
+    validas: list[_Orden] = []
+    vistas: set[tuple[str, str]] = set()
+    for indice, datos in enumerate(ordenes):
+        if isinstance(datos, str):
+            resultados.append(EcommerceOrderLoteItemResultado(indice=indice, status="error", error=datos))
+            continue
+        resultado = EcommerceOrderLoteItemResultado(
+            indice=indice,
+            proveedor=datos.proveedor,
+            external_order_id=datos.external_order_id,
+            status="procesada",
+        )
+        resultados.append(resultado)
+        clave = (datos.proveedor, datos.external_order_id)
+        if clave in vistas:
+            resultado.status = "duplicada"
+            continue
+        vistas.add(clave)
+        try:
+            MonedaWallet(datos.currency)
+        except ValueError:
+            resultado.status = "error"
+            resultado.error = f"Moneda no soportada para ecommerce: {datos.currency}."
+            continue
+        validas.append(_Orden(indice=indice, datos=datos, resultado=resultado))
+
+    procesadas: list[EcommerceOrderPaidResponse] = []
+    chunk_size = max(settings.ECOMMERCE_LOTE_CHUNK_SIZE, 1)
+    for inicio in range(0, len(validas), chunk_size):
+        tramo = validas[inicio : inicio + chunk_size]
+        try:
+            procesadas.extend(_procesar_tramo(tramo, organizacion_id=organizacion_id, api_key_id=api_key_id, db=db))
+        except Exception:
+            db.rollback()
+            for orden in tramo:
+                orden.resultado.status = "error"
+                orden.resultado.error = ERROR_TRAMO
+                orden.resultado.event_id = orden.resultado.aplicacion_id = orden.resultado.movimiento_id = None
+
+    respuesta = EcommerceOrderLoteResponse(
+        procesadas=sum(1 for resultado in resultados if resultado.status == "procesada"),
+        fallidas=sum(1 for resultado in resultados if resultado.status == "fallida"),
+        duplicadas=sum(1 for resultado in resultados if resultado.status == "duplicada"),
+        errores=sum(1 for resultado in resultados if resultado.status == "error"),
+        resultados=resultados,
+    )
+    return ResultadoLoteOrdenes(respuesta=respuesta, ordenes=procesadas)
+
+
+def _detalle_limite(validar: Callable[[Session, UUID], None], db: Session, organizacion_id: UUID) -> str:
+    try:
+        validar(db, organizacion_id)
+    except HTTPException as exc:
+        return str(exc.detail)
+    return "Limite del plan alcanzado."
+
+
+class _Cupo:
+    """Cupo de un limite del plan para el tramo; el detalle del 403 se arma una sola vez."""
+
+    def __init__(self, db: Session, organizacion_id: UUID, cupo: Callable, validar: Callable) -> None:
+        self._db = db
+        self._organizacion_id = organizacion_id
+        self._validar = validar
+        self.disponible: int | None = cupo(db, organizacion_id)
+        self._detalle: str | None = None
+
+    def tomar(self) -> str | None:
+        """Consume una unidad; devuelve el error si no queda cupo."""
+        if self.disponible is None:
+            return None
+        if self.disponible <= 0:
+            if self._detalle is None:
+                self._detalle = _detalle_limite(self._validar, self._db, self._organizacion_id)
+            return self._detalle
+        self.disponible -= 1
+        return None
+
+
+def _procesar_tramo(
+    tramo: list[_Orden],
+    *,
+    organizacion_id: UUID,
+    api_key_id: UUID,
+    db: Session,
+) -> list[EcommerceOrderPaidResponse]:
+    now = _now()
+    ordenes = _insertar_eventos(tramo, organizacion_id=organizacion_id, api_key_id=api_key_id, now=now, db=db)
+    if not ordenes:
+        db.rollback()
+        return []
+
+    auditorias: list[AuditLog] = []
+
+    def auditar(evento: str, mensaje: str, metadata: dict[str, Any], nivel: str = "INFO") -> None:
+        auditorias.append(
+            AuditLog(
+                evento=evento,
+                mensaje=mensaje,
+                nivel=nivel,
+                actor_tipo="api_key",
+                actor_api_key_id=api_key_id,
+                organizacion_id=organizacion_id,
+                metadata_log=_json_metadata(metadata),
+            )
+        )
+
+    usuarios = _resolver_clientes(ordenes, organizacion_id=organizacion_id, db=db, auditar=auditar)
+    wallets_por_usuario: dict[UUID, list[Wallet]] = {}
+    if usuarios:
+        # Las wallets se bloquean en orden de id: dos tramos con clientes en comun no se bloquean mutuamente.
+        for wallet in db.scalars(
+            select(Wallet)
+            .where(
+                Wallet.owner_type == OwnerTypeWallet.usuario,
+                Wallet.usuario_id.in_([usuario.id for usuario in usuarios.values()]),
+                Wallet.organizacion_id == organizacion_id,
+                Wallet.estado != EstadoWallet.cerrada,
+            )
+            .order_by(Wallet.id)
+            .with_for_update()
+        ).all():
+            wallets_por_usuario.setdefault(wallet.usuario_id, []).append(wallet)
+
+    reglas = reglas_organizacion(db, organizacion_id)
+    now_us = a_microsegundos(now)
+    cupo_wallet = _Cupo(db, organizacion_id, cupo_wallets, validar_limite_wallets)
+    cupo_movimiento = _Cupo(db, organizacion_id, cupo_movimientos_mes, validar_limite_movimientos_mes)
+    nuevos: list[Any] = []
+    notificaciones: list[Notificacion] = []
+
+    def crear_wallet(usuario: Usuario, moneda: MonedaWallet, *, alias: str, principal: bool) -> Wallet | str:
+        error = cupo_wallet.tomar()
+        if error is not None:
+            return error
+        wallet = Wallet(
+            id=uuid4(),
+            alias=alias,
+            tipo=TipoWallet.principal if principal else TipoWallet.recompensas,
+            estado=EstadoWallet.activa,
+            moneda=moneda,
+            saldo=Decimal("0.00"),
+            es_principal=principal,
+            owner_type=OwnerTypeWallet.usuario,
+            usuario_id=usuario.id,
+            organizacion_owner_id=None,
+            organizacion_id=organizacion_id,
+            fecha_creacion=now,
+        )
+        nuevos.append(wallet)
+        wallets_por_usuario.setdefault(usuario.id, []).append(wallet)
+        auditar("ecommerce.wallet_cliente_creada", "Wallet de cliente ecommerce creada.", {"usuario_id": usuario.id})
+        return wallet
+
+    for orden in ordenes:
+        if orden.resultado.status == "fallida":
+            continue
+        datos = orden.datos
+        usuario = usuarios[datos.customer_email]
+        wallets = wallets_por_usuario.get(usuario.id, [])
+        if not any(wallet.es_principal for wallet in wallets):
+            creada = crear_wallet(usuario, MonedaWallet(datos.currency), alias="Wallet ecommerce", principal=True)
+            if isinstance(creada, str):
+                _fallar(orden, creada)
+                continue
+            wallets = wallets_por_usuario[usuario.id]
+
+        monto_compra = _amount(datos.amount)
+        regla = reglas.seleccionar_centavos(a_centavos(monto_compra), now_us)
+        if regla is None:
+            _fallar(orden, NO_REWARD_RULE_MESSAGE)
+            continue
+
+        moneda = _reward_currency_to_wallet_currency(regla.moneda_recompensa)
+        candidatas = sorted(
+            (wallet for wallet in wallets if wallet.moneda == moneda and wallet.estado == EstadoWallet.activa),
+            key=lambda wallet: (not wallet.es_principal, _as_utc(wallet.fecha_creacion)),
+        )
+        wallet = candidatas[0] if candidatas else crear_wallet(
+            usuario,
+            moneda,
+            alias=f"Recompensas ecommerce {moneda.value}",
+            principal=not wallets,
+        )
+        if isinstance(wallet, str):
+            _fallar(orden, wallet)
+            continue
+        monto_recompensa = regla.calcular_recompensa(monto_compra)
+        error = cupo_movimiento.tomar()
+        if error is not None:
+            _fallar(orden, error)
+            continue
+
+        wallet.saldo = _amount(wallet.saldo) + monto_recompensa
+        metadata = _json_metadata(
+            {
+                "ecommerce_event_id": orden.event["id"],
+                "proveedor": datos.proveedor,
+                "external_order_id": datos.external_order_id,
+                "customer_email": datos.customer_email,
+                "amount": monto_compra,
+                "currency": datos.currency,
+                "metadata": datos.metadata or {},
+                "regla_id": regla.id,
+                "tipo_recompensa": regla.tipo.value,
+                "moneda_recompensa": regla.moneda_recompensa.value,
+                "monto_compra": str(monto_compra),
+            }
+        )
+        referencia = f"ecommerce:{orden.event['id']}"
+        orden.movimiento = Movimiento(
+            id=uuid4(),
+            wallet_origen_id=None,
+            wallet_destino_id=wallet.id,
+            organizacion_id=organizacion_id,
+            monto=monto_recompensa,
+            moneda=moneda,
+            tipo=_movement_type_for_reward(regla.tipo),
+            estado=EstadoMovimiento.aprobada,
+            descripcion=f"Recompensa ecommerce: {regla.nombre}",
+            referencia_externa=referencia,
+            metadata_movimiento=metadata,
+            es_reversa=False,
+        )
+        orden.aplicacion = AplicacionRecompensa(
+            id=uuid4(),
+            organizacion_id=organizacion_id,
+            regla_id=regla.id,
+            usuario_id=usuario.id,
+            wallet_destino_id=wallet.id,
+            movimiento_id=orden.movimiento.id,
+            monto_compra=monto_compra,
+            monto_recompensa=monto_recompensa,
+            moneda_recompensa=regla.moneda_recompensa,
+            referencia_externa=referencia,
+            metadata_aplicacion=metadata,
+        )
+        orden.event.update(
+            procesado=True,
+            recompensa_aplicada_id=orden.aplicacion.id,
+            error_procesamiento=None,
+            fecha_procesamiento=now,
+        )
+        orden.resultado.aplicacion_id = orden.aplicacion.id
+        orden.resultado.movimiento_id = orden.movimiento.id
+        notificaciones.append(
+            Notificacion(
+                organizacion_id=organizacion_id,
+                usuario_id=usuario.id,
+                tipo=TipoNotificacion.recompensa_aplicada,
+                canal=CanalNotificacion.interna,
+                titulo="Recompensa recibida",
+                mensaje="Recibiste una recompensa por tu compra.",
+                metadata_notificacion=_json_metadata(
+                    {
+                        "ecommerce_event_id": orden.event["id"],
+                        "aplicacion_id": orden.aplicacion.id,
+                        "movimiento_id": orden.movimiento.id,
+                        "external_order_id": datos.external_order_id,
+                        "monto_recompensa": str(monto_recompensa),
+                        "moneda_recompensa": regla.moneda_recompensa.value,
+                    }
+                ),
+            )
+        )
+        metadata_recompensa = {
+            "event_id": orden.event["id"],
+            "aplicacion_id": orden.aplicacion.id,
+            "movimiento_id": orden.movimiento.id,
+            "regla_id": regla.id,
+            "external_order_id": datos.external_order_id,
+            "monto_compra": str(monto_compra),
+            "monto_recompensa": str(monto_recompensa),
+            "wallet_destino_id": wallet.id,
+            "usuario_id": usuario.id,
+        }
+        auditar(
+            "movimiento_registrado",
+            f"Movimiento {orden.movimiento.tipo.value} registrado.",
+            {
+                "movimiento_id": orden.movimiento.id,
+                "tipo_operacion": orden.movimiento.tipo.value,
+                "monto": str(monto_recompensa),
+                "moneda": moneda.value,
+                "wallet_destino_id": wallet.id,
+            },
+        )
+        auditar("recompensa_aplicada", "Recompensa aplicada.", metadata_recompensa)
+
+    for orden in ordenes:
+        if orden.resultado.status == "fallida":
+            auditar(
+                "ecommerce.order_paid_error",
+                "Orden ecommerce procesada con error.",
+                {
+                    "event_id": orden.event["id"],
+                    "error": orden.event["error_procesamiento"],
+                    "external_order_id": orden.event["external_order_id"],
+                },
+                nivel="ERROR",
+            )
+    auditar(
+        "ecommerce.lote_procesado",
+        "Lote de ordenes ecommerce procesado.",
+        {
+            "ordenes": len(ordenes),
+            "procesadas": sum(1 for orden in ordenes if orden.aplicacion is not None),
+            "fallidas": sum(1 for orden in ordenes if orden.resultado.status == "fallida"),
+        },
+    )
+
+    # Primero wallets y movimientos; las aplicaciones y los eventos los referencian.
+    db.add_all(nuevos)
+    db.add_all([orden.movimiento for orden in ordenes if orden.movimiento is not None])
+    db.flush()
+    aplicaciones = [orden.aplicacion for orden in ordenes if orden.aplicacion is not None]
+    db.add_all(aplicaciones)
+    db.flush()
+    acumular_totales(db, aplicaciones)
+    db.execute(
+        update(EcommerceOrderEvent),
+        [
+            {
+                "id": orden.event["id"],
+                "procesado": True,
+                "recompensa_aplicada_id": orden.event.get("recompensa_aplicada_id"),
+                "error_procesamiento": orden.event.get("error_procesamiento"),
+                "fecha_procesamiento": now,
+            }
+            for orden in ordenes
+        ],
+    )
+    db.add_all(notificaciones)
+    db.add_all(auditorias)
+    db.flush()
+    sumar_notificaciones(db, notificaciones)
+    respuestas = [
+        EcommerceOrderPaidResponse(
+            event=EcommerceOrderEventResponse.model_validate(orden.event),
+            recompensa_aplicada=(
+                AplicacionRecompensaResponse.model_validate(orden.aplicacion) if orden.aplicacion else None
+            ),
+            movimiento=MovimientoResponse.model_validate(orden.movimiento) if orden.movimiento else None,
+            mensaje=(
+                "Recompensa aplicada por compra ecommerce."
+                if orden.aplicacion is not None
+                else orden.event["error_procesamiento"]
+            ),
+        )
+        for orden in ordenes
+    ]
+    db.commit()
+    return respuestas
+
+
+def _fallar(orden: _Orden, mensaje: str) -> None:
+    orden.resultado.status = "fallida"
+    orden.resultado.error = mensaje
+    orden.event.update(procesado=True, error_procesamiento=mensaje)
+
+
+def _insertar_eventos(
+    tramo: list[_Orden],
+    *,
+    organizacion_id: UUID,
+    api_key_id: UUID,
+    now: datetime,
+    db: Session,
+) -> list[_Orden]:
+    """Inserta los eventos del tramo y devuelve las ordenes nuevas; el resto queda como ``duplicada``."""
+    for orden in tramo:
+        datos = orden.datos
+        orden.event = {
+            "id": uuid4(),
+            "organizacion_id": organizacion_id,
+            "proveedor": datos.proveedor,
+            "external_order_id": datos.external_order_id,
+            "customer_email": datos.customer_email,
+            "customer_name": datos.customer_name,
+            "amount": _amount(datos.amount),
+            "currency": datos.currency,
+            "status": "paid",
+            "raw_payload": _raw_payload(datos),
+            "procesado": False,
+            "recompensa_aplicada_id": None,
+            "error_procesamiento": None,
+            "api_key_id": api_key_id,
+            "intentos_procesamiento": 0,
+            "fecha_proximo_intento": None,
+            "fecha_creacion": now,
+            "fecha_procesamiento": None,
+        }
+    insertados = set(
+        db.scalars(
+            _insert(db, EcommerceOrderEvent)
+            .on_conflict_do_nothing(index_elements=["organizacion_id", "proveedor", "external_order_id"])
+            .returning(EcommerceOrderEvent.id),
+            [orden.event for orden in tramo],
+        ).all()
+    )
+    nuevas: list[_Orden] = []
+    for orden in tramo:
+        if orden.event["id"] in insertados:
+            orden.resultado.event_id = orden.event["id"]
+            nuevas.append(orden)
+        else:
+            orden.resultado.status = "duplicada"
+            orden.event = {}
+    return nuevas
+
+
+def _resolver_clientes(
+    ordenes: list[_Orden],
+    *,
+    organizacion_id: UUID,
+    db: Session,
+    auditar: Callable[..., None],
+) -> dict[str, Usuario]:
+    """Busca los clientes por email, crea los que faltan y bloquea los de la organizacion en orden de id.
+
+    Las ordenes cuyo cliente no se puede usar quedan ``fallida``. Cada cliente nuevo recibe su propio
+    hash de un password aleatorio, como en el alta individual. Los usuarios de otras organizaciones
+    con el mismo email solo se leen, sin bloquearlos, para no frenar a otros tenants.
+    """
+    emails = list(dict.fromkeys(orden.datos.customer_email for orden in ordenes))
+    existentes = set(db.scalars(select(Usuario.email).where(Usuario.email.in_(emails))).all())
+    faltantes = [email for email in emails if email not in existentes]
+    excedido = False
+    if faltantes:
+        cupo = cupo_usuarios(db, organizacion_id)
+        if cupo is not None and cupo < len(faltantes):
+            excedido = True
+            faltantes = faltantes[:cupo]
+    if faltantes:
+        nombres = {orden.datos.customer_email: orden.datos.customer_name for orden in ordenes}
+        creados = set(
+            db.scalars(
+                _insert(db, Usuario)
+                .on_conflict_do_nothing(index_elements=["email"])
+                .returning(Usuario.email),
+                [
+                    {
+                        "id": uuid4(),
+                        "nombre": nombres[email] or email,
+                        "email": email,
+                        "hashed_password": hash_password(secrets.token_urlsafe(32)),
+                        "es_activo": True,
+                        "rol": RolUsuario.cliente,
+                        "intentos_fallidos": 0,
+                        "organizacion_id": organizacion_id,
+                    }
+                    for email in faltantes
+                ],
+            ).all()
+        )
+    else:
+        creados = set()
+    detalle_limite = _detalle_limite(validar_limite_usuarios, db, organizacion_id) if excedido else None
+    usuarios = {
+        usuario.email: usuario
+        for usuario in db.scalars(
+            select(Usuario)
+            .where(Usuario.email.in_(emails), Usuario.organizacion_id == organizacion_id)
+            .order_by(Usuario.id)
+            .with_for_update()
+        ).all()
+    }
+    de_otra_organizacion = set(
+        db.scalars(
+            select(Usuario.email).where(Usuario.email.in_(emails), Usuario.organizacion_id != organizacion_id)
+        ).all()
+    )
+    for email in creados:
+        auditar(
+            "ecommerce.cliente_creado_automaticamente",
+            "Cliente ecommerce creado automaticamente.",
+            {"usuario_id": usuarios[email].id, "email": email},
+        )
+    for orden in ordenes:
+        usuario = usuarios.get(orden.datos.customer_email)
+        if orden.datos.customer_email in de_otra_organizacion:
+            _fallar(orden, "El email pertenece a otra organizacion.")
+        elif usuario is None:
+            _fallar(orden, detalle_limite or "Cliente ecommerce no encontrado.")
+        elif not usuario.es_activo:
+            _fallar(orden, "El cliente esta inactivo.")
+    return usuarios
@@ -5,7 +5,7 @@ from decimal import Decimal
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import JSON, Boolean, CheckConstraint, DateTime, ForeignKey, Index, Numeric, String, Uuid
+from sqlalchemy import JSON, Boolean, CheckConstraint, DateTime, ForeignKey, Index, Integer, Numeric, String, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -22,6 +22,11 @@ class EcommerceOrderEvent(Base):
             "external_order_id",
             unique=True,
         ),
+        Index(
+            "ix_ecommerce_order_events_pendientes",
+            "fecha_proximo_intento",
+            postgresql_where=text("procesado = false"),
+        ),
     )
 
     id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4, index=True)
@@ -47,6 +52,15 @@ class EcommerceOrderEvent(Base):
         index=True,
     )
     error_procesamiento: Mapped[str | None] = mapped_column(String(500))
+    # Procesamiento asincrono: API Key que recibio la orden (actor de la auditoria), reintentos y proximo
+    # intento. ``fecha_proximo_intento`` nula significa que la orden la procesa el propio request.
+    api_key_id: Mapped[UUID | None] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("api_keys.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    intentos_procesamiento: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    fecha_proximo_intento: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     fecha_creacion: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -2,16 +2,32 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, BackgroundTasks, Depends, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.apps.auth.dependencies import get_current_user
 from app.apps.auth.schemas import DatosUsuarioToken
-from app.apps.ecommerce.schemas import EcommerceOrderEventResponse, EcommerceOrderPaidRequest, EcommerceOrderPaidResponse
-from app.apps.ecommerce.services import listar_order_events, obtener_order_event, registrar_order_paid
+from app.apps.ecommerce.lotes import ResultadoLoteOrdenes, leer_ordenes_lote, registrar_orders_paid_lote
+from app.apps.ecommerce.schemas import (
+    EcommerceOrderEstadoResponse,
+    EcommerceOrderEventResponse,
+    EcommerceOrderLoteResponse,
+    EcommerceOrderPaidRequest,
+    EcommerceOrderPaidResponse,
+)
+from app.apps.ecommerce.services import (
+    encolar_order_paid,
+    encolar_webhooks_order_paid,
+    listar_order_events,
+    obtener_estado_order_event,
+    obtener_order_event,
+    registrar_order_paid,
+)
 from app.apps.integraciones.dependencies import APIKeyContext, require_api_key_scope
 from app.apps.integraciones.services import registrar_uso_api_key
-from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento
+from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento_lote
+from app.core.config import settings
 from app.core.database import get_db
 from app.shared.responses import ApiResponse, ok
 
@@ -26,15 +42,29 @@ def _order_payload(response: EcommerceOrderPaidResponse) -> dict[str, object]:
 
 @ext_router.post(
     "/order-paid",
-    response_model=ApiResponse[EcommerceOrderPaidResponse],
+    response_model=ApiResponse[EcommerceOrderPaidResponse | EcommerceOrderEstadoResponse],
     status_code=status.HTTP_201_CREATED,
 )
 def ext_post_order_paid(
     datos: EcommerceOrderPaidRequest,
     background_tasks: BackgroundTasks,
+    response: Response,
     context: APIKeyContext = Depends(require_api_key_scope("ecommerce:write")),
     db: Session = Depends(get_db),
-) -> ApiResponse[EcommerceOrderPaidResponse]:
+) -> ApiResponse[EcommerceOrderPaidResponse | EcommerceOrderEstadoResponse]:
+    organizacion_id = context.organizacion.id
+    if settings.ECOMMERCE_ORDER_WORKER_ENABLED:
+        # La orden queda guardada y la procesa el worker de ordenes; la plataforma no espera el pipeline.
+        estado = encolar_order_paid(datos, context, db)
+        registrar_uso_api_key(
+            context.api_key,
+            db,
+            endpoint="POST /api/v1/ext/ecommerce/order-paid",
+            scope="ecommerce:write",
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return ok(estado, "Orden ecommerce recibida; se procesara en segundo plano.")
+
     result = registrar_order_paid(datos, context, db)
     registrar_uso_api_key(
         context.api_key,
@@ -42,42 +72,85 @@ def ext_post_order_paid(
         endpoint="POST /api/v1/ext/ecommerce/order-paid",
         scope="ecommerce:write",
     )
-    payload = _order_payload(result)
-    encolar_webhook_evento(
-        evento="ecommerce.order_paid",
-        organizacion_id=context.organizacion.id,
-        data=payload,
-        db=db,
-        background_tasks=background_tasks,
+    encolar_webhooks_order_paid(result, organizacion_id=organizacion_id, db=db, background_tasks=background_tasks)
+    return ok(result, result.mensaje)
+
+
+@ext_router.get("/order-paid/{event_id}", response_model=ApiResponse[EcommerceOrderEstadoResponse])
+def ext_get_order_paid(
+    event_id: UUID,
+    context: APIKeyContext = Depends(require_api_key_scope("ecommerce:read")),
+    db: Session = Depends(get_db),
+) -> ApiResponse[EcommerceOrderEstadoResponse]:
+    estado = obtener_estado_order_event(event_id, context.organizacion.id, db)
+    registrar_uso_api_key(
+        context.api_key,
+        db,
+        endpoint="GET /api/v1/ext/ecommerce/order-paid/{event_id}",
+        scope="ecommerce:read",
     )
-    if result.recompensa_aplicada is not None:
-        encolar_webhook_evento(
-            evento="ecommerce.order_processed",
-            organizacion_id=context.organizacion.id,
-            data=payload,
-            db=db,
-            background_tasks=background_tasks,
-        )
-        encolar_webhook_evento(
+    return ok(estado, "Estado de la orden ecommerce obtenido correctamente.")
+
+
+@ext_router.post("/order-paid/lote", response_model=ApiResponse[EcommerceOrderLoteResponse])
+async def ext_post_order_paid_lote(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    context: APIKeyContext = Depends(require_api_key_scope("ecommerce:write")),
+    db: Session = Depends(get_db),
+) -> ApiResponse[EcommerceOrderLoteResponse]:
+    """Recibe un arreglo JSON o NDJSON (``Content-Type: application/x-ndjson``) de ordenes pagadas."""
+    ordenes = leer_ordenes_lote(await request.body(), request.headers.get("content-type"))
+    resultado = await run_in_threadpool(_registrar_lote, ordenes, context, db, background_tasks)
+    return ok(resultado.respuesta, "Lote de ordenes ecommerce procesado.")
+
+
+def _registrar_lote(
+    ordenes: list[EcommerceOrderPaidRequest | str],
+    context: APIKeyContext,
+    db: Session,
+    background_tasks: BackgroundTasks,
+) -> ResultadoLoteOrdenes:
+    organizacion_id = context.organizacion.id
+    resultado = registrar_orders_paid_lote(ordenes, context, db)
+    registrar_uso_api_key(
+        context.api_key,
+        db,
+        endpoint="POST /api/v1/ext/ecommerce/order-paid/lote",
+        scope="ecommerce:write",
+    )
+    ordenes_procesadas = resultado.ordenes
+    con_recompensa = [orden for orden in ordenes_procesadas if orden.recompensa_aplicada is not None]
+    fallidas = [orden for orden in ordenes_procesadas if orden.recompensa_aplicada is None]
+    for evento, seleccion in (
+        ("ecommerce.order_paid", ordenes_procesadas),
+        ("ecommerce.order_processed", con_recompensa),
+        ("ecommerce.order_failed", fallidas),
+    ):
+        if seleccion:
+            encolar_webhook_evento_lote(
+                evento=evento,
+                organizacion_id=organizacion_id,
+                datos=lambda seleccion=seleccion: [_order_payload(orden) for orden in seleccion],
+                db=db,
+                background_tasks=background_tasks,
+            )
+    if con_recompensa:
+        encolar_webhook_evento_lote(
             evento="recompensa.aplicada",
-            organizacion_id=context.organizacion.id,
-            data={
-                "aplicacion": result.recompensa_aplicada.model_dump(mode="json"),
-                "movimiento": result.movimiento.model_dump(mode="json") if result.movimiento else None,
-                "ecommerce_event": result.event.model_dump(mode="json"),
-            },
+            organizacion_id=organizacion_id,
+            datos=lambda: [
+                {
+                    "aplicacion": orden.recompensa_aplicada.model_dump(mode="json"),
+                    "movimiento": orden.movimiento.model_dump(mode="json") if orden.movimiento else None,
+                    "ecommerce_event": orden.event.model_dump(mode="json"),
+                }
+                for orden in con_recompensa
+            ],
             db=db,
             background_tasks=background_tasks,
         )
-    elif result.event.error_procesamiento:
-        encolar_webhook_evento(
-            evento="ecommerce.order_failed",
-            organizacion_id=context.organizacion.id,
-            data=payload,
-            db=db,
-            background_tasks=background_tasks,
-        )
-    return ok(result, result.mensaje)
+    return resultado
 
 
 @router.get("/orders", response_model=ApiResponse[list[EcommerceOrderEventResponse]])
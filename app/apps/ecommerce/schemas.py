@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Any
+from typing import Any, Literal
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
@@ -83,3 +83,29 @@ class EcommerceOrderPaidResponse(BaseModel):
     recompensa_aplicada: AplicacionRecompensaResponse | None = None
     movimiento: MovimientoResponse | None = None
     mensaje: str
+
+
+class EcommerceOrderEstadoResponse(BaseModel):
+    event: EcommerceOrderEventResponse
+    estado: Literal["pendiente", "reintentando", "procesado", "fallido"]
+    intentos: int
+    fecha_proximo_intento: datetime | None = None
+
+
+class EcommerceOrderLoteItemResultado(BaseModel):
+    indice: int
+    proveedor: str | None = None
+    external_order_id: str | None = None
+    status: Literal["procesada", "fallida", "duplicada", "error"]
+    event_id: UUID | None = None
+    aplicacion_id: UUID | None = None
+    movimiento_id: UUID | None = None
+    error: str | None = None
+
+
+class EcommerceOrderLoteResponse(BaseModel):
+    procesadas: int
+    fallidas: int
+    duplicadas: int
+    errores: int
+    resultados: list[EcommerceOrderLoteItemResultado]
@@ -5,39 +5,45 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from enum import Enum
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from fastapi import HTTPException, status
-from sqlalchemy import select
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.services import registrar_evento_api_key
 from app.apps.auth.schemas import DatosUsuarioToken
+from app.apps.ecommerce.identidades import IdentidadCliente, identidades_clientes
 from app.apps.ecommerce.models import EcommerceOrderEvent
 from app.apps.ecommerce.permissions import ensure_can_read_ecommerce
 from app.apps.ecommerce.schemas import (
+    EcommerceOrderEstadoResponse,
     EcommerceOrderEventResponse,
     EcommerceOrderPaidRequest,
     EcommerceOrderPaidResponse,
 )
 from app.apps.integraciones.dependencies import APIKeyContext
+from app.apps.integraciones.models import WebhookDelivery
+from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento, encolar_webhook_eventos
 from app.apps.movimientos.models import Movimiento
 from app.apps.movimientos.schemas import MovimientoResponse
 from app.apps.notificaciones.services import crear_notificacion_interna
 from app.apps.organizaciones.dependencies import resolve_organization_scope
 from app.apps.organizaciones.models import Organizacion
 from app.apps.planes.limit_service import validar_limite_movimientos_mes, validar_limite_usuarios, validar_limite_wallets
-from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa
+from app.apps.recompensas.models import AplicacionRecompensa
+from app.apps.recompensas.motor import ReglaCompilada, reglas_organizacion
 from app.apps.recompensas.schemas import AplicacionRecompensaResponse
+from app.apps.recompensas.totales import acumular_totales
 from app.apps.usuarios.models import Usuario
-from app.apps.wallets.models import Wallet
+from app.apps.wallets.models import WALLET_PRINCIPAL_ABIERTA, Wallet
 from app.core.permissions import is_super_admin
 from app.core.security import hash_password
 from app.shared.enums import (
     EstadoMovimiento,
     EstadoOrganizacion,
-    EstadoReglaRecompensa,
     EstadoWallet,
     MonedaRecompensa,
     MonedaWallet,
@@ -189,6 +195,27 @@ def registrar_order_paid(
     context: APIKeyContext,
     db: Session,
 ) -> EcommerceOrderPaidResponse:
+    event = _persistir_order_paid(datos, context, db, asincrono=False)
+    return procesar_order_paid(event, datos, context, db)
+
+
+def encolar_order_paid(
+    datos: EcommerceOrderPaidRequest,
+    context: APIKeyContext,
+    db: Session,
+) -> EcommerceOrderEstadoResponse:
+    """Guarda la orden para el worker de ordenes (``ECOMMERCE_ORDER_WORKER_ENABLED``) sin procesarla."""
+    event = _persistir_order_paid(datos, context, db, asincrono=True)
+    return estado_order_event(event)
+
+
+def _persistir_order_paid(
+    datos: EcommerceOrderPaidRequest,
+    context: APIKeyContext,
+    db: Session,
+    *,
+    asincrono: bool,
+) -> EcommerceOrderEvent:
     organizacion = context.organizacion
     if organizacion.estado != EstadoOrganizacion.activa:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Organizacion inactiva.")
@@ -222,6 +249,9 @@ def registrar_order_paid(
         status="paid",
         raw_payload=_raw_payload(datos),
         procesado=False,
+        api_key_id=context.api_key.id,
+        intentos_procesamiento=0,
+        fecha_proximo_intento=_now() if asincrono else None,
     )
     db.add(event)
     try:
@@ -248,7 +278,61 @@ def registrar_order_paid(
         actor_api_key_id=context.api_key.id,
         metadata={"event_id": event.id, "proveedor": event.proveedor, "external_order_id": event.external_order_id},
     )
-    return procesar_order_paid(event, datos, context, db)
+    return event
+
+
+def estado_order_event(event: EcommerceOrderEvent) -> EcommerceOrderEstadoResponse:
+    if event.procesado:
+        estado = "fallido" if event.error_procesamiento else "procesado"
+    else:
+        estado = "reintentando" if event.error_procesamiento else "pendiente"
+    return EcommerceOrderEstadoResponse(
+        event=EcommerceOrderEventResponse.model_validate(event),
+        estado=estado,
+        intentos=event.intentos_procesamiento,
+        fecha_proximo_intento=None if event.procesado else event.fecha_proximo_intento,
+    )
+
+
+def obtener_estado_order_event(event_id: UUID, organizacion_id: UUID, db: Session) -> EcommerceOrderEstadoResponse:
+    event = db.get(EcommerceOrderEvent, event_id)
+    if event is None or event.organizacion_id != organizacion_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Evento ecommerce no encontrado.")
+    return estado_order_event(event)
+
+
+def encolar_webhooks_order_paid(
+    result: EcommerceOrderPaidResponse,
+    *,
+    organizacion_id: UUID,
+    db: Session,
+    background_tasks: BackgroundTasks | None = None,
+) -> list[WebhookDelivery]:
+    eventos = ["ecommerce.order_paid"]
+    if result.recompensa_aplicada is not None:
+        eventos.append("ecommerce.order_processed")
+    elif result.event.error_procesamiento:
+        eventos.append("ecommerce.order_failed")
+    deliveries = encolar_webhook_eventos(
+        eventos=eventos,
+        organizacion_id=organizacion_id,
+        data=lambda: result.model_dump(mode="json"),
+        db=db,
+        background_tasks=background_tasks,
+    )
+    if result.recompensa_aplicada is not None:
+        deliveries += encolar_webhook_evento(
+            evento="recompensa.aplicada",
+            organizacion_id=organizacion_id,
+            data=lambda: {
+                "aplicacion": result.recompensa_aplicada.model_dump(mode="json"),
+                "movimiento": result.movimiento.model_dump(mode="json") if result.movimiento else None,
+                "ecommerce_event": result.event.model_dump(mode="json"),
+            },
+            db=db,
+            background_tasks=background_tasks,
+        )
+    return deliveries
 
 
 def procesar_order_paid(
@@ -257,14 +341,14 @@ def procesar_order_paid(
     context: APIKeyContext,
     db: Session,
 ) -> EcommerceOrderPaidResponse:
+    email = normalize_email(str(datos.customer_email))
+    identidad = identidades_clientes.obtener(context.organizacion.id, email)
+    cliente_creado = wallet_inicial_creada = reward_wallet_creada = False
     try:
-        usuario, cliente_creado = obtener_o_crear_cliente_ecommerce(datos, context, db)
-        wallet_inicial_creada = _ensure_customer_primary_wallet(
-            usuario,
-            context,
-            db,
-            moneda=_validate_supported_currency(datos.currency),
-        )
+        if identidad is None:
+            identidad, cliente_creado, wallet_inicial_creada = _resolver_cliente(datos, context, db)
+        else:
+            _validate_supported_currency(datos.currency)
         regla = _find_applicable_rule(db, organizacion_id=context.organizacion.id, monto_compra=_amount(datos.amount))
         if regla is None:
             response = _mark_event_failed(
@@ -276,31 +360,44 @@ def procesar_order_paid(
             _audit_customer_side_effects(
                 db,
                 context=context,
-                usuario=usuario,
+                usuario_id=identidad.usuario_id,
+                email=email,
                 cliente_creado=cliente_creado,
                 wallet_creada=wallet_inicial_creada,
             )
+            identidades_clientes.guardar(context.organizacion.id, email, identidad)
             return response
 
-        wallet, reward_wallet_creada = _obtener_o_crear_wallet_recompensa(usuario, regla, context, db)
-        result = _aplicar_recompensa_ecommerce(event, datos, usuario, wallet, regla, context, db)
+        wallet, reward_wallet_creada = _obtener_o_crear_wallet_recompensa(identidad, regla, context, db)
+        if wallet is None:
+            # La identidad cacheada quedo vieja (wallet cerrada o cliente inactivo en otro proceso).
+            identidades_clientes.invalidar_usuario(identidad.usuario_id)
+            identidad, cliente_creado, wallet_inicial_creada = _resolver_cliente(datos, context, db)
+            wallet, reward_wallet_creada = _obtener_o_crear_wallet_recompensa(identidad, regla, context, db)
+        result = _aplicar_recompensa_ecommerce(event, datos, identidad.usuario_id, wallet, regla, context, db)
     except EcommerceProcessingError as exc:
         return _mark_event_failed(db, event_id=event.id, message=exc.message, context=context)
     except HTTPException as exc:
         message = str(exc.detail)
         return _mark_event_failed(db, event_id=event.id, message=message, context=context)
 
+    identidades_clientes.guardar(
+        context.organizacion.id,
+        email,
+        identidad.con_wallet_recompensa(wallet.moneda, wallet.id),
+    )
     _audit_customer_side_effects(
         db,
         context=context,
-        usuario=usuario,
+        usuario_id=identidad.usuario_id,
+        email=email,
         cliente_creado=cliente_creado,
         wallet_creada=wallet_inicial_creada or reward_wallet_creada,
     )
     _notificar_recompensa_cliente(
         db,
         organizacion_id=context.organizacion.id,
-        usuario_id=usuario.id,
+        usuario_id=identidad.usuario_id,
         aplicacion=result["aplicacion"],
         movimiento=result["movimiento"],
         event=event,
@@ -324,83 +421,142 @@ def procesar_order_paid(
     )
 
 
+def _insert(db: Session, modelo: type) -> Any:
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialecto.insert(modelo)
+
+
+def _resolver_cliente(
+    datos: EcommerceOrderPaidRequest,
+    context: APIKeyContext,
+    db: Session,
+) -> tuple[IdentidadCliente, bool, bool]:
+    """Resuelve el cliente y su wallet principal desde la base. Devuelve la identidad y que se creo."""
+    usuario_id, cliente_creado = obtener_o_crear_cliente_ecommerce(datos, context, db)
+    wallet_principal_id, wallet_creada = _ensure_customer_primary_wallet(
+        usuario_id,
+        context,
+        db,
+        moneda=_validate_supported_currency(datos.currency),
+    )
+    return IdentidadCliente(usuario_id, wallet_principal_id), cliente_creado, wallet_creada
+
+
 def obtener_o_crear_cliente_ecommerce(
     datos: EcommerceOrderPaidRequest,
     context: APIKeyContext,
     db: Session,
-) -> tuple[Usuario, bool]:
+) -> tuple[UUID, bool]:
+    """Devuelve el id del cliente por email, creandolo con ``INSERT ... ON CONFLICT DO NOTHING``.
+
+    Si dos ordenes del mismo cliente nuevo llegan a la vez, una crea el usuario y la otra lo encuentra.
+    """
     email = normalize_email(str(datos.customer_email))
-    usuario = db.scalar(select(Usuario).where(Usuario.email == email))
-    if usuario is not None:
-        if usuario.organizacion_id != context.organizacion.id:
-            raise EcommerceProcessingError("El email pertenece a otra organizacion.")
-        if not usuario.es_activo:
-            raise EcommerceProcessingError("El cliente esta inactivo.")
-        return usuario, False
-
-    validar_limite_usuarios(db, context.organizacion.id)
-    usuario = Usuario(
-        nombre=datos.customer_name or email,
-        email=email,
-        hashed_password=hash_password(secrets.token_urlsafe(32)),
-        es_activo=True,
-        rol=RolUsuario.cliente,
-        organizacion_id=context.organizacion.id,
-    )
-    db.add(usuario)
-    db.flush()
-    return usuario, True
+    consulta = select(Usuario.id, Usuario.organizacion_id, Usuario.es_activo).where(Usuario.email == email)
+    usuario = db.execute(consulta).first()
+    if usuario is None:
+        validar_limite_usuarios(db, context.organizacion.id)
+        usuario_id = db.scalar(
+            _insert(db, Usuario)
+            .values(
+                id=uuid4(),
+                nombre=datos.customer_name or email,
+                email=email,
+                hashed_password=hash_password(secrets.token_urlsafe(32)),
+                es_activo=True,
+                rol=RolUsuario.cliente,
+                intentos_fallidos=0,
+                organizacion_id=context.organizacion.id,
+            )
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(Usuario.id)
+        )
+        if usuario_id is not None:
+            return usuario_id, True
+        usuario = db.execute(consulta).one()
+
+    if usuario.organizacion_id != context.organizacion.id:
+        raise EcommerceProcessingError("El email pertenece a otra organizacion.")
+    if not usuario.es_activo:
+        raise EcommerceProcessingError("El cliente esta inactivo.")
+    return usuario.id, False
 
 
 def _ensure_customer_primary_wallet(
-    usuario: Usuario,
+    usuario_id: UUID,
     context: APIKeyContext,
     db: Session,
     *,
     moneda: MonedaWallet,
-) -> bool:
-    existing = db.scalar(
-        select(Wallet.id).where(
-            Wallet.owner_type == OwnerTypeWallet.usuario,
-            Wallet.usuario_id == usuario.id,
-            Wallet.organizacion_id == context.organizacion.id,
-            Wallet.es_principal.is_(True),
-            Wallet.estado != EstadoWallet.cerrada,
-        )
+) -> tuple[UUID, bool]:
+    """Devuelve la wallet principal abierta del cliente; la crea contra ``ux_wallets_principal_usuario``."""
+    consulta = select(Wallet.id).where(
+        Wallet.owner_type == OwnerTypeWallet.usuario,
+        Wallet.usuario_id == usuario_id,
+        Wallet.organizacion_id == context.organizacion.id,
+        Wallet.es_principal.is_(True),
+        Wallet.estado != EstadoWallet.cerrada,
     )
+    existing = db.scalar(consulta)
     if existing is not None:
-        return False
+        return existing, False
 
     validar_limite_wallets(db, context.organizacion.id)
-    wallet = Wallet(
-        alias="Wallet ecommerce",
-        tipo=TipoWallet.principal,
-        estado=EstadoWallet.activa,
-        moneda=moneda,
-        saldo=Decimal("0.00"),
-        es_principal=True,
-        owner_type=OwnerTypeWallet.usuario,
-        usuario_id=usuario.id,
-        organizacion_owner_id=None,
-        organizacion_id=context.organizacion.id,
+    wallet_id = db.scalar(
+        _insert(db, Wallet)
+        .values(
+            id=uuid4(),
+            alias="Wallet ecommerce",
+            tipo=TipoWallet.principal,
+            estado=EstadoWallet.activa,
+            moneda=moneda,
+            saldo=Decimal("0.00"),
+            es_principal=True,
+            owner_type=OwnerTypeWallet.usuario,
+            usuario_id=usuario_id,
+            organizacion_owner_id=None,
+            organizacion_id=context.organizacion.id,
+        )
+        .on_conflict_do_nothing(index_elements=["usuario_id"], index_where=text(WALLET_PRINCIPAL_ABIERTA))
+        .returning(Wallet.id)
     )
-    db.add(wallet)
-    db.flush()
-    return True
+    if wallet_id is not None:
+        return wallet_id, True
+    return db.scalars(consulta).one(), False
 
 
 def _obtener_o_crear_wallet_recompensa(
-    usuario: Usuario,
-    regla: ReglaRecompensa,
+    identidad: IdentidadCliente,
+    regla: ReglaCompilada,
     context: APIKeyContext,
     db: Session,
-) -> tuple[Wallet, bool]:
+) -> tuple[Wallet | None, bool]:
+    """Bloquea la wallet activa del cliente en la moneda de la regla, creandola si no existe.
+
+    Con una wallet cacheada en ``identidad`` devuelve ``None`` si ya no esta activa o el cliente fue
+    desactivado: el llamador resuelve de nuevo desde la base.
+    """
     moneda = _reward_currency_to_wallet_currency(regla.moneda_recompensa)
-    wallet = db.scalar(
+    wallet_id = identidad.wallet_recompensa(moneda)
+    if wallet_id is not None:
+        wallet = db.scalar(
+            select(Wallet)
+            .join(Usuario, Usuario.id == Wallet.usuario_id)
+            .where(
+                Wallet.id == wallet_id,
+                Wallet.usuario_id == identidad.usuario_id,
+                Wallet.estado == EstadoWallet.activa,
+                Usuario.es_activo.is_(True),
+            )
+            .with_for_update(of=Wallet)
+        )
+        return wallet, False
+
+    consulta = (
         select(Wallet)
         .where(
             Wallet.owner_type == OwnerTypeWallet.usuario,
-            Wallet.usuario_id == usuario.id,
+            Wallet.usuario_id == identidad.usuario_id,
             Wallet.organizacion_id == context.organizacion.id,
             Wallet.moneda == moneda,
             Wallet.estado == EstadoWallet.activa,
@@ -408,21 +564,19 @@ def _obtener_o_crear_wallet_recompensa(
         .order_by(Wallet.es_principal.desc(), Wallet.fecha_creacion.asc())
         .with_for_update()
     )
+    wallet = db.scalar(consulta)
+    if wallet is not None:
+        return wallet, False
+
+    # Un cliente puede tener varias wallets por moneda, asi que no hay indice unico para un upsert:
+    # el bloqueo del cliente serializa la creacion con otras ordenes y con los lotes, que lo toman igual.
+    db.execute(select(Usuario.id).where(Usuario.id == identidad.usuario_id).with_for_update())
+    wallet = db.scalar(consulta)
     if wallet is not None:
         return wallet, False
 
-    has_wallet = (
-        db.scalar(
-            select(Wallet.id).where(
-                Wallet.owner_type == OwnerTypeWallet.usuario,
-                Wallet.usuario_id == usuario.id,
-                Wallet.organizacion_id == context.organizacion.id,
-                Wallet.estado != EstadoWallet.cerrada,
-            )
-        )
-        is not None
-    )
     validar_limite_wallets(db, context.organizacion.id)
+    has_wallet = identidad.wallet_principal_id is not None
     wallet = Wallet(
         alias=f"Recompensas ecommerce {moneda.value}",
         tipo=TipoWallet.recompensas if has_wallet else TipoWallet.principal,
@@ -431,7 +585,7 @@ def _obtener_o_crear_wallet_recompensa(
         saldo=Decimal("0.00"),
         es_principal=not has_wallet,
         owner_type=OwnerTypeWallet.usuario,
-        usuario_id=usuario.id,
+        usuario_id=identidad.usuario_id,
         organizacion_owner_id=None,
         organizacion_id=context.organizacion.id,
     )
@@ -440,62 +594,21 @@ def _obtener_o_crear_wallet_recompensa(
     return wallet, True
 
 
-def _find_applicable_rule(db: Session, *, organizacion_id: UUID, monto_compra: Decimal) -> ReglaRecompensa | None:
-    now = _now()
-    reglas = db.scalars(
-        select(ReglaRecompensa)
-        .where(ReglaRecompensa.organizacion_id == organizacion_id)
-        .order_by(ReglaRecompensa.fecha_creacion.asc(), ReglaRecompensa.id.asc())
-    ).all()
-    for regla in reglas:
-        if _evaluate_rule(regla, monto_compra, now=now):
-            return regla
-    return None
-
-
-def _evaluate_rule(regla: ReglaRecompensa, monto_compra: Decimal, *, now: datetime) -> bool:
-    if regla.estado != EstadoReglaRecompensa.activa:
-        return False
-    if regla.monto_minimo_compra is not None and monto_compra < _amount(regla.monto_minimo_compra):
-        return False
-    fecha_inicio = _as_utc(regla.fecha_inicio)
-    fecha_fin = _as_utc(regla.fecha_fin)
-    if fecha_inicio is not None and now < fecha_inicio:
-        return False
-    if fecha_fin is not None and now > fecha_fin:
-        return False
-    return _calculate_reward(regla, monto_compra) > Decimal("0.00")
-
-
-def _calculate_reward(regla: ReglaRecompensa, monto_compra: Decimal) -> Decimal:
-    if regla.porcentaje_cashback is not None:
-        reward = monto_compra * _amount(regla.porcentaje_cashback) / Decimal("100.00")
-    elif regla.monto_fijo is not None:
-        reward = _amount(regla.monto_fijo)
-    else:
-        reward = Decimal("0.00")
-    reward = _amount(reward)
-    if regla.monto_maximo_recompensa is not None:
-        reward = min(reward, _amount(regla.monto_maximo_recompensa))
-    return _amount(reward)
+def _find_applicable_rule(db: Session, *, organizacion_id: UUID, monto_compra: Decimal) -> ReglaCompilada | None:
+    return reglas_organizacion(db, organizacion_id).seleccionar(monto_compra, _now())
 
 
 def _aplicar_recompensa_ecommerce(
     event: EcommerceOrderEvent,
     datos: EcommerceOrderPaidRequest,
-    usuario: Usuario,
-    wallet: Wallet,
-    regla: ReglaRecompensa,
+    usuario_id: UUID,
+    locked_wallet: Wallet,
+    regla: ReglaCompilada,
     context: APIKeyContext,
     db: Session,
 ) -> dict[str, AplicacionRecompensaResponse | MovimientoResponse]:
-    locked_wallet = wallet
-    if wallet.id is not None:
-        locked_wallet = db.scalar(select(Wallet).where(Wallet.id == wallet.id).with_for_update())
-        if locked_wallet is None:
-            raise EcommerceProcessingError("Wallet de recompensa no encontrada.")
-
-    if locked_wallet.owner_type != OwnerTypeWallet.usuario or locked_wallet.usuario_id != usuario.id:
+    """Acredita la recompensa; ``locked_wallet`` ya viene bloqueada (o recien creada) por el llamador."""
+    if locked_wallet.owner_type != OwnerTypeWallet.usuario or locked_wallet.usuario_id != usuario_id:
         raise EcommerceProcessingError("La wallet de recompensa no pertenece al cliente.")
     if locked_wallet.organizacion_id != context.organizacion.id:
         raise EcommerceProcessingError("No se puede operar entre organizaciones.")
@@ -507,7 +620,7 @@ def _aplicar_recompensa_ecommerce(
         raise EcommerceProcessingError("La moneda de la wallet no coincide con la recompensa.")
 
     monto_compra = _amount(datos.amount)
-    monto_recompensa = _calculate_reward(regla, monto_compra)
+    monto_recompensa = regla.calcular_recompensa(monto_compra)
     if monto_recompensa <= Decimal("0.00"):
         raise EcommerceProcessingError(NO_REWARD_RULE_MESSAGE)
 
@@ -542,7 +655,7 @@ def _aplicar_recompensa_ecommerce(
         aplicacion = AplicacionRecompensa(
             organizacion_id=context.organizacion.id,
             regla_id=regla.id,
-            usuario_id=usuario.id,
+            usuario_id=usuario_id,
             wallet_destino_id=locked_wallet.id,
             movimiento_id=movimiento.id,
             monto_compra=monto_compra,
@@ -558,6 +671,7 @@ def _aplicar_recompensa_ecommerce(
         event.error_procesamiento = None
         event.fecha_procesamiento = _now()
         db.add(event)
+        acumular_totales(db, [aplicacion])
         db.commit()
         db.refresh(aplicacion)
         db.refresh(movimiento)
@@ -581,9 +695,13 @@ def _mark_event_failed(
     message: str,
     context: APIKeyContext,
 ) -> EcommerceOrderPaidResponse:
-    event = db.get(EcommerceOrderEvent, event_id)
+    event = db.get(EcommerceOrderEvent, event_id, with_for_update=True, populate_existing=True)
     if event is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Evento ecommerce no encontrado.")
+    if event.procesado:
+        # Otro proceso ya cerro la orden (por ejemplo, con la recompensa aplicada): no se pisa su resultado.
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="La orden ya fue procesada.")
     event.procesado = True
     event.error_procesamiento = message
     event.fecha_procesamiento = _now()
@@ -606,7 +724,8 @@ def _audit_customer_side_effects(
     db: Session,
     *,
     context: APIKeyContext,
-    usuario: Usuario,
+    usuario_id: UUID,
+    email: str,
     cliente_creado: bool,
     wallet_creada: bool,
 ) -> None:
@@ -617,7 +736,7 @@ def _audit_customer_side_effects(
             mensaje="Cliente ecommerce creado automaticamente.",
             organizacion_id=context.organizacion.id,
             actor_api_key_id=context.api_key.id,
-            metadata={"usuario_id": usuario.id, "email": usuario.email},
+            metadata={"usuario_id": usuario_id, "email": email},
         )
     if wallet_creada:
         _audit_api_key(
@@ -626,7 +745,7 @@ def _audit_customer_side_effects(
             mensaje="Wallet de cliente ecommerce creada.",
             organizacion_id=context.organizacion.id,
             actor_api_key_id=context.api_key.id,
-            metadata={"usuario_id": usuario.id},
+            metadata={"usuario_id": usuario_id},
         )
 
 
@@ -667,7 +786,7 @@ def _audit_reward_result(
     event: EcommerceOrderEvent,
     aplicacion: AplicacionRecompensaResponse,
     movimiento: MovimientoResponse,
-    regla: ReglaRecompensa,
+    regla: ReglaCompilada,
 ) -> None:
     metadata = {
         "event_id": event.id,
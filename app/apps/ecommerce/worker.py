@@ -0,0 +1,226 @@
+"""Worker de ordenes ecommerce recibidas con ``ECOMMERCE_ORDER_WORKER_ENABLED``.
+
+El estado del trabajo vive en la orden: ``procesado=false`` es una orden pendiente, ``error_procesamiento``
+sin ``procesado`` es un reintento programado para ``fecha_proximo_intento`` y ``procesado=true`` es final.
+El barrido retoma las ordenes que un request dejo sin procesar (por ejemplo, un proceso que murio a
+mitad del pipeline).
+
+Uso: ``python -m app.apps.ecommerce.worker [--once] [--barrer]``.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.apps.auditoria.models import AuditLog
+from app.apps.ecommerce.models import EcommerceOrderEvent
+from app.apps.ecommerce.schemas import EcommerceOrderPaidRequest
+from app.apps.ecommerce.services import encolar_webhooks_order_paid, procesar_order_paid
+from app.apps.integraciones.dependencies import APIKeyContext
+from app.apps.integraciones.models import APIKey
+from app.apps.integraciones.webhook_dispatcher import enviar_webhook_delivery
+from app.apps.organizaciones.models import Organizacion
+from app.core import database as database_module
+from app.core.config import settings
+from app.core.logging import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+BARRIDO_INTERVAL_SECONDS = 30.0
+REINTENTOS_AGOTADOS = "Se agotaron los reintentos de procesamiento."
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def calcular_backoff_orden(intentos: int) -> float:
+    return settings.ECOMMERCE_WORKER_RETRY_BASE_SECONDS * (2 ** max(intentos - 1, 0))
+
+
+def reclamar_ordenes(db: Session, *, limit: int) -> list[UUID]:
+    """Toma ordenes vencidas con ``FOR UPDATE SKIP LOCKED``, cuenta el intento y las reserva por un lease.
+
+    El intento se cuenta al reclamar: una orden que tumba al worker tambien agota sus reintentos.
+    """
+    if limit <= 0:
+        return []
+    now = _now()
+    ordenes = db.scalars(
+        select(EcommerceOrderEvent)
+        .where(EcommerceOrderEvent.procesado.is_(False), EcommerceOrderEvent.fecha_proximo_intento <= now)
+        .order_by(EcommerceOrderEvent.fecha_proximo_intento.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    lease_until = now + timedelta(seconds=settings.ECOMMERCE_WORKER_LEASE_SECONDS)
+    reclamadas: list[UUID] = []
+    for orden in ordenes:
+        if orden.intentos_procesamiento >= settings.ECOMMERCE_WORKER_MAX_ATTEMPTS:
+            _marcar_fallida(db, orden, REINTENTOS_AGOTADOS, now)
+            continue
+        orden.intentos_procesamiento += 1
+        orden.fecha_proximo_intento = lease_until
+        reclamadas.append(orden.id)
+    db.commit()
+    return reclamadas
+
+
+def barrer_ordenes_trabadas(db: Session, *, now: datetime | None = None) -> int:
+    """Programa para ya las ordenes sin procesar ni agendar con mas de ``ECOMMERCE_ORDER_STUCK_SECONDS``."""
+    now = now or _now()
+    limite = now - timedelta(seconds=settings.ECOMMERCE_ORDER_STUCK_SECONDS)
+    barridas = db.execute(
+        update(EcommerceOrderEvent)
+        .where(
+            EcommerceOrderEvent.procesado.is_(False),
+            EcommerceOrderEvent.fecha_proximo_intento.is_(None),
+            EcommerceOrderEvent.fecha_creacion <= limite,
+        )
+        .values(fecha_proximo_intento=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if barridas:
+        logger.warning("Se retomaron %s ordenes ecommerce sin procesar", barridas)
+    return barridas
+
+
+def procesar_orden(event_id: UUID) -> None:
+    """Corre el pipeline de recompensa de la orden en una sesion propia y encola sus webhooks."""
+    session = database_module.SessionLocal()
+    try:
+        # El lock se mantiene hasta el commit del pipeline: un worker que reclamo la misma orden con el lease
+        # vencido espera aca y despues la ve procesada.
+        event = session.get(EcommerceOrderEvent, event_id, with_for_update=True)
+        if event is None or event.procesado:
+            return
+        organizacion = session.get(Organizacion, event.organizacion_id)
+        api_key = session.get(APIKey, event.api_key_id) if event.api_key_id is not None else None
+        if organizacion is None or api_key is None:
+            _marcar_fallida(session, event, "API Key de la orden no encontrada.", _now())
+            session.commit()
+            return
+        context = APIKeyContext(organizacion=organizacion, api_key=api_key, scopes=set(api_key.scopes or []))
+        datos = EcommerceOrderPaidRequest.model_validate(event.raw_payload)
+        result = procesar_order_paid(event, datos, context, session)
+        deliveries = encolar_webhooks_order_paid(result, organizacion_id=organizacion.id, db=session)
+        if not settings.WEBHOOK_WORKER_ENABLED:
+            # Sin worker de webhooks no hay request que agende el envio: se hace aca, como la background task.
+            for delivery in deliveries:
+                if delivery.status == "pendiente":
+                    enviar_webhook_delivery(delivery.id)
+    except Exception as exc:
+        session.rollback()
+        logger.exception("No se pudo procesar la orden ecommerce %s", event_id)
+        _registrar_fallo(session, event_id, str(exc) or exc.__class__.__name__)
+    finally:
+        session.close()
+
+
+def _registrar_fallo(db: Session, event_id: UUID, error: str) -> None:
+    event = db.get(EcommerceOrderEvent, event_id, with_for_update=True, populate_existing=True)
+    if event is None or event.procesado:
+        return
+    now = _now()
+    if event.intentos_procesamiento >= settings.ECOMMERCE_WORKER_MAX_ATTEMPTS:
+        _marcar_fallida(db, event, error, now)
+    else:
+        event.error_procesamiento = error[:500]
+        event.fecha_proximo_intento = now + timedelta(seconds=calcular_backoff_orden(event.intentos_procesamiento))
+    db.commit()
+
+
+def _marcar_fallida(db: Session, event: EcommerceOrderEvent, error: str, now: datetime) -> None:
+    event.procesado = True
+    event.error_procesamiento = error[:500]
+    event.fecha_procesamiento = now
+    event.fecha_proximo_intento = None
+    db.add(
+        AuditLog(
+            evento="ecommerce.order_paid_error",
+            mensaje="Orden ecommerce procesada con error.",
+            nivel="ERROR",
+            actor_tipo="sistema",
+            organizacion_id=event.organizacion_id,
+            metadata_log={
+                "event_id": str(event.id),
+                "error": event.error_procesamiento,
+                "external_order_id": event.external_order_id,
+                "intentos": event.intentos_procesamiento,
+            },
+        )
+    )
+
+
+def ejecutar_worker(
+    *,
+    concurrency: int | None = None,
+    batch_size: int | None = None,
+    once: bool = False,
+    stop_event: threading.Event | None = None,
+) -> int:
+    """Procesa ordenes hasta ``stop_event`` (o hasta vaciar la cola con ``once``). Devuelve cuantas tomo."""
+    concurrency = concurrency or settings.ECOMMERCE_WORKER_CONCURRENCY
+    batch_size = batch_size or settings.ECOMMERCE_WORKER_BATCH_SIZE
+    stop_event = stop_event or threading.Event()
+    procesadas = 0
+    ultimo_barrido = 0.0
+    in_flight: set[Future[None]] = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ecommerce-worker") as executor:
+        while not stop_event.is_set():
+            with database_module.SessionLocal() as db:
+                if time.monotonic() - ultimo_barrido >= BARRIDO_INTERVAL_SECONDS:
+                    barrer_ordenes_trabadas(db)
+                    ultimo_barrido = time.monotonic()
+                event_ids = reclamar_ordenes(db, limit=min(concurrency - len(in_flight), batch_size))
+            in_flight.update(executor.submit(procesar_orden, event_id) for event_id in event_ids)
+            procesadas += len(event_ids)
+            if not in_flight:
+                if once:
+                    break
+                stop_event.wait(settings.ECOMMERCE_WORKER_POLL_SECONDS)
+                continue
+            _, in_flight = wait(in_flight, timeout=settings.ECOMMERCE_WORKER_POLL_SECONDS, return_when=FIRST_COMPLETED)
+        wait(in_flight)
+    return procesadas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker de ordenes ecommerce recibidas en modo asincrono.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Ordenes procesadas en paralelo.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Maximo de ordenes reclamadas por consulta.")
+    parser.add_argument("--once", action="store_true", help="Procesa las ordenes vencidas y termina.")
+    parser.add_argument("--barrer", action="store_true", help="Solo retoma las ordenes trabadas y termina.")
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.barrer:
+        with database_module.SessionLocal() as db:
+            barridas = barrer_ordenes_trabadas(db)
+        logger.info("Ordenes ecommerce retomadas: %s", barridas)
+        return
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    procesadas = ejecutar_worker(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        once=args.once,
+        stop_event=stop_event,
+    )
+    logger.info("Worker de ordenes ecommerce detenido. Ordenes tomadas: %s", procesadas)
+
+
+if __name__ == "__main__":
+    main()
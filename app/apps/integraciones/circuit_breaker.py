@@ -0,0 +1,120 @@
+"""Circuit breaker por webhook endpoint.
+
+``cerrado``: se envia normalmente. Tras ``WEBHOOK_CIRCUIT_FAILURE_THRESHOLD`` fallos consecutivos
+pasa a ``abierto`` y las deliveries quedan ``diferido`` hasta ``circuito_abierto_hasta`` sin
+intentar el envio. Vencido ese plazo, una sola delivery toma el circuito en ``semiabierto`` como
+sonda: si responde 2xx se cierra y se liberan las diferidas; si falla vuelve a ``abierto``.
+Solo se difiere con ``WEBHOOK_WORKER_ENABLED``: sin worker nadie retomaria una delivery ``diferido``.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import Session
+
+from app.apps.integraciones.models import WebhookBatch, WebhookDelivery, WebhookEndpoint
+from app.core.config import settings
+
+
+CIRCUITO_CERRADO = "cerrado"
+CIRCUITO_ABIERTO = "abierto"
+CIRCUITO_SEMIABIERTO = "semiabierto"
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _actualizar_endpoint(endpoint_id: UUID):
+    # El estado del circuito no es un cambio de configuracion: conserva fecha_actualizacion.
+    return (
+        update(WebhookEndpoint)
+        .where(WebhookEndpoint.id == endpoint_id)
+        .values(fecha_actualizacion=WebhookEndpoint.fecha_actualizacion)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def evaluar_circuito(db: Session, endpoint: WebhookEndpoint, now: datetime) -> datetime | None:
+    """Devuelve hasta cuando diferir la delivery, o ``None`` si se puede enviar (incluida la sonda).
+
+    Tomar la sonda es un UPDATE condicional: solo un worker la gana. El commit queda a cargo del llamador.
+    """
+    if endpoint.circuito_estado == CIRCUITO_CERRADO:
+        return None
+    hasta = _as_utc(endpoint.circuito_abierto_hasta) if endpoint.circuito_abierto_hasta is not None else None
+    if hasta is not None and hasta > now:
+        return hasta
+    sonda_hasta = now + timedelta(seconds=settings.WEBHOOK_WORKER_LEASE_SECONDS)
+    tomada = db.execute(
+        _actualizar_endpoint(endpoint.id)
+        .where(
+            WebhookEndpoint.circuito_estado != CIRCUITO_CERRADO,
+            or_(WebhookEndpoint.circuito_abierto_hasta.is_(None), WebhookEndpoint.circuito_abierto_hasta <= now),
+        )
+        .values(circuito_estado=CIRCUITO_SEMIABIERTO, circuito_abierto_hasta=sonda_hasta)
+    ).rowcount
+    return None if tomada else sonda_hasta
+
+
+def registrar_resultado_circuito(db: Session, endpoint_id: UUID, *, exito: bool, now: datetime) -> list[UUID]:
+    """Actualiza el circuito en la transaccion actual; el commit queda a cargo del llamador.
+
+    Devuelve las deliveries que se liberaron al cerrarse el circuito.
+    """
+    if exito:
+        reseteado = db.execute(
+            _actualizar_endpoint(endpoint_id)
+            .where(
+                or_(
+                    WebhookEndpoint.circuito_estado != CIRCUITO_CERRADO,
+                    WebhookEndpoint.fallos_consecutivos > 0,
+                )
+            )
+            .values(circuito_estado=CIRCUITO_CERRADO, fallos_consecutivos=0, circuito_abierto_hasta=None)
+        ).rowcount
+        return liberar_diferidas(db, endpoint_id, now) if reseteado else []
+    abre = or_(
+        WebhookEndpoint.circuito_estado == CIRCUITO_SEMIABIERTO,
+        WebhookEndpoint.fallos_consecutivos + 1 >= settings.WEBHOOK_CIRCUIT_FAILURE_THRESHOLD,
+    )
+    db.execute(
+        _actualizar_endpoint(endpoint_id).values(
+            fallos_consecutivos=WebhookEndpoint.fallos_consecutivos + 1,
+            circuito_estado=case((abre, CIRCUITO_ABIERTO), else_=WebhookEndpoint.circuito_estado),
+            circuito_abierto_hasta=case(
+                (abre, now + timedelta(seconds=settings.WEBHOOK_CIRCUIT_OPEN_SECONDS)),
+                else_=WebhookEndpoint.circuito_abierto_hasta,
+            ),
+        )
+    )
+    return []
+
+
+def liberar_diferidas(db: Session, endpoint_id: UUID, now: datetime) -> list[UUID]:
+    """Pasa a ``pendiente`` los lotes y deliveries diferidos del endpoint; devuelve los ids de las deliveries."""
+    db.execute(
+        update(WebhookBatch)
+        .where(WebhookBatch.webhook_endpoint_id == endpoint_id, WebhookBatch.status == "diferido")
+        .values(status="pendiente", next_attempt_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return list(
+        db.scalars(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.webhook_endpoint_id == endpoint_id, WebhookDelivery.status == "diferido")
+            .values(status="pendiente", next_attempt_at=now)
+            .returning(WebhookDelivery.id)
+            .execution_options(synchronize_session=False)
+        )
+    )
+
+
+def resetear_circuito(endpoint: WebhookEndpoint) -> None:
+    endpoint.circuito_estado = CIRCUITO_CERRADO
+    endpoint.fallos_consecutivos = 0
+    endpoint.circuito_abierto_hasta = None
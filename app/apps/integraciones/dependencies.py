@@ -2,10 +2,11 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 
-from fastapi import Depends, Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 
 from app.apps.integraciones.models import APIKey
+from app.apps.integraciones.rate_limit import aplicar_rate_limit
 from app.apps.integraciones.services import validar_api_key, verificar_scope
 from app.apps.organizaciones.models import Organizacion
 from app.core.database import get_db
@@ -20,6 +21,7 @@ class APIKeyContext:
 
 def require_api_key_scope(scope: str):
     def _dependency(
+        response: Response,
         x_api_key: str | None = Header(default=None, alias="X-API-Key"),
         db: Session = Depends(get_db),
     ) -> APIKeyContext:
@@ -30,6 +32,7 @@ def require_api_key_scope(scope: str):
         organizacion = db.get(Organizacion, api_key.organizacion_id)
         if organizacion is None:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Organizacion inactiva.")
+        aplicar_rate_limit(api_key, organizacion, db, response)
         return APIKeyContext(
             organizacion=organizacion,
             api_key=api_key,
@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, Integer, String, Text, Uuid
+from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Index, Integer, String, Text, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -25,6 +25,7 @@ class APIKey(Base):
     key_hash: Mapped[str] = mapped_column(String(128), nullable=False)
     scopes: Mapped[list[str]] = mapped_column(JSON, nullable=False)
     activa: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    limite_requests_minuto: Mapped[int | None] = mapped_column(Integer)
     ultimo_uso_en: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     fecha_creacion: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -37,6 +38,18 @@ class APIKey(Base):
     audit_logs: Mapped[list["AuditLog"]] = relationship(back_populates="actor_api_key")
 
 
+class APIRateLimitBucket(Base):
+    __tablename__ = "api_rate_limit_buckets"
+
+    bucket_key: Mapped[str] = mapped_column(String(120), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    fecha_actualizacion: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
 class WebhookEndpoint(Base):
     __tablename__ = "webhook_endpoints"
 
@@ -52,6 +65,12 @@ class WebhookEndpoint(Base):
     eventos: Mapped[list[str]] = mapped_column(JSON, nullable=False)
     secret_encrypted: Mapped[str] = mapped_column(String(1000), nullable=False)
     activo: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    circuito_estado: Mapped[str] = mapped_column(String(20), nullable=False, default="cerrado")
+    fallos_consecutivos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    circuito_abierto_hasta: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    modo_lote: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    lote_max_eventos: Mapped[int] = mapped_column(Integer, nullable=False, default=100)
+    lote_max_segundos: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
     fecha_creacion: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -66,8 +85,104 @@ class WebhookEndpoint(Base):
     deliveries: Mapped[list["WebhookDelivery"]] = relationship(back_populates="webhook_endpoint")
 
 
+class WebhookEvent(Base):
+    """Payload de un evento, guardado una sola vez y compartido por todas sus deliveries."""
+
+    __tablename__ = "webhook_events"
+
+    id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    evento: Mapped[str] = mapped_column(String(120), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    fecha_creacion: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
+class WebhookBatch(Base):
+    """Lote de deliveries de un endpoint en ``modo_lote``, enviado como un unico POST firmado."""
+
+    __tablename__ = "webhook_batches"
+    __table_args__ = (Index("ix_webhook_batches_status_next_attempt_at", "status", "next_attempt_at"),)
+
+    id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    webhook_endpoint_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("webhook_endpoints.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    cantidad_eventos: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[str] = mapped_column(String(30), nullable=False, default="pendiente")
+    status_code: Mapped[int | None] = mapped_column(Integer)
+    respuesta_body: Mapped[str | None] = mapped_column(Text)
+    intentos: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text)
+    fecha_creacion: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    fecha_ultimo_intento: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+    deliveries: Mapped[list["WebhookDelivery"]] = relationship(back_populates="webhook_batch")
+
+
+class WebhookReplay(Base):
+    """Reenvio masivo de deliveries: se marcan de una vez y el worker las libera a ``tasa_por_segundo``."""
+
+    __tablename__ = "webhook_replays"
+
+    id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    solicitado_por_id: Mapped[UUID | None] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("usuarios.id", ondelete="SET NULL"),
+    )
+    filtros: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    tasa_por_segundo: Mapped[int] = mapped_column(Integer, nullable=False)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    encoladas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    status: Mapped[str] = mapped_column(String(30), nullable=False, default="en_curso", index=True)
+    fecha_creacion: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    fecha_ultima_alimentacion: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    fecha_finalizacion: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+
 class WebhookDelivery(Base):
     __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index("ix_webhook_deliveries_status_next_attempt_at", "status", "next_attempt_at"),
+        Index(
+            "ix_webhook_deliveries_acumulando",
+            "webhook_endpoint_id",
+            "fecha_creacion",
+            postgresql_where=text("status = 'acumulando'"),
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4, index=True)
     organizacion_id: Mapped[UUID] = mapped_column(
@@ -82,8 +197,23 @@ class WebhookDelivery(Base):
         nullable=False,
         index=True,
     )
+    webhook_event_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("webhook_events.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    webhook_batch_id: Mapped[UUID | None] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("webhook_batches.id", ondelete="RESTRICT"),
+        index=True,
+    )
+    webhook_replay_id: Mapped[UUID | None] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("webhook_replays.id", ondelete="SET NULL"),
+        index=True,
+    )
     evento: Mapped[str] = mapped_column(String(120), nullable=False, index=True)
-    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
     status: Mapped[str] = mapped_column(String(30), nullable=False, default="pendiente", index=True)
     status_code: Mapped[int | None] = mapped_column(Integer)
     respuesta_body: Mapped[str | None] = mapped_column(Text)
@@ -95,6 +225,13 @@ class WebhookDelivery(Base):
         nullable=False,
     )
     fecha_ultimo_intento: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
     organizacion: Mapped["Organizacion"] = relationship()
     webhook_endpoint: Mapped[WebhookEndpoint] = relationship(back_populates="deliveries")
+    webhook_event: Mapped[WebhookEvent] = relationship()
+    webhook_batch: Mapped[WebhookBatch | None] = relationship(back_populates="deliveries")
+
+    @property
+    def payload(self) -> dict[str, Any]:
+        return self.webhook_event.payload
@@ -0,0 +1,187 @@
+"""Rate limiting token bucket para la API externa, por API Key y por plan de organizacion."""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Protocol
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.apps.integraciones.models import APIKey, APIRateLimitBucket
+from app.apps.organizaciones.models import Organizacion
+from app.apps.planes.services import obtener_o_asignar_plan_organizacion
+from app.core import database as database_module
+from app.core.config import settings
+
+
+RATE_LIMIT_WINDOW_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+    retry_after_seconds: int
+
+
+class RateLimitBackend(Protocol):
+    def consume(self, limits: list[tuple[str, int]]) -> list[RateLimitDecision]: ...
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _refill(tokens: float, elapsed_seconds: float, limit: int) -> float:
+    return min(float(limit), tokens + max(elapsed_seconds, 0.0) * limit / RATE_LIMIT_WINDOW_SECONDS)
+
+
+def _decision(tokens: float, limit: int, *, allowed: bool) -> RateLimitDecision:
+    refill_rate = limit / RATE_LIMIT_WINDOW_SECONDS
+    return RateLimitDecision(
+        allowed=allowed,
+        limit=limit,
+        remaining=int(tokens),
+        reset_seconds=math.ceil((limit - tokens) / refill_rate),
+        retry_after_seconds=0 if allowed else math.ceil((1.0 - tokens) / refill_rate),
+    )
+
+
+def _take_tokens(buckets: list[tuple[float, int]]) -> tuple[list[float], list[RateLimitDecision]]:
+    """Toma un token de cada bucket solo si todos lo tienen; recibe ``(tokens recargados, limite)``."""
+    if all(tokens >= 1.0 for tokens, _ in buckets):
+        restantes = [tokens - 1.0 for tokens, _ in buckets]
+        return restantes, [_decision(tokens, limit, allowed=True) for tokens, (_, limit) in zip(restantes, buckets)]
+    return [tokens for tokens, _ in buckets], [
+        _decision(tokens, limit, allowed=tokens >= 1.0) for tokens, limit in buckets
+    ]
+
+
+class MemoryRateLimitBackend:
+    """Buckets en memoria del proceso: cada worker aplica el limite por separado."""
+
+    def __init__(self) -> None:
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, limits: list[tuple[str, int]]) -> list[RateLimitDecision]:
+        now = time.monotonic()
+        with self._lock:
+            recargados = []
+            for bucket_key, limit in limits:
+                tokens, updated_at = self._buckets.get(bucket_key, (float(limit), now))
+                recargados.append((_refill(tokens, now - updated_at, limit), limit))
+            restantes, decisions = _take_tokens(recargados)
+            for (bucket_key, _), tokens in zip(limits, restantes):
+                self._buckets[bucket_key] = (tokens, now)
+        return decisions
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseRateLimitBackend:
+    """Buckets compartidos entre workers, en una sesion propia para no commitear la del request.
+
+    Los buckets faltantes se crean con ``ON CONFLICT DO NOTHING`` y despues se bloquean en orden de clave,
+    asi dos requests concurrentes no se bloquean mutuamente ni chocan al crear el mismo bucket.
+    """
+
+    def consume(self, limits: list[tuple[str, int]]) -> list[RateLimitDecision]:
+        now = _now()
+        claves = sorted(bucket_key for bucket_key, _ in limits)
+        with database_module.SessionLocal() as db:
+            dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            db.execute(
+                dialecto.insert(APIRateLimitBucket).on_conflict_do_nothing(index_elements=["bucket_key"]),
+                [
+                    {"bucket_key": bucket_key, "tokens": float(limit), "fecha_actualizacion": now}
+                    for bucket_key, limit in limits
+                ],
+            )
+            buckets = {
+                bucket.bucket_key: bucket
+                for bucket in db.scalars(
+                    select(APIRateLimitBucket)
+                    .where(APIRateLimitBucket.bucket_key.in_(claves))
+                    .order_by(APIRateLimitBucket.bucket_key)
+                    .with_for_update()
+                ).all()
+            }
+            recargados = []
+            for bucket_key, limit in limits:
+                bucket = buckets[bucket_key]
+                elapsed = (now - _as_utc(bucket.fecha_actualizacion)).total_seconds()
+                recargados.append((_refill(bucket.tokens, elapsed, limit), limit))
+            restantes, decisions = _take_tokens(recargados)
+            for (bucket_key, _), tokens in zip(limits, restantes):
+                buckets[bucket_key].tokens = tokens
+                buckets[bucket_key].fecha_actualizacion = now
+            db.commit()
+        return decisions
+
+
+memory_backend = MemoryRateLimitBackend()
+database_backend = DatabaseRateLimitBackend()
+
+
+def _backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "database":
+        return database_backend
+    return memory_backend
+
+
+def _rate_limit_headers(decision: RateLimitDecision) -> dict[str, str]:
+    return {
+        "RateLimit-Limit": str(decision.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(decision.reset_seconds),
+        "RateLimit-Policy": f"{decision.limit};w={RATE_LIMIT_WINDOW_SECONDS}",
+    }
+
+
+def _limits_for(api_key: APIKey, organizacion: Organizacion, db: Session) -> list[tuple[str, int]]:
+    limits: list[tuple[str, int]] = []
+    if api_key.limite_requests_minuto is not None:
+        limits.append((f"api_key:{api_key.id}", api_key.limite_requests_minuto))
+    plan = obtener_o_asignar_plan_organizacion(db, organizacion)
+    if plan.limite_requests_minuto is not None:
+        limits.append((f"organizacion:{organizacion.id}", plan.limite_requests_minuto))
+    return limits
+
+
+def aplicar_rate_limit(api_key: APIKey, organizacion: Organizacion, db: Session, response: Response) -> None:
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    limits = _limits_for(api_key, organizacion, db)
+    if not limits:
+        return
+    # Se consume un token de cada bucket solo si todos lo permiten: un rechazo no gasta cupo de los demas.
+    decisions = _backend().consume(limits)
+    rechazos = [decision for decision in decisions if not decision.allowed]
+    if rechazos:
+        decision = max(rechazos, key=lambda item: item.retry_after_seconds)
+        headers = _rate_limit_headers(decision)
+        headers["Retry-After"] = str(decision.retry_after_seconds)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Limite de requests excedido.",
+            headers=headers,
+        )
+    most_restrictive = min(decisions, key=lambda item: item.remaining)
+    response.headers.update(_rate_limit_headers(most_restrictive))
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from uuid import UUID
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
@@ -14,30 +17,53 @@ from app.apps.integraciones.schemas import (
     APIKeyCreateResponse,
     APIKeyResponse,
     APIKeyRevokeResponse,
+    WebhookBatchResponse,
     WebhookDeliveryResponse,
     WebhookEndpointCreate,
     WebhookEndpointResponse,
     WebhookEndpointUpdate,
+    WebhookQueueMetricsResponse,
+    WebhookReplayCreate,
+    WebhookReplayResponse,
 )
 from app.apps.integraciones.services import (
     actualizar_webhook_endpoint,
     crear_api_key,
+    crear_reenvio_masivo,
     crear_webhook_endpoint,
     desactivar_webhook_endpoint,
     listar_api_keys,
+    listar_webhook_batches,
     listar_webhook_deliveries,
     listar_webhook_endpoints,
+    obtener_metricas_cola_webhooks,
+    obtener_reenvio_masivo,
     registrar_uso_api_key,
     reenviar_webhook_delivery,
     revocar_api_key,
 )
-from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento
+from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento, encolar_webhook_evento_lote
 from app.apps.movimientos.models import Movimiento
-from app.apps.movimientos.schemas import MovimientoCashbackCreate, MovimientoDepositoCreate, MovimientoResponse
-from app.apps.movimientos.services import crear_cashback_api_key, crear_deposito_api_key
+from app.apps.movimientos.schemas import (
+    MovimientoCambiosResponse,
+    MovimientoCashbackCreate,
+    MovimientoCashbackLoteCreate,
+    MovimientoDepositoCreate,
+    MovimientoDepositoLoteCreate,
+    MovimientoLoteResponse,
+    MovimientoResponse,
+)
+from app.apps.movimientos.services import (
+    crear_cashback_api_key,
+    crear_deposito_api_key,
+    crear_movimientos_lote_api_key,
+    leer_cambios_movimientos,
+)
 from app.apps.wallets.models import Wallet
 from app.apps.wallets.schemas import WalletResponse
+from app.core.config import settings
 from app.core.database import get_db
+from app.shared.enums import TipoMovimiento
 from app.shared.responses import ApiResponse, ok
 
 
@@ -113,6 +139,7 @@ def delete_webhook(
 def get_webhook_deliveries(
     organizacion_id: UUID | None = Query(default=None),
     webhook_endpoint_id: UUID | None = Query(default=None),
+    webhook_batch_id: UUID | None = Query(default=None),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     current_user: DatosUsuarioToken = Depends(get_current_user),
@@ -125,10 +152,63 @@ def get_webhook_deliveries(
         webhook_endpoint_id=webhook_endpoint_id,
         skip=skip,
         limit=limit,
+        webhook_batch_id=webhook_batch_id,
     )
     return ok(deliveries, "Deliveries obtenidos correctamente.")
 
 
+@router.get("/webhooks/lotes", response_model=ApiResponse[list[WebhookBatchResponse]])
+def get_webhook_batches(
+    organizacion_id: UUID | None = Query(default=None),
+    webhook_endpoint_id: UUID | None = Query(default=None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[list[WebhookBatchResponse]]:
+    lotes = listar_webhook_batches(
+        current_user,
+        db,
+        organizacion_id=organizacion_id,
+        webhook_endpoint_id=webhook_endpoint_id,
+        skip=skip,
+        limit=limit,
+    )
+    return ok(lotes, "Lotes de webhooks obtenidos correctamente.")
+
+
+@router.get("/webhooks/cola", response_model=ApiResponse[WebhookQueueMetricsResponse])
+def get_webhook_queue_metrics(
+    organizacion_id: UUID | None = Query(default=None),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[WebhookQueueMetricsResponse]:
+    metricas = obtener_metricas_cola_webhooks(current_user, db, organizacion_id)
+    return ok(metricas, "Metricas de cola de webhooks obtenidas correctamente.")
+
+
+@router.post(
+    "/webhooks/reenvios",
+    response_model=ApiResponse[WebhookReplayResponse],
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def post_reenvio_masivo(
+    datos: WebhookReplayCreate,
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[WebhookReplayResponse]:
+    return ok(crear_reenvio_masivo(datos, current_user, db), "Reenvio masivo agendado correctamente.")
+
+
+@router.get("/webhooks/reenvios/{replay_id}", response_model=ApiResponse[WebhookReplayResponse])
+def get_reenvio_masivo(
+    replay_id: UUID,
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[WebhookReplayResponse]:
+    return ok(obtener_reenvio_masivo(replay_id, current_user, db), "Reenvio masivo obtenido correctamente.")
+
+
 @router.post("/webhooks/deliveries/{delivery_id}/reenviar", response_model=ApiResponse[WebhookDeliveryResponse])
 def post_reenviar_webhook_delivery(
     delivery_id: UUID,
@@ -179,7 +259,7 @@ def ext_post_cashback(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=context.organizacion.id,
-        data=_movement_payload(movimiento),
+        data=lambda: _movement_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -208,13 +288,118 @@ def ext_post_deposito(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=context.organizacion.id,
-        data=_movement_payload(movimiento),
+        data=lambda: _movement_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
     return ok(movimiento, "Deposito creado correctamente.")
 
 
+@ext_router.post("/movimientos/cashback/lote", response_model=ApiResponse[MovimientoLoteResponse])
+def ext_post_cashback_lote(
+    datos: MovimientoCashbackLoteCreate,
+    background_tasks: BackgroundTasks,
+    context: APIKeyContext = Depends(require_api_key_scope("movimientos:write")),
+    db: Session = Depends(get_db),
+) -> ApiResponse[MovimientoLoteResponse]:
+    lote = _crear_movimientos_lote(
+        datos.items,
+        TipoMovimiento.cashback,
+        "POST /api/v1/ext/movimientos/cashback/lote",
+        context,
+        db,
+        background_tasks,
+    )
+    return ok(lote, "Lote de cashback procesado.")
+
+
+@ext_router.post("/movimientos/deposito/lote", response_model=ApiResponse[MovimientoLoteResponse])
+def ext_post_deposito_lote(
+    datos: MovimientoDepositoLoteCreate,
+    background_tasks: BackgroundTasks,
+    context: APIKeyContext = Depends(require_api_key_scope("movimientos:write")),
+    db: Session = Depends(get_db),
+) -> ApiResponse[MovimientoLoteResponse]:
+    lote = _crear_movimientos_lote(
+        datos.items,
+        TipoMovimiento.deposito,
+        "POST /api/v1/ext/movimientos/deposito/lote",
+        context,
+        db,
+        background_tasks,
+    )
+    return ok(lote, "Lote de depositos procesado.")
+
+
+def _crear_movimientos_lote(
+    items: list[MovimientoDepositoCreate] | list[MovimientoCashbackCreate],
+    tipo: TipoMovimiento,
+    endpoint: str,
+    context: APIKeyContext,
+    db: Session,
+    background_tasks: BackgroundTasks,
+) -> MovimientoLoteResponse:
+    # La API Key se valida una vez por request, no por item.
+    organizacion_id = context.organizacion.id
+    lote = crear_movimientos_lote_api_key(
+        items,
+        tipo=tipo,
+        organizacion_id=organizacion_id,
+        actor_api_key_id=context.api_key.id,
+        db=db,
+    )
+    registrar_uso_api_key(context.api_key, db, endpoint=endpoint, scope="movimientos:write")
+    creados = [resultado.movimiento for resultado in lote.resultados if resultado.status == "creado"]
+    if creados:
+        encolar_webhook_evento_lote(
+            evento="movimiento.creado",
+            organizacion_id=organizacion_id,
+            datos=lambda: [_movement_payload(movimiento) for movimiento in creados],
+            db=db,
+            background_tasks=background_tasks,
+        )
+    return lote
+
+
+def _registrar_uso_feed(context: APIKeyContext, db: Session) -> UUID:
+    organizacion_id = context.organizacion.id
+    registrar_uso_api_key(
+        context.api_key,
+        db,
+        endpoint="GET /api/v1/ext/movimientos/cambios",
+        scope="movimientos:read",
+    )
+    return organizacion_id
+
+
+@ext_router.get("/movimientos/cambios", response_model=ApiResponse[MovimientoCambiosResponse])
+async def ext_get_cambios_movimientos(
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    espera: int = Query(0, ge=0, description="Segundos de long-poll si no hay cambios."),
+    context: APIKeyContext = Depends(require_api_key_scope("movimientos:read")),
+    db: Session = Depends(get_db),
+) -> ApiResponse[MovimientoCambiosResponse]:
+    """Feed incremental: altas y cambios de estado posteriores a ``cursor``, en orden.
+
+    Con ``espera`` el request queda abierto (sin ocupar un thread) hasta que aparece un cambio o vence el plazo.
+    """
+    organizacion_id = await run_in_threadpool(_registrar_uso_feed, context, db)
+    limite_espera = time.monotonic() + min(espera, settings.MOVIMIENTOS_FEED_MAX_WAIT_SECONDS)
+    while True:
+        pagina = await run_in_threadpool(
+            leer_cambios_movimientos,
+            db,
+            organizacion_id,
+            cursor=cursor,
+            limit=limit,
+        )
+        restante = limite_espera - time.monotonic()
+        if pagina.cambios or restante <= 0:
+            return ok(pagina, "Cambios de movimientos obtenidos correctamente.")
+        await asyncio.sleep(min(settings.MOVIMIENTOS_FEED_POLL_SECONDS, restante))
+
+
 @ext_router.get("/movimientos", response_model=ApiResponse[list[MovimientoResponse]])
 def ext_get_movimientos(
     skip: int = Query(0, ge=0),
@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import Any
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field, HttpUrl, field_validator
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl, field_validator, model_validator
 
 
 ALLOWED_API_KEY_SCOPES = {
@@ -33,7 +33,9 @@ ALLOWED_WEBHOOK_EVENTS = {
     "organizacion.suspendida",
 }
 
-WEBHOOK_DELIVERY_STATUSES = {"pendiente", "enviado", "fallido"}
+WEBHOOK_DELIVERY_STATUSES = {"acumulando", "en_lote", "reenvio", "pendiente", "diferido", "enviado", "fallido"}
+WEBHOOK_BATCH_STATUSES = {"pendiente", "diferido", "enviado", "fallido"}
+WEBHOOK_REPLAY_SOURCE_STATUSES = {"fallido", "enviado"}
 
 
 def _validate_items(values: list[str], allowed: set[str], label: str) -> list[str]:
@@ -49,6 +51,7 @@ def _validate_items(values: list[str], allowed: set[str], label: str) -> list[st
 class APIKeyCreate(BaseModel):
     nombre: str = Field(..., min_length=2, max_length=120)
     scopes: list[str] = Field(..., min_length=1)
+    limite_requests_minuto: int | None = Field(default=None, ge=1)
     organizacion_id: UUID | None = None
 
     @field_validator("scopes")
@@ -66,6 +69,7 @@ class APIKeyResponse(BaseModel):
     key_prefix: str
     scopes: list[str]
     activa: bool
+    limite_requests_minuto: int | None = None
     ultimo_uso_en: datetime | None = None
     fecha_creacion: datetime
     fecha_revocacion: datetime | None = None
@@ -88,6 +92,9 @@ class WebhookEndpointCreate(BaseModel):
     eventos: list[str] = Field(..., min_length=1)
     secret: str = Field(..., min_length=16, max_length=255)
     organizacion_id: UUID | None = None
+    modo_lote: bool = False
+    lote_max_eventos: int = Field(default=100, ge=1, le=1000)
+    lote_max_segundos: int = Field(default=5, ge=1, le=3600)
 
     @field_validator("eventos")
     @classmethod
@@ -101,6 +108,9 @@ class WebhookEndpointUpdate(BaseModel):
     eventos: list[str] | None = Field(default=None, min_length=1)
     secret: str | None = Field(default=None, min_length=16, max_length=255)
     activo: bool | None = None
+    modo_lote: bool | None = None
+    lote_max_eventos: int | None = Field(default=None, ge=1, le=1000)
+    lote_max_segundos: int | None = Field(default=None, ge=1, le=3600)
 
     @field_validator("eventos")
     @classmethod
@@ -119,6 +129,12 @@ class WebhookEndpointResponse(BaseModel):
     url: str
     eventos: list[str]
     activo: bool
+    circuito_estado: str = "cerrado"
+    fallos_consecutivos: int = 0
+    circuito_abierto_hasta: datetime | None = None
+    modo_lote: bool = False
+    lote_max_eventos: int = 100
+    lote_max_segundos: int = 5
     fecha_creacion: datetime
     fecha_actualizacion: datetime | None = None
 
@@ -129,6 +145,7 @@ class WebhookDeliveryResponse(BaseModel):
     id: UUID
     organizacion_id: UUID
     webhook_endpoint_id: UUID
+    webhook_batch_id: UUID | None = None
     evento: str
     payload: dict[str, Any]
     status: str
@@ -138,3 +155,79 @@ class WebhookDeliveryResponse(BaseModel):
     error: str | None = None
     fecha_creacion: datetime
     fecha_ultimo_intento: datetime | None = None
+    next_attempt_at: datetime | None = None
+
+
+class WebhookBatchResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    organizacion_id: UUID
+    webhook_endpoint_id: UUID
+    cantidad_eventos: int
+    status: str
+    status_code: int | None = None
+    respuesta_body: str | None = None
+    intentos: int
+    error: str | None = None
+    fecha_creacion: datetime
+    fecha_ultimo_intento: datetime | None = None
+    next_attempt_at: datetime | None = None
+
+
+class WebhookReplayCreate(BaseModel):
+    organizacion_id: UUID | None = None
+    webhook_endpoint_id: UUID | None = None
+    evento: str | None = None
+    status: list[str] = Field(default_factory=lambda: ["fallido"], min_length=1)
+    desde: datetime | None = None
+    hasta: datetime | None = None
+    tasa_por_segundo: int | None = Field(default=None, ge=1, le=10000)
+
+    @field_validator("evento")
+    @classmethod
+    def validate_event(cls, value: str | None) -> str | None:
+        if value is not None and value not in ALLOWED_WEBHOOK_EVENTS:
+            raise ValueError(f"evento invalido: {value}.")
+        return value
+
+    @field_validator("status")
+    @classmethod
+    def validate_status(cls, values: list[str]) -> list[str]:
+        invalid = sorted(set(values) - WEBHOOK_REPLAY_SOURCE_STATUSES)
+        if invalid:
+            raise ValueError(f"status invalidos: {', '.join(invalid)}.")
+        return sorted(set(values))
+
+    @model_validator(mode="after")
+    def validate_rango(self) -> "WebhookReplayCreate":
+        if self.desde is not None and self.hasta is not None and self.desde >= self.hasta:
+            raise ValueError("desde debe ser anterior a hasta.")
+        return self
+
+
+class WebhookReplayResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    organizacion_id: UUID
+    filtros: dict[str, Any]
+    tasa_por_segundo: int
+    status: str
+    total: int
+    encoladas: int
+    enviadas: int = 0
+    fallidas: int = 0
+    en_curso: int = 0
+    fecha_creacion: datetime
+    fecha_finalizacion: datetime | None = None
+
+
+class WebhookQueueMetricsResponse(BaseModel):
+    pendientes: int
+    vencidos: int
+    en_reintento: int
+    fallidos: int
+    diferidos: int = 0
+    lag_segundos: float
+    proximo_intento: datetime | None = None
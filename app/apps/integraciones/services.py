@@ -1,33 +1,45 @@
 from __future__ import annotations
 
 import base64
+import binascii
 import hashlib
 import hmac
+import logging
 import secrets
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any
 from uuid import UUID
 
 from cryptography.fernet import Fernet, InvalidToken
 from fastapi import BackgroundTasks, HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.orm import Session, selectinload
 
 from app.apps.auditoria.schemas import AuditActorTipo
 from app.apps.auditoria.services import registrar_evento
 from app.apps.auth.schemas import DatosUsuarioToken
-from app.apps.integraciones.models import APIKey, WebhookDelivery, WebhookEndpoint
+from app.apps.integraciones.circuit_breaker import resetear_circuito
+from app.apps.integraciones.models import APIKey, WebhookBatch, WebhookDelivery, WebhookEndpoint, WebhookReplay
 from app.apps.integraciones.schemas import (
     ALLOWED_API_KEY_SCOPES,
     APIKeyCreate,
     APIKeyCreateResponse,
     APIKeyResponse,
     APIKeyRevokeResponse,
+    WebhookBatchResponse,
     WebhookDeliveryResponse,
     WebhookEndpointCreate,
     WebhookEndpointResponse,
     WebhookEndpointUpdate,
+    WebhookQueueMetricsResponse,
+    WebhookReplayCreate,
+    WebhookReplayResponse,
 )
+from app.apps.integraciones.subscriptions import subscription_index
+from app.apps.integraciones.webhook_replays import progreso_reenvio
 from app.apps.organizaciones.dependencies import resolve_organization_scope
 from app.apps.organizaciones.models import Organizacion
 from app.apps.planes.services import obtener_o_asignar_plan_organizacion
@@ -37,12 +49,25 @@ from app.shared.enums import EstadoOrganizacion
 
 
 KEY_PREFIX_LENGTH = 20
+# Token Fernet: version (1) + timestamp (8) + IV (16) + al menos un bloque AES (16) + HMAC (32).
+FERNET_LARGO_MINIMO = 73
+
+logger = logging.getLogger(__name__)
+
+_secret_cache: OrderedDict[tuple[UUID, datetime | None], str] = OrderedDict()
+_secret_cache_lock = threading.Lock()
 
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
 def _ensure_integration_admin(current_user: DatosUsuarioToken, *, write: bool = False) -> None:
     if not is_admin(current_user.rol):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operacion restringida a administradores.")
@@ -72,11 +97,17 @@ def _legacy_encryption_key() -> bytes:
     return hashlib.sha256(settings.SECRET_KEY.encode("utf-8")).digest()
 
 
-def _fernet() -> Fernet:
-    key = base64.urlsafe_b64encode(hashlib.sha256(settings.SECRET_KEY.encode("utf-8")).digest())
+@lru_cache(maxsize=4)
+def _fernet_para(secret_key: str) -> Fernet:
+    key = base64.urlsafe_b64encode(hashlib.sha256(secret_key.encode("utf-8")).digest())
     return Fernet(key)
 
 
+def _fernet() -> Fernet:
+    """Una instancia por valor de ``SECRET_KEY``: rotar la clave crea otra, sin derivar en cada uso."""
+    return _fernet_para(settings.SECRET_KEY)
+
+
 def _legacy_encrypt_secret(secret: str) -> str:
     data = secret.encode("utf-8")
     key = _legacy_encryption_key()
@@ -95,13 +126,110 @@ def encrypt_webhook_secret(secret: str) -> str:
     return _fernet().encrypt(secret.encode("utf-8")).decode("ascii")
 
 
+def _forma_fernet(encrypted: str) -> bool:
+    """Si el valor tiene la forma de un token Fernet: version ``0x80`` y largo de firma + bloques AES."""
+    try:
+        data = base64.urlsafe_b64decode(encrypted.encode("ascii"))
+    except (binascii.Error, UnicodeEncodeError, ValueError):
+        return False
+    largo = len(data)
+    return data[:1] == b"\x80" and largo >= FERNET_LARGO_MINIMO and (largo - FERNET_LARGO_MINIMO) % 16 == 0
+
+
 def decrypt_webhook_secret(encrypted: str) -> str:
     try:
         return _fernet().decrypt(encrypted.encode("ascii")).decode("utf-8")
     except InvalidToken:
+        if _forma_fernet(encrypted):
+            # Token Fernet de otra SECRET_KEY: descifrarlo como XOR devolveria basura.
+            raise
+        # Se elimina cuando scripts/reencrypt_webhook_secrets.py haya corrido en todos los entornos.
+        logger.warning("Webhook secret con cifrado legacy; correr scripts/reencrypt_webhook_secrets.py.")
         return _legacy_decrypt_secret(encrypted)
 
 
+def webhook_secret(endpoint: WebhookEndpoint) -> str:
+    """Secret descifrado de un endpoint, cacheado por ``(id, fecha_actualizacion)``.
+
+    Cambiar el secret actualiza ``fecha_actualizacion``, asi que la entrada vieja deja de usarse sola;
+    el circuit breaker conserva esa fecha y no invalida el cache.
+    """
+    clave = (endpoint.id, endpoint.fecha_actualizacion)
+    with _secret_cache_lock:
+        secret = _secret_cache.get(clave)
+        if secret is not None:
+            _secret_cache.move_to_end(clave)
+            return secret
+    secret = decrypt_webhook_secret(endpoint.secret_encrypted)
+    if settings.WEBHOOK_SECRET_CACHE_SIZE > 0:
+        with _secret_cache_lock:
+            _secret_cache[clave] = secret
+            while len(_secret_cache) > settings.WEBHOOK_SECRET_CACHE_SIZE:
+                _secret_cache.popitem(last=False)
+    return secret
+
+
+def es_secret_legacy(encrypted: str) -> bool:
+    """Los secrets legacy se reconocen por formato, no porque Fernet falle con la ``SECRET_KEY`` actual."""
+    return not _forma_fernet(encrypted)
+
+
+def recifrar_secrets_legacy(
+    db: Session,
+    *,
+    dry_run: bool = False,
+    batch_size: int = 500,
+) -> tuple[int, list[UUID]]:
+    """Recifra con Fernet los secrets XOR legacy; commitea por lote.
+
+    Devuelve cuantos recifro (o encontro, con ``dry_run``) y los endpoints omitidos: tokens Fernet que
+    no descifran con la ``SECRET_KEY`` actual y valores legacy que no decodifican. Una fila omitida no
+    corta la corrida. El secret en claro no cambia, por eso se conserva ``fecha_actualizacion``.
+    """
+    recifrados = 0
+    omitidos: list[UUID] = []
+    ultimo_id: UUID | None = None
+    while True:
+        query = (
+            select(WebhookEndpoint.id, WebhookEndpoint.secret_encrypted)
+            .order_by(WebhookEndpoint.id)
+            .limit(batch_size)
+        )
+        if ultimo_id is not None:
+            query = query.where(WebhookEndpoint.id > ultimo_id)
+        filas = db.execute(query).all()
+        if not filas:
+            return recifrados, omitidos
+        ultimo_id = filas[-1].id
+        for endpoint_id, encrypted in filas:
+            if not es_secret_legacy(encrypted):
+                try:
+                    _fernet().decrypt(encrypted.encode("ascii"))
+                except InvalidToken:
+                    logger.warning("Webhook secret %s no descifra con la SECRET_KEY actual; se omite.", endpoint_id)
+                    omitidos.append(endpoint_id)
+                continue
+            try:
+                secret = _legacy_decrypt_secret(encrypted)
+            except (binascii.Error, UnicodeError, ValueError):
+                logger.warning("Webhook secret legacy %s no se pudo decodificar; se omite.", endpoint_id)
+                omitidos.append(endpoint_id)
+                continue
+            recifrados += 1
+            if dry_run:
+                continue
+            db.execute(
+                update(WebhookEndpoint)
+                .where(WebhookEndpoint.id == endpoint_id, WebhookEndpoint.secret_encrypted == encrypted)
+                .values(
+                    secret_encrypted=encrypt_webhook_secret(secret),
+                    fecha_actualizacion=WebhookEndpoint.fecha_actualizacion,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+
+
 encrypt_secret = encrypt_webhook_secret
 decrypt_secret = decrypt_webhook_secret
 
@@ -149,6 +277,7 @@ def crear_api_key(datos: APIKeyCreate, current_user: DatosUsuarioToken, db: Sess
         key_hash=_hash_value(raw_key),
         scopes=datos.scopes,
         activa=True,
+        limite_requests_minuto=datos.limite_requests_minuto,
     )
     db.add(api_key)
     db.commit()
@@ -280,12 +409,22 @@ def _ensure_webhooks_allowed(db: Session, organizacion: Organizacion) -> None:
         )
 
 
+def _ensure_modo_lote_disponible(modo_lote: bool | None) -> None:
+    # Solo el worker agrupa las deliveries en lotes; sin el, quedarian acumulando para siempre.
+    if modo_lote and not settings.WEBHOOK_WORKER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El modo lote requiere el worker de webhooks habilitado.",
+        )
+
+
 def crear_webhook_endpoint(
     datos: WebhookEndpointCreate,
     current_user: DatosUsuarioToken,
     db: Session,
 ) -> WebhookEndpointResponse:
     _ensure_integration_admin(current_user, write=True)
+    _ensure_modo_lote_disponible(datos.modo_lote)
     organizacion = _resolve_organization_for_user(current_user, db, datos.organizacion_id)
     _ensure_webhooks_allowed(db, organizacion)
     webhook = WebhookEndpoint(
@@ -295,10 +434,14 @@ def crear_webhook_endpoint(
         eventos=datos.eventos,
         secret_encrypted=encrypt_webhook_secret(datos.secret),
         activo=True,
+        modo_lote=datos.modo_lote,
+        lote_max_eventos=datos.lote_max_eventos,
+        lote_max_segundos=datos.lote_max_segundos,
     )
     db.add(webhook)
     db.commit()
     db.refresh(webhook)
+    subscription_index.invalidar(webhook.organizacion_id)
     _audit(
         db,
         evento="webhook_creado",
@@ -349,16 +492,21 @@ def actualizar_webhook_endpoint(
     _ensure_integration_admin(current_user, write=True)
     webhook = _get_webhook_scoped(webhook_id, current_user, db)
     cambios = datos.model_dump(exclude_unset=True)
+    _ensure_modo_lote_disponible(cambios.get("modo_lote"))
     if "url" in cambios and cambios["url"] is not None:
         webhook.url = str(cambios["url"])
+        resetear_circuito(webhook)
+    if cambios.get("activo") and not webhook.activo:
+        resetear_circuito(webhook)
     if "secret" in cambios and cambios["secret"] is not None:
         webhook.secret_encrypted = encrypt_webhook_secret(cambios["secret"])
-    for field in ("nombre", "eventos", "activo"):
+    for field in ("nombre", "eventos", "activo", "modo_lote", "lote_max_eventos", "lote_max_segundos"):
         if field in cambios:
             setattr(webhook, field, cambios[field])
     db.add(webhook)
     db.commit()
     db.refresh(webhook)
+    subscription_index.invalidar(webhook.organizacion_id)
     _audit(
         db,
         evento="webhook_actualizado",
@@ -381,6 +529,7 @@ def desactivar_webhook_endpoint(
     db.add(webhook)
     db.commit()
     db.refresh(webhook)
+    subscription_index.invalidar(webhook.organizacion_id)
     _audit(
         db,
         evento="webhook_desactivado",
@@ -399,9 +548,14 @@ def listar_webhook_deliveries(
     webhook_endpoint_id: UUID | None = None,
     skip: int = 0,
     limit: int = 50,
+    webhook_batch_id: UUID | None = None,
 ) -> list[WebhookDeliveryResponse]:
     _ensure_integration_admin(current_user)
-    query = select(WebhookDelivery).order_by(WebhookDelivery.fecha_creacion.desc())
+    query = (
+        select(WebhookDelivery)
+        .options(selectinload(WebhookDelivery.webhook_event))
+        .order_by(WebhookDelivery.fecha_creacion.desc())
+    )
     if is_super_admin(current_user.rol):
         if organizacion_id is not None:
             query = query.where(WebhookDelivery.organizacion_id == organizacion_id)
@@ -411,10 +565,35 @@ def listar_webhook_deliveries(
         query = query.where(WebhookDelivery.organizacion_id == current_user.organizacion_id)
     if webhook_endpoint_id is not None:
         query = query.where(WebhookDelivery.webhook_endpoint_id == webhook_endpoint_id)
+    if webhook_batch_id is not None:
+        query = query.where(WebhookDelivery.webhook_batch_id == webhook_batch_id)
     deliveries = db.scalars(query.offset(skip).limit(limit)).all()
     return [WebhookDeliveryResponse.model_validate(delivery) for delivery in deliveries]
 
 
+def listar_webhook_batches(
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+    webhook_endpoint_id: UUID | None = None,
+    skip: int = 0,
+    limit: int = 50,
+) -> list[WebhookBatchResponse]:
+    _ensure_integration_admin(current_user)
+    query = select(WebhookBatch).order_by(WebhookBatch.fecha_creacion.desc())
+    if is_super_admin(current_user.rol):
+        if organizacion_id is not None:
+            query = query.where(WebhookBatch.organizacion_id == organizacion_id)
+    else:
+        if organizacion_id is not None and organizacion_id != current_user.organizacion_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puedes operar otra organizacion.")
+        query = query.where(WebhookBatch.organizacion_id == current_user.organizacion_id)
+    if webhook_endpoint_id is not None:
+        query = query.where(WebhookBatch.webhook_endpoint_id == webhook_endpoint_id)
+    lotes = db.scalars(query.offset(skip).limit(limit)).all()
+    return [WebhookBatchResponse.model_validate(lote) for lote in lotes]
+
+
 def _get_delivery_scoped(
     delivery_id: UUID,
     current_user: DatosUsuarioToken,
@@ -443,6 +622,7 @@ def reenviar_webhook_delivery(
         )
     delivery.status = "pendiente"
     delivery.error = None
+    delivery.next_attempt_at = _now()
     db.add(delivery)
     db.commit()
     db.refresh(delivery)
@@ -460,7 +640,138 @@ def reenviar_webhook_delivery(
         },
     )
 
-    from app.apps.integraciones.webhook_dispatcher import enviar_webhook_delivery
+    if not settings.WEBHOOK_WORKER_ENABLED:
+        from app.apps.integraciones.webhook_dispatcher import enviar_webhook_delivery
 
-    background_tasks.add_task(enviar_webhook_delivery, delivery.id)
+        background_tasks.add_task(enviar_webhook_delivery, delivery.id)
     return WebhookDeliveryResponse.model_validate(delivery)
+
+
+def _replay_response(db: Session, replay: WebhookReplay) -> WebhookReplayResponse:
+    response = WebhookReplayResponse.model_validate(replay)
+    return response.model_copy(update=progreso_reenvio(db, replay.id))
+
+
+def crear_reenvio_masivo(
+    datos: WebhookReplayCreate,
+    current_user: DatosUsuarioToken,
+    db: Session,
+) -> WebhookReplayResponse:
+    """Marca todas las deliveries del filtro con un solo UPDATE; el worker las libera a la tasa pedida."""
+    _ensure_integration_admin(current_user, write=True)
+    if not settings.WEBHOOK_WORKER_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El reenvio masivo requiere el worker de webhooks habilitado.",
+        )
+    organizacion = _resolve_organization_for_user(current_user, db, datos.organizacion_id)
+    condiciones = [
+        WebhookDelivery.organizacion_id == organizacion.id,
+        WebhookDelivery.status.in_(datos.status),
+    ]
+    if datos.webhook_endpoint_id is not None:
+        webhook = _get_webhook_scoped(datos.webhook_endpoint_id, current_user, db)
+        if webhook.organizacion_id != organizacion.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook no encontrado.")
+        condiciones.append(WebhookDelivery.webhook_endpoint_id == webhook.id)
+    if datos.evento is not None:
+        condiciones.append(WebhookDelivery.evento == datos.evento)
+    if datos.desde is not None:
+        condiciones.append(WebhookDelivery.fecha_creacion >= datos.desde)
+    if datos.hasta is not None:
+        condiciones.append(WebhookDelivery.fecha_creacion < datos.hasta)
+
+    replay = WebhookReplay(
+        organizacion_id=organizacion.id,
+        solicitado_por_id=current_user.id,
+        filtros=datos.model_dump(mode="json", exclude={"organizacion_id", "tasa_por_segundo"}, exclude_none=True),
+        tasa_por_segundo=datos.tasa_por_segundo or settings.WEBHOOK_REPLAY_RATE_PER_SECOND,
+        status="en_curso",
+        total=0,
+        encoladas=0,
+    )
+    db.add(replay)
+    db.flush()
+    replay.total = db.execute(
+        update(WebhookDelivery)
+        .where(*condiciones)
+        .values(status="reenvio", webhook_replay_id=replay.id, intentos=0, error=None, next_attempt_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if replay.total == 0:
+        replay.status = "completado"
+        replay.fecha_finalizacion = _now()
+    db.commit()
+    db.refresh(replay)
+    _audit(
+        db,
+        evento="webhook_reenvio_masivo_agendado",
+        mensaje="Reenvio masivo de webhooks agendado.",
+        actor_usuario_id=current_user.id,
+        organizacion_id=organizacion.id,
+        metadata={
+            "webhook_replay_id": str(replay.id),
+            "filtros": replay.filtros,
+            "total": replay.total,
+            "tasa_por_segundo": replay.tasa_por_segundo,
+        },
+    )
+    return _replay_response(db, replay)
+
+
+def obtener_reenvio_masivo(
+    replay_id: UUID,
+    current_user: DatosUsuarioToken,
+    db: Session,
+) -> WebhookReplayResponse:
+    _ensure_integration_admin(current_user)
+    replay = db.get(WebhookReplay, replay_id)
+    if replay is None or (
+        not is_super_admin(current_user.rol) and replay.organizacion_id != current_user.organizacion_id
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reenvio no encontrado.")
+    return _replay_response(db, replay)
+
+
+def obtener_metricas_cola_webhooks(
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+) -> WebhookQueueMetricsResponse:
+    _ensure_integration_admin(current_user)
+    scope_id = organizacion_id
+    if not is_super_admin(current_user.rol):
+        if organizacion_id is not None and organizacion_id != current_user.organizacion_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puedes operar otra organizacion.")
+        scope_id = current_user.organizacion_id
+    return calcular_metricas_cola_webhooks(db, organizacion_id=scope_id)
+
+
+def calcular_metricas_cola_webhooks(db: Session, *, organizacion_id: UUID | None = None) -> WebhookQueueMetricsResponse:
+    now = _now()
+    pendiente = WebhookDelivery.status == "pendiente"
+    vencido = and_(pendiente, WebhookDelivery.next_attempt_at <= now)
+    query = select(
+        func.count().filter(pendiente),
+        func.count().filter(vencido),
+        func.count().filter(and_(pendiente, WebhookDelivery.intentos > 0)),
+        func.count().filter(WebhookDelivery.status == "fallido"),
+        func.count().filter(WebhookDelivery.status == "diferido"),
+        func.min(WebhookDelivery.next_attempt_at).filter(vencido),
+        func.min(WebhookDelivery.next_attempt_at).filter(pendiente),
+    )
+    if organizacion_id is not None:
+        query = query.where(WebhookDelivery.organizacion_id == organizacion_id)
+    pendientes, vencidos, en_reintento, fallidos, diferidos, mas_antiguo_vencido, proximo = db.execute(query).one()
+    lag = 0.0
+    if mas_antiguo_vencido is not None:
+        lag = max((now - _as_utc(mas_antiguo_vencido)).total_seconds(), 0.0)
+    return WebhookQueueMetricsResponse(
+        pendientes=pendientes,
+        vencidos=vencidos,
+        en_reintento=en_reintento,
+        fallidos=fallidos,
+        diferidos=diferidos,
+        lag_segundos=round(lag, 3),
+        proximo_intento=_as_utc(proximo) if proximo is not None else None,
+    )
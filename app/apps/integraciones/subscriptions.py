@@ -0,0 +1,81 @@
+"""Indice en memoria de suscripciones a webhooks: (organizacion, evento) -> endpoints activos.
+
+La mayoria de las organizaciones no tiene webhooks; el indice evita consultar ``webhook_endpoints``
+y construir el payload en cada movimiento, notificacion o evento ecommerce. Se invalida al crear,
+actualizar o desactivar un endpoint en este proceso; ``WEBHOOK_SUBSCRIPTION_CACHE_SECONDS`` acota
+cuanto tarda otro proceso en ver el cambio.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.apps.integraciones.models import WebhookEndpoint
+from app.core.config import settings
+
+
+class Suscripcion(NamedTuple):
+    endpoint_id: UUID
+    modo_lote: bool = False
+
+
+class SubscriptionIndex:
+    def __init__(self) -> None:
+        self._por_organizacion: dict[UUID, tuple[float, dict[str, tuple[Suscripcion, ...]]]] = {}
+        self._lock = threading.Lock()
+
+    def endpoints(self, db: Session, organizacion_id: UUID, evento: str) -> tuple[Suscripcion, ...]:
+        ttl = settings.WEBHOOK_SUBSCRIPTION_CACHE_SECONDS
+        now = time.monotonic()
+        with self._lock:
+            cached = self._por_organizacion.get(organizacion_id)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1].get(evento, ())
+        indice = self._cargar(db, organizacion_id)
+        if ttl > 0:
+            with self._lock:
+                self._por_organizacion[organizacion_id] = (now, indice)
+        return indice.get(evento, ())
+
+    @staticmethod
+    def _cargar(db: Session, organizacion_id: UUID) -> dict[str, tuple[Suscripcion, ...]]:
+        rows = db.execute(
+            select(WebhookEndpoint.id, WebhookEndpoint.eventos, WebhookEndpoint.modo_lote)
+            .where(
+                WebhookEndpoint.organizacion_id == organizacion_id,
+                WebhookEndpoint.activo.is_(True),
+            )
+            .order_by(WebhookEndpoint.fecha_creacion.asc())
+        ).all()
+        indice: dict[str, list[Suscripcion]] = {}
+        for endpoint_id, eventos, modo_lote in rows:
+            for evento in eventos or []:
+                indice.setdefault(evento, []).append(Suscripcion(endpoint_id, bool(modo_lote)))
+        return {evento: tuple(suscripciones) for evento, suscripciones in indice.items()}
+
+    def invalidar(self, organizacion_id: UUID) -> None:
+        with self._lock:
+            self._por_organizacion.pop(organizacion_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._por_organizacion.clear()
+
+
+subscription_index = SubscriptionIndex()
+
+
+def endpoints_suscritos(db: Session, organizacion_id: UUID, evento: str) -> tuple[Suscripcion, ...]:
+    return subscription_index.endpoints(db, organizacion_id, evento)
+
+
+@event.listens_for(WebhookEndpoint, "after_insert")
+@event.listens_for(WebhookEndpoint, "after_update")
+@event.listens_for(WebhookEndpoint, "after_delete")
+def _invalidar_por_cambio(mapper, connection, target: WebhookEndpoint) -> None:
+    subscription_index.invalidar(target.organizacion_id)
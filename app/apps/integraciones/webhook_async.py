@@ -0,0 +1,179 @@
+"""Motor asyncio de envio de webhooks: miles de deliveries en vuelo por proceso sin un thread por request."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+from uuid import UUID
+
+import httpx
+
+from app.apps.integraciones.webhook_batches import aplicar_resultado_lote, preparar_lote
+from app.apps.integraciones.webhook_dispatcher import (
+    EnvioPreparado,
+    ResultadoEnvio,
+    _http2_disponible,
+    aplicar_resultados,
+    preparar_envios,
+)
+from app.core import database as database_module
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def crear_cliente_http_async(max_connections: int) -> httpx.AsyncClient:
+    # La espera por conexion libre la acota el semaforo global, no un timeout de pool.
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.WEBHOOK_TIMEOUT_SECONDS, pool=None),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            keepalive_expiry=settings.WEBHOOK_KEEPALIVE_SECONDS,
+        ),
+        http2=_http2_disponible(),
+    )
+
+
+class MotorWebhooksAsync:
+    """Envia lotes de deliveries con un semaforo global y otro por endpoint.
+
+    Los resultados se acumulan y se escriben en lotes (``WEBHOOK_RESULT_FLUSH_SIZE`` o cada
+    ``WEBHOOK_RESULT_FLUSH_SECONDS``). Todo acceso a la DB pasa por un unico thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int | None = None,
+        max_por_endpoint: int | None = None,
+        flush_size: int | None = None,
+        flush_seconds: float | None = None,
+        client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.concurrency = concurrency or settings.WEBHOOK_ASYNC_CONCURRENCY
+        self.max_por_endpoint = max_por_endpoint or settings.WEBHOOK_MAX_IN_FLIGHT_PER_ENDPOINT
+        self.flush_size = flush_size or settings.WEBHOOK_RESULT_FLUSH_SIZE
+        self.flush_seconds = flush_seconds or settings.WEBHOOK_RESULT_FLUSH_SECONDS
+        self.en_vuelo = 0
+        self._client = client
+        self._client_propio = client is None
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._por_endpoint: dict[UUID, asyncio.Semaphore] = {}
+        self._resultados: list[ResultadoEnvio] = []
+        self._hay_resultados = asyncio.Event()
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-db")
+        self._flusher: asyncio.Task[None] | None = None
+
+    async def __aenter__(self) -> MotorWebhooksAsync:
+        if self._client is None:
+            self._client = crear_cliente_http_async(self.concurrency)
+        self._flusher = asyncio.create_task(self._flush_periodico())
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self._client_propio and self._client is not None:
+            await self._client.aclose()
+        self._db_executor.shutdown(wait=True)
+
+    @property
+    def capacidad_libre(self) -> int:
+        return max(self.concurrency - self.en_vuelo, 0)
+
+    async def ejecutar_db(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Corre ``func(db, ...)`` con una sesion propia en el thread de DB del motor."""
+
+        def _run() -> T:
+            with database_module.SessionLocal() as db:
+                return func(db, *args, **kwargs)
+
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, _run)
+
+    async def enviar(self, delivery_ids: list[UUID]) -> None:
+        self.en_vuelo += len(delivery_ids)
+        try:
+            envios, resultados = await self.ejecutar_db(preparar_envios, delivery_ids)
+            self._registrar(resultados)
+            self.en_vuelo -= len(delivery_ids) - len(envios)
+            await asyncio.gather(*(self._enviar_uno(envio) for envio in envios))
+        except Exception:
+            logger.exception("No se pudo preparar el lote de webhooks")
+            self.en_vuelo = max(self.en_vuelo - len(delivery_ids), 0)
+
+    async def enviar_lote(self, lote_id: UUID) -> None:
+        """Un lote ocupa un solo lugar en vuelo; su resultado se guarda apenas llega."""
+        self.en_vuelo += 1
+        try:
+            preparado = await self.ejecutar_db(preparar_lote, lote_id)
+            if isinstance(preparado, EnvioPreparado):
+                slot = self._slot_endpoint(preparado.webhook_endpoint_id)
+                async with slot, self._global:
+                    try:
+                        response = await self._client.post(
+                            preparado.url, content=preparado.body, headers=preparado.headers
+                        )
+                        preparado = ResultadoEnvio.desde_respuesta(lote_id, response)
+                    except Exception as exc:
+                        preparado = ResultadoEnvio.desde_error(lote_id, str(exc))
+            if preparado is not None:
+                await self.ejecutar_db(aplicar_resultado_lote, preparado)
+        except Exception:
+            logger.exception("No se pudo enviar el lote de webhooks %s", lote_id)
+        finally:
+            self.en_vuelo -= 1
+
+    def _slot_endpoint(self, endpoint_id: UUID) -> asyncio.Semaphore:
+        slot = self._por_endpoint.get(endpoint_id)
+        if slot is None:
+            slot = asyncio.Semaphore(self.max_por_endpoint)
+            self._por_endpoint[endpoint_id] = slot
+        return slot
+
+    async def _enviar_uno(self, envio: EnvioPreparado) -> None:
+        try:
+            async with self._slot_endpoint(envio.webhook_endpoint_id), self._global:
+                try:
+                    response = await self._client.post(envio.url, content=envio.body, headers=envio.headers)
+                    resultado = ResultadoEnvio.desde_respuesta(envio.delivery_id, response)
+                except Exception as exc:
+                    resultado = ResultadoEnvio.desde_error(envio.delivery_id, str(exc))
+            self._registrar([resultado])
+        finally:
+            self.en_vuelo -= 1
+
+    def _registrar(self, resultados: list[ResultadoEnvio]) -> None:
+        if not resultados:
+            return
+        self._resultados.extend(resultados)
+        if len(self._resultados) >= self.flush_size:
+            self._hay_resultados.set()
+
+    async def flush(self) -> None:
+        resultados, self._resultados = self._resultados, []
+        self._hay_resultados.clear()
+        if not resultados:
+            return
+        try:
+            await self.ejecutar_db(aplicar_resultados, resultados)
+        except Exception:
+            logger.exception("No se pudieron guardar %s resultados de webhooks", len(resultados))
+
+    async def _flush_periodico(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._hay_resultados.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
@@ -0,0 +1,248 @@
+"""Entrega de webhooks en lotes para endpoints con ``modo_lote``.
+
+Las deliveries de esos endpoints se encolan ``acumulando``. El worker las agrupa cuando hay
+``lote_max_eventos`` o la mas antigua supera ``lote_max_segundos``: crea un ``WebhookBatch`` y las
+pasa a ``en_lote``. El lote se envia como un unico POST firmado con los payloads en ``eventos`` y
+reintenta como una delivery; su resultado se copia a cada delivery del lote.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, selectinload
+
+from app.apps.auditoria.models import AuditLog
+from app.apps.integraciones.circuit_breaker import evaluar_circuito, registrar_resultado_circuito
+from app.apps.integraciones.models import WebhookBatch, WebhookDelivery, WebhookEndpoint
+from app.apps.integraciones.services import webhook_secret
+from app.apps.integraciones.webhook_dispatcher import (
+    EnvioPreparado,
+    ResultadoEnvio,
+    _aplicar_resultado,
+    _endpoint_inactivo,
+    _post_webhook,
+    codificar_payload,
+    firmar_body,
+)
+from app.core import database as database_module
+from app.core.config import settings
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _actualizar_deliveries(*condiciones):
+    return update(WebhookDelivery).where(*condiciones).execution_options(synchronize_session=False)
+
+
+def formar_lotes(db: Session, *, now: datetime | None = None) -> list[UUID]:
+    """Agrupa las deliveries ``acumulando`` listas en lotes ``pendiente``. Devuelve los lotes creados.
+
+    Las filas se toman con ``FOR UPDATE SKIP LOCKED``: dos workers no arman el mismo lote.
+    """
+    now = now or _now()
+    grupos = db.execute(
+        select(WebhookDelivery.webhook_endpoint_id, func.count(), func.min(WebhookDelivery.fecha_creacion))
+        .where(WebhookDelivery.status == "acumulando")
+        .group_by(WebhookDelivery.webhook_endpoint_id)
+    ).all()
+    if not grupos:
+        return []
+    endpoints = {
+        endpoint.id: endpoint
+        for endpoint in db.scalars(
+            select(WebhookEndpoint).where(WebhookEndpoint.id.in_([endpoint_id for endpoint_id, _, _ in grupos]))
+        ).all()
+    }
+    lotes: list[UUID] = []
+    for endpoint_id, cantidad, mas_antigua in grupos:
+        endpoint = endpoints.get(endpoint_id)
+        acumulando = (WebhookDelivery.webhook_endpoint_id == endpoint_id, WebhookDelivery.status == "acumulando")
+        if endpoint is None or not endpoint.activo:
+            db.execute(
+                _actualizar_deliveries(*acumulando).values(status="fallido", error="Webhook endpoint inactivo.")
+            )
+            continue
+        if not endpoint.modo_lote:
+            db.execute(_actualizar_deliveries(*acumulando).values(status="pendiente", next_attempt_at=now))
+            continue
+        vencido = now - _as_utc(mas_antigua) >= timedelta(seconds=endpoint.lote_max_segundos)
+        if cantidad < endpoint.lote_max_eventos and not vencido:
+            continue
+        lotes.extend(_armar_lotes_endpoint(db, endpoint, now))
+    db.commit()
+    return lotes
+
+
+def _armar_lotes_endpoint(db: Session, endpoint: WebhookEndpoint, now: datetime) -> list[UUID]:
+    lotes: list[UUID] = []
+    limite_edad = now - timedelta(seconds=endpoint.lote_max_segundos)
+    while True:
+        filas = db.execute(
+            select(WebhookDelivery.id, WebhookDelivery.fecha_creacion)
+            .where(WebhookDelivery.webhook_endpoint_id == endpoint.id, WebhookDelivery.status == "acumulando")
+            .order_by(WebhookDelivery.fecha_creacion.asc())
+            .limit(endpoint.lote_max_eventos)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not filas:
+            return lotes
+        if len(filas) < endpoint.lote_max_eventos and _as_utc(filas[0].fecha_creacion) > limite_edad:
+            return lotes
+        lote = WebhookBatch(
+            organizacion_id=endpoint.organizacion_id,
+            webhook_endpoint_id=endpoint.id,
+            cantidad_eventos=len(filas),
+            status="pendiente",
+            intentos=0,
+            next_attempt_at=now,
+        )
+        db.add(lote)
+        db.flush()
+        db.execute(
+            _actualizar_deliveries(WebhookDelivery.id.in_([fila.id for fila in filas])).values(
+                status="en_lote",
+                webhook_batch_id=lote.id,
+            )
+        )
+        lotes.append(lote.id)
+        if len(filas) < endpoint.lote_max_eventos:
+            return lotes
+
+
+def reclamar_lotes(db: Session, *, limit: int) -> list[UUID]:
+    """Igual que ``reclamar_deliveries`` pero sobre ``webhook_batches``."""
+    if limit <= 0:
+        return []
+    now = _now()
+    lotes = db.scalars(
+        select(WebhookBatch)
+        .where(WebhookBatch.status.in_(("pendiente", "diferido")), WebhookBatch.next_attempt_at <= now)
+        .order_by(WebhookBatch.next_attempt_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    lease_until = now + timedelta(seconds=settings.WEBHOOK_WORKER_LEASE_SECONDS)
+    for lote in lotes:
+        lote.status = "pendiente"
+        lote.next_attempt_at = lease_until
+    db.commit()
+    return [lote.id for lote in lotes]
+
+
+def codificar_lote(lote_id: UUID, payloads: list[dict]) -> bytes:
+    """JSON canonico ``{"eventos": [...], "id": ...}`` armado con los bytes ya codificados de cada payload."""
+    eventos = b",".join(codificar_payload(payload) for payload in payloads)
+    return b'{"eventos":[' + eventos + b'],"id":"' + str(lote_id).encode("ascii") + b'"}'
+
+
+def preparar_lote(db: Session, lote_id: UUID) -> EnvioPreparado | ResultadoEnvio | None:
+    """Devuelve el envio listo o, si no corresponde enviar, el resultado a aplicar."""
+    lote = db.get(WebhookBatch, lote_id)
+    if lote is None:
+        return None
+    endpoint = db.get(WebhookEndpoint, lote.webhook_endpoint_id)
+    if endpoint is None or not endpoint.activo:
+        return _endpoint_inactivo(lote.id)
+    diferir_hasta = evaluar_circuito(db, endpoint, _now())
+    db.commit()
+    if diferir_hasta is not None:
+        return ResultadoEnvio.diferido(lote.id, diferir_hasta)
+    deliveries = db.scalars(
+        select(WebhookDelivery)
+        .options(selectinload(WebhookDelivery.webhook_event))
+        .where(WebhookDelivery.webhook_batch_id == lote.id)
+        .order_by(WebhookDelivery.fecha_creacion.asc())
+    ).all()
+    try:
+        body = codificar_lote(lote.id, [delivery.payload for delivery in deliveries])
+        signature = firmar_body(body, webhook_secret(endpoint))
+    except Exception as exc:
+        return ResultadoEnvio.desde_error(lote.id, str(exc))
+    return EnvioPreparado(
+        delivery_id=lote.id,
+        webhook_endpoint_id=endpoint.id,
+        url=endpoint.url,
+        body=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-Wallet-Signature": signature,
+            "X-Wallet-Event": "lote",
+            "X-Wallet-Batch-Id": str(lote.id),
+            "X-Wallet-Batch-Size": str(len(deliveries)),
+        },
+    )
+
+
+def aplicar_resultado_lote(db: Session, resultado: ResultadoEnvio) -> None:
+    """Actualiza el lote, copia el resultado a sus deliveries y audita el intento en una transaccion."""
+    lote = db.get(WebhookBatch, resultado.delivery_id)
+    if lote is None:
+        return
+    _aplicar_resultado(lote, resultado)
+    if resultado.diferido_hasta is None:
+        final = lote.status in {"enviado", "fallido"}
+        db.execute(
+            _actualizar_deliveries(WebhookDelivery.webhook_batch_id == lote.id).values(
+                status=lote.status if final else "en_lote",
+                intentos=lote.intentos,
+                status_code=lote.status_code,
+                respuesta_body=lote.respuesta_body,
+                error=lote.error,
+                fecha_ultimo_intento=lote.fecha_ultimo_intento,
+                next_attempt_at=None,
+            )
+        )
+        if resultado.cuenta_para_circuito:
+            registrar_resultado_circuito(
+                db,
+                lote.webhook_endpoint_id,
+                exito=resultado.exitoso,
+                now=resultado.fecha_intento,
+            )
+        exito = lote.status == "enviado"
+        db.add(
+            AuditLog(
+                evento="webhook_lote_enviado" if exito else "webhook_lote_fallido",
+                mensaje="Lote de webhooks enviado." if exito else "Lote de webhooks fallido.",
+                nivel="INFO" if exito else "ERROR",
+                actor_tipo="sistema",
+                organizacion_id=lote.organizacion_id,
+                metadata_log={
+                    "webhook_batch_id": str(lote.id),
+                    "webhook_endpoint_id": str(lote.webhook_endpoint_id),
+                    "cantidad_eventos": lote.cantidad_eventos,
+                    "status": lote.status,
+                    "status_code": lote.status_code,
+                    "intentos": lote.intentos,
+                },
+            )
+        )
+    db.commit()
+
+
+def enviar_webhook_lote(lote_id: UUID) -> None:
+    session = database_module.SessionLocal()
+    try:
+        preparado = preparar_lote(session, lote_id)
+        if isinstance(preparado, EnvioPreparado):
+            try:
+                response = _post_webhook(preparado.url, preparado.body, preparado.headers)
+                preparado = ResultadoEnvio.desde_respuesta(lote_id, response)
+            except Exception as exc:
+                preparado = ResultadoEnvio.desde_error(lote_id, str(exc))
+        if preparado is not None:
+            aplicar_resultado_lote(session, preparado)
+    except Exception:
+        session.rollback()
+    finally:
+        session.close()
@@ -1,28 +1,106 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+import importlib.util
 import json
-from datetime import datetime, timezone
+import random
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from enum import Enum
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
 import httpx
 from fastapi import BackgroundTasks
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
+from app.apps.auditoria.models import AuditLog
 from app.apps.auditoria.services import registrar_evento_sistema
-from app.apps.integraciones.models import WebhookDelivery, WebhookEndpoint
+from app.apps.integraciones.circuit_breaker import (
+    CIRCUITO_CERRADO,
+    evaluar_circuito,
+    registrar_resultado_circuito,
+)
+from app.apps.integraciones.models import WebhookBatch, WebhookDelivery, WebhookEndpoint, WebhookEvent
 from app.apps.integraciones.schemas import ALLOWED_WEBHOOK_EVENTS
-from app.apps.integraciones.services import decrypt_webhook_secret
+from app.apps.integraciones.services import webhook_secret
+from app.apps.integraciones.subscriptions import Suscripcion, endpoints_suscritos
+from app.core.config import settings
 from app.core.database import SessionLocal
 
 
+_http_client: httpx.Client | None = None
+_http_client_lock = threading.Lock()
+_host_slots: dict[str, threading.BoundedSemaphore] = {}
+_payload_cache: OrderedDict[str, bytes] = OrderedDict()
+_payload_cache_lock = threading.Lock()
+
+
 def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _http2_disponible() -> bool:
+    return settings.WEBHOOK_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def crear_cliente_http() -> httpx.Client:
+    return httpx.Client(
+        timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            keepalive_expiry=settings.WEBHOOK_KEEPALIVE_SECONDS,
+        ),
+        http2=_http2_disponible(),
+    )
+
+
+def abrir_cliente_http() -> httpx.Client:
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = crear_cliente_http()
+        return _http_client
+
+
+def cerrar_cliente_http() -> None:
+    global _http_client
+    with _http_client_lock:
+        client, _http_client = _http_client, None
+        _host_slots.clear()
+    if client is not None:
+        client.close()
+
+
+def obtener_cliente_http() -> httpx.Client:
+    client = _http_client
+    if client is None or client.is_closed:
+        return abrir_cliente_http()
+    return client
+
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = httpx.URL(url).host
+    with _http_client_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(settings.WEBHOOK_MAX_CONNECTIONS_PER_HOST)
+            _host_slots[host] = slot
+        return slot
+
+
+def _post_webhook(url: str, body: bytes, headers: dict[str, str]) -> httpx.Response:
+    with _host_slot(url):
+        return obtener_cliente_http().post(url, content=body, headers=headers)
+
+
 def _jsonable(value: Any) -> Any:
     if isinstance(value, UUID):
         return str(value)
@@ -41,6 +119,7 @@ def _jsonable(value: Any) -> Any:
 
 def construir_payload_evento(evento: str, organizacion_id: UUID, data: dict[str, Any]) -> dict[str, Any]:
     return {
+        "id": str(uuid4()),
         "evento": evento,
         "organizacion_id": str(organizacion_id),
         "fecha": _now().isoformat(),
@@ -52,118 +131,419 @@ def _canonical_payload(payload: dict[str, Any]) -> bytes:
     return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
 
-def firmar_payload(payload: dict[str, Any], secret: str) -> str:
-    import hashlib
-    import hmac
+def codificar_payload(payload: dict[str, Any]) -> bytes:
+    """Bytes canonicos que se firman y se envian; se cachean por ``payload["id"]`` entre endpoints."""
+    event_id = payload.get("id")
+    if not isinstance(event_id, str) or settings.WEBHOOK_PAYLOAD_CACHE_SIZE <= 0:
+        return _canonical_payload(payload)
+    with _payload_cache_lock:
+        body = _payload_cache.get(event_id)
+        if body is not None:
+            _payload_cache.move_to_end(event_id)
+            return body
+    body = _canonical_payload(payload)
+    with _payload_cache_lock:
+        _payload_cache[event_id] = body
+        while len(_payload_cache) > settings.WEBHOOK_PAYLOAD_CACHE_SIZE:
+            _payload_cache.popitem(last=False)
+    return body
 
-    signature = hmac.new(secret.encode("utf-8"), _canonical_payload(payload), hashlib.sha256).hexdigest()
+
+def firmar_body(body: bytes, secret: str) -> str:
+    signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
     return f"sha256={signature}"
 
 
+def firmar_payload(payload: dict[str, Any], secret: str) -> str:
+    return firmar_body(_canonical_payload(payload), secret)
+
+
+DatosEvento = dict[str, Any] | Callable[[], dict[str, Any]]
+
+
 def encolar_webhook_evento(
     *,
     evento: str,
     organizacion_id: UUID,
-    data: dict[str, Any],
+    data: DatosEvento,
     db: Session,
     background_tasks: BackgroundTasks | None = None,
 ) -> list[WebhookDelivery]:
+    return encolar_webhook_eventos(
+        eventos=[evento],
+        organizacion_id=organizacion_id,
+        data=data,
+        db=db,
+        background_tasks=background_tasks,
+    )
+
+
+def encolar_webhook_eventos(
+    *,
+    eventos: list[str],
+    organizacion_id: UUID,
+    data: DatosEvento,
+    db: Session,
+    background_tasks: BackgroundTasks | None = None,
+) -> list[WebhookDelivery]:
+    """Encola varios eventos con los mismos datos en un solo commit.
+
+    ``data`` puede ser un callable: solo se evalua si algun endpoint esta suscrito.
+    """
+    suscripciones = [
+        (evento, endpoints_suscritos(db, organizacion_id, evento))
+        for evento in eventos
+        if evento in ALLOWED_WEBHOOK_EVENTS
+    ]
+    if not any(suscritos for _, suscritos in suscripciones):
+        return []
+    datos = data() if callable(data) else data
+    next_attempt_at = _primer_intento_programado()
+    deliveries: list[WebhookDelivery] = []
+    for evento, suscritos in suscripciones:
+        if suscritos:
+            deliveries.extend(_agregar_evento(db, evento, organizacion_id, datos, suscritos, next_attempt_at))
+    return confirmar_deliveries(db, deliveries, background_tasks)
+
+
+def encolar_webhook_evento_lote(
+    *,
+    evento: str,
+    organizacion_id: UUID,
+    datos: list[dict[str, Any]] | Callable[[], list[dict[str, Any]]],
+    db: Session,
+    background_tasks: BackgroundTasks | None = None,
+) -> list[WebhookDelivery]:
+    """Encola un evento por cada elemento de ``datos`` (por ejemplo, los movimientos de un lote) en un solo commit."""
+    deliveries = agregar_webhook_evento_lote(evento=evento, organizacion_id=organizacion_id, datos=datos, db=db)
+    if not deliveries:
+        return []
+    return confirmar_deliveries(db, deliveries, background_tasks)
+
+
+def agregar_webhook_evento_lote(
+    *,
+    evento: str,
+    organizacion_id: UUID,
+    datos: list[dict[str, Any]] | Callable[[], list[dict[str, Any]]],
+    db: Session,
+) -> list[WebhookDelivery]:
+    """Como ``encolar_webhook_evento_lote`` pero sin commit: el llamador confirma con ``confirmar_deliveries``."""
     if evento not in ALLOWED_WEBHOOK_EVENTS:
         return []
-    endpoints = db.scalars(
-        select(WebhookEndpoint).where(
-            WebhookEndpoint.organizacion_id == organizacion_id,
-            WebhookEndpoint.activo.is_(True),
-        )
-    ).all()
-    payload = construir_payload_evento(evento, organizacion_id, data)
+    suscritos = endpoints_suscritos(db, organizacion_id, evento)
+    if not suscritos:
+        return []
+    next_attempt_at = _primer_intento_programado()
     deliveries: list[WebhookDelivery] = []
-    for endpoint in endpoints:
-        if evento not in (endpoint.eventos or []):
-            continue
+    for item in datos() if callable(datos) else datos:
+        deliveries.extend(_agregar_evento(db, evento, organizacion_id, item, suscritos, next_attempt_at))
+    return deliveries
+
+
+def _agregar_evento(
+    db: Session,
+    evento: str,
+    organizacion_id: UUID,
+    datos: dict[str, Any],
+    suscritos: tuple[Suscripcion, ...],
+    next_attempt_at: datetime,
+) -> list[WebhookDelivery]:
+    payload = construir_payload_evento(evento, organizacion_id, datos)
+    webhook_event = WebhookEvent(
+        id=UUID(payload["id"]),
+        organizacion_id=organizacion_id,
+        evento=evento,
+        payload=payload,
+    )
+    db.add(webhook_event)
+    deliveries: list[WebhookDelivery] = []
+    for suscripcion in suscritos:
+        # En modo lote la delivery espera a que el worker la agrupe; no tiene intento propio. Sin worker
+        # (endpoints configurados antes de apagarlo) se entrega una por una.
+        en_lote = suscripcion.modo_lote and settings.WEBHOOK_WORKER_ENABLED
         delivery = WebhookDelivery(
             organizacion_id=organizacion_id,
-            webhook_endpoint_id=endpoint.id,
+            webhook_endpoint_id=suscripcion.endpoint_id,
+            webhook_event=webhook_event,
             evento=evento,
-            payload=payload,
-            status="pendiente",
+            status="acumulando" if en_lote else "pendiente",
             intentos=0,
+            next_attempt_at=None if en_lote else next_attempt_at,
         )
         db.add(delivery)
         deliveries.append(delivery)
-    if not deliveries:
-        return []
+    return deliveries
+
+
+def confirmar_deliveries(
+    db: Session,
+    deliveries: list[WebhookDelivery],
+    background_tasks: BackgroundTasks | None,
+) -> list[WebhookDelivery]:
+    """Confirma la transaccion en curso y agenda el envio de las deliveries pendientes."""
     db.commit()
     for delivery in deliveries:
         db.refresh(delivery)
-        if background_tasks is not None:
+        if background_tasks is not None and not settings.WEBHOOK_WORKER_ENABLED and delivery.status == "pendiente":
             background_tasks.add_task(enviar_webhook_delivery, delivery.id)
     return deliveries
 
 
-def _audit_delivery(db: Session, delivery: WebhookDelivery, *, success: bool) -> None:
-    try:
-        registrar_evento_sistema(
-            db,
-            organizacion_id=delivery.organizacion_id,
-            evento="webhook_enviado" if success else "webhook_fallido",
-            mensaje="Webhook enviado." if success else "Webhook fallido.",
-            nivel="INFO" if success else "ERROR",
-            metadata={
-                "delivery_id": str(delivery.id),
-                "webhook_endpoint_id": str(delivery.webhook_endpoint_id),
-                "evento": delivery.evento,
-                "status": delivery.status,
-                "status_code": delivery.status_code,
-                "intentos": delivery.intentos,
-            },
+def _primer_intento_programado() -> datetime:
+    """Con worker, la delivery queda lista ya; sin worker, el worker solo la toma si el envio inline no termino."""
+    if settings.WEBHOOK_WORKER_ENABLED:
+        return _now()
+    return _now() + timedelta(seconds=settings.WEBHOOK_WORKER_LEASE_SECONDS)
+
+
+def calcular_backoff(intentos: int) -> float:
+    techo = min(
+        settings.WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(intentos - 1, 0)),
+        settings.WEBHOOK_RETRY_MAX_SECONDS,
+    )
+    return random.uniform(techo / 2, techo)
+
+
+def _registrar_fallo(delivery: WebhookDelivery | WebhookBatch, error: str, *, reintentable: bool = True) -> None:
+    delivery.error = error
+    if reintentable and settings.WEBHOOK_WORKER_ENABLED and delivery.intentos < settings.WEBHOOK_MAX_ATTEMPTS:
+        delivery.status = "pendiente"
+        delivery.next_attempt_at = _now() + timedelta(seconds=calcular_backoff(delivery.intentos))
+        return
+    delivery.status = "fallido"
+    delivery.next_attempt_at = None
+
+
+@dataclass(frozen=True)
+class EnvioPreparado:
+    delivery_id: UUID
+    webhook_endpoint_id: UUID
+    url: str
+    body: bytes
+    headers: dict[str, str]
+
+
+@dataclass(frozen=True)
+class ResultadoEnvio:
+    delivery_id: UUID
+    fecha_intento: datetime
+    status_code: int | None = None
+    respuesta_body: str | None = None
+    error: str | None = None
+    reintentable: bool = True
+    diferido_hasta: datetime | None = None
+
+    @property
+    def exitoso(self) -> bool:
+        return self.status_code is not None and 200 <= self.status_code < 300
+
+    @property
+    def cuenta_para_circuito(self) -> bool:
+        """Solo los intentos reales contra el endpoint alimentan el circuit breaker."""
+        return self.diferido_hasta is None and self.reintentable
+
+    @classmethod
+    def desde_respuesta(cls, delivery_id: UUID, response: httpx.Response) -> ResultadoEnvio:
+        return cls(
+            delivery_id=delivery_id,
+            fecha_intento=_now(),
+            status_code=response.status_code,
+            respuesta_body=response.text[:2000],
         )
+
+    @classmethod
+    def desde_error(cls, delivery_id: UUID, error: str, *, reintentable: bool = True) -> ResultadoEnvio:
+        return cls(delivery_id=delivery_id, fecha_intento=_now(), error=error[:1000], reintentable=reintentable)
+
+    @classmethod
+    def diferido(cls, delivery_id: UUID, hasta: datetime) -> ResultadoEnvio:
+        return cls(delivery_id=delivery_id, fecha_intento=_now(), diferido_hasta=hasta)
+
+
+def _endpoint_inactivo(delivery_id: UUID) -> ResultadoEnvio:
+    return ResultadoEnvio.desde_error(delivery_id, "Webhook endpoint inactivo.", reintentable=False)
+
+
+def _preparar_envio(delivery: WebhookDelivery, endpoint: WebhookEndpoint, secret: str) -> EnvioPreparado:
+    body = codificar_payload(delivery.payload)
+    return EnvioPreparado(
+        delivery_id=delivery.id,
+        webhook_endpoint_id=endpoint.id,
+        url=endpoint.url,
+        body=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-Wallet-Signature": firmar_body(body, secret),
+            "X-Wallet-Event": delivery.evento,
+            "X-Wallet-Delivery-Id": str(delivery.id),
+        },
+    )
+
+
+def preparar_envios(db: Session, delivery_ids: list[UUID]) -> tuple[list[EnvioPreparado], list[ResultadoEnvio]]:
+    """Carga deliveries y endpoints en dos consultas; los secrets salen del cache de descifrados.
+
+    Las deliveries de endpoints con el circuito abierto vuelven como resultados diferidos sin enviarse.
+    """
+    deliveries = db.scalars(
+        select(WebhookDelivery)
+        .options(selectinload(WebhookDelivery.webhook_event))
+        .where(WebhookDelivery.id.in_(delivery_ids))
+    ).all()
+    endpoint_ids = {delivery.webhook_endpoint_id for delivery in deliveries}
+    endpoints = {
+        endpoint.id: endpoint
+        for endpoint in db.scalars(select(WebhookEndpoint).where(WebhookEndpoint.id.in_(endpoint_ids))).all()
+    }
+    envios: list[EnvioPreparado] = []
+    resultados: list[ResultadoEnvio] = []
+    now = _now()
+    for delivery in deliveries:
+        endpoint = endpoints.get(delivery.webhook_endpoint_id)
+        if endpoint is None or not endpoint.activo:
+            resultados.append(_endpoint_inactivo(delivery.id))
+            continue
+        diferir_hasta = evaluar_circuito(db, endpoint, now)
+        if diferir_hasta is not None:
+            resultados.append(ResultadoEnvio.diferido(delivery.id, diferir_hasta))
+            continue
+        try:
+            envios.append(_preparar_envio(delivery, endpoint, webhook_secret(endpoint)))
+        except Exception as exc:
+            resultados.append(ResultadoEnvio.desde_error(delivery.id, str(exc)))
+    db.commit()
+    return envios, resultados
+
+
+def _aplicar_resultado(delivery: WebhookDelivery | WebhookBatch, resultado: ResultadoEnvio) -> None:
+    """Aplica un intento a una delivery o a un lote; ambos comparten las columnas de estado."""
+    if resultado.diferido_hasta is not None:
+        delivery.status = "diferido"
+        delivery.next_attempt_at = resultado.diferido_hasta
+        return
+    delivery.intentos += 1
+    delivery.fecha_ultimo_intento = resultado.fecha_intento
+    delivery.status_code = resultado.status_code
+    if resultado.status_code is not None:
+        delivery.respuesta_body = resultado.respuesta_body
+    if resultado.exitoso:
+        delivery.status = "enviado"
+        delivery.error = None
+        delivery.next_attempt_at = None
+    elif resultado.status_code is not None:
+        _registrar_fallo(delivery, f"HTTP {resultado.status_code}")
+    else:
+        _registrar_fallo(delivery, resultado.error or "Error de envio.", reintentable=resultado.reintentable)
+
+
+def _audit_log_delivery(delivery: WebhookDelivery) -> dict[str, Any]:
+    success = delivery.status == "enviado"
+    return {
+        "organizacion_id": delivery.organizacion_id,
+        "evento": "webhook_enviado" if success else "webhook_fallido",
+        "mensaje": "Webhook enviado." if success else "Webhook fallido.",
+        "nivel": "INFO" if success else "ERROR",
+        "metadata": {
+            "delivery_id": str(delivery.id),
+            "webhook_endpoint_id": str(delivery.webhook_endpoint_id),
+            "evento": delivery.evento,
+            "status": delivery.status,
+            "status_code": delivery.status_code,
+            "intentos": delivery.intentos,
+        },
+    }
+
+
+def _audit_delivery(db: Session, delivery: WebhookDelivery) -> None:
+    try:
+        registrar_evento_sistema(db, **_audit_log_delivery(delivery))
     except Exception:
         db.rollback()
 
 
+def aplicar_resultados(db: Session, resultados: list[ResultadoEnvio]) -> None:
+    """Persiste un lote de resultados, su auditoria y el estado de los circuitos en una sola transaccion."""
+    if not resultados:
+        return
+    deliveries = {
+        delivery.id: delivery
+        for delivery in db.scalars(
+            select(WebhookDelivery).where(WebhookDelivery.id.in_([resultado.delivery_id for resultado in resultados]))
+        ).all()
+    }
+    for resultado in resultados:
+        delivery = deliveries.get(resultado.delivery_id)
+        if delivery is None:
+            continue
+        _aplicar_resultado(delivery, resultado)
+        if resultado.diferido_hasta is not None:
+            continue
+        if resultado.cuenta_para_circuito:
+            registrar_resultado_circuito(
+                db,
+                delivery.webhook_endpoint_id,
+                exito=resultado.exitoso,
+                now=resultado.fecha_intento,
+            )
+        audit = _audit_log_delivery(delivery)
+        db.add(
+            AuditLog(
+                evento=audit["evento"],
+                mensaje=audit["mensaje"],
+                nivel=audit["nivel"],
+                actor_tipo="sistema",
+                organizacion_id=audit["organizacion_id"],
+                metadata_log=audit["metadata"],
+            )
+        )
+    db.commit()
+
+
 def _send_delivery(delivery_id: UUID, db: Session) -> None:
     delivery = db.get(WebhookDelivery, delivery_id)
     if delivery is None:
         return
-    delivery.intentos += 1
-    delivery.fecha_ultimo_intento = _now()
     endpoint = db.get(WebhookEndpoint, delivery.webhook_endpoint_id)
-    if endpoint is None or not endpoint.activo:
-        delivery.status = "fallido"
-        delivery.error = "Webhook endpoint inactivo."
-        delivery.status_code = None
-        db.add(delivery)
+    diferir_hasta = None
+    if (
+        settings.WEBHOOK_WORKER_ENABLED
+        and endpoint is not None
+        and endpoint.activo
+        and endpoint.circuito_estado != CIRCUITO_CERRADO
+    ):
+        diferir_hasta = evaluar_circuito(db, endpoint, _now())
         db.commit()
-        db.refresh(delivery)
-        _audit_delivery(db, delivery, success=False)
-        return
-
-    try:
-        secret = decrypt_webhook_secret(endpoint.secret_encrypted)
-        headers = {
-            "Content-Type": "application/json",
-            "X-Wallet-Signature": firmar_payload(delivery.payload, secret),
-            "X-Wallet-Event": delivery.evento,
-            "X-Wallet-Delivery-Id": str(delivery.id),
-        }
-        with httpx.Client(timeout=2.0) as client:
-            response = client.post(endpoint.url, json=delivery.payload, headers=headers)
-        delivery.status_code = response.status_code
-        delivery.respuesta_body = response.text[:2000]
-        if 200 <= response.status_code < 300:
-            delivery.status = "enviado"
-            delivery.error = None
-        else:
-            delivery.status = "fallido"
-            delivery.error = f"HTTP {response.status_code}"
-    except Exception as exc:
-        delivery.status = "fallido"
-        delivery.error = str(exc)[:1000]
+    if endpoint is None or not endpoint.activo:
+        resultado = _endpoint_inactivo(delivery.id)
+    elif diferir_hasta is not None:
+        resultado = ResultadoEnvio.diferido(delivery.id, diferir_hasta)
+    else:
+        try:
+            envio = _preparar_envio(delivery, endpoint, webhook_secret(endpoint))
+            response = _post_webhook(envio.url, envio.body, envio.headers)
+            resultado = ResultadoEnvio.desde_respuesta(delivery.id, response)
+        except Exception as exc:
+            resultado = ResultadoEnvio.desde_error(delivery.id, str(exc))
+    _aplicar_resultado(delivery, resultado)
+    liberadas: list[UUID] = []
+    if resultado.cuenta_para_circuito:
+        liberadas = registrar_resultado_circuito(
+            db,
+            endpoint.id,
+            exito=resultado.exitoso,
+            now=resultado.fecha_intento,
+        )
     db.add(delivery)
     db.commit()
+    if resultado.diferido_hasta is not None:
+        return
     db.refresh(delivery)
-    _audit_delivery(db, delivery, success=delivery.status == "enviado")
+    _audit_delivery(db, delivery)
+    if not settings.WEBHOOK_WORKER_ENABLED:
+        # Sin worker nadie retoma las diferidas que libero el cierre del circuito: se envian aca.
+        for liberada_id in liberadas:
+            _send_delivery(liberada_id, db)
 
 
 def enviar_webhook_delivery(delivery_id: UUID) -> None:
@@ -0,0 +1,87 @@
+"""Reenvio masivo de deliveries.
+
+El request marca todas las deliveries del filtro con un unico ``UPDATE`` (``status='reenvio'``). El
+worker las pasa a ``pendiente`` a razon de ``tasa_por_segundo`` en cada vuelta, asi un reenvio de
+decenas de miles no satura al endpoint que se acaba de recuperar ni a la cola.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.apps.integraciones.models import WebhookDelivery, WebhookReplay
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def alimentar_reenvios(db: Session, *, now: datetime | None = None) -> int:
+    """Libera hacia la cola las deliveries que le tocan a cada reenvio en curso. Devuelve cuantas libero.
+
+    El cupo acumulado nunca supera un segundo de tasa: un worker detenido no provoca una rafaga al volver.
+    """
+    now = now or _now()
+    reenvios = db.scalars(
+        select(WebhookReplay)
+        .where(WebhookReplay.status == "en_curso")
+        .order_by(WebhookReplay.fecha_creacion.asc())
+        .with_for_update(skip_locked=True)
+    ).all()
+    liberadas = 0
+    for reenvio in reenvios:
+        desde = _as_utc(reenvio.fecha_ultima_alimentacion or reenvio.fecha_creacion)
+        transcurrido = min(max((now - desde).total_seconds(), 0.0), 1.0)
+        cupo = int(reenvio.tasa_por_segundo * transcurrido)
+        if cupo <= 0:
+            continue
+        delivery_ids = db.scalars(
+            select(WebhookDelivery.id)
+            .where(WebhookDelivery.webhook_replay_id == reenvio.id, WebhookDelivery.status == "reenvio")
+            .order_by(WebhookDelivery.fecha_creacion.asc())
+            .limit(cupo)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if delivery_ids:
+            db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(delivery_ids))
+                .values(status="pendiente", next_attempt_at=now)
+                .execution_options(synchronize_session=False)
+            )
+        reenvio.encoladas += len(delivery_ids)
+        # Se conserva la fraccion de cupo no usada para que la tasa promedio sea exacta.
+        reenvio.fecha_ultima_alimentacion = now - timedelta(seconds=transcurrido - cupo / reenvio.tasa_por_segundo)
+        if len(delivery_ids) < cupo:
+            reenvio.status = "completado"
+            reenvio.fecha_finalizacion = now
+        liberadas += len(delivery_ids)
+    db.commit()
+    return liberadas
+
+
+def progreso_reenvio(db: Session, replay_id: UUID) -> dict[str, int]:
+    """Cuenta las deliveries del reenvio por resultado: ``enviadas``, ``fallidas`` y ``en_curso``."""
+    progreso = {"enviadas": 0, "fallidas": 0, "en_curso": 0}
+    rows = db.execute(
+        select(WebhookDelivery.status, func.count())
+        .where(WebhookDelivery.webhook_replay_id == replay_id)
+        .group_by(WebhookDelivery.status)
+    ).all()
+    for status, cantidad in rows:
+        if status == "enviado":
+            progreso["enviadas"] += cantidad
+        elif status == "fallido":
+            progreso["fallidas"] += cantidad
+        else:
+            progreso["en_curso"] += cantidad
+    return progreso
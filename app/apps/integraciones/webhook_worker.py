@@ -0,0 +1,211 @@
+"""Worker durable de webhooks: reclama deliveries pendientes y las envia con reintentos.
+
+Uso: ``python -m app.apps.integraciones.webhook_worker [--engine async]``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.apps.integraciones.models import WebhookDelivery
+from app.apps.integraciones.services import calcular_metricas_cola_webhooks
+from app.apps.integraciones.webhook_async import MotorWebhooksAsync
+from app.apps.integraciones.webhook_batches import enviar_webhook_lote, formar_lotes, reclamar_lotes
+from app.apps.integraciones.webhook_dispatcher import cerrar_cliente_http, enviar_webhook_delivery
+from app.apps.integraciones.webhook_replays import alimentar_reenvios
+from app.core import database as database_module
+from app.core.config import settings
+from app.core.logging import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+METRICS_INTERVAL_SECONDS = 30.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def reclamar_deliveries(db: Session, *, limit: int) -> list[UUID]:
+    """Toma deliveries vencidas con ``FOR UPDATE SKIP LOCKED`` y las reserva por un lease.
+
+    Las ``diferido`` reclamadas pasan a ``pendiente`` para que cerrar el circuito no las libere dos veces.
+    """
+    if limit <= 0:
+        return []
+    now = _now()
+    deliveries = db.scalars(
+        select(WebhookDelivery)
+        .where(
+            WebhookDelivery.status.in_(("pendiente", "diferido")),
+            WebhookDelivery.next_attempt_at <= now,
+        )
+        .order_by(WebhookDelivery.next_attempt_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    lease_until = now + timedelta(seconds=settings.WEBHOOK_WORKER_LEASE_SECONDS)
+    for delivery in deliveries:
+        delivery.status = "pendiente"
+        delivery.next_attempt_at = lease_until
+    db.commit()
+    return [delivery.id for delivery in deliveries]
+
+
+def reclamar_envios(db: Session, *, limit: int) -> tuple[list[UUID], list[UUID]]:
+    """Libera reenvios masivos, arma los lotes listos y reclama deliveries y lotes vencidos.
+
+    Un lote ocupa un solo lugar en vuelo.
+    """
+    alimentar_reenvios(db)
+    formar_lotes(db)
+    delivery_ids = reclamar_deliveries(db, limit=limit)
+    lote_ids = reclamar_lotes(db, limit=limit - len(delivery_ids))
+    return delivery_ids, lote_ids
+
+
+def procesar_envios(executor: ThreadPoolExecutor, *, limit: int) -> list[Future[None]]:
+    with database_module.SessionLocal() as db:
+        delivery_ids, lote_ids = reclamar_envios(db, limit=limit)
+    futures = [executor.submit(enviar_webhook_delivery, delivery_id) for delivery_id in delivery_ids]
+    futures.extend(executor.submit(enviar_webhook_lote, lote_id) for lote_id in lote_ids)
+    return futures
+
+
+def _log_metricas(db: Session) -> None:
+    metricas = calcular_metricas_cola_webhooks(db)
+    logger.info(
+        "webhook_queue pendientes=%s vencidos=%s en_reintento=%s fallidos=%s lag_segundos=%.3f",
+        metricas.pendientes,
+        metricas.vencidos,
+        metricas.en_reintento,
+        metricas.fallidos,
+        metricas.lag_segundos,
+    )
+
+
+def ejecutar_worker(
+    *,
+    concurrency: int | None = None,
+    batch_size: int | None = None,
+    once: bool = False,
+    stop_event: threading.Event | None = None,
+) -> int:
+    """Procesa deliveries hasta ``stop_event`` (o hasta vaciar la cola con ``once``). Devuelve cuantas envio."""
+    concurrency = concurrency or settings.WEBHOOK_WORKER_CONCURRENCY
+    batch_size = batch_size or settings.WEBHOOK_WORKER_BATCH_SIZE
+    stop_event = stop_event or threading.Event()
+    procesadas = 0
+    ultimo_log = 0.0
+    in_flight: set[Future[None]] = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="webhook-worker") as executor:
+        while not stop_event.is_set():
+            nuevos = procesar_envios(executor, limit=min(concurrency - len(in_flight), batch_size))
+            in_flight.update(nuevos)
+            procesadas += len(nuevos)
+            if time.monotonic() - ultimo_log >= METRICS_INTERVAL_SECONDS:
+                with database_module.SessionLocal() as db:
+                    _log_metricas(db)
+                ultimo_log = time.monotonic()
+            if not in_flight:
+                if once:
+                    break
+                stop_event.wait(settings.WEBHOOK_WORKER_POLL_SECONDS)
+                continue
+            done, in_flight = wait(in_flight, timeout=settings.WEBHOOK_WORKER_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    logger.error("Delivery de webhook fallo en el worker", exc_info=future.exception())
+        wait(in_flight)
+    return procesadas
+
+
+async def ejecutar_worker_async(
+    *,
+    concurrency: int | None = None,
+    batch_size: int | None = None,
+    once: bool = False,
+    stop_event: threading.Event | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> int:
+    """Variante asyncio de ``ejecutar_worker``: un solo thread de red y escritura de resultados por lotes."""
+    batch_size = batch_size or settings.WEBHOOK_WORKER_BATCH_SIZE
+    stop_event = stop_event or threading.Event()
+    procesadas = 0
+    ultimo_log = 0.0
+    tareas: set[asyncio.Task[None]] = set()
+    async with MotorWebhooksAsync(concurrency=concurrency, client=client) as motor:
+        while not stop_event.is_set():
+            limite = min(motor.capacidad_libre, batch_size)
+            delivery_ids, lote_ids = await motor.ejecutar_db(reclamar_envios, limit=limite) if limite else ([], [])
+            envios = [motor.enviar_lote(lote_id) for lote_id in lote_ids]
+            if delivery_ids:
+                envios.append(motor.enviar(delivery_ids))
+            for envio in envios:
+                tarea = asyncio.create_task(envio)
+                tareas.add(tarea)
+                tarea.add_done_callback(tareas.discard)
+            procesadas += len(delivery_ids) + len(lote_ids)
+            if time.monotonic() - ultimo_log >= METRICS_INTERVAL_SECONDS:
+                await motor.ejecutar_db(_log_metricas)
+                ultimo_log = time.monotonic()
+            if len(delivery_ids) + len(lote_ids) == batch_size:
+                continue
+            if not tareas:
+                if once:
+                    break
+                await asyncio.sleep(settings.WEBHOOK_WORKER_POLL_SECONDS)
+                continue
+            await asyncio.wait(tareas, timeout=settings.WEBHOOK_WORKER_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+        if tareas:
+            await asyncio.gather(*tareas)
+    return procesadas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker durable de deliveries de webhooks.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Deliveries en vuelo simultaneas.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Maximo de deliveries reclamadas por consulta.")
+    parser.add_argument("--once", action="store_true", help="Procesa las deliveries vencidas y termina.")
+    parser.add_argument(
+        "--engine",
+        choices=("thread", "async"),
+        default=settings.WEBHOOK_WORKER_ENGINE,
+        help="thread: pool de threads; async: httpx.AsyncClient con miles de envios en vuelo.",
+    )
+    args = parser.parse_args()
+
+    configure_logging()
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    options = {
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "once": args.once,
+        "stop_event": stop_event,
+    }
+    try:
+        if args.engine == "async":
+            procesadas = asyncio.run(ejecutar_worker_async(**options))
+        else:
+            procesadas = ejecutar_worker(**options)
+    finally:
+        cerrar_cliente_http()
+    logger.info("Webhook worker detenido. Deliveries procesadas: %s", procesadas)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,50 @@ from decimal import Decimal
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, Numeric, String, Uuid
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+    Uuid,
+    cast,
+    event,
+    func,
+    insert,
+    text,
+)
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Mapped, Session, mapped_column, object_session, relationship
 
 from app.core.database import Base
 from app.shared.enums import EstadoMovimiento, MonedaWallet, TipoMovimiento
 
 
+# Depositos y cashbacks acreditan por referencia externa idempotente; los ajustes de vencimiento y las
+# reversas comparten referencias a proposito y quedan fuera del indice.
+_REFERENCIA_UNICA_WHERE = text("referencia_externa IS NOT NULL AND tipo IN ('deposito', 'cashback')")
+
+
 class Movimiento(Base):
     __tablename__ = "movimientos"
+    __table_args__ = (
+        Index(
+            "uq_movimientos_organizacion_tipo_referencia",
+            "organizacion_id",
+            "tipo",
+            "referencia_externa",
+            unique=True,
+            postgresql_where=_REFERENCIA_UNICA_WHERE,
+            sqlite_where=_REFERENCIA_UNICA_WHERE,
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4, index=True)
     wallet_origen_id: Mapped[UUID | None] = mapped_column(
@@ -86,3 +121,88 @@ class Movimiento(Base):
         back_populates="movimientos_destino",
     )
     movimiento_origen: Mapped["Movimiento | None"] = relationship(remote_side=[id])
+
+
+class MovimientoCambio(Base):
+    """Change-log de movimientos: una fila por alta o cambio de ``estado``.
+
+    El feed se recorre en orden ``(txid, id)``, donde ``txid`` es la transaccion que escribio la fila
+    (``pg_current_xact_id()`` en PostgreSQL, 0 en SQLite); ``id`` identifica la fila en el cursor.
+
+    El corte de visibilidad es el ``xmin`` de toda la base: cualquier transaccion con escrituras que siga
+    abierta, de cualquier organizacion, tabla o job, detiene el feed de todas las organizaciones hasta que
+    termina (las transacciones de solo lectura no lo afectan). ``DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS``
+    corta las sesiones de la app que quedan idle in transaction, y el feed loguea un warning con el pid
+    cuando la transaccion mas vieja supera ``MOVIMIENTOS_FEED_MAX_LAG_SECONDS``.
+    """
+
+    __tablename__ = "movimiento_cambios"
+    __table_args__ = (
+        Index("ix_movimiento_cambios_organizacion_id_txid_id", "organizacion_id", "txid", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    movimiento_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("movimientos.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    tipo: Mapped[str] = mapped_column(String(20), nullable=False)
+    txid: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0)
+    fecha: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    movimiento: Mapped[Movimiento] = relationship()
+
+
+CAMBIOS_PENDIENTES = "movimiento_cambios_pendientes"
+
+
+def _registrar_cambio(target: Movimiento, tipo: str) -> None:
+    # Se juntan en el orden del flush y se escriben con un solo executemany al terminarlo.
+    session = object_session(target)
+    session.info.setdefault(CAMBIOS_PENDIENTES, []).append(
+        {
+            "organizacion_id": target.organizacion_id,
+            "movimiento_id": target.id,
+            "tipo": tipo,
+            "fecha": datetime.now(timezone.utc),
+        }
+    )
+
+
+@event.listens_for(Movimiento, "after_insert")
+def _cambio_por_alta(mapper, connection, target: Movimiento) -> None:
+    _registrar_cambio(target, "creado")
+
+
+@event.listens_for(Movimiento, "after_update")
+def _cambio_por_estado(mapper, connection, target: Movimiento) -> None:
+    if sa_inspect(target).attrs.estado.history.has_changes():
+        _registrar_cambio(target, "estado")
+
+
+@event.listens_for(Session, "after_flush")
+def _escribir_cambios(session: Session, flush_context) -> None:
+    cambios = session.info.pop(CAMBIOS_PENDIENTES, None)
+    if not cambios:
+        return
+    connection = session.connection()
+    sentencia = insert(MovimientoCambio)
+    if connection.dialect.name == "postgresql":
+        sentencia = sentencia.values(txid=cast(cast(func.pg_current_xact_id(), Text), BigInteger))
+    connection.execute(sentencia, cambios)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_cambios(session: Session, previous_transaction) -> None:
+    # Un flush que fallo a mitad de camino no deja cambios de movimientos que ya no existen.
+    session.info.pop(CAMBIOS_PENDIENTES, None)
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from app.apps.auth.dependencies import get_current_user
 from app.apps.auth.schemas import DatosUsuarioToken
-from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento
+from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento, encolar_webhook_eventos
 from app.apps.notificaciones.services import notificar_movimiento, notificar_pago_organizacion
 from app.apps.movimientos.schemas import (
     MovimientoAjusteAdminCreate,
@@ -53,7 +53,7 @@ def post_deposito(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -72,7 +72,7 @@ def post_retiro(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -91,7 +91,7 @@ def post_transferencia(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -110,7 +110,7 @@ def post_pago(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -126,17 +126,10 @@ def post_pago_organizacion(
 ) -> ApiResponse[MovimientoResponse]:
     movimiento = crear_pago_a_organizacion(datos, current_user, db)
     notificar_pago_organizacion(movimiento, db, background_tasks, actor_usuario_id=current_user.id)
-    encolar_webhook_evento(
-        evento="movimiento.creado",
-        organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
-        db=db,
-        background_tasks=background_tasks,
-    )
-    encolar_webhook_evento(
-        evento="pago_organizacion.creado",
+    encolar_webhook_eventos(
+        eventos=["movimiento.creado", "pago_organizacion.creado"],
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -155,7 +148,7 @@ def post_cashback(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -174,7 +167,7 @@ def post_ajuste_admin(
     encolar_webhook_evento(
         evento="movimiento.creado",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
@@ -194,7 +187,7 @@ def post_reversa(
     encolar_webhook_evento(
         evento="movimiento.revertido",
         organizacion_id=movimiento.organizacion_id,
-        data=_movimiento_payload(movimiento),
+        data=lambda: _movimiento_payload(movimiento),
         db=db,
         background_tasks=background_tasks,
     )
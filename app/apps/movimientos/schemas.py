@@ -55,6 +55,17 @@ class MovimientoCashbackCreate(MovimientoBaseCreate):
     wallet_destino_id: UUID
 
 
+MOVIMIENTOS_LOTE_MAX_ITEMS = 1000
+
+
+class MovimientoDepositoLoteCreate(BaseModel):
+    items: list[MovimientoDepositoCreate] = Field(..., min_length=1, max_length=MOVIMIENTOS_LOTE_MAX_ITEMS)
+
+
+class MovimientoCashbackLoteCreate(BaseModel):
+    items: list[MovimientoCashbackCreate] = Field(..., min_length=1, max_length=MOVIMIENTOS_LOTE_MAX_ITEMS)
+
+
 class MovimientoAjusteAdminCreate(MovimientoBaseCreate):
     wallet_id: UUID
     operacion: Literal["credito", "debito"]
@@ -90,3 +101,30 @@ class MovimientoResponse(BaseModel):
     @classmethod
     def normalize_amount(cls, value: Any) -> Decimal:
         return normalize_decimal(value)
+
+
+class MovimientoCambioResponse(BaseModel):
+    cursor: int
+    tipo: Literal["creado", "estado"]
+    movimiento: MovimientoResponse
+
+
+class MovimientoCambiosResponse(BaseModel):
+    cambios: list[MovimientoCambioResponse]
+    cursor: int
+    hay_mas: bool
+
+
+class MovimientoLoteItemResultado(BaseModel):
+    indice: int
+    referencia_externa: str | None = None
+    status: Literal["creado", "duplicado", "error"]
+    movimiento: MovimientoResponse | None = None
+    error: str | None = None
+
+
+class MovimientoLoteResponse(BaseModel):
+    creados: int
+    duplicados: int
+    errores: int
+    resultados: list[MovimientoLoteItemResultado]
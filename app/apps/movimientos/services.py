@@ -1,19 +1,27 @@
+import logging
+import time
 from decimal import Decimal
 from typing import Any
 from uuid import UUID
 
 from fastapi import HTTPException, status
-from sqlalchemy import or_, select
+from sqlalchemy import BigInteger, Text, cast, func, literal, or_, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.apps.auditoria.models import AuditLog
 from app.apps.auditoria.services import registrar_evento_api_key, registrar_evento_usuario
 from app.apps.auth.schemas import DatosUsuarioToken
-from app.apps.movimientos.models import Movimiento
+from app.apps.movimientos.models import Movimiento, MovimientoCambio
 from app.apps.movimientos.permissions import ensure_can_debit_wallet
 from app.apps.movimientos.schemas import (
     MovimientoAjusteAdminCreate,
+    MovimientoCambioResponse,
+    MovimientoCambiosResponse,
     MovimientoCashbackCreate,
     MovimientoDepositoCreate,
+    MovimientoLoteItemResultado,
+    MovimientoLoteResponse,
     MovimientoPagoOrganizacionCreate,
     MovimientoPagoCreate,
     MovimientoResponse,
@@ -21,13 +29,19 @@ from app.apps.movimientos.schemas import (
     MovimientoReversaCreate,
     MovimientoTransferenciaCreate,
 )
-from app.apps.planes.limit_service import validar_limite_movimientos_mes
+from app.apps.planes.limit_service import cupo_movimientos_mes, validar_limite_movimientos_mes
 from app.apps.wallets.models import Wallet
+from app.core.config import settings
 from app.core.permissions import can_consult_financial_info, is_financial_operator, is_super_admin
 from app.shared.enums import EstadoMovimiento, EstadoWallet, MonedaWallet, OwnerTypeWallet, RolUsuario, TipoMovimiento
 from app.shared.utils import normalize_decimal
 
 
+logger = logging.getLogger(__name__)
+
+_ultimo_aviso_horizonte = float("-inf")
+
+
 def _amount(value: Decimal | str | int | float) -> Decimal:
     return normalize_decimal(value)
 
@@ -198,6 +212,7 @@ def _create_movement(
     movimiento_origen_id: UUID | None = None,
     es_reversa: bool = False,
     motivo_reversa: str | None = None,
+    validar_limite: bool = True,
 ) -> Movimiento:
     cleaned_metadata = _json_metadata(metadata)
     _validate_movement_consistency(
@@ -206,7 +221,7 @@ def _create_movement(
         wallet_destino_id=destino.id if destino is not None else None,
         operacion=_operation_from_metadata(cleaned_metadata),
     )
-    if estado == EstadoMovimiento.aprobada:
+    if estado == EstadoMovimiento.aprobada and validar_limite:
         validar_limite_movimientos_mes(db, organization_id)
     movimiento = Movimiento(
         wallet_origen_id=origen.id if origen is not None else None,
@@ -231,6 +246,12 @@ def _commit(db: Session, movimiento: Movimiento) -> MovimientoResponse:
     try:
         db.commit()
         db.refresh(movimiento)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ya existe un movimiento de este tipo con esa referencia_externa.",
+        )
     except Exception:
         db.rollback()
         raise
@@ -351,6 +372,166 @@ def crear_deposito_api_key(
     return response
 
 
+def crear_movimientos_lote_api_key(
+    items: list[MovimientoDepositoCreate] | list[MovimientoCashbackCreate],
+    *,
+    tipo: TipoMovimiento,
+    organizacion_id: UUID,
+    actor_api_key_id: UUID,
+    db: Session,
+) -> MovimientoLoteResponse:
+    """Acredita depositos o cashbacks en tramos de ``MOVIMIENTOS_LOTE_CHUNK_SIZE`` con un commit por tramo.
+
+    Un item con ``referencia_externa`` ya registrada para el mismo tipo en la organizacion (o repetida
+    antes en el lote) se informa como ``duplicado`` con el movimiento existente: reenviar un archivo
+    no acredita dos veces. Un item invalido queda como ``error`` sin afectar al resto.
+    """
+    resultados: list[MovimientoLoteItemResultado] = []
+    chunk_size = max(settings.MOVIMIENTOS_LOTE_CHUNK_SIZE, 1)
+    for inicio in range(0, len(items), chunk_size):
+        resultados.extend(
+            _crear_tramo_lote(
+                list(enumerate(items[inicio : inicio + chunk_size], start=inicio)),
+                tipo=tipo,
+                organizacion_id=organizacion_id,
+                actor_api_key_id=actor_api_key_id,
+                db=db,
+            )
+        )
+    return MovimientoLoteResponse(
+        creados=sum(1 for resultado in resultados if resultado.status == "creado"),
+        duplicados=sum(1 for resultado in resultados if resultado.status == "duplicado"),
+        errores=sum(1 for resultado in resultados if resultado.status == "error"),
+        resultados=resultados,
+    )
+
+
+def _crear_tramo_lote(
+    tramo: list[tuple[int, MovimientoDepositoCreate | MovimientoCashbackCreate]],
+    *,
+    tipo: TipoMovimiento,
+    organizacion_id: UUID,
+    actor_api_key_id: UUID,
+    db: Session,
+    reintentar: bool = True,
+) -> list[MovimientoLoteItemResultado]:
+    # Las wallets se bloquean en orden de id: dos lotes que comparten wallets no se bloquean mutuamente.
+    wallet_ids = {datos.wallet_destino_id for _, datos in tramo}
+    wallets = {
+        wallet.id: wallet
+        for wallet in db.scalars(
+            select(Wallet).where(Wallet.id.in_(wallet_ids)).order_by(Wallet.id).with_for_update()
+        ).all()
+    }
+    # La busqueda de duplicados va despues del bloqueo: un reintento concurrente sobre la misma wallet ya ve el alta.
+    # Un lote concurrente sobre otras wallets no espera a este: ese caso lo frena el indice unico de referencia.
+    referencias = {datos.referencia_externa for _, datos in tramo if datos.referencia_externa}
+    existentes: dict[str, Movimiento] = {}
+    if referencias:
+        for movimiento in db.scalars(
+            select(Movimiento)
+            .where(
+                Movimiento.organizacion_id == organizacion_id,
+                Movimiento.tipo == tipo,
+                Movimiento.referencia_externa.in_(referencias),
+            )
+            .order_by(Movimiento.fecha.asc())
+        ).all():
+            existentes.setdefault(movimiento.referencia_externa, movimiento)
+
+    cupo = cupo_movimientos_mes(db, organizacion_id)
+    detalle_limite: str | None = None
+    resultados: list[MovimientoLoteItemResultado] = []
+    creados: list[tuple[MovimientoLoteItemResultado, Movimiento]] = []
+    repetidos: list[tuple[MovimientoLoteItemResultado, Movimiento]] = []
+    # Sin autoflush: un conflicto de referencia se resuelve en el flush del tramo, no a mitad del loop.
+    with db.no_autoflush:
+        for indice, datos in tramo:
+            referencia = datos.referencia_externa
+            resultado = MovimientoLoteItemResultado(indice=indice, referencia_externa=referencia, status="creado")
+            resultados.append(resultado)
+            if referencia and referencia in existentes:
+                resultado.status = "duplicado"
+                repetidos.append((resultado, existentes[referencia]))
+                continue
+            try:
+                destino = wallets.get(datos.wallet_destino_id)
+                if destino is None:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wallet destino no encontrada.")
+                _ensure_same_api_key_organization([destino], organizacion_id)
+                _ensure_active(destino, "destino")
+                if cupo is not None and cupo <= 0:
+                    if detalle_limite is None:
+                        try:
+                            validar_limite_movimientos_mes(db, organizacion_id)
+                        except HTTPException as exc:
+                            detalle_limite = str(exc.detail)
+                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detalle_limite)
+                amount = _amount(datos.monto)
+                destino.saldo = _amount(destino.saldo) + amount
+                movimiento = _create_movement(
+                    db,
+                    origen=None,
+                    destino=destino,
+                    amount=amount,
+                    tipo=tipo,
+                    organization_id=organizacion_id,
+                    descripcion=datos.descripcion,
+                    referencia_externa=referencia,
+                    metadata=datos.metadata,
+                    validar_limite=False,
+                )
+            except HTTPException as exc:
+                resultado.status = "error"
+                resultado.error = str(exc.detail)
+                continue
+            if cupo is not None:
+                cupo -= 1
+            if referencia:
+                existentes[referencia] = movimiento
+            creados.append((resultado, movimiento))
+
+    try:
+        db.flush()
+        for resultado, movimiento in repetidos + creados:
+            resultado.movimiento = MovimientoResponse.model_validate(movimiento)
+        if not creados:
+            db.rollback()
+            return resultados
+        for resultado, _ in creados:
+            db.add(
+                AuditLog(
+                    evento="movimiento_registrado",
+                    mensaje=f"Movimiento {tipo.value} registrado.",
+                    nivel="INFO",
+                    actor_tipo="api_key",
+                    actor_api_key_id=actor_api_key_id,
+                    organizacion_id=organizacion_id,
+                    metadata_log={**_movement_audit_metadata(resultado.movimiento), "lote": True},
+                )
+            )
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        if reintentar and isinstance(exc, IntegrityError):
+            # Otro lote confirmo la misma referencia: se rehace el tramo una vez y esos items salen como duplicado.
+            return _crear_tramo_lote(
+                tramo,
+                tipo=tipo,
+                organizacion_id=organizacion_id,
+                actor_api_key_id=actor_api_key_id,
+                db=db,
+                reintentar=False,
+            )
+        nuevos = {id(movimiento) for _, movimiento in creados}
+        for resultado, movimiento in creados + repetidos:
+            if id(movimiento) in nuevos:
+                resultado.status = "error"
+                resultado.movimiento = None
+                resultado.error = "No se pudo registrar el movimiento."
+    return resultados
+
+
 def crear_retiro(datos: MovimientoRetiroCreate, current_user: DatosUsuarioToken, db: Session) -> MovimientoResponse:
     amount = _amount(datos.monto)
     origen = _get_wallet_locked(db, datos.wallet_origen_id, "origen")
@@ -752,3 +933,80 @@ def obtener_movimiento(
         if visible is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movimiento no encontrado.")
     return MovimientoResponse.model_validate(movimiento)
+
+
+def _avisar_horizonte_retrasado(db: Session) -> None:
+    """Loguea (a lo sumo una vez por ``MOVIMIENTOS_FEED_MAX_LAG_SECONDS``) la transaccion que frena el feed."""
+    global _ultimo_aviso_horizonte
+    limite = settings.MOVIMIENTOS_FEED_MAX_LAG_SECONDS
+    if limite <= 0 or time.monotonic() - _ultimo_aviso_horizonte < limite:
+        return
+    mas_vieja = db.execute(
+        text(
+            "SELECT pid, state, extract(epoch FROM clock_timestamp() - xact_start) AS segundos "
+            "FROM pg_stat_activity WHERE backend_xid IS NOT NULL ORDER BY xact_start LIMIT 1"
+        )
+    ).first()
+    if mas_vieja is None or mas_vieja.segundos < limite:
+        return
+    _ultimo_aviso_horizonte = time.monotonic()
+    logger.warning(
+        "Feed de movimientos detenido: la transaccion del pid %s (%s) lleva %.0f s abierta.",
+        mas_vieja.pid,
+        mas_vieja.state,
+        mas_vieja.segundos,
+    )
+
+
+def leer_cambios_movimientos(
+    db: Session,
+    organizacion_id: UUID,
+    *,
+    cursor: int = 0,
+    limit: int = 100,
+) -> MovimientoCambiosResponse:
+    """Cambios posteriores a ``cursor`` (el id del ultimo cambio servido), en orden ``(txid, id)``.
+
+    En PostgreSQL solo se sirven filas de transacciones anteriores al ``xmin`` del snapshot actual: todas
+    estan confirmadas y ninguna transaccion en curso o futura puede escribir antes de ellas en ese orden,
+    asi que el cursor nunca saltea un cambio que commitea tarde (los ids no siguen el orden de commit).
+    En SQLite las escrituras son serializadas y ``txid`` vale 0. La sesion se libera al terminar para no
+    retener la conexion entre sondeos.
+    """
+    posicion = tuple_(MovimientoCambio.txid, MovimientoCambio.id)
+    condiciones = [MovimientoCambio.organizacion_id == organizacion_id]
+    if cursor:
+        txid_cursor = db.scalar(
+            select(MovimientoCambio.txid).where(
+                MovimientoCambio.id == cursor,
+                MovimientoCambio.organizacion_id == organizacion_id,
+            )
+        )
+        if txid_cursor is None:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor desconocido; reinicia el feed con cursor=0.",
+            )
+        condiciones.append(posicion > tuple_(literal(txid_cursor), literal(cursor)))
+    if db.get_bind().dialect.name == "postgresql":
+        _avisar_horizonte_retrasado(db)
+        horizonte = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+        condiciones.append(MovimientoCambio.txid < horizonte)
+    filas = db.execute(
+        select(MovimientoCambio.id, MovimientoCambio.tipo, Movimiento)
+        .join(Movimiento, Movimiento.id == MovimientoCambio.movimiento_id)
+        .where(*condiciones)
+        .order_by(MovimientoCambio.txid.asc(), MovimientoCambio.id.asc())
+        .limit(limit + 1)
+    ).all()
+    cambios = [
+        MovimientoCambioResponse(cursor=cambio_id, tipo=tipo, movimiento=MovimientoResponse.model_validate(movimiento))
+        for cambio_id, tipo, movimiento in filas[:limit]
+    ]
+    db.rollback()
+    return MovimientoCambiosResponse(
+        cambios=cambios,
+        cursor=cambios[-1].cursor if cambios else cursor,
+        hay_mas=len(filas) > limit,
+    )
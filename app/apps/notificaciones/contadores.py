@@ -0,0 +1,135 @@
+"""Contadores materializados de notificaciones internas por usuario y por organizacion.
+
+El badge de no leidas se consulta cada pocos segundos por usuario conectado. En lugar de contar
+``notificaciones`` en cada pedido, cada camino que crea notificaciones internas llama a
+``sumar_notificaciones`` antes de confirmar, y cada lectura ajusta ``no_leidas`` con ``ajustar_no_leidas``
+en la misma transaccion. Se actualizan primero las filas de organizacion y despues las de usuario, cada
+grupo en orden de clave, para que dos transacciones no se bloqueen mutuamente. ``reconstruir_contadores``
+los recalcula desde ``notificaciones`` (``scripts/reconstruir_contadores_notificaciones.py``).
+
+El contador de organizacion se reparte en ``FRAGMENTOS_ORGANIZACION`` filas segun el usuario (las
+notificaciones sin usuario van al fragmento 0) y se suma al leer: un lote que notifica a muchos clientes de
+la misma organizacion no serializa todas las transacciones sobre una unica fila. Un fragmento puede quedar
+con ``no_leidas`` negativo (por ejemplo los contados antes de fragmentar); solo la suma es significativa.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping
+from uuid import UUID
+
+from sqlalchemy import bindparam, delete, func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.apps.notificaciones.models import (
+    ContadorNotificacionesOrganizacion,
+    ContadorNotificacionesUsuario,
+    Notificacion,
+)
+from app.shared.enums import CanalNotificacion
+
+
+CAMPOS = ("total", "no_leidas")
+FRAGMENTOS_ORGANIZACION = 16
+
+
+def fragmento(usuario_id: UUID | None) -> int:
+    """Fragmento del contador de organizacion donde cuentan las notificaciones de ``usuario_id``."""
+    return usuario_id.int % FRAGMENTOS_ORGANIZACION if usuario_id is not None else 0
+
+
+def _insert(db: Session, modelo: type) -> Any:
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialecto.insert(modelo)
+
+
+def _upsert(db: Session, modelo: type, claves: tuple[str, ...], deltas: dict[tuple[Any, ...], dict[str, int]]) -> None:
+    if not deltas:
+        return
+    sentencia = _insert(db, modelo)
+    db.execute(
+        sentencia.on_conflict_do_update(
+            index_elements=list(claves),
+            set_={campo: getattr(modelo, campo) + getattr(sentencia.excluded, campo) for campo in CAMPOS},
+        ),
+        [{**dict(zip(claves, clave)), **deltas[clave]} for clave in sorted(deltas)],
+    )
+
+
+def sumar_notificaciones(db: Session, notificaciones: Iterable[Notificacion]) -> None:
+    """Suma las notificaciones internas recien agregadas a los contadores, en la transaccion en curso."""
+    por_organizacion: dict[tuple[Any, ...], dict[str, int]] = {}
+    por_usuario: dict[tuple[Any, ...], dict[str, int]] = {}
+    for notificacion in notificaciones:
+        if notificacion.canal != CanalNotificacion.interna:
+            continue
+        clave_organizacion = (notificacion.organizacion_id, fragmento(notificacion.usuario_id))
+        destinos = [por_organizacion.setdefault(clave_organizacion, dict.fromkeys(CAMPOS, 0))]
+        if notificacion.usuario_id is not None:
+            destinos.append(por_usuario.setdefault((notificacion.usuario_id,), dict.fromkeys(CAMPOS, 0)))
+        for acumulado in destinos:
+            acumulado["total"] += 1
+            acumulado["no_leidas"] += 0 if notificacion.leida else 1
+    _upsert(db, ContadorNotificacionesOrganizacion, ("organizacion_id", "fragmento"), por_organizacion)
+    _upsert(db, ContadorNotificacionesUsuario, ("usuario_id",), por_usuario)
+
+
+def ajustar_no_leidas(db: Session, deltas: Mapping[tuple[UUID, UUID | None], int]) -> None:
+    """Suma cada delta por ``(organizacion_id, usuario_id)`` (negativo al marcar como leidas) a ``no_leidas``.
+
+    Los fragmentos de organizacion se insertan si faltan: las notificaciones contadas antes de fragmentar
+    estan en el fragmento 0 y su lectura se descuenta del fragmento del usuario.
+    """
+    por_organizacion: dict[tuple[Any, ...], dict[str, int]] = {}
+    por_usuario: dict[UUID, int] = {}
+    for (organizacion_id, usuario_id), delta in deltas.items():
+        if not delta:
+            continue
+        acumulado = por_organizacion.setdefault((organizacion_id, fragmento(usuario_id)), dict.fromkeys(CAMPOS, 0))
+        acumulado["no_leidas"] += delta
+        if usuario_id is not None:
+            por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + delta
+    _upsert(db, ContadorNotificacionesOrganizacion, ("organizacion_id", "fragmento"), por_organizacion)
+    filas = [{"b_clave": valor, "b_delta": por_usuario[valor]} for valor in sorted(por_usuario) if por_usuario[valor]]
+    if filas:
+        tabla = ContadorNotificacionesUsuario.__table__
+        db.execute(
+            update(tabla)
+            .where(tabla.c.usuario_id == bindparam("b_clave"))
+            .values(no_leidas=tabla.c.no_leidas + bindparam("b_delta")),
+            filas,
+        )
+
+
+def reconstruir_contadores(db: Session) -> tuple[int, int]:
+    """Recalcula todos los contadores y confirma. Devuelve cuantas organizaciones y usuarios tienen contador."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Las altas y lecturas concurrentes esperan al commit y ajustan los contadores ya reconstruidos.
+        db.execute(
+            text("LOCK TABLE notificacion_contadores_organizacion, notificacion_contadores_usuario IN EXCLUSIVE MODE")
+        )
+    db.execute(delete(ContadorNotificacionesOrganizacion))
+    db.execute(delete(ContadorNotificacionesUsuario))
+    internas = Notificacion.canal == CanalNotificacion.interna
+    conteos = (func.count(), func.count().filter(Notificacion.leida.is_(False)))
+    por_organizacion: dict[tuple[Any, ...], dict[str, int]] = {}
+    for organizacion_id, usuario_id, total, no_leidas in db.execute(
+        select(Notificacion.organizacion_id, Notificacion.usuario_id, *conteos)
+        .where(internas)
+        .group_by(Notificacion.organizacion_id, Notificacion.usuario_id)
+    ):
+        acumulado = por_organizacion.setdefault((organizacion_id, fragmento(usuario_id)), dict.fromkeys(CAMPOS, 0))
+        acumulado["total"] += total
+        acumulado["no_leidas"] += no_leidas
+    _upsert(db, ContadorNotificacionesOrganizacion, ("organizacion_id", "fragmento"), por_organizacion)
+    organizaciones = len({organizacion_id for organizacion_id, _ in por_organizacion})
+    usuarios = db.execute(
+        ContadorNotificacionesUsuario.__table__.insert().from_select(
+            ["usuario_id", "total", "no_leidas"],
+            select(Notificacion.usuario_id, *conteos)
+            .where(internas, Notificacion.usuario_id.is_not(None))
+            .group_by(Notificacion.usuario_id),
+        )
+    ).rowcount
+    db.commit()
+    return organizaciones, usuarios
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import html
 import smtplib
+from dataclasses import dataclass
 from email.message import EmailMessage
 from pathlib import Path
 from string import Template
@@ -16,6 +17,21 @@ from app.core.database import SessionLocal
 
 
 TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+TEXT_TEMPLATE = "base.txt"
+BRANDING = frozenset({"nombre_organizacion", "color_primario", "logo_block"})
+
+
+@dataclass(frozen=True)
+class _Plantilla:
+    template: Template
+    campos: frozenset[str]
+    rutas: tuple[Path, ...]
+    mtimes: tuple[float, ...]
+
+
+# Plantillas compiladas por nombre y branding ya escapado por organizacion (version, fragmento).
+_PLANTILLAS: dict[str, _Plantilla] = {}
+_BRANDING: dict[str, tuple[str, dict[str, str]]] = {}
 
 
 def _silent_mode() -> bool:
@@ -27,26 +43,88 @@ def _silent_mode() -> bool:
     )
 
 
-def _render_template(template_name: str, context: dict[str, Any]) -> str:
-    base = (TEMPLATE_DIR / "base.html").read_text(encoding="utf-8")
-    content = (TEMPLATE_DIR / template_name).read_text(encoding="utf-8")
-    safe_context = {key: html.escape(str(value)) for key, value in context.items() if value is not None}
-    safe_context.setdefault("logo_block", "")
+def _compilar(template_name: str) -> _Plantilla:
+    """``base.html`` con el contenido ya insertado (o ``base.txt``) como un solo ``Template``."""
+    if template_name == TEXT_TEMPLATE:
+        rutas: tuple[Path, ...] = (TEMPLATE_DIR / TEXT_TEMPLATE,)
+        texto = rutas[0].read_text(encoding="utf-8")
+    else:
+        rutas = (TEMPLATE_DIR / "base.html", TEMPLATE_DIR / template_name)
+        base, content = (ruta.read_text(encoding="utf-8") for ruta in rutas)
+        texto = base.replace("$content", content)
+    template = Template(texto)
+    campos = frozenset(template.get_identifiers())
+    return _Plantilla(
+        template=template,
+        # En HTML el branding sale del fragmento cacheado; el resto se escapa en cada email.
+        campos=campos if template_name == TEXT_TEMPLATE else campos - BRANDING,
+        rutas=rutas,
+        mtimes=tuple(ruta.stat().st_mtime for ruta in rutas),
+    )
+
+
+def cargar_plantillas() -> None:
+    """Compila todas las plantillas de email; se llama al iniciar la app."""
+    for ruta in sorted(TEMPLATE_DIR.iterdir()):
+        if ruta.name == TEXT_TEMPLATE or (ruta.suffix == ".html" and ruta.name != "base.html"):
+            _PLANTILLAS[ruta.name] = _compilar(ruta.name)
+
+
+def _plantilla(template_name: str) -> _Plantilla:
+    plantilla = _PLANTILLAS.get(template_name)
+    if plantilla is None or (
+        settings.EMAIL_TEMPLATES_RELOAD and plantilla.mtimes != tuple(ruta.stat().st_mtime for ruta in plantilla.rutas)
+    ):
+        plantilla = _PLANTILLAS[template_name] = _compilar(template_name)
+    return plantilla
+
+
+def _branding(context: dict[str, Any]) -> dict[str, str]:
+    """Nombre, color y bloque de logo escapados, cacheados por organizacion mientras no cambie su version."""
+    organizacion_id = context.get("organizacion_id")
+    version = context.get("version_organizacion")
+    clave = str(organizacion_id) if organizacion_id is not None and version else None
+    if clave is not None:
+        cacheado = _BRANDING.get(clave)
+        if cacheado is not None and cacheado[0] == version:
+            return cacheado[1]
+    nombre = html.escape(str(context.get("nombre_organizacion") or ""))
+    fragmento = {
+        "nombre_organizacion": nombre,
+        "color_primario": html.escape(str(context.get("color_primario") or "")),
+        "logo_block": "",
+    }
     if context.get("logo_url"):
-        safe_context["logo_block"] = (
-            f'<img src="{html.escape(str(context["logo_url"]))}" alt="{safe_context.get("nombre_organizacion", "")}" '
+        fragmento["logo_block"] = (
+            f'<img src="{html.escape(str(context["logo_url"]))}" alt="{nombre}" '
             'style="max-height:48px; margin-bottom:16px;" />'
         )
-    body = Template(content).safe_substitute(safe_context)
-    return Template(base).safe_substitute({**safe_context, "content": body})
+    if clave is not None:
+        _BRANDING[clave] = (str(version), fragmento)
+    return fragmento
+
+
+def _render_template(template_name: str, context: dict[str, Any]) -> str:
+    plantilla = _plantilla(template_name)
+    safe_context = {
+        campo: html.escape(str(context[campo])) for campo in plantilla.campos if context.get(campo) is not None
+    }
+    return plantilla.template.safe_substitute(safe_context, **_branding(context))
+
+
+def _render_texto(context: dict[str, Any]) -> str:
+    plantilla = _plantilla(TEXT_TEMPLATE)
+    return plantilla.template.safe_substitute(
+        {campo: str(context[campo]) for campo in plantilla.campos if context.get(campo) is not None}
+    )
 
 
-def enviar_email(destinatario: str, asunto: str, html_body: str) -> None:
+def enviar_email(destinatario: str, asunto: str, html_body: str, text_body: str | None = None) -> None:
     message = EmailMessage()
     message["From"] = settings.MAIL_FROM
     message["To"] = destinatario
     message["Subject"] = asunto
-    message.set_content("Este mensaje requiere un cliente compatible con HTML.")
+    message.set_content(text_body or "Este mensaje requiere un cliente compatible con HTML.")
     message.add_alternative(html_body, subtype="html")
 
     if settings.MAIL_SSL_TLS:
@@ -83,7 +161,7 @@ def enviar_email_template(
         return
     try:
         html_body = _render_template(template_name, context)
-        enviar_email(destinatario, asunto, html_body)
+        enviar_email(destinatario, asunto, html_body, _render_texto(context))
     except Exception as exc:
         try:
             _with_session(lambda db: registrar_error_envio(notificacion_id, str(exc), db))
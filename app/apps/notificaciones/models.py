@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, String, Text, Uuid
+from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, Integer, SmallInteger, String, Text, Uuid
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -55,3 +55,35 @@ class Notificacion(Base):
 
     usuario: Mapped["Usuario | None"] = relationship(back_populates="notificaciones")
     organizacion: Mapped["Organizacion | None"] = relationship(back_populates="notificaciones")
+
+
+class ContadorNotificacionesUsuario(Base):
+    """Notificaciones internas de un usuario; se actualiza en la misma transaccion que cada alta o lectura."""
+
+    __tablename__ = "notificacion_contadores_usuario"
+
+    usuario_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("usuarios.id", ondelete="RESTRICT"),
+        primary_key=True,
+    )
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    no_leidas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ContadorNotificacionesOrganizacion(Base):
+    """Notificaciones internas de una organizacion, incluidas las que no tienen usuario.
+
+    Cada organizacion tiene hasta ``FRAGMENTOS_ORGANIZACION`` filas (ver ``contadores``); el total es la suma.
+    """
+
+    __tablename__ = "notificacion_contadores_organizacion"
+
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        primary_key=True,
+    )
+    fragmento: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=0)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    no_leidas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -57,4 +57,5 @@ class EmailTemplateContext(BaseModel):
     nombre_organizacion: str
     color_primario: str = "#0f766e"
     logo_url: str | None = None
+    version_organizacion: str | None = None
     metadata: dict[str, Any] = Field(default_factory=dict)
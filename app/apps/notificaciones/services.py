@@ -1,19 +1,26 @@
 from __future__ import annotations
 
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Any
-from uuid import UUID
+from typing import Any, Sequence
+from uuid import UUID, uuid4
 
 from fastapi import BackgroundTasks, HTTPException, status
-from sqlalchemy import func, or_, select
+from sqlalchemy import func, or_, select, update
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.schemas import AuditLogCreate
-from app.apps.auditoria.services import registrar_audit_log
+from app.apps.auditoria.services import agregar_evento, registrar_audit_log
 from app.apps.auth.schemas import DatosUsuarioToken
 from app.apps.movimientos.schemas import MovimientoResponse
-from app.apps.notificaciones.models import Notificacion
+from app.apps.notificaciones.contadores import ajustar_no_leidas, sumar_notificaciones
+from app.apps.notificaciones.models import (
+    ContadorNotificacionesOrganizacion,
+    ContadorNotificacionesUsuario,
+    Notificacion,
+)
 from app.apps.notificaciones.schemas import (
     EmailTemplateContext,
     NotificacionCreate,
@@ -81,10 +88,13 @@ def _audit(
 
 
 def _brand_context(organizacion: Organizacion) -> dict[str, str | None]:
+    version = organizacion.fecha_actualizacion or organizacion.fecha_creacion
     return {
         "nombre_organizacion": organizacion.nombre_comercial or organizacion.nombre,
         "color_primario": organizacion.color_primario or "#0f766e",
         "logo_url": organizacion.logo_url,
+        # Cambia con cada actualizacion de la organizacion; invalida el branding cacheado del email.
+        "version_organizacion": version.isoformat() if version is not None else None,
     }
 
 
@@ -102,13 +112,15 @@ def _metadata(value: dict[str, Any] | None) -> dict[str, Any] | None:
     return cleaned
 
 
-def _persistir_notificacion(
+def _nueva_notificacion(
     datos: NotificacionCreate,
     db: Session,
     *,
     actor_usuario_id: UUID | None = None,
 ) -> Notificacion:
+    """Agrega la notificacion y su auditoria a la transaccion en curso, sin confirmar."""
     notificacion = Notificacion(
+        id=uuid4(),
         organizacion_id=datos.organizacion_id,
         usuario_id=datos.usuario_id,
         tipo=datos.tipo,
@@ -118,9 +130,7 @@ def _persistir_notificacion(
         metadata_notificacion=_metadata(datos.metadata),
     )
     db.add(notificacion)
-    db.commit()
-    db.refresh(notificacion)
-    _audit(
+    agregar_evento(
         db,
         evento="notificacion_creada",
         mensaje=f"Notificacion {notificacion.tipo.value} creada.",
@@ -131,6 +141,20 @@ def _persistir_notificacion(
     return notificacion
 
 
+def _persistir_notificacion(
+    datos: NotificacionCreate,
+    db: Session,
+    *,
+    actor_usuario_id: UUID | None = None,
+) -> Notificacion:
+    notificacion = _nueva_notificacion(datos, db, actor_usuario_id=actor_usuario_id)
+    db.flush()
+    sumar_notificaciones(db, [notificacion])
+    db.commit()
+    db.refresh(notificacion)
+    return notificacion
+
+
 def crear_notificacion_interna(
     *,
     organizacion_id: UUID,
@@ -158,6 +182,28 @@ def crear_notificacion_interna(
     return NotificacionResponse.model_validate(notificacion)
 
 
+def _datos_email(
+    *,
+    organizacion_id: UUID,
+    usuario_id: UUID | None,
+    tipo: TipoNotificacion,
+    titulo: str,
+    mensaje: str,
+    destinatario: str,
+    template_name: str,
+    metadata: dict[str, Any] | None,
+) -> NotificacionCreate:
+    return NotificacionCreate(
+        organizacion_id=organizacion_id,
+        usuario_id=usuario_id,
+        tipo=tipo,
+        canal=CanalNotificacion.email,
+        titulo=titulo,
+        mensaje=mensaje,
+        metadata={**(metadata or {}), "destinatario": destinatario, "template": template_name},
+    )
+
+
 def crear_notificacion_email(
     *,
     organizacion_id: UUID,
@@ -171,16 +217,16 @@ def crear_notificacion_email(
     metadata: dict[str, Any] | None = None,
     actor_usuario_id: UUID | None = None,
 ) -> Notificacion:
-    datos_metadata = {**(metadata or {}), "destinatario": destinatario, "template": template_name}
     return _persistir_notificacion(
-        NotificacionCreate(
+        _datos_email(
             organizacion_id=organizacion_id,
             usuario_id=usuario_id,
             tipo=tipo,
-            canal=CanalNotificacion.email,
             titulo=titulo,
             mensaje=mensaje,
-            metadata=datos_metadata,
+            destinatario=destinatario,
+            template_name=template_name,
+            metadata=metadata,
         ),
         db,
         actor_usuario_id=actor_usuario_id,
@@ -210,6 +256,108 @@ def _agendar_email(
     )
 
 
+@dataclass(frozen=True)
+class EnvioNotificacion:
+    """Una notificacion interna para ``usuario`` (o para la organizacion, sin usuario) y su email."""
+
+    usuario: Usuario | None
+    tipo: TipoNotificacion
+    titulo: str
+    mensaje: str
+    template_name: str = "base.html"
+    metadata: dict[str, Any] | None = None
+
+
+def crear_notificaciones(
+    envios: Sequence[EnvioNotificacion],
+    *,
+    organizacion: Organizacion,
+    db: Session,
+    background_tasks: BackgroundTasks | None = None,
+    actor_usuario_id: UUID | None = None,
+) -> list[NotificacionResponse]:
+    """Crea las notificaciones internas y de email de todos los envios, con sus auditorias y webhooks, en un commit.
+
+    Los emails se agendan despues del commit, asi el envio nunca ve una notificacion sin confirmar.
+    """
+    brand = _brand_context(organizacion)
+    internas: list[Notificacion] = []
+    emails: list[dict[str, Any]] = []
+    for envio in envios:
+        usuario_id = envio.usuario.id if envio.usuario is not None else None
+        internas.append(
+            _nueva_notificacion(
+                NotificacionCreate(
+                    organizacion_id=organizacion.id,
+                    usuario_id=usuario_id,
+                    tipo=envio.tipo,
+                    canal=CanalNotificacion.interna,
+                    titulo=envio.titulo,
+                    mensaje=envio.mensaje,
+                    metadata=envio.metadata,
+                ),
+                db,
+                actor_usuario_id=actor_usuario_id,
+            )
+        )
+        if envio.usuario is None:
+            continue
+        destinatario = envio.usuario.email
+        email = _nueva_notificacion(
+            _datos_email(
+                organizacion_id=organizacion.id,
+                usuario_id=usuario_id,
+                tipo=envio.tipo,
+                titulo=envio.titulo,
+                mensaje=envio.mensaje,
+                destinatario=destinatario,
+                template_name=envio.template_name,
+                metadata=envio.metadata,
+            ),
+            db,
+            actor_usuario_id=actor_usuario_id,
+        )
+        # Los datos del email se arman antes del commit, que expira las filas de la sesion.
+        emails.append(
+            {
+                "notificacion_id": email.id,
+                "destinatario": destinatario,
+                "asunto": envio.titulo,
+                "template_name": envio.template_name,
+                "context": EmailTemplateContext(
+                    organizacion_id=organizacion.id,
+                    destinatario=destinatario,
+                    asunto=envio.titulo,
+                    titulo=envio.titulo,
+                    mensaje=envio.mensaje,
+                    nombre_organizacion=str(brand["nombre_organizacion"]),
+                    color_primario=str(brand["color_primario"]),
+                    logo_url=brand["logo_url"],
+                    version_organizacion=brand["version_organizacion"],
+                    metadata=_metadata(envio.metadata) or {},
+                ),
+            }
+        )
+    if not internas:
+        return []
+    db.flush()
+    sumar_notificaciones(db, internas)
+    respuestas = [NotificacionResponse.model_validate(notificacion) for notificacion in internas]
+
+    from app.apps.integraciones.webhook_dispatcher import agregar_webhook_evento_lote, confirmar_deliveries
+
+    deliveries = agregar_webhook_evento_lote(
+        evento="notificacion.creada",
+        organizacion_id=organizacion.id,
+        datos=lambda: [respuesta.model_dump(mode="json", by_alias=True) for respuesta in respuestas],
+        db=db,
+    )
+    confirmar_deliveries(db, deliveries, background_tasks)
+    for email in emails:
+        _agendar_email(background_tasks, **email)
+    return respuestas
+
+
 def crear_notificacion_y_email(
     *,
     organizacion: Organizacion,
@@ -223,65 +371,49 @@ def crear_notificacion_y_email(
     metadata: dict[str, Any] | None = None,
     actor_usuario_id: UUID | None = None,
 ) -> NotificacionResponse:
-    usuario_id = usuario.id if usuario is not None else None
-    interna = crear_notificacion_interna(
-        organizacion_id=organizacion.id,
-        usuario_id=usuario_id,
-        tipo=tipo,
-        titulo=titulo,
-        mensaje=mensaje,
+    [interna] = crear_notificaciones(
+        [
+            EnvioNotificacion(
+                usuario=usuario,
+                tipo=tipo,
+                titulo=titulo,
+                mensaje=mensaje,
+                template_name=template_name,
+                metadata=metadata,
+            )
+        ],
+        organizacion=organizacion,
         db=db,
-        metadata=metadata,
+        background_tasks=background_tasks,
         actor_usuario_id=actor_usuario_id,
     )
-    try:
-        from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento
+    return interna
 
-        encolar_webhook_evento(
-            evento="notificacion.creada",
-            organizacion_id=organizacion.id,
-            data=interna.model_dump(mode="json", by_alias=True),
-            db=db,
-            background_tasks=background_tasks,
-        )
-    except Exception:
-        db.rollback()
-    if usuario is None:
-        return interna
 
-    email = crear_notificacion_email(
-        organizacion_id=organizacion.id,
-        usuario_id=usuario.id,
-        tipo=tipo,
-        titulo=titulo,
-        mensaje=mensaje,
-        destinatario=usuario.email,
-        template_name=template_name,
-        db=db,
-        metadata=metadata,
-        actor_usuario_id=actor_usuario_id,
-    )
-    brand = _brand_context(organizacion)
-    context = EmailTemplateContext(
-        organizacion_id=organizacion.id,
-        destinatario=usuario.email,
-        asunto=titulo,
-        titulo=titulo,
-        mensaje=mensaje,
-        nombre_organizacion=str(brand["nombre_organizacion"]),
-        color_primario=str(brand["color_primario"]),
-        logo_url=brand["logo_url"],
-        metadata=_metadata(metadata) or {},
-    )
-    _agendar_email(
-        background_tasks,
-        notificacion_id=email.id,
-        destinatario=usuario.email,
-        asunto=titulo,
-        template_name=template_name,
-        context=context,
-    )
-    return interna
+def _alcance(current_user: DatosUsuarioToken, organizacion_id: UUID | None = None) -> tuple[UUID | None, UUID | None]:
+    """``(organizacion_id, usuario_id)`` visibles para ``current_user``; ambos ``None`` es todo."""
+    if is_super_admin(current_user.rol):
+        return organizacion_id, None
+    if is_admin(current_user.rol):
+        if organizacion_id is not None and organizacion_id != current_user.organizacion_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puedes operar otra organizacion.")
+        return current_user.organizacion_id, None
+    return None, current_user.id
+
+
+def _filtros_scoped(
+    current_user: DatosUsuarioToken,
+    organizacion_id: UUID | None = None,
+    *,
+    canal: CanalNotificacion = CanalNotificacion.interna,
+) -> list[Any]:
+    scope_id, usuario_id = _alcance(current_user, organizacion_id)
+    filtros = [Notificacion.canal == canal]
+    if usuario_id is not None:
+        filtros.append(Notificacion.usuario_id == usuario_id)
+    elif scope_id is not None:
+        filtros.append(Notificacion.organizacion_id == scope_id)
+    return filtros
 
 
 def _query_scoped(
@@ -290,17 +422,29 @@ def _query_scoped(
     *,
     canal: CanalNotificacion = CanalNotificacion.interna,
 ) -> Any:
-    query = select(Notificacion).where(Notificacion.canal == canal)
-    if is_super_admin(current_user.rol):
-        if organizacion_id is not None:
-            query = query.where(Notificacion.organizacion_id == organizacion_id)
-    elif is_admin(current_user.rol):
-        if organizacion_id is not None and organizacion_id != current_user.organizacion_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No puedes operar otra organizacion.")
-        query = query.where(Notificacion.organizacion_id == current_user.organizacion_id)
+    return select(Notificacion).where(*_filtros_scoped(current_user, organizacion_id, canal=canal))
+
+
+def _contadores_scoped(
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+) -> tuple[int, int]:
+    """``(total, no_leidas)`` de las notificaciones internas visibles, desde los contadores materializados."""
+    scope_id, usuario_id = _alcance(current_user, organizacion_id)
+    if usuario_id is not None:
+        query = select(ContadorNotificacionesUsuario.total, ContadorNotificacionesUsuario.no_leidas).where(
+            ContadorNotificacionesUsuario.usuario_id == usuario_id
+        )
     else:
-        query = query.where(Notificacion.usuario_id == current_user.id)
-    return query
+        query = select(
+            func.coalesce(func.sum(ContadorNotificacionesOrganizacion.total), 0),
+            func.coalesce(func.sum(ContadorNotificacionesOrganizacion.no_leidas), 0),
+        )
+        if scope_id is not None:
+            query = query.where(ContadorNotificacionesOrganizacion.organizacion_id == scope_id)
+    fila = db.execute(query).first()
+    return (fila[0], fila[1]) if fila is not None else (0, 0)
 
 
 def listar_notificaciones_usuario(
@@ -311,9 +455,7 @@ def listar_notificaciones_usuario(
     limit: int = 50,
 ) -> NotificacionListResponse:
     query = _query_scoped(current_user, organizacion_id)
-    total = db.scalar(select(func.count()).select_from(query.subquery())) or 0
-    unread_query = query.where(Notificacion.leida.is_(False))
-    no_leidas = db.scalar(select(func.count()).select_from(unread_query.subquery())) or 0
+    total, no_leidas = _contadores_scoped(current_user, db, organizacion_id)
     items = db.scalars(query.order_by(Notificacion.fecha_creacion.desc()).offset(skip).limit(limit)).all()
     return NotificacionListResponse(
         items=[NotificacionResponse.model_validate(item) for item in items],
@@ -354,9 +496,16 @@ def marcar_como_leida(
     db: Session,
 ) -> NotificacionResponse:
     notificacion = _get_notificacion_scoped(notificacion_id, current_user, db)
-    notificacion.leida = datos.leida
-    notificacion.fecha_lectura = _now() if datos.leida else None
-    db.add(notificacion)
+    # Condicional sobre ``leida``: si otra lectura gano la carrera, el contador no se ajusta dos veces.
+    cambio = db.execute(
+        update(Notificacion)
+        .where(Notificacion.id == notificacion.id, Notificacion.leida != datos.leida)
+        .values(leida=datos.leida, fecha_lectura=_now() if datos.leida else None)
+        .execution_options(synchronize_session=False)
+    )
+    if cambio.rowcount:
+        delta = -1 if datos.leida else 1
+        ajustar_no_leidas(db, {(notificacion.organizacion_id, notificacion.usuario_id): delta})
     db.commit()
     db.refresh(notificacion)
     _audit(
@@ -370,13 +519,33 @@ def marcar_como_leida(
     return NotificacionResponse.model_validate(notificacion)
 
 
+def _marcadas_por_destinatario(marcar: Any) -> Any:
+    """Agrupa en SQL las filas que devuelve ``marcar`` (un ``UPDATE ... RETURNING``) por organizacion y usuario."""
+    marcadas = marcar.cte("marcadas")
+    return select(marcadas.c.organizacion_id, marcadas.c.usuario_id, func.count()).group_by(
+        marcadas.c.organizacion_id, marcadas.c.usuario_id
+    )
+
+
 def marcar_todas_como_leidas(current_user: DatosUsuarioToken, db: Session) -> int:
-    query = _query_scoped(current_user).where(Notificacion.leida.is_(False))
-    notificaciones = db.scalars(query).all()
-    for notificacion in notificaciones:
-        notificacion.leida = True
-        notificacion.fecha_lectura = _now()
-        db.add(notificacion)
+    marcar = (
+        update(Notificacion)
+        .where(*_filtros_scoped(current_user), Notificacion.leida.is_(False))
+        .values(leida=True, fecha_lectura=_now())
+        .returning(Notificacion.organizacion_id, Notificacion.usuario_id)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        filas = db.execute(_marcadas_por_destinatario(marcar)).all()
+    else:
+        # SQLite no admite UPDATE dentro de WITH: se agrupa lo que devuelve el RETURNING.
+        devueltas = Counter(tuple(fila) for fila in db.execute(marcar.execution_options(synchronize_session=False)))
+        filas = [(*destinatario, marcadas) for destinatario, marcadas in devueltas.items()]
+    cantidad = 0
+    deltas: dict[tuple[UUID, UUID | None], int] = {}
+    for organizacion_id, usuario_id, marcadas in filas:
+        cantidad += marcadas
+        deltas[(organizacion_id, usuario_id)] = -marcadas
+    ajustar_no_leidas(db, deltas)
     db.commit()
     _audit(
         db,
@@ -384,14 +553,13 @@ def marcar_todas_como_leidas(current_user: DatosUsuarioToken, db: Session) -> in
         mensaje="Notificaciones marcadas como leidas.",
         actor_usuario_id=current_user.id,
         organizacion_id=current_user.organizacion_id,
-        metadata={"cantidad": len(notificaciones)},
+        metadata={"cantidad": cantidad},
     )
-    return len(notificaciones)
+    return cantidad
 
 
 def contar_no_leidas(current_user: DatosUsuarioToken, db: Session) -> int:
-    query = _query_scoped(current_user).where(Notificacion.leida.is_(False))
-    return db.scalar(select(func.count()).select_from(query.subquery())) or 0
+    return _contadores_scoped(current_user, db)[1]
 
 
 def registrar_envio_exitoso(notificacion_id: UUID, db: Session) -> None:
@@ -511,39 +679,30 @@ def notificar_wallet_organizacion_creada(
         organizacion = db.get(Organizacion, wallet.organizacion_id)
         if organizacion is None:
             return
-        usuarios = _usuarios_owner_admin(db, wallet.organizacion_id)
         metadata = {
             "wallet_id": wallet.id,
             "moneda": wallet.moneda.value,
             "owner_type": wallet.owner_type.value,
         }
-        if not usuarios:
-            crear_notificacion_y_email(
-                organizacion=organizacion,
-                usuario=None,
-                tipo=TipoNotificacion.wallet_organizacion_creada,
-                titulo="Wallet de organizacion creada",
-                mensaje=f"Se creo la wallet {wallet.alias or wallet.id} en {wallet.moneda.value}.",
-                template_name="wallet_creada.html",
-                metadata=metadata,
-                db=db,
-                background_tasks=background_tasks,
-                actor_usuario_id=actor_usuario_id,
-            )
-            return
-        for usuario in usuarios:
-            crear_notificacion_y_email(
-                organizacion=organizacion,
-                usuario=usuario,
-                tipo=TipoNotificacion.wallet_organizacion_creada,
-                titulo="Wallet de organizacion creada",
-                mensaje=f"Se creo la wallet {wallet.alias or wallet.id} en {wallet.moneda.value}.",
-                template_name="wallet_creada.html",
-                metadata=metadata,
-                db=db,
-                background_tasks=background_tasks,
-                actor_usuario_id=actor_usuario_id,
-            )
+        # Sin owners ni admins queda una notificacion para la organizacion, sin email.
+        usuarios: list[Usuario | None] = list(_usuarios_owner_admin(db, wallet.organizacion_id)) or [None]
+        crear_notificaciones(
+            [
+                EnvioNotificacion(
+                    usuario=usuario,
+                    tipo=TipoNotificacion.wallet_organizacion_creada,
+                    titulo="Wallet de organizacion creada",
+                    mensaje=f"Se creo la wallet {wallet.alias or wallet.id} en {wallet.moneda.value}.",
+                    template_name="wallet_creada.html",
+                    metadata=metadata,
+                )
+                for usuario in usuarios
+            ],
+            organizacion=organizacion,
+            db=db,
+            background_tasks=background_tasks,
+            actor_usuario_id=actor_usuario_id,
+        )
 
     _safe_event(_run)
 
@@ -579,29 +738,40 @@ def notificar_wallet_congelada(
     _safe_event(_run)
 
 
-def _usuarios_para_movimiento(movimiento: MovimientoResponse, db: Session) -> list[Usuario]:
-    origen = db.get(Wallet, movimiento.wallet_origen_id) if movimiento.wallet_origen_id is not None else None
-    destino = db.get(Wallet, movimiento.wallet_destino_id) if movimiento.wallet_destino_id is not None else None
-    usuarios: list[Usuario] = []
+def _wallets(db: Session, *wallet_ids: UUID | None) -> dict[UUID, Wallet]:
+    ids = {wallet_id for wallet_id in wallet_ids if wallet_id is not None}
+    if not ids:
+        return {}
+    return {wallet.id: wallet for wallet in db.scalars(select(Wallet).where(Wallet.id.in_(ids))).all()}
 
-    def add_wallet_owner(wallet: Wallet | None) -> None:
-        if wallet is None or wallet.usuario_id is None:
-            return
-        usuario = db.get(Usuario, wallet.usuario_id)
-        if usuario is not None and all(existing.id != usuario.id for existing in usuarios):
-            usuarios.append(usuario)
+
+def _usuarios_por_id(db: Session, usuario_ids: Sequence[UUID]) -> list[Usuario]:
+    """Usuarios en el orden pedido, sin repetir, con una sola consulta ``IN``."""
+    ids = list(dict.fromkeys(usuario_ids))
+    if not ids:
+        return []
+    usuarios = {usuario.id: usuario for usuario in db.scalars(select(Usuario).where(Usuario.id.in_(ids))).all()}
+    return [usuarios[usuario_id] for usuario_id in ids if usuario_id in usuarios]
+
+
+def _usuarios_para_movimiento(movimiento: MovimientoResponse, db: Session) -> list[Usuario]:
+    wallets = _wallets(db, movimiento.wallet_origen_id, movimiento.wallet_destino_id)
+    origen = wallets.get(movimiento.wallet_origen_id) if movimiento.wallet_origen_id is not None else None
+    destino = wallets.get(movimiento.wallet_destino_id) if movimiento.wallet_destino_id is not None else None
 
     if movimiento.tipo in {TipoMovimiento.deposito, TipoMovimiento.cashback, TipoMovimiento.credito_tienda}:
-        add_wallet_owner(destino)
+        afectadas = [destino]
     elif movimiento.tipo == TipoMovimiento.retiro:
-        add_wallet_owner(origen)
+        afectadas = [origen]
     elif movimiento.tipo == TipoMovimiento.ajuste_admin:
         operation = (movimiento.metadata_movimiento or {}).get("operacion")
-        add_wallet_owner(origen if operation == "debito" else destino)
+        afectadas = [origen if operation == "debito" else destino]
     else:
-        for wallet in (origen, destino):
-            add_wallet_owner(wallet)
-    return usuarios
+        afectadas = [origen, destino]
+    return _usuarios_por_id(
+        db,
+        [wallet.usuario_id for wallet in afectadas if wallet is not None and wallet.usuario_id is not None],
+    )
 
 
 def _texto_movimiento(movimiento: MovimientoResponse) -> tuple[str, str]:
@@ -648,19 +818,23 @@ def notificar_movimiento(
             metadata["wallet_origen_id"] = movimiento.wallet_origen_id
         if movimiento.wallet_destino_id is not None:
             metadata["wallet_destino_id"] = movimiento.wallet_destino_id
-        for usuario in _usuarios_para_movimiento(movimiento, db):
-            crear_notificacion_y_email(
-                organizacion=organizacion,
-                usuario=usuario,
-                tipo=tipo,
-                titulo=titulo,
-                mensaje=mensaje,
-                template_name="movimiento.html",
-                metadata=metadata,
-                db=db,
-                background_tasks=background_tasks,
-                actor_usuario_id=actor_usuario_id,
-            )
+        crear_notificaciones(
+            [
+                EnvioNotificacion(
+                    usuario=usuario,
+                    tipo=tipo,
+                    titulo=titulo,
+                    mensaje=mensaje,
+                    template_name="movimiento.html",
+                    metadata=metadata,
+                )
+                for usuario in _usuarios_para_movimiento(movimiento, db)
+            ],
+            organizacion=organizacion,
+            db=db,
+            background_tasks=background_tasks,
+            actor_usuario_id=actor_usuario_id,
+        )
 
     _safe_event(_run)
 
@@ -674,8 +848,9 @@ def notificar_pago_organizacion(
 ) -> None:
     def _run() -> None:
         organizacion = db.get(Organizacion, movimiento.organizacion_id)
-        origen = db.get(Wallet, movimiento.wallet_origen_id) if movimiento.wallet_origen_id is not None else None
-        destino = db.get(Wallet, movimiento.wallet_destino_id) if movimiento.wallet_destino_id is not None else None
+        wallets = _wallets(db, movimiento.wallet_origen_id, movimiento.wallet_destino_id)
+        origen = wallets.get(movimiento.wallet_origen_id) if movimiento.wallet_origen_id is not None else None
+        destino = wallets.get(movimiento.wallet_destino_id) if movimiento.wallet_destino_id is not None else None
         if organizacion is None or origen is None or destino is None:
             return
 
@@ -687,36 +862,44 @@ def notificar_pago_organizacion(
             "wallet_origen_id": movimiento.wallet_origen_id,
             "wallet_destino_id": movimiento.wallet_destino_id,
         }
-        if origen.usuario_id is not None:
-            pagador = db.get(Usuario, origen.usuario_id)
-            if pagador is not None:
-                crear_notificacion_y_email(
-                    organizacion=organizacion,
-                    usuario=pagador,
-                    tipo=TipoNotificacion.pago_organizacion_realizado,
-                    titulo="Pago realizado",
-                    mensaje=f"Se registro tu pago a la organizacion por {movimiento.monto}.",
-                    template_name="movimiento.html",
-                    metadata=metadata,
-                    db=db,
-                    background_tasks=background_tasks,
-                    actor_usuario_id=actor_usuario_id,
-                )
-
-        usuarios = _usuarios_owner_admin(db, movimiento.organizacion_id)
-        for usuario in usuarios:
-            crear_notificacion_y_email(
-                organizacion=organizacion,
+        # Pagador y owners/admins en una sola consulta.
+        condicion_admins = (Usuario.organizacion_id == movimiento.organizacion_id) & Usuario.rol.in_(
+            (RolUsuario.owner, RolUsuario.admin)
+        )
+        condicion = or_(Usuario.id == origen.usuario_id, condicion_admins) if origen.usuario_id else condicion_admins
+        usuarios = db.scalars(select(Usuario).where(condicion)).all()
+        envios: list[EnvioNotificacion] = [
+            EnvioNotificacion(
+                usuario=usuario,
+                tipo=TipoNotificacion.pago_organizacion_realizado,
+                titulo="Pago realizado",
+                mensaje=f"Se registro tu pago a la organizacion por {movimiento.monto}.",
+                template_name="movimiento.html",
+                metadata=metadata,
+            )
+            for usuario in usuarios
+            if usuario.id == origen.usuario_id
+        ]
+        envios.extend(
+            EnvioNotificacion(
                 usuario=usuario,
                 tipo=TipoNotificacion.pago_organizacion_recibido,
                 titulo="Pago recibido",
                 mensaje=f"La organizacion recibio un pago por {movimiento.monto}.",
                 template_name="movimiento.html",
                 metadata=metadata,
-                db=db,
-                background_tasks=background_tasks,
-                actor_usuario_id=actor_usuario_id,
             )
+            for usuario in usuarios
+            if usuario.organizacion_id == movimiento.organizacion_id
+            and usuario.rol in (RolUsuario.owner, RolUsuario.admin)
+        )
+        crear_notificaciones(
+            envios,
+            organizacion=organizacion,
+            db=db,
+            background_tasks=background_tasks,
+            actor_usuario_id=actor_usuario_id,
+        )
 
     _safe_event(_run)
 
@@ -732,24 +915,22 @@ def notificar_organizacion_suspendida(
         organizacion = db.get(Organizacion, organizacion_id)
         if organizacion is None or organizacion.estado != EstadoOrganizacion.suspendida:
             return
-        usuarios = db.scalars(
-            select(Usuario).where(
-                Usuario.organizacion_id == organizacion.id,
-                or_(Usuario.rol == RolUsuario.owner, Usuario.rol == RolUsuario.admin),
-            )
-        ).all()
-        for usuario in usuarios:
-            crear_notificacion_y_email(
-                organizacion=organizacion,
-                usuario=usuario,
-                tipo=TipoNotificacion.organizacion_suspendida,
-                titulo="Organizacion suspendida",
-                mensaje="La organizacion fue suspendida. Contacta a soporte para revisar el estado.",
-                template_name="organizacion_suspendida.html",
-                metadata={"organizacion_id": organizacion.id},
-                db=db,
-                background_tasks=background_tasks,
-                actor_usuario_id=actor_usuario_id,
-            )
+        crear_notificaciones(
+            [
+                EnvioNotificacion(
+                    usuario=usuario,
+                    tipo=TipoNotificacion.organizacion_suspendida,
+                    titulo="Organizacion suspendida",
+                    mensaje="La organizacion fue suspendida. Contacta a soporte para revisar el estado.",
+                    template_name="organizacion_suspendida.html",
+                    metadata={"organizacion_id": organizacion.id},
+                )
+                for usuario in _usuarios_owner_admin(db, organizacion.id)
+            ],
+            organizacion=organizacion,
+            db=db,
+            background_tasks=background_tasks,
+            actor_usuario_id=actor_usuario_id,
+        )
 
     _safe_event(_run)
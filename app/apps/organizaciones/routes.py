@@ -123,7 +123,7 @@ def patch_organizacion(
         encolar_webhook_evento(
             evento="organizacion.suspendida",
             organizacion_id=organizacion.id,
-            data=organizacion.model_dump(mode="json"),
+            data=lambda: organizacion.model_dump(mode="json"),
             db=db,
             background_tasks=background_tasks,
         )
@@ -20,26 +20,60 @@ def validar_limite_usuarios(db: Session, organizacion_id: UUID) -> None:
     plan = _plan_for_organization(db, organizacion_id)
     if plan.limite_usuarios is None:
         return
-    total = db.scalar(select(func.count()).select_from(Usuario).where(Usuario.organizacion_id == organizacion_id)) or 0
-    _raise_if_limit_reached(total, plan.limite_usuarios, "usuarios", plan.codigo)
+    _raise_if_limit_reached(_usuarios(db, organizacion_id), plan.limite_usuarios, "usuarios", plan.codigo)
 
 
 def validar_limite_wallets(db: Session, organizacion_id: UUID) -> None:
     plan = _plan_for_organization(db, organizacion_id)
     if plan.limite_wallets is None:
         return
-    total = db.scalar(select(func.count()).select_from(Wallet).where(Wallet.organizacion_id == organizacion_id)) or 0
-    _raise_if_limit_reached(total, plan.limite_wallets, "wallets", plan.codigo)
+    _raise_if_limit_reached(_wallets(db, organizacion_id), plan.limite_wallets, "wallets", plan.codigo)
+
+
+def cupo_usuarios(db: Session, organizacion_id: UUID) -> int | None:
+    """Usuarios que el plan admite aun; ``None`` si no tiene limite."""
+    plan = _plan_for_organization(db, organizacion_id)
+    if plan.limite_usuarios is None:
+        return None
+    return max(plan.limite_usuarios - _usuarios(db, organizacion_id), 0)
+
+
+def cupo_wallets(db: Session, organizacion_id: UUID) -> int | None:
+    """Wallets que el plan admite aun; ``None`` si no tiene limite."""
+    plan = _plan_for_organization(db, organizacion_id)
+    if plan.limite_wallets is None:
+        return None
+    return max(plan.limite_wallets - _wallets(db, organizacion_id), 0)
+
+
+def _usuarios(db: Session, organizacion_id: UUID) -> int:
+    return db.scalar(select(func.count()).select_from(Usuario).where(Usuario.organizacion_id == organizacion_id)) or 0
+
+
+def _wallets(db: Session, organizacion_id: UUID) -> int:
+    return db.scalar(select(func.count()).select_from(Wallet).where(Wallet.organizacion_id == organizacion_id)) or 0
 
 
 def validar_limite_movimientos_mes(db: Session, organizacion_id: UUID) -> None:
     plan = _plan_for_organization(db, organizacion_id)
     if plan.limite_movimientos_mes is None:
         return
+    total = _movimientos_aprobados_mes(db, organizacion_id)
+    _raise_if_limit_reached(total, plan.limite_movimientos_mes, "movimientos mensuales", plan.codigo)
 
+
+def cupo_movimientos_mes(db: Session, organizacion_id: UUID) -> int | None:
+    """Movimientos aprobados que el plan admite aun este mes; ``None`` si no tiene limite."""
+    plan = _plan_for_organization(db, organizacion_id)
+    if plan.limite_movimientos_mes is None:
+        return None
+    return max(plan.limite_movimientos_mes - _movimientos_aprobados_mes(db, organizacion_id), 0)
+
+
+def _movimientos_aprobados_mes(db: Session, organizacion_id: UUID) -> int:
     now = datetime.now(timezone.utc)
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    total = (
+    return (
         db.scalar(
             select(func.count())
             .select_from(Movimiento)
@@ -51,7 +85,6 @@ def validar_limite_movimientos_mes(db: Session, organizacion_id: UUID) -> None:
         )
         or 0
     )
-    _raise_if_limit_reached(total, plan.limite_movimientos_mes, "movimientos mensuales", plan.codigo)
 
 
 def _plan_for_organization(db: Session, organizacion_id: UUID) -> Plan:
@@ -21,6 +21,7 @@ class Plan(Base):
     limite_usuarios: Mapped[int | None] = mapped_column(Integer)
     limite_wallets: Mapped[int | None] = mapped_column(Integer)
     limite_movimientos_mes: Mapped[int | None] = mapped_column(Integer)
+    limite_requests_minuto: Mapped[int | None] = mapped_column(Integer)
     permite_webhooks: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     permite_white_label: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     activo: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
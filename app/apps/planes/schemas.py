@@ -31,6 +31,7 @@ class PlanBase(BaseModel):
     limite_usuarios: int | None = None
     limite_wallets: int | None = None
     limite_movimientos_mes: int | None = None
+    limite_requests_minuto: int | None = None
     permite_webhooks: bool = False
     permite_white_label: bool = False
     activo: bool = True
@@ -52,7 +53,7 @@ class PlanBase(BaseModel):
     def validate_price(cls, value: Any) -> Decimal:
         return _normalize_price(value)
 
-    @field_validator("limite_usuarios", "limite_wallets", "limite_movimientos_mes")
+    @field_validator("limite_usuarios", "limite_wallets", "limite_movimientos_mes", "limite_requests_minuto")
     @classmethod
     def validate_limits(cls, value: int | None) -> int | None:
         return _validate_limit(value)
@@ -70,6 +71,7 @@ class PlanUpdate(BaseModel):
     limite_usuarios: int | None = None
     limite_wallets: int | None = None
     limite_movimientos_mes: int | None = None
+    limite_requests_minuto: int | None = None
     permite_webhooks: bool | None = None
     permite_white_label: bool | None = None
     activo: bool | None = None
@@ -93,7 +95,7 @@ class PlanUpdate(BaseModel):
             return None
         return _normalize_price(value)
 
-    @field_validator("limite_usuarios", "limite_wallets", "limite_movimientos_mes")
+    @field_validator("limite_usuarios", "limite_wallets", "limite_movimientos_mes", "limite_requests_minuto")
     @classmethod
     def validate_optional_limits(cls, value: int | None) -> int | None:
         return _validate_limit(value)
@@ -110,6 +112,7 @@ class PlanResponse(BaseModel):
     limite_usuarios: int | None = None
     limite_wallets: int | None = None
     limite_movimientos_mes: int | None = None
+    limite_requests_minuto: int | None = None
     permite_webhooks: bool
     permite_white_label: bool
     activo: bool
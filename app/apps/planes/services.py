@@ -30,6 +30,7 @@ BASE_PLANS: tuple[dict[str, object], ...] = (
         "limite_usuarios": 10,
         "limite_wallets": 3,
         "limite_movimientos_mes": 100,
+        "limite_requests_minuto": 60,
         "permite_webhooks": False,
         "permite_white_label": False,
     },
@@ -40,6 +41,7 @@ BASE_PLANS: tuple[dict[str, object], ...] = (
         "limite_usuarios": 100,
         "limite_wallets": 50,
         "limite_movimientos_mes": 2000,
+        "limite_requests_minuto": 300,
         "permite_webhooks": False,
         "permite_white_label": False,
     },
@@ -50,6 +52,7 @@ BASE_PLANS: tuple[dict[str, object], ...] = (
         "limite_usuarios": 1000,
         "limite_wallets": None,
         "limite_movimientos_mes": 50000,
+        "limite_requests_minuto": 1200,
         "permite_webhooks": True,
         "permite_white_label": True,
     },
@@ -60,6 +63,7 @@ BASE_PLANS: tuple[dict[str, object], ...] = (
         "limite_usuarios": None,
         "limite_wallets": None,
         "limite_movimientos_mes": None,
+        "limite_requests_minuto": None,
         "permite_webhooks": True,
         "permite_white_label": True,
     },
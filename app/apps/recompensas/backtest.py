@@ -0,0 +1,270 @@
+"""Backtest de reglas de recompensa borrador contra las ordenes ecommerce historicas de una organizacion.
+
+Reproduce cada ``EcommerceOrderEvent`` (monto, fecha de recepcion y cliente) contra reglas que todavia
+no existen y proyecta recompensas, pasivo por moneda y tasa de aplicacion de cada regla sin tocar
+wallets. Las reglas se eligen como en produccion: la primera regla, en el orden del borrador, vigente a
+la fecha de la orden que alcanza el minimo y genera recompensa positiva.
+
+Las ordenes se leen en tramos de ``RECOMPENSAS_BACKTEST_CHUNK_SIZE`` filas (``yield_per``, cursor del
+lado del servidor en PostgreSQL), cada tramo se evalua en un pool de procesos y los agregados parciales
+se combinan al terminar cada tramo. Con un solo proceso se evalua en linea.
+
+Uso: ``python -m app.apps.recompensas.backtest --organizacion-id ... --reglas borradores.json``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Sequence
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.apps.ecommerce.models import EcommerceOrderEvent
+from app.apps.recompensas.models import ReglaRecompensa
+from app.apps.recompensas.motor import ReglaCompilada, a_centavos, a_microsegundos, compilar_regla, desde_centavos
+from app.apps.recompensas.schemas import (
+    BacktestPasivo,
+    BacktestReglaResumen,
+    BacktestReglasRequest,
+    BacktestReglasResponse,
+    ReglaRecompensaCreate,
+)
+from app.core import database as database_module
+from app.core.config import settings
+from app.core.logging import configure_logging
+from app.shared.enums import EstadoReglaRecompensa, MonedaRecompensa
+from app.shared.utils import normalize_decimal
+
+
+Fila = tuple[Decimal, datetime, str]
+
+
+@dataclass
+class _ParcialRegla:
+    elegibles: int = 0
+    aplicadas: int = 0
+    con_tope: int = 0
+    monto_compra: int = 0
+    recompensa: int = 0
+    clientes: set[str] = field(default_factory=set)
+
+    def combinar(self, otro: _ParcialRegla) -> None:
+        self.elegibles += otro.elegibles
+        self.aplicadas += otro.aplicadas
+        self.con_tope += otro.con_tope
+        self.monto_compra += otro.monto_compra
+        self.recompensa += otro.recompensa
+        self.clientes |= otro.clientes
+
+
+@dataclass
+class _Parcial:
+    """Agregados de un tramo de ordenes; los tramos se combinan en cualquier orden."""
+
+    reglas: list[_ParcialRegla]
+    eventos: int = 0
+    con_recompensa: int = 0
+    monto_compra: int = 0
+    clientes: set[str] = field(default_factory=set)
+
+    @classmethod
+    def vacio(cls, cantidad_reglas: int) -> _Parcial:
+        return cls(reglas=[_ParcialRegla() for _ in range(cantidad_reglas)])
+
+    def combinar(self, otro: _Parcial) -> None:
+        self.eventos += otro.eventos
+        self.con_recompensa += otro.con_recompensa
+        self.monto_compra += otro.monto_compra
+        self.clientes |= otro.clientes
+        for propia, ajena in zip(self.reglas, otro.reglas):
+            propia.combinar(ajena)
+
+
+def compilar_borradores(borradores: Sequence[ReglaRecompensaCreate]) -> tuple[ReglaCompilada | None, ...]:
+    """Compila los borradores en orden; ``None`` marca un borrador que nunca genera recompensa."""
+    return tuple(
+        compilar_regla(
+            ReglaRecompensa(id=uuid4(), estado=EstadoReglaRecompensa.activa, **borrador.model_dump()),
+            prioridad,
+        )
+        for prioridad, borrador in enumerate(borradores)
+    )
+
+
+def evaluar_tramo(reglas: tuple[ReglaCompilada | None, ...], filas: Sequence[Fila]) -> _Parcial:
+    """Evalua un tramo de ordenes; corre en los procesos del pool, sin sesion de base de datos."""
+    parcial = _Parcial.vacio(len(reglas))
+    for amount, fecha_creacion, email in filas:
+        monto = a_centavos(normalize_decimal(amount))
+        fecha = a_microsegundos(fecha_creacion)
+        parcial.eventos += 1
+        parcial.monto_compra += monto
+        parcial.clientes.add(email)
+        aplicada = False
+        for regla, acumulado in zip(reglas, parcial.reglas):
+            if regla is None or monto < regla.minimo_centavos or not regla.vigente(fecha):
+                continue
+            acumulado.elegibles += 1
+            if aplicada:
+                continue
+            aplicada = True
+            recompensa = regla.recompensa_bruta_centavos(monto)
+            if regla.maximo_centavos is not None and recompensa > regla.maximo_centavos:
+                acumulado.con_tope += 1
+                recompensa = regla.maximo_centavos
+            acumulado.aplicadas += 1
+            acumulado.monto_compra += monto
+            acumulado.recompensa += recompensa
+            acumulado.clientes.add(email)
+        parcial.con_recompensa += aplicada
+    return parcial
+
+
+def _consulta_eventos(organizacion_id: UUID, datos: BacktestReglasRequest):
+    consulta = select(
+        EcommerceOrderEvent.amount,
+        EcommerceOrderEvent.fecha_creacion,
+        EcommerceOrderEvent.customer_email,
+    ).where(EcommerceOrderEvent.organizacion_id == organizacion_id, EcommerceOrderEvent.status == "paid")
+    if datos.desde is not None:
+        consulta = consulta.where(EcommerceOrderEvent.fecha_creacion >= datos.desde)
+    if datos.hasta is not None:
+        consulta = consulta.where(EcommerceOrderEvent.fecha_creacion < datos.hasta)
+    return consulta
+
+
+def ejecutar_backtest(
+    db: Session,
+    organizacion_id: UUID,
+    datos: BacktestReglasRequest,
+    *,
+    procesos: int | None = None,
+    tamano_tramo: int | None = None,
+) -> BacktestReglasResponse:
+    procesos = procesos or settings.RECOMPENSAS_BACKTEST_PROCESOS or os.cpu_count() or 1
+    tamano_tramo = tamano_tramo or settings.RECOMPENSAS_BACKTEST_CHUNK_SIZE
+    reglas = compilar_borradores(datos.reglas)
+    total = _Parcial.vacio(len(reglas))
+    tramos = 0
+    resultado = db.execute(_consulta_eventos(organizacion_id, datos).execution_options(yield_per=tamano_tramo))
+    if procesos <= 1:
+        for tramo in resultado.partitions():
+            total.combinar(evaluar_tramo(reglas, tramo))
+            tramos += 1
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            pendientes: set[Future[_Parcial]] = set()
+            for tramo in resultado.partitions():
+                # Dos tramos en vuelo por proceso: la lectura no se adelanta al computo sin limite.
+                if len(pendientes) >= procesos * 2:
+                    terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        total.combinar(futuro.result())
+                pendientes.add(executor.submit(evaluar_tramo, reglas, [tuple(fila) for fila in tramo]))
+                tramos += 1
+            for futuro in wait(pendientes).done:
+                total.combinar(futuro.result())
+    return _respuesta(organizacion_id, datos, reglas, total, tramos=tramos, procesos=procesos)
+
+
+def _porcentaje(parte: int, total: int) -> Decimal:
+    if not total:
+        return Decimal("0.00")
+    return (Decimal(parte * 100) / Decimal(total)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _respuesta(
+    organizacion_id: UUID,
+    datos: BacktestReglasRequest,
+    reglas: tuple[ReglaCompilada | None, ...],
+    total: _Parcial,
+    *,
+    tramos: int,
+    procesos: int,
+) -> BacktestReglasResponse:
+    pasivo: dict[MonedaRecompensa, tuple[int, set[str]]] = {}
+    resumenes: list[BacktestReglaResumen] = []
+    for indice, (borrador, regla, acumulado) in enumerate(zip(datos.reglas, reglas, total.reglas)):
+        if regla is not None and acumulado.aplicadas:
+            monto, clientes = pasivo.get(regla.moneda_recompensa, (0, set()))
+            pasivo[regla.moneda_recompensa] = (monto + acumulado.recompensa, clientes | acumulado.clientes)
+        resumenes.append(
+            BacktestReglaResumen(
+                indice=indice,
+                nombre=borrador.nombre,
+                tipo=borrador.tipo,
+                moneda_recompensa=borrador.moneda_recompensa,
+                compras_elegibles=acumulado.elegibles,
+                porcentaje_elegibles=_porcentaje(acumulado.elegibles, total.eventos),
+                compras_aplicadas=acumulado.aplicadas,
+                porcentaje_aplicadas=_porcentaje(acumulado.aplicadas, total.eventos),
+                compras_con_tope=acumulado.con_tope,
+                clientes=len(acumulado.clientes),
+                monto_compra_total=desde_centavos(acumulado.monto_compra),
+                monto_recompensa_total=desde_centavos(acumulado.recompensa),
+                recompensa_promedio=(
+                    desde_centavos(acumulado.recompensa) / acumulado.aplicadas
+                ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+                if acumulado.aplicadas
+                else None,
+            )
+        )
+    return BacktestReglasResponse(
+        organizacion_id=organizacion_id,
+        desde=datos.desde,
+        hasta=datos.hasta,
+        eventos=total.eventos,
+        clientes=len(total.clientes),
+        monto_compra_total=desde_centavos(total.monto_compra),
+        compras_con_recompensa=total.con_recompensa,
+        compras_sin_recompensa=total.eventos - total.con_recompensa,
+        pasivo=[
+            BacktestPasivo(moneda_recompensa=moneda, monto_total=desde_centavos(monto), clientes=len(clientes))
+            for moneda, (monto, clientes) in pasivo.items()
+        ],
+        reglas=resumenes,
+        tramos=tramos,
+        procesos=procesos,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest de reglas de recompensa borrador sobre ordenes ecommerce.")
+    parser.add_argument("--organizacion-id", type=UUID, required=True, help="Organizacion cuyas ordenes se reproducen.")
+    parser.add_argument(
+        "--reglas",
+        type=Path,
+        required=True,
+        help="JSON con la lista de reglas borrador (mismo formato que POST /recompensas/reglas).",
+    )
+    parser.add_argument("--desde", type=datetime.fromisoformat, default=None, help="Fecha ISO inicial (incluida).")
+    parser.add_argument("--hasta", type=datetime.fromisoformat, default=None, help="Fecha ISO final (excluida).")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool (1 evalua en linea).")
+    parser.add_argument("--tamano-tramo", type=int, default=None, help="Ordenes leidas y evaluadas por tramo.")
+    args = parser.parse_args()
+
+    configure_logging()
+    datos = BacktestReglasRequest.model_validate(
+        {"reglas": json.loads(args.reglas.read_text(encoding="utf-8")), "desde": args.desde, "hasta": args.hasta}
+    )
+    with database_module.SessionLocal() as db:
+        resultado = ejecutar_backtest(
+            db,
+            args.organizacion_id,
+            datos,
+            procesos=args.procesos,
+            tamano_tramo=args.tamano_tramo,
+        )
+    print(resultado.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""Aplicacion masiva de recompensas desde archivos de compras (CSV, NDJSON o arreglo JSON).
+
+Cada tramo de ``RECOMPENSAS_LOTE_CHUNK_SIZE`` compras es una transaccion: las wallets del tramo se
+bloquean una sola vez en orden de id, las referencias ya aplicadas se buscan con una sola consulta
+(``uq_aplicaciones_recompensa_org_referencia``), las reglas se eligen en memoria y los movimientos,
+aplicaciones, notificaciones y auditorias se escriben con un solo flush. Los movimientos pasan por el
+ORM para que el change-log de movimientos siga registrando cada alta.
+
+La ``referencia_externa`` es obligatoria: reprocesar el mismo archivo informa como ``duplicada`` cada
+compra ya aplicada, asi un lote cortado a mitad de camino se retoma sin acreditar dos veces.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, NamedTuple
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.apps.auditoria.models import AuditLog
+from app.apps.auth.schemas import DatosUsuarioToken
+from app.apps.integraciones.models import WebhookDelivery
+from app.apps.integraciones.webhook_dispatcher import agregar_webhook_evento_lote
+from app.apps.movimientos.models import Movimiento
+from app.apps.movimientos.schemas import MovimientoResponse
+from app.apps.notificaciones.contadores import sumar_notificaciones
+from app.apps.notificaciones.models import Notificacion
+from app.apps.notificaciones.schemas import NotificacionResponse
+from app.apps.organizaciones.dependencies import resolve_organization_scope
+from app.apps.planes.limit_service import cupo_movimientos_mes, validar_limite_movimientos_mes
+from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa
+from app.apps.recompensas.motor import a_centavos, a_microsegundos, reglas_organizacion
+from app.apps.recompensas.permissions import ensure_can_apply_rewards
+from app.apps.recompensas.schemas import (
+    AplicacionRecompensaLoteItemResultado,
+    AplicacionRecompensaResponse,
+    AplicarRecompensaLoteResponse,
+    AplicarRecompensaRequest,
+    AplicarRecompensaResponse,
+)
+from app.apps.recompensas.services import (
+    _amount,
+    _ensure_reward_wallet,
+    _evaluate_rule,
+    _json_metadata,
+    _movement_type_for_reward,
+    _now,
+    _reward_currency_to_wallet_currency,
+)
+from app.apps.recompensas.totales import acumular_totales
+from app.apps.usuarios.models import Usuario
+from app.apps.wallets.models import Wallet
+from app.core.config import settings
+from app.shared.enums import CanalNotificacion, EstadoMovimiento, TipoNotificacion
+
+
+ERROR_TRAMO = "No se pudo aplicar la recompensa."
+DUPLICADA = "Ya existe una recompensa aplicada con esa referencia externa."
+COLUMNAS_CSV = ("usuario_id", "wallet_destino_id", "monto_compra", "regla_id", "referencia_externa", "metadata")
+
+
+@dataclass
+class _Compra:
+    indice: int
+    datos: AplicarRecompensaRequest
+    resultado: AplicacionRecompensaLoteItemResultado
+
+
+class ResultadoLoteAplicaciones(NamedTuple):
+    respuesta: AplicarRecompensaLoteResponse
+    aplicadas: list[AplicarRecompensaResponse]
+    # ``notificacion.creada`` de los tramos confirmados; el llamador las agenda con ``confirmar_deliveries``.
+    deliveries: list[WebhookDelivery]
+
+
+def _filas_csv(texto: str) -> list[Any]:
+    filas: list[Any] = []
+    for fila in csv.DictReader(io.StringIO(texto)):
+        crudo = {columna: valor for columna, valor in fila.items() if columna in COLUMNAS_CSV and valor}
+        if "metadata" in crudo:
+            try:
+                crudo["metadata"] = json.loads(crudo["metadata"])
+            except ValueError:
+                filas.append(None)
+                continue
+        filas.append(crudo)
+    return filas
+
+
+def leer_aplicaciones_lote(
+    body: bytes,
+    content_type: str | None,
+    *,
+    max_items: int | None = None,
+) -> list[AplicarRecompensaRequest | str]:
+    """Parsea CSV con encabezado, NDJSON o un arreglo JSON. Cada compra invalida queda como el texto de su error."""
+    tipo = content_type or ""
+    texto = body.decode("utf-8-sig")
+    if "csv" in tipo:
+        crudos = _filas_csv(texto)
+    elif "ndjson" in tipo or "jsonl" in tipo:
+        crudos = []
+        for linea in texto.splitlines():
+            if not linea.strip():
+                continue
+            try:
+                crudos.append(json.loads(linea))
+            except ValueError:
+                crudos.append(None)
+    else:
+        try:
+            crudos = json.loads(texto or "null")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El cuerpo no es JSON valido.")
+        if not isinstance(crudos, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Se espera un arreglo de compras.")
+    if not crudos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El lote no tiene compras.")
+    max_items = settings.RECOMPENSAS_LOTE_MAX_ITEMS if max_items is None else max_items
+    if max_items > 0 and len(crudos) > max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote admite hasta {max_items} compras.",
+        )
+    compras: list[AplicarRecompensaRequest | str] = []
+    for crudo in crudos:
+        if not isinstance(crudo, dict):
+            compras.append("Compra invalida.")
+            continue
+        try:
+            compras.append(AplicarRecompensaRequest.model_validate(crudo))
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            campo = ".".join(str(parte) for parte in error["loc"])
+            compras.append(f"{campo}: {error['msg']}" if campo else error["msg"])
+    return compras
+
+
+def aplicar_recompensas_lote(
+    compras: list[AplicarRecompensaRequest | str],
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+    *,
+    desde: int = 0,
+    al_confirmar_tramo: Callable[[int], None] | None = None,
+) -> ResultadoLoteAplicaciones:
+    """Aplica las compras desde el indice ``desde`` con un commit por tramo.
+
+    ``al_confirmar_tramo`` recibe el indice de la primera compra sin procesar despues de cada tramo
+    confirmado. Desde el primer tramo que falla ya no se llama: el avance queda en ese tramo y una
+    corrida retomada lo reintenta (las compras posteriores que se aplicaron salen como duplicadas).
+    """
+    ensure_can_apply_rewards(current_user)
+    scope_id = resolve_organization_scope(current_user, organizacion_id)
+    if scope_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Debe indicar una organizacion.")
+
+    resultados: list[AplicacionRecompensaLoteItemResultado] = []
+    pendientes: list[_Compra] = []
+    vistas: set[str] = set()
+    for indice, datos in enumerate(compras):
+        if indice < desde:
+            continue
+        if isinstance(datos, str):
+            resultados.append(AplicacionRecompensaLoteItemResultado(indice=indice, status="error", error=datos))
+            continue
+        resultado = AplicacionRecompensaLoteItemResultado(
+            indice=indice,
+            referencia_externa=datos.referencia_externa,
+            status="aplicada",
+        )
+        resultados.append(resultado)
+        if not datos.referencia_externa:
+            resultado.status = "error"
+            resultado.error = "referencia_externa es obligatoria en la aplicacion en lote."
+        elif datos.referencia_externa in vistas:
+            resultado.status = "duplicada"
+            resultado.error = DUPLICADA
+        else:
+            vistas.add(datos.referencia_externa)
+            pendientes.append(_Compra(indice=indice, datos=datos, resultado=resultado))
+
+    aplicadas: list[AplicarRecompensaResponse] = []
+    deliveries: list[WebhookDelivery] = []
+    chunk_size = max(settings.RECOMPENSAS_LOTE_CHUNK_SIZE, 1)
+    avance_detenido = False
+    for inicio in range(0, len(pendientes), chunk_size):
+        tramo = pendientes[inicio : inicio + chunk_size]
+        try:
+            respuestas, deliveries_tramo = _aplicar_tramo(
+                tramo, organizacion_id=scope_id, current_user=current_user, db=db
+            )
+            aplicadas.extend(respuestas)
+            deliveries.extend(deliveries_tramo)
+        except Exception:
+            db.rollback()
+            avance_detenido = True
+            for compra in tramo:
+                if compra.resultado.status != "aplicada":
+                    continue
+                compra.resultado.status = "error"
+                compra.resultado.error = ERROR_TRAMO
+                compra.resultado.aplicacion_id = compra.resultado.movimiento_id = None
+                compra.resultado.monto_recompensa = None
+        if al_confirmar_tramo is not None and not avance_detenido:
+            fin = inicio + chunk_size
+            al_confirmar_tramo(pendientes[fin].indice if fin < len(pendientes) else len(compras))
+
+    respuesta = AplicarRecompensaLoteResponse(
+        aplicadas=sum(1 for resultado in resultados if resultado.status == "aplicada"),
+        duplicadas=sum(1 for resultado in resultados if resultado.status == "duplicada"),
+        errores=sum(1 for resultado in resultados if resultado.status == "error"),
+        resultados=resultados,
+    )
+    return ResultadoLoteAplicaciones(respuesta=respuesta, aplicadas=aplicadas, deliveries=deliveries)
+
+
+def _fallar(compra: _Compra, mensaje: str, estado: str = "error") -> None:
+    compra.resultado.status = estado
+    compra.resultado.error = mensaje
+
+
+def _aplicar_tramo(
+    tramo: list[_Compra],
+    *,
+    organizacion_id: UUID,
+    current_user: DatosUsuarioToken,
+    db: Session,
+) -> tuple[list[AplicarRecompensaResponse], list[WebhookDelivery]]:
+    # Cada wallet se bloquea una vez por tramo y en orden de id: dos lotes con wallets en comun no se traban.
+    wallets = {
+        wallet.id: wallet
+        for wallet in db.scalars(
+            select(Wallet)
+            .where(Wallet.id.in_({compra.datos.wallet_destino_id for compra in tramo}))
+            .order_by(Wallet.id)
+            .with_for_update()
+        ).all()
+    }
+    # Despues del bloqueo: un reintento concurrente sobre las mismas wallets ya ve sus aplicaciones.
+    existentes = set(
+        db.scalars(
+            select(AplicacionRecompensa.referencia_externa).where(
+                AplicacionRecompensa.organizacion_id == organizacion_id,
+                AplicacionRecompensa.referencia_externa.in_([compra.datos.referencia_externa for compra in tramo]),
+            )
+        ).all()
+    )
+    usuarios = {
+        usuario.id: usuario
+        for usuario in db.scalars(
+            select(Usuario).where(Usuario.id.in_({compra.datos.usuario_id for compra in tramo}))
+        ).all()
+    }
+    regla_ids = {compra.datos.regla_id for compra in tramo if compra.datos.regla_id is not None}
+    reglas_explicitas = (
+        {
+            regla.id: regla
+            for regla in db.scalars(
+                select(ReglaRecompensa).where(
+                    ReglaRecompensa.id.in_(regla_ids),
+                    ReglaRecompensa.organizacion_id == organizacion_id,
+                )
+            ).all()
+        }
+        if regla_ids
+        else {}
+    )
+    reglas = reglas_organizacion(db, organizacion_id)
+    now = _now()
+    now_us = a_microsegundos(now)
+    cupo = cupo_movimientos_mes(db, organizacion_id)
+    detalle_limite: str | None = None
+
+    aplicadas: list[tuple[_Compra, Movimiento, AplicacionRecompensa]] = []
+    notificaciones: list[Notificacion] = []
+    auditorias: list[AuditLog] = []
+    for compra in tramo:
+        datos = compra.datos
+        if datos.referencia_externa in existentes:
+            _fallar(compra, DUPLICADA, "duplicada")
+            continue
+        usuario = usuarios.get(datos.usuario_id)
+        wallet = wallets.get(datos.wallet_destino_id)
+        if usuario is None:
+            _fallar(compra, "Usuario no encontrado.")
+            continue
+        if wallet is None:
+            _fallar(compra, "Wallet destino no encontrada.")
+            continue
+        if usuario.organizacion_id != organizacion_id or wallet.organizacion_id != organizacion_id:
+            _fallar(compra, "No se puede operar entre organizaciones.")
+            continue
+
+        monto_compra = _amount(datos.monto_compra)
+        if datos.regla_id is not None:
+            regla = reglas_explicitas.get(datos.regla_id)
+            if regla is None:
+                _fallar(compra, "Regla de recompensa no encontrada.")
+                continue
+            simulacion = _evaluate_rule(regla, monto_compra, now=now)
+            if not simulacion.aplica:
+                _fallar(compra, simulacion.motivo)
+                continue
+            monto_recompensa = _amount(simulacion.monto_recompensa)
+        else:
+            regla = reglas.seleccionar_centavos(a_centavos(monto_compra), now_us)
+            if regla is None:
+                _fallar(compra, "No hay reglas aplicables.")
+                continue
+            monto_recompensa = regla.calcular_recompensa(monto_compra)
+        try:
+            _ensure_reward_wallet(wallet, usuario.id, regla.moneda_recompensa)
+        except HTTPException as exc:
+            _fallar(compra, str(exc.detail))
+            continue
+        if cupo is not None:
+            if cupo <= 0:
+                if detalle_limite is None:
+                    try:
+                        validar_limite_movimientos_mes(db, organizacion_id)
+                    except HTTPException as exc:
+                        detalle_limite = str(exc.detail)
+                _fallar(compra, detalle_limite or "Limite del plan alcanzado.")
+                continue
+            cupo -= 1
+
+        wallet.saldo = _amount(wallet.saldo) + monto_recompensa
+        movimiento = Movimiento(
+            id=uuid4(),
+            wallet_origen_id=None,
+            wallet_destino_id=wallet.id,
+            organizacion_id=organizacion_id,
+            monto=monto_recompensa,
+            moneda=_reward_currency_to_wallet_currency(regla.moneda_recompensa),
+            tipo=_movement_type_for_reward(regla.tipo),
+            estado=EstadoMovimiento.aprobada,
+            descripcion=f"Recompensa aplicada: {regla.nombre}",
+            referencia_externa=datos.referencia_externa,
+            metadata_movimiento=_json_metadata(
+                {
+                    **(datos.metadata or {}),
+                    "regla_id": regla.id,
+                    "tipo_recompensa": regla.tipo.value,
+                    "moneda_recompensa": regla.moneda_recompensa.value,
+                    "monto_compra": str(monto_compra),
+                }
+            ),
+            es_reversa=False,
+        )
+        aplicacion = AplicacionRecompensa(
+            id=uuid4(),
+            organizacion_id=organizacion_id,
+            regla_id=regla.id,
+            usuario_id=usuario.id,
+            wallet_destino_id=wallet.id,
+            movimiento_id=movimiento.id,
+            monto_compra=monto_compra,
+            monto_recompensa=monto_recompensa,
+            moneda_recompensa=regla.moneda_recompensa,
+            referencia_externa=datos.referencia_externa,
+            metadata_aplicacion=_json_metadata(datos.metadata),
+        )
+        existentes.add(datos.referencia_externa)
+        aplicadas.append((compra, movimiento, aplicacion))
+        metadata = {
+            "aplicacion_id": aplicacion.id,
+            "movimiento_id": movimiento.id,
+            "regla_id": regla.id,
+            "tipo_recompensa": regla.tipo.value,
+            "monto_compra": str(monto_compra),
+            "monto_recompensa": str(monto_recompensa),
+            "moneda_recompensa": regla.moneda_recompensa.value,
+        }
+        notificacion = Notificacion(
+            id=uuid4(),
+            organizacion_id=organizacion_id,
+            usuario_id=usuario.id,
+            tipo=TipoNotificacion.recompensa_aplicada,
+            canal=CanalNotificacion.interna,
+            titulo="Recompensa acreditada",
+            mensaje=f"Recibiste {monto_recompensa} {regla.moneda_recompensa.value} en tu wallet.",
+            metadata_notificacion=_json_metadata(metadata),
+        )
+        notificaciones.append(notificacion)
+        auditorias.append(
+            AuditLog(
+                evento="notificacion_creada",
+                mensaje=f"Notificacion {notificacion.tipo.value} creada.",
+                nivel="INFO",
+                actor_tipo="usuario",
+                actor_usuario_id=current_user.id,
+                organizacion_id=organizacion_id,
+                metadata_log={"notificacion_id": str(notificacion.id), "canal": notificacion.canal.value},
+            )
+        )
+        auditorias.append(
+            AuditLog(
+                evento="recompensa_aplicada",
+                mensaje="Recompensa aplicada.",
+                nivel="INFO",
+                actor_tipo="usuario",
+                actor_usuario_id=current_user.id,
+                organizacion_id=organizacion_id,
+                metadata_log=_json_metadata(
+                    {**metadata, "wallet_destino_id": wallet.id, "usuario_id": usuario.id, "lote": True}
+                ),
+            )
+        )
+
+    if not aplicadas:
+        db.rollback()
+        return [], []
+    # Primero los movimientos: las aplicaciones los referencian.
+    db.add_all([movimiento for _, movimiento, _ in aplicadas])
+    db.flush()
+    db.add_all([aplicacion for _, _, aplicacion in aplicadas])
+    db.add_all(notificaciones)
+    db.add_all(auditorias)
+    db.flush()
+    sumar_notificaciones(db, notificaciones)
+    acumular_totales(db, [aplicacion for _, _, aplicacion in aplicadas])
+    # Como ``crear_notificaciones``: los webhooks de las notificaciones se confirman con el tramo.
+    deliveries = agregar_webhook_evento_lote(
+        evento="notificacion.creada",
+        organizacion_id=organizacion_id,
+        datos=lambda: [
+            NotificacionResponse.model_validate(notificacion).model_dump(mode="json", by_alias=True)
+            for notificacion in notificaciones
+        ],
+        db=db,
+    )
+    respuestas: list[AplicarRecompensaResponse] = []
+    for compra, movimiento, aplicacion in aplicadas:
+        respuesta = AplicarRecompensaResponse(
+            aplicacion=AplicacionRecompensaResponse.model_validate(aplicacion),
+            movimiento=MovimientoResponse.model_validate(movimiento),
+        )
+        compra.resultado.aplicacion_id = aplicacion.id
+        compra.resultado.movimiento_id = movimiento.id
+        compra.resultado.monto_recompensa = aplicacion.monto_recompensa
+        respuestas.append(respuesta)
+    db.commit()
+    return respuestas, deliveries
+
@@ -5,7 +5,7 @@ from decimal import Decimal
 from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, Index, Numeric, String, Uuid, text
+from sqlalchemy import JSON, Boolean, DateTime, Enum, ForeignKey, Index, Integer, Numeric, String, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -81,6 +81,7 @@ class AplicacionRecompensa(Base):
             postgresql_where=text("referencia_externa IS NOT NULL"),
             sqlite_where=text("referencia_externa IS NOT NULL"),
         ),
+        Index("ix_aplicaciones_recompensa_fecha_creacion_moneda", "fecha_creacion", "moneda_recompensa"),
     )
 
     id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4, index=True)
@@ -135,3 +136,81 @@ class AplicacionRecompensa(Base):
     usuario: Mapped["Usuario"] = relationship()
     wallet_destino: Mapped["Wallet"] = relationship()
     movimiento: Mapped["Movimiento | None"] = relationship()
+
+
+class TotalRecompensaUsuario(Base):
+    """Totales de recompensas por usuario y moneda; se acumulan en la misma transaccion que cada aplicacion."""
+
+    __tablename__ = "recompensa_totales_usuario"
+
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        primary_key=True,
+    )
+    usuario_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("usuarios.id", ondelete="RESTRICT"),
+        primary_key=True,
+    )
+    moneda_recompensa: Mapped[MonedaRecompensa] = mapped_column(
+        Enum(
+            MonedaRecompensa,
+            name="moneda_recompensa",
+            values_callable=lambda enum_cls: [item.value for item in enum_cls],
+        ),
+        primary_key=True,
+    )
+    cantidad_aplicaciones: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    monto_compra_total: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False, default=Decimal("0.00"))
+    monto_recompensa_total: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False, default=Decimal("0.00"))
+    fecha_ultima_aplicacion: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class TotalRecompensaRegla(Base):
+    """Totales de recompensas por regla y moneda (la moneda de una regla se puede editar)."""
+
+    __tablename__ = "recompensa_totales_regla"
+
+    regla_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("reglas_recompensa.id", ondelete="RESTRICT"),
+        primary_key=True,
+    )
+    moneda_recompensa: Mapped[MonedaRecompensa] = mapped_column(
+        Enum(
+            MonedaRecompensa,
+            name="moneda_recompensa",
+            values_callable=lambda enum_cls: [item.value for item in enum_cls],
+        ),
+        primary_key=True,
+    )
+    organizacion_id: Mapped[UUID] = mapped_column(
+        Uuid(as_uuid=True),
+        ForeignKey("organizaciones.id", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+    )
+    cantidad_aplicaciones: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    monto_compra_total: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False, default=Decimal("0.00"))
+    monto_recompensa_total: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False, default=Decimal("0.00"))
+    fecha_ultima_aplicacion: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class EjecucionVencimientoPuntos(Base):
+    """Corrida del job de vencimiento de puntos; ``procesado_hasta`` marca hasta donde se vencio."""
+
+    __tablename__ = "ejecuciones_vencimiento_puntos"
+
+    id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4)
+    corte: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    desde: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    procesado_hasta: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True)
+    wallets_vencidas: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    puntos_vencidos: Mapped[Decimal] = mapped_column(Numeric(18, 2), nullable=False, default=Decimal("0.00"))
+    fecha_inicio: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    fecha_fin: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
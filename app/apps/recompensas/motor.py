@@ -0,0 +1,271 @@
+"""Motor de reglas de recompensa compiladas por organizacion.
+
+Las reglas activas se compilan a campos numericos planos (centavos, puntos basicos y microsegundos
+UTC) y se indexan por ventana de vigencia y minimo de compra: elegir la regla de una compra es una
+busqueda binaria sin consultas. La regla elegida es la misma que la evaluacion lineal: la primera por
+``(fecha_creacion, id)`` que esta activa, vigente, alcanza el minimo y genera recompensa positiva.
+
+El conjunto compilado se invalida al crear, actualizar, activar o pausar una regla en este proceso
+(al hacer flush y otra vez al confirmar la transaccion); ``RECOMPENSAS_REGLAS_CACHE_SECONDS`` acota
+cuanto tarda otro proceso en ver el cambio.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from app.apps.recompensas.models import ReglaRecompensa
+from app.core.config import settings
+from app.shared.enums import EstadoReglaRecompensa, MonedaRecompensa, TipoRecompensa
+from app.shared.utils import normalize_decimal
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSEGUNDO = timedelta(microseconds=1)
+CENTAVO = Decimal("0.01")
+_ORGANIZACIONES_MODIFICADAS = "recompensas_reglas_modificadas"
+
+
+def a_centavos(value: Decimal) -> int:
+    """Centavos de un monto ya normalizado a dos decimales."""
+    return int(value.scaleb(2))
+
+
+def desde_centavos(centavos: int) -> Decimal:
+    return Decimal(centavos).scaleb(-2).quantize(CENTAVO)
+
+
+def _centavos(value: Decimal | None) -> int | None:
+    return a_centavos(normalize_decimal(value)) if value is not None else None
+
+
+def a_microsegundos(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // MICROSEGUNDO
+
+
+@dataclass(frozen=True, slots=True)
+class ReglaCompilada:
+    """Regla activa lista para evaluar; expone los mismos campos que usa quien aplica la recompensa."""
+
+    id: UUID
+    nombre: str
+    tipo: TipoRecompensa
+    moneda_recompensa: MonedaRecompensa
+    prioridad: int
+    minimo_centavos: int
+    inicio_us: int | None
+    fin_us: int | None
+    porcentaje_bp: int | None
+    fijo_centavos: int | None
+    maximo_centavos: int | None
+
+    def recompensa_bruta_centavos(self, monto_centavos: int) -> int:
+        """Recompensa antes del tope: porcentaje con redondeo half-up o monto fijo."""
+        if self.porcentaje_bp is not None:
+            producto = monto_centavos * self.porcentaje_bp
+            return (producto + 5000) // 10000 if producto >= 0 else -((-producto + 5000) // 10000)
+        if self.fijo_centavos is not None:
+            return self.fijo_centavos
+        return 0
+
+    def recompensa_centavos(self, monto_centavos: int) -> int:
+        """Igual que ``_calculate_reward`` en aritmetica entera."""
+        reward = self.recompensa_bruta_centavos(monto_centavos)
+        if self.maximo_centavos is not None:
+            reward = min(reward, self.maximo_centavos)
+        return reward
+
+    def calcular_recompensa(self, monto_compra: Decimal) -> Decimal:
+        return desde_centavos(self.recompensa_centavos(a_centavos(monto_compra)))
+
+    def vigente(self, now_us: int) -> bool:
+        return (self.inicio_us is None or now_us >= self.inicio_us) and (self.fin_us is None or now_us <= self.fin_us)
+
+
+def compilar_regla(regla: ReglaRecompensa, prioridad: int, *, exigir_activa: bool = True) -> ReglaCompilada | None:
+    """Devuelve la regla compilada o ``None`` si nunca puede aplicar (pausada o sin recompensa posible).
+
+    ``exigir_activa=False`` compila reglas pausadas para simular una campana antes de activarla.
+    """
+    if exigir_activa and regla.estado != EstadoReglaRecompensa.activa:
+        return None
+    porcentaje_bp = _centavos(regla.porcentaje_cashback)
+    fijo = _centavos(regla.monto_fijo)
+    maximo = _centavos(regla.monto_maximo_recompensa)
+    minimo = _centavos(regla.monto_minimo_compra)
+    if porcentaje_bp is not None:
+        if porcentaje_bp <= 0:
+            return None
+        # Menor compra cuyo porcentaje redondeado llega a un centavo: monto * bp >= 5000.
+        umbral = -(-5000 // porcentaje_bp)
+    elif fijo is not None and fijo > 0:
+        umbral = None
+    else:
+        return None
+    if maximo is not None and maximo <= 0:
+        return None
+    if umbral is not None:
+        minimo = umbral if minimo is None else max(minimo, umbral)
+    inicio = a_microsegundos(regla.fecha_inicio) if regla.fecha_inicio is not None else None
+    fin = a_microsegundos(regla.fecha_fin) if regla.fecha_fin is not None else None
+    if inicio is not None and fin is not None and fin < inicio:
+        return None
+    return ReglaCompilada(
+        id=regla.id,
+        nombre=regla.nombre,
+        tipo=regla.tipo,
+        moneda_recompensa=regla.moneda_recompensa,
+        prioridad=prioridad,
+        # Sin minimo una regla de monto fijo aplica a cualquier compra, incluso a montos no positivos.
+        minimo_centavos=minimo if minimo is not None else -(2**63),
+        inicio_us=inicio,
+        fin_us=fin,
+        porcentaje_bp=porcentaje_bp,
+        fijo_centavos=fijo,
+        maximo_centavos=maximo,
+    )
+
+
+class _Tramo:
+    """Reglas vigentes en un tramo de tiempo, ordenadas por minimo, con la mejor prioridad acumulada."""
+
+    __slots__ = ("minimos", "mejores")
+
+    def __init__(self, reglas: list[ReglaCompilada]) -> None:
+        reglas = sorted(reglas, key=lambda regla: regla.minimo_centavos)
+        self.minimos = [regla.minimo_centavos for regla in reglas]
+        self.mejores: list[ReglaCompilada] = []
+        for regla in reglas:
+            if not self.mejores or regla.prioridad < self.mejores[-1].prioridad:
+                self.mejores.append(regla)
+            else:
+                self.mejores.append(self.mejores[-1])
+
+    def seleccionar(self, monto_centavos: int) -> ReglaCompilada | None:
+        posicion = bisect_right(self.minimos, monto_centavos)
+        return self.mejores[posicion - 1] if posicion else None
+
+
+class ConjuntoReglas:
+    """Reglas activas de una organizacion indexadas por vigencia y minimo de compra.
+
+    Los bordes de las ventanas de vigencia parten el tiempo en tramos donde el conjunto de reglas
+    vigentes no cambia; cada tramo (por tipo de recompensa) se indexa la primera vez que se usa.
+    """
+
+    def __init__(self, reglas: list[ReglaCompilada]) -> None:
+        self.reglas = tuple(reglas)
+        bordes: set[int] = set()
+        for regla in reglas:
+            if regla.inicio_us is not None:
+                bordes.add(regla.inicio_us)
+            if regla.fin_us is not None:
+                bordes.add(regla.fin_us + 1)
+        self._bordes = sorted(bordes)
+        self._tramos: dict[tuple[int, TipoRecompensa | None], _Tramo] = {}
+        self._lock = threading.Lock()
+
+    def seleccionar(
+        self,
+        monto_compra: Decimal,
+        now: datetime,
+        *,
+        tipo: TipoRecompensa | None = None,
+    ) -> ReglaCompilada | None:
+        return self.seleccionar_centavos(a_centavos(monto_compra), a_microsegundos(now), tipo=tipo)
+
+    def seleccionar_centavos(
+        self,
+        monto_centavos: int,
+        now_us: int,
+        *,
+        tipo: TipoRecompensa | None = None,
+    ) -> ReglaCompilada | None:
+        return self.tramo(now_us, tipo=tipo).seleccionar(monto_centavos)
+
+    def tramo(self, now_us: int, *, tipo: TipoRecompensa | None = None) -> _Tramo:
+        clave = (bisect_right(self._bordes, now_us), tipo)
+        tramo = self._tramos.get(clave)
+        if tramo is None:
+            tramo = _Tramo(
+                [
+                    regla
+                    for regla in self.reglas
+                    if regla.vigente(now_us) and (tipo is None or regla.tipo == tipo)
+                ]
+            )
+            with self._lock:
+                self._tramos[clave] = tramo
+        return tramo
+
+
+def compilar_reglas(db: Session, organizacion_id: UUID) -> ConjuntoReglas:
+    reglas = db.scalars(
+        select(ReglaRecompensa)
+        .where(ReglaRecompensa.organizacion_id == organizacion_id)
+        .order_by(ReglaRecompensa.fecha_creacion.asc(), ReglaRecompensa.id.asc())
+    ).all()
+    compiladas = [compilar_regla(regla, prioridad) for prioridad, regla in enumerate(reglas)]
+    return ConjuntoReglas([regla for regla in compiladas if regla is not None])
+
+
+class MotorReglas:
+    def __init__(self) -> None:
+        self._por_organizacion: dict[UUID, tuple[float, ConjuntoReglas]] = {}
+        self._lock = threading.Lock()
+
+    def reglas(self, db: Session, organizacion_id: UUID) -> ConjuntoReglas:
+        ttl = settings.RECOMPENSAS_REGLAS_CACHE_SECONDS
+        now = time.monotonic()
+        with self._lock:
+            cached = self._por_organizacion.get(organizacion_id)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+        conjunto = compilar_reglas(db, organizacion_id)
+        if ttl > 0:
+            with self._lock:
+                self._por_organizacion[organizacion_id] = (now, conjunto)
+        return conjunto
+
+    def invalidar(self, organizacion_id: UUID) -> None:
+        with self._lock:
+            self._por_organizacion.pop(organizacion_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._por_organizacion.clear()
+
+
+motor_reglas = MotorReglas()
+
+
+def reglas_organizacion(db: Session, organizacion_id: UUID) -> ConjuntoReglas:
+    return motor_reglas.reglas(db, organizacion_id)
+
+
+@event.listens_for(ReglaRecompensa, "after_insert")
+@event.listens_for(ReglaRecompensa, "after_update")
+@event.listens_for(ReglaRecompensa, "after_delete")
+def _invalidar_por_cambio(mapper, connection, target: ReglaRecompensa) -> None:
+    motor_reglas.invalidar(target.organizacion_id)
+    # Otro request pudo recompilar con la version anterior antes del commit: se invalida de nuevo al confirmar.
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_ORGANIZACIONES_MODIFICADAS, set()).add(target.organizacion_id)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidar_al_terminar(session: Session) -> None:
+    for organizacion_id in session.info.pop(_ORGANIZACIONES_MODIFICADAS, ()):
+        motor_reglas.invalidar(organizacion_id)
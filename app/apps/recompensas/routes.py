@@ -1,20 +1,31 @@
 from uuid import UUID
 
-from fastapi import APIRouter, BackgroundTasks, Depends, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.apps.auth.dependencies import get_current_user
 from app.apps.auth.schemas import DatosUsuarioToken
-from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento
+from app.apps.integraciones.webhook_dispatcher import (
+    confirmar_deliveries,
+    encolar_webhook_evento,
+    encolar_webhook_evento_lote,
+)
+from app.apps.recompensas.lotes import ResultadoLoteAplicaciones, aplicar_recompensas_lote, leer_aplicaciones_lote
 from app.apps.recompensas.schemas import (
     AplicacionRecompensaResponse,
+    AplicarRecompensaLoteResponse,
     AplicarRecompensaRequest,
     AplicarRecompensaResponse,
     ReglaRecompensaCreate,
     ReglaRecompensaResponse,
     ReglaRecompensaUpdate,
+    SimularRecompensaLoteRequest,
+    SimularRecompensaLoteResponse,
     SimularRecompensaRequest,
     SimularRecompensaResponse,
+    TotalRecompensaReglaResponse,
+    TotalRecompensaUsuarioResponse,
 )
 from app.apps.recompensas.services import (
     actualizar_regla_recompensa,
@@ -22,11 +33,16 @@ from app.apps.recompensas.services import (
     crear_regla_recompensa,
     listar_aplicaciones_recompensa,
     listar_mis_aplicaciones_recompensa,
+    listar_mis_totales_recompensa,
     listar_reglas_recompensa,
+    listar_totales_reglas,
+    listar_totales_usuarios,
     obtener_regla_recompensa,
     simular_recompensa,
+    simular_recompensas_lote,
 )
 from app.core.database import get_db
+from app.shared.enums import MonedaRecompensa
 from app.shared.responses import ApiResponse, ok
 
 
@@ -92,6 +108,19 @@ def post_simular_recompensa(
     return ok(simular_recompensa(datos, current_user, db, organizacion_id), "Simulacion calculada correctamente.")
 
 
+@router.post("/simular/lote", response_model=ApiResponse[SimularRecompensaLoteResponse])
+def post_simular_recompensas_lote(
+    datos: SimularRecompensaLoteRequest,
+    organizacion_id: UUID | None = Query(default=None),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[SimularRecompensaLoteResponse]:
+    return ok(
+        simular_recompensas_lote(datos, current_user, db, organizacion_id),
+        "Simulacion en lote calculada correctamente.",
+    )
+
+
 @router.post("/aplicar", response_model=ApiResponse[AplicarRecompensaResponse], status_code=status.HTTP_201_CREATED)
 def post_aplicar_recompensa(
     datos: AplicarRecompensaRequest,
@@ -103,13 +132,47 @@ def post_aplicar_recompensa(
     encolar_webhook_evento(
         evento="recompensa.aplicada",
         organizacion_id=resultado.aplicacion.organizacion_id,
-        data=_aplicacion_payload(resultado),
+        data=lambda: _aplicacion_payload(resultado),
         db=db,
         background_tasks=background_tasks,
     )
     return ok(resultado, "Recompensa aplicada correctamente.")
 
 
+@router.post("/aplicar/lote", response_model=ApiResponse[AplicarRecompensaLoteResponse])
+async def post_aplicar_recompensas_lote(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    organizacion_id: UUID | None = Query(default=None),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[AplicarRecompensaLoteResponse]:
+    """Recibe un CSV (``text/csv``), NDJSON (``application/x-ndjson``) o un arreglo JSON de compras."""
+    compras = leer_aplicaciones_lote(await request.body(), request.headers.get("content-type"))
+    resultado = await run_in_threadpool(_aplicar_lote, compras, current_user, db, organizacion_id, background_tasks)
+    return ok(resultado.respuesta, "Lote de recompensas procesado.")
+
+
+def _aplicar_lote(
+    compras: list[AplicarRecompensaRequest | str],
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None,
+    background_tasks: BackgroundTasks,
+) -> ResultadoLoteAplicaciones:
+    resultado = aplicar_recompensas_lote(compras, current_user, db, organizacion_id)
+    confirmar_deliveries(db, resultado.deliveries, background_tasks)
+    if resultado.aplicadas:
+        encolar_webhook_evento_lote(
+            evento="recompensa.aplicada",
+            organizacion_id=resultado.aplicadas[0].aplicacion.organizacion_id,
+            datos=lambda: [_aplicacion_payload(aplicada) for aplicada in resultado.aplicadas],
+            db=db,
+            background_tasks=background_tasks,
+        )
+    return resultado
+
+
 @router.get("/aplicaciones/me", response_model=ApiResponse[list[AplicacionRecompensaResponse]])
 def get_mis_aplicaciones_recompensa(
     skip: int = Query(0, ge=0),
@@ -143,3 +206,57 @@ def get_aplicaciones_recompensa(
         ),
         "Aplicaciones de recompensa obtenidas correctamente.",
     )
+
+
+@router.get("/totales/me", response_model=ApiResponse[list[TotalRecompensaUsuarioResponse]])
+def get_mis_totales_recompensa(
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[list[TotalRecompensaUsuarioResponse]]:
+    return ok(listar_mis_totales_recompensa(current_user, db), "Totales de recompensas obtenidos correctamente.")
+
+
+@router.get("/totales/usuarios", response_model=ApiResponse[list[TotalRecompensaUsuarioResponse]])
+def get_totales_recompensa_usuarios(
+    organizacion_id: UUID | None = Query(default=None),
+    usuario_id: UUID | None = Query(default=None),
+    moneda: MonedaRecompensa | None = Query(default=None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[list[TotalRecompensaUsuarioResponse]]:
+    return ok(
+        listar_totales_usuarios(
+            current_user,
+            db,
+            organizacion_id=organizacion_id,
+            usuario_id=usuario_id,
+            moneda=moneda,
+            skip=skip,
+            limit=limit,
+        ),
+        "Totales de recompensas por usuario obtenidos correctamente.",
+    )
+
+
+@router.get("/totales/reglas", response_model=ApiResponse[list[TotalRecompensaReglaResponse]])
+def get_totales_recompensa_reglas(
+    organizacion_id: UUID | None = Query(default=None),
+    regla_id: UUID | None = Query(default=None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: DatosUsuarioToken = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> ApiResponse[list[TotalRecompensaReglaResponse]]:
+    return ok(
+        listar_totales_reglas(
+            current_user,
+            db,
+            organizacion_id=organizacion_id,
+            regla_id=regla_id,
+            skip=skip,
+            limit=limit,
+        ),
+        "Totales de recompensas por regla obtenidos correctamente.",
+    )
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Any
+from typing import Any, Literal
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
@@ -11,6 +11,9 @@ from app.apps.movimientos.schemas import MovimientoResponse
 from app.shared.enums import EstadoReglaRecompensa, MonedaRecompensa, TipoRecompensa
 from app.shared.utils import normalize_decimal
 
+SIMULACION_LOTE_MAX_REGLAS = 50
+SIMULACION_LOTE_MAX_BUCKETS = 100
+
 
 def _normalize_optional_amount(value: Any, *, allow_zero: bool) -> Decimal | None:
     if value is None:
@@ -154,6 +157,115 @@ class SimularRecompensaResponse(BaseModel):
     motivo: str
 
 
+class SimularRecompensaLoteRequest(BaseModel):
+    montos_compra: list[Decimal] = Field(min_length=1)
+    fechas: list[datetime] | None = None
+    regla_ids: list[UUID] | None = Field(default=None, min_length=1, max_length=SIMULACION_LOTE_MAX_REGLAS)
+    tipo: TipoRecompensa | None = None
+    buckets: int = Field(default=10, ge=1, le=SIMULACION_LOTE_MAX_BUCKETS)
+
+    @field_validator("montos_compra", mode="before")
+    @classmethod
+    def validate_purchase_amounts(cls, value: Any) -> list[Decimal]:
+        if not isinstance(value, list):
+            return value
+        montos: list[Decimal] = []
+        for indice, item in enumerate(value):
+            try:
+                montos.append(_normalize_positive_amount(item))
+            except (ArithmeticError, ValueError):
+                raise ValueError(f"montos_compra[{indice}] debe ser un monto mayor a 0.")
+        return montos
+
+    @model_validator(mode="after")
+    def validate_dates(self) -> "SimularRecompensaLoteRequest":
+        if self.fechas is not None and len(self.fechas) != len(self.montos_compra):
+            raise ValueError("fechas debe tener un elemento por monto de compra.")
+        return self
+
+
+class DistribucionRecompensaBucket(BaseModel):
+    desde: Decimal
+    hasta: Decimal
+    cantidad: int
+
+
+class SimulacionReglaResumen(BaseModel):
+    regla_id: UUID
+    nombre_regla: str
+    moneda_recompensa: MonedaRecompensa
+    compras_aplicadas: int
+    compras_con_tope: int
+    monto_compra_total: Decimal
+    monto_recompensa_total: Decimal
+    recompensa_minima: Decimal | None = None
+    recompensa_maxima: Decimal | None = None
+    recompensa_promedio: Decimal | None = None
+    percentil_50: Decimal | None = None
+    percentil_90: Decimal | None = None
+    percentil_99: Decimal | None = None
+    distribucion: list[DistribucionRecompensaBucket]
+
+
+class SimularRecompensaLoteResponse(BaseModel):
+    modo: Literal["primera_aplicable", "por_regla"]
+    motor: Literal["numpy", "python"]
+    cantidad_compras: int
+    monto_compra_total: Decimal
+    compras_con_recompensa: int
+    compras_sin_recompensa: int
+    reglas: list[SimulacionReglaResumen]
+
+
+class BacktestReglasRequest(BaseModel):
+    reglas: list[ReglaRecompensaCreate] = Field(min_length=1, max_length=SIMULACION_LOTE_MAX_REGLAS)
+    desde: datetime | None = None
+    hasta: datetime | None = None
+
+    @model_validator(mode="after")
+    def validate_period(self) -> "BacktestReglasRequest":
+        if self.desde is not None and self.hasta is not None and self.hasta <= self.desde:
+            raise ValueError("hasta debe ser posterior a desde.")
+        return self
+
+
+class BacktestReglaResumen(BaseModel):
+    indice: int
+    nombre: str
+    tipo: TipoRecompensa
+    moneda_recompensa: MonedaRecompensa
+    compras_elegibles: int
+    porcentaje_elegibles: Decimal
+    compras_aplicadas: int
+    porcentaje_aplicadas: Decimal
+    compras_con_tope: int
+    clientes: int
+    monto_compra_total: Decimal
+    monto_recompensa_total: Decimal
+    recompensa_promedio: Decimal | None = None
+
+
+class BacktestPasivo(BaseModel):
+    moneda_recompensa: MonedaRecompensa
+    monto_total: Decimal
+    clientes: int
+
+
+class BacktestReglasResponse(BaseModel):
+    organizacion_id: UUID
+    desde: datetime | None = None
+    hasta: datetime | None = None
+    eventos: int
+    clientes: int
+    monto_compra_total: Decimal
+    compras_con_recompensa: int
+    compras_sin_recompensa: int
+    pasivo: list[BacktestPasivo]
+    reglas: list[BacktestReglaResumen]
+    tramos: int
+    procesos: int
+
+
 class AplicarRecompensaRequest(BaseModel):
     usuario_id: UUID
     wallet_destino_id: UUID
@@ -185,6 +297,48 @@ class AplicacionRecompensaResponse(BaseModel):
     fecha_creacion: datetime
 
 
+class TotalRecompensaUsuarioResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    organizacion_id: UUID
+    usuario_id: UUID
+    moneda_recompensa: MonedaRecompensa
+    cantidad_aplicaciones: int
+    monto_compra_total: Decimal
+    monto_recompensa_total: Decimal
+    fecha_ultima_aplicacion: datetime
+
+
+class TotalRecompensaReglaResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    regla_id: UUID
+    nombre_regla: str
+    organizacion_id: UUID
+    moneda_recompensa: MonedaRecompensa
+    cantidad_aplicaciones: int
+    monto_compra_total: Decimal
+    monto_recompensa_total: Decimal
+    fecha_ultima_aplicacion: datetime
+
+
 class AplicarRecompensaResponse(BaseModel):
     aplicacion: AplicacionRecompensaResponse
     movimiento: MovimientoResponse
+
+
+class AplicacionRecompensaLoteItemResultado(BaseModel):
+    indice: int
+    referencia_externa: str | None = None
+    status: Literal["aplicada", "duplicada", "error"]
+    aplicacion_id: UUID | None = None
+    movimiento_id: UUID | None = None
+    monto_recompensa: Decimal | None = None
+    error: str | None = None
+
+
+class AplicarRecompensaLoteResponse(BaseModel):
+    aplicadas: int
+    duplicadas: int
+    errores: int
+    resultados: list[AplicacionRecompensaLoteItemResultado]
@@ -18,7 +18,13 @@ from app.apps.notificaciones.services import crear_notificacion_interna
 from app.apps.organizaciones.dependencies import resolve_organization_scope
 from app.apps.organizaciones.models import Organizacion
 from app.apps.planes.limit_service import validar_limite_movimientos_mes
-from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa
+from app.apps.recompensas.models import (
+    AplicacionRecompensa,
+    ReglaRecompensa,
+    TotalRecompensaRegla,
+    TotalRecompensaUsuario,
+)
+from app.apps.recompensas.motor import reglas_organizacion
 from app.apps.recompensas.permissions import (
     ensure_can_apply_rewards,
     ensure_can_manage_rewards,
@@ -31,9 +37,15 @@ from app.apps.recompensas.schemas import (
     ReglaRecompensaCreate,
     ReglaRecompensaResponse,
     ReglaRecompensaUpdate,
+    SimularRecompensaLoteRequest,
+    SimularRecompensaLoteResponse,
     SimularRecompensaRequest,
     SimularRecompensaResponse,
+    TotalRecompensaReglaResponse,
+    TotalRecompensaUsuarioResponse,
 )
+from app.apps.recompensas.simulacion import simular_lote
+from app.apps.recompensas.totales import acumular_totales
 from app.apps.usuarios.models import Usuario
 from app.apps.wallets.models import Wallet
 from app.core.permissions import is_super_admin
@@ -361,16 +373,17 @@ def _find_applicable_rule(
     scope_id = resolve_organization_scope(current_user, organizacion_id)
     if scope_id is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Debe indicar una organizacion.")
-    query = select(ReglaRecompensa).where(ReglaRecompensa.organizacion_id == scope_id)
-    if datos.tipo is not None:
-        query = query.where(ReglaRecompensa.tipo == datos.tipo)
-    reglas = db.scalars(
-        query.order_by(ReglaRecompensa.fecha_creacion.asc(), ReglaRecompensa.id.asc())
-    ).all()
-    for regla in reglas:
-        result = _evaluate_rule(regla, monto_compra, now=now)
-        if result.aplica:
-            return result
+    regla = reglas_organizacion(db, scope_id).seleccionar(monto_compra, now, tipo=datos.tipo)
+    if regla is not None:
+        return SimularRecompensaResponse(
+            aplica=True,
+            regla_id=regla.id,
+            nombre_regla=regla.nombre,
+            monto_compra=monto_compra,
+            monto_recompensa=regla.calcular_recompensa(monto_compra),
+            moneda_recompensa=regla.moneda_recompensa,
+            motivo="Regla aplicable.",
+        )
     return SimularRecompensaResponse(
         aplica=False,
         regla_id=None,
@@ -392,6 +405,19 @@ def simular_recompensa(
     return _find_applicable_rule(datos, current_user, db, organizacion_id)
 
 
+def simular_recompensas_lote(
+    datos: SimularRecompensaLoteRequest,
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+) -> SimularRecompensaLoteResponse:
+    ensure_can_read_rewards(current_user)
+    scope_id = resolve_organization_scope(current_user, organizacion_id)
+    if scope_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Debe indicar una organizacion.")
+    return simular_lote(db, scope_id, datos)
+
+
 def _get_user_or_404(db: Session, usuario_id: UUID) -> Usuario:
     usuario = db.get(Usuario, usuario_id)
     if usuario is None:
@@ -529,6 +555,8 @@ def aplicar_recompensa(
             metadata_aplicacion=_json_metadata(datos.metadata),
         )
         db.add(aplicacion)
+        db.flush()
+        acumular_totales(db, [aplicacion])
         db.commit()
         db.refresh(aplicacion)
         db.refresh(movimiento)
@@ -607,6 +635,92 @@ def listar_mis_aplicaciones_recompensa(
     return [AplicacionRecompensaResponse.model_validate(aplicacion) for aplicacion in db.scalars(query).all()]
 
 
+def listar_totales_usuarios(
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+    usuario_id: UUID | None = None,
+    moneda: MonedaRecompensa | None = None,
+    skip: int = 0,
+    limit: int = 50,
+) -> list[TotalRecompensaUsuarioResponse]:
+    ensure_can_read_rewards(current_user)
+    query = select(TotalRecompensaUsuario)
+    if is_super_admin(current_user.rol):
+        if organizacion_id is not None:
+            query = query.where(TotalRecompensaUsuario.organizacion_id == organizacion_id)
+    else:
+        scope_id = resolve_organization_scope(current_user, organizacion_id)
+        query = query.where(TotalRecompensaUsuario.organizacion_id == scope_id)
+    if usuario_id is not None:
+        query = query.where(TotalRecompensaUsuario.usuario_id == usuario_id)
+    if moneda is not None:
+        query = query.where(TotalRecompensaUsuario.moneda_recompensa == moneda)
+    totales = db.scalars(
+        query.order_by(TotalRecompensaUsuario.monto_recompensa_total.desc(), TotalRecompensaUsuario.usuario_id)
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    return [TotalRecompensaUsuarioResponse.model_validate(total) for total in totales]
+
+
+def listar_mis_totales_recompensa(
+    current_user: DatosUsuarioToken,
+    db: Session,
+) -> list[TotalRecompensaUsuarioResponse]:
+    if current_user.organizacion_id is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario sin organizacion.")
+    query = (
+        select(TotalRecompensaUsuario)
+        .where(
+            TotalRecompensaUsuario.organizacion_id == current_user.organizacion_id,
+            TotalRecompensaUsuario.usuario_id == current_user.id,
+        )
+        .order_by(TotalRecompensaUsuario.moneda_recompensa)
+    )
+    return [TotalRecompensaUsuarioResponse.model_validate(total) for total in db.scalars(query).all()]
+
+
+def listar_totales_reglas(
+    current_user: DatosUsuarioToken,
+    db: Session,
+    organizacion_id: UUID | None = None,
+    regla_id: UUID | None = None,
+    skip: int = 0,
+    limit: int = 50,
+) -> list[TotalRecompensaReglaResponse]:
+    ensure_can_read_rewards(current_user)
+    query = select(TotalRecompensaRegla, ReglaRecompensa.nombre).join(
+        ReglaRecompensa, ReglaRecompensa.id == TotalRecompensaRegla.regla_id
+    )
+    if is_super_admin(current_user.rol):
+        if organizacion_id is not None:
+            query = query.where(TotalRecompensaRegla.organizacion_id == organizacion_id)
+    else:
+        scope_id = resolve_organization_scope(current_user, organizacion_id)
+        query = query.where(TotalRecompensaRegla.organizacion_id == scope_id)
+    if regla_id is not None:
+        query = query.where(TotalRecompensaRegla.regla_id == regla_id)
+    filas = db.execute(
+        query.order_by(TotalRecompensaRegla.monto_recompensa_total.desc(), TotalRecompensaRegla.regla_id)
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    return [
+        TotalRecompensaReglaResponse(
+            regla_id=total.regla_id,
+            nombre_regla=nombre,
+            organizacion_id=total.organizacion_id,
+            moneda_recompensa=total.moneda_recompensa,
+            cantidad_aplicaciones=total.cantidad_aplicaciones,
+            monto_compra_total=total.monto_compra_total,
+            monto_recompensa_total=total.monto_recompensa_total,
+            fecha_ultima_aplicacion=total.fecha_ultima_aplicacion,
+        )
+        for total, nombre in filas
+    ]
+
+
 def _audit_rule_change(
     db: Session,
     *,
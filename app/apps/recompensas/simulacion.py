@@ -0,0 +1,345 @@
+"""Simulacion de recompensas sobre lotes de compras, por ejemplo una campana sobre montos historicos.
+
+Trabaja en centavos enteros con las reglas compiladas del motor: cada recompensa es identica a la que
+devuelve ``POST /recompensas/simular`` compra por compra. Con NumPy instalado cada regla se evalua
+sobre arreglos ``int64`` con las mascaras de minimo, vigencia y tope en bloque; sin NumPy se usa el
+mismo calculo en Python.
+
+Sin ``regla_ids`` cada compra recibe la primera regla activa aplicable, como en produccion. Con
+``regla_ids`` cada regla se evalua por separado sobre todas las compras, aunque este pausada.
+"""
+from __future__ import annotations
+
+import csv
+import importlib.util
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from types import ModuleType
+from typing import Any, NamedTuple, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.apps.recompensas.models import ReglaRecompensa
+from app.apps.recompensas.motor import (
+    ReglaCompilada,
+    a_centavos,
+    a_microsegundos,
+    compilar_regla,
+    desde_centavos,
+    reglas_organizacion,
+)
+from app.apps.recompensas.schemas import (
+    DistribucionRecompensaBucket,
+    SimulacionReglaResumen,
+    SimularRecompensaLoteRequest,
+    SimularRecompensaLoteResponse,
+)
+from app.core.config import settings
+from app.shared.enums import MonedaRecompensa
+
+
+LIMITE_INT64 = 2**62
+PERCENTILES = (50, 90, 99)
+
+
+def _numpy() -> ModuleType | None:
+    if importlib.util.find_spec("numpy") is None:
+        return None
+    import numpy
+
+    return numpy
+
+
+class _Candidata(NamedTuple):
+    id: UUID
+    nombre: str
+    moneda_recompensa: MonedaRecompensa
+    regla: ReglaCompilada | None
+
+
+@dataclass
+class _Estadistica:
+    aplicadas: int = 0
+    con_tope: int = 0
+    monto_compra_total: int = 0
+    recompensa_total: int = 0
+    minima: int = 0
+    maxima: int = 0
+    percentiles: tuple[int, ...] = ()
+    conteos: Sequence[int] = ()
+
+
+def _posicion_percentil(percentil: int, cantidad: int) -> int:
+    # Rango mas cercano: el menor valor que deja al menos el percentil de las compras por debajo o igual.
+    return -(-percentil * cantidad // 100) - 1
+
+
+def _estadistica_python(montos: list[int], recompensas: list[int], con_tope: int, buckets: int) -> _Estadistica:
+    if not recompensas:
+        return _Estadistica()
+    ordenadas = sorted(recompensas)
+    minima, maxima = ordenadas[0], ordenadas[-1]
+    ancho = maxima - minima + 1
+    conteos = [0] * buckets
+    for recompensa in recompensas:
+        conteos[(recompensa - minima) * buckets // ancho] += 1
+    return _Estadistica(
+        aplicadas=len(recompensas),
+        con_tope=con_tope,
+        monto_compra_total=sum(montos),
+        recompensa_total=sum(recompensas),
+        minima=minima,
+        maxima=maxima,
+        percentiles=tuple(ordenadas[_posicion_percentil(p, len(ordenadas))] for p in PERCENTILES),
+        conteos=conteos,
+    )
+
+
+def _evaluar_python(
+    candidatas: list[_Candidata],
+    montos: list[int],
+    fechas: list[int],
+    *,
+    primera_aplicable: bool,
+    buckets: int,
+) -> tuple[list[_Estadistica], int]:
+    asignadas = bytearray(len(montos))
+    estadisticas: list[_Estadistica] = []
+    for candidata in candidatas:
+        regla = candidata.regla
+        if regla is None:
+            estadisticas.append(_Estadistica())
+            continue
+        montos_aplicados: list[int] = []
+        recompensas: list[int] = []
+        con_tope = 0
+        for indice, (monto, fecha) in enumerate(zip(montos, fechas)):
+            if monto < regla.minimo_centavos or not regla.vigente(fecha):
+                continue
+            if primera_aplicable and asignadas[indice]:
+                continue
+            asignadas[indice] = 1
+            bruta = regla.recompensa_bruta_centavos(monto)
+            if regla.maximo_centavos is not None and bruta > regla.maximo_centavos:
+                con_tope += 1
+                bruta = regla.maximo_centavos
+            montos_aplicados.append(monto)
+            recompensas.append(bruta)
+        estadisticas.append(_estadistica_python(montos_aplicados, recompensas, con_tope, buckets))
+    return estadisticas, sum(asignadas)
+
+
+def _evaluar_numpy(
+    np: ModuleType,
+    candidatas: list[_Candidata],
+    montos: list[int],
+    fechas: list[int],
+    *,
+    primera_aplicable: bool,
+    buckets: int,
+) -> tuple[list[_Estadistica], int]:
+    arreglo_montos = np.asarray(montos, dtype=np.int64)
+    arreglo_fechas = np.asarray(fechas, dtype=np.int64)
+    asignadas = np.zeros(len(montos), dtype=bool)
+    estadisticas: list[_Estadistica] = []
+    for candidata in candidatas:
+        regla = candidata.regla
+        if regla is None:
+            estadisticas.append(_Estadistica())
+            continue
+        mascara = arreglo_montos >= regla.minimo_centavos
+        if regla.inicio_us is not None:
+            mascara &= arreglo_fechas >= regla.inicio_us
+        if regla.fin_us is not None:
+            mascara &= arreglo_fechas <= regla.fin_us
+        if primera_aplicable:
+            mascara &= ~asignadas
+        asignadas |= mascara
+        aplicados = arreglo_montos[mascara]
+        if not len(aplicados):
+            estadisticas.append(_Estadistica())
+            continue
+        if regla.porcentaje_bp is not None:
+            # Los montos son positivos: el half-up entero coincide con el de Decimal.
+            recompensas = (aplicados * regla.porcentaje_bp + 5000) // 10000
+        else:
+            recompensas = np.full(len(aplicados), regla.fijo_centavos, dtype=np.int64)
+        con_tope = 0
+        if regla.maximo_centavos is not None:
+            con_tope = int(np.count_nonzero(recompensas > regla.maximo_centavos))
+            recompensas = np.minimum(recompensas, regla.maximo_centavos)
+        ordenadas = np.sort(recompensas)
+        minima, maxima = int(ordenadas[0]), int(ordenadas[-1])
+        conteos = np.bincount((recompensas - minima) * buckets // (maxima - minima + 1), minlength=buckets)
+        estadisticas.append(
+            _Estadistica(
+                aplicadas=len(recompensas),
+                con_tope=con_tope,
+                monto_compra_total=int(aplicados.sum()),
+                recompensa_total=int(recompensas.sum()),
+                minima=minima,
+                maxima=maxima,
+                percentiles=tuple(int(ordenadas[_posicion_percentil(p, len(ordenadas))]) for p in PERCENTILES),
+                conteos=[int(conteo) for conteo in conteos],
+            )
+        )
+    return estadisticas, int(np.count_nonzero(asignadas))
+
+
+def _cabe_en_int64(candidatas: list[_Candidata], montos: list[int]) -> bool:
+    """Productos y sumas deben entrar en ``int64``; si no, se usa el camino de enteros de Python."""
+    reglas = [candidata.regla for candidata in candidatas if candidata.regla is not None]
+    porcentaje = max((regla.porcentaje_bp or 0 for regla in reglas), default=0)
+    fijo = max((regla.fijo_centavos or 0 for regla in reglas), default=0)
+    monto_maximo = max(montos)
+    if monto_maximo * max(porcentaje, 1) >= LIMITE_INT64:
+        return False
+    return len(montos) * max(monto_maximo, fijo, monto_maximo * porcentaje // 10000 + 1) < LIMITE_INT64
+
+
+def _promedio(total: int, cantidad: int) -> Decimal:
+    return (Decimal(total) / Decimal(cantidad)).scaleb(-2).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _distribucion(estadistica: _Estadistica, buckets: int) -> list[DistribucionRecompensaBucket]:
+    if not estadistica.aplicadas:
+        return []
+    ancho = estadistica.maxima - estadistica.minima + 1
+    distribucion: list[DistribucionRecompensaBucket] = []
+    for indice, cantidad in enumerate(estadistica.conteos):
+        # El bucket i agrupa las recompensas r con (r - minima) * buckets // ancho == i.
+        desde = estadistica.minima - (-indice * ancho // buckets)
+        hasta = estadistica.minima - (-(indice + 1) * ancho // buckets) - 1
+        if desde > hasta:
+            continue
+        distribucion.append(
+            DistribucionRecompensaBucket(desde=desde_centavos(desde), hasta=desde_centavos(hasta), cantidad=cantidad)
+        )
+    return distribucion
+
+
+def _resumen(candidata: _Candidata, estadistica: _Estadistica, buckets: int) -> SimulacionReglaResumen:
+    resumen = SimulacionReglaResumen(
+        regla_id=candidata.id,
+        nombre_regla=candidata.nombre,
+        moneda_recompensa=candidata.moneda_recompensa,
+        compras_aplicadas=estadistica.aplicadas,
+        compras_con_tope=estadistica.con_tope,
+        monto_compra_total=desde_centavos(estadistica.monto_compra_total),
+        monto_recompensa_total=desde_centavos(estadistica.recompensa_total),
+        distribucion=_distribucion(estadistica, buckets),
+    )
+    if estadistica.aplicadas:
+        p50, p90, p99 = (desde_centavos(valor) for valor in estadistica.percentiles)
+        resumen.recompensa_minima = desde_centavos(estadistica.minima)
+        resumen.recompensa_maxima = desde_centavos(estadistica.maxima)
+        resumen.recompensa_promedio = _promedio(estadistica.recompensa_total, estadistica.aplicadas)
+        resumen.percentil_50, resumen.percentil_90, resumen.percentil_99 = p50, p90, p99
+    return resumen
+
+
+def _candidatas(
+    db: Session,
+    organizacion_id: UUID,
+    datos: SimularRecompensaLoteRequest,
+) -> list[_Candidata]:
+    if datos.regla_ids is None:
+        reglas = reglas_organizacion(db, organizacion_id).reglas
+        return [
+            _Candidata(regla.id, regla.nombre, regla.moneda_recompensa, regla)
+            for regla in sorted(reglas, key=lambda regla: regla.prioridad)
+            if datos.tipo is None or regla.tipo == datos.tipo
+        ]
+    regla_ids = list(dict.fromkeys(datos.regla_ids))
+    reglas = {
+        regla.id: regla
+        for regla in db.scalars(
+            select(ReglaRecompensa).where(
+                ReglaRecompensa.organizacion_id == organizacion_id,
+                ReglaRecompensa.id.in_(regla_ids),
+            )
+        ).all()
+    }
+    if len(reglas) != len(regla_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Regla de recompensa no encontrada.")
+    return [
+        _Candidata(
+            regla.id,
+            regla.nombre,
+            regla.moneda_recompensa,
+            compilar_regla(regla, prioridad, exigir_activa=False),
+        )
+        for prioridad, regla in enumerate(reglas[regla_id] for regla_id in regla_ids)
+    ]
+
+
+def simular_lote(
+    db: Session,
+    organizacion_id: UUID,
+    datos: SimularRecompensaLoteRequest,
+    *,
+    max_compras: int | None = None,
+) -> SimularRecompensaLoteResponse:
+    """Simula el lote; ``max_compras`` (por defecto ``RECOMPENSAS_SIMULACION_MAX_COMPRAS``) acota su tamano."""
+    max_compras = settings.RECOMPENSAS_SIMULACION_MAX_COMPRAS if max_compras is None else max_compras
+    if max_compras > 0 and len(datos.montos_compra) > max_compras:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La simulacion admite hasta {max_compras} compras.",
+        )
+    candidatas = _candidatas(db, organizacion_id, datos)
+    montos = [a_centavos(monto) for monto in datos.montos_compra]
+    if datos.fechas is None:
+        fechas = [a_microsegundos(datetime.now(timezone.utc))] * len(montos)
+    else:
+        fechas = [a_microsegundos(fecha) for fecha in datos.fechas]
+
+    primera_aplicable = datos.regla_ids is None
+    np = _numpy()
+    if np is not None and _cabe_en_int64(candidatas, montos):
+        estadisticas, con_recompensa = _evaluar_numpy(
+            np, candidatas, montos, fechas, primera_aplicable=primera_aplicable, buckets=datos.buckets
+        )
+        motor = "numpy"
+    else:
+        estadisticas, con_recompensa = _evaluar_python(
+            candidatas, montos, fechas, primera_aplicable=primera_aplicable, buckets=datos.buckets
+        )
+        motor = "python"
+    return SimularRecompensaLoteResponse(
+        modo="primera_aplicable" if primera_aplicable else "por_regla",
+        motor=motor,
+        cantidad_compras=len(montos),
+        monto_compra_total=desde_centavos(sum(montos)),
+        compras_con_recompensa=con_recompensa,
+        compras_sin_recompensa=len(montos) - con_recompensa,
+        reglas=[
+            _resumen(candidata, estadistica, datos.buckets)
+            for candidata, estadistica in zip(candidatas, estadisticas)
+        ],
+    )
+
+
+def leer_compras(ruta: Path) -> dict[str, Any]:
+    """Lee ``monto_compra`` y ``fecha`` (opcional) de un CSV con encabezado o de un NDJSON."""
+    montos: list[str] = []
+    fechas: list[str] = []
+    with ruta.open(encoding="utf-8", newline="") as archivo:
+        if ruta.suffix.lower() in {".ndjson", ".jsonl"}:
+            filas = (json.loads(linea) for linea in archivo if linea.strip())
+        else:
+            filas = csv.DictReader(archivo)
+        for fila in filas:
+            montos.append(fila["monto_compra"])
+            if fila.get("fecha"):
+                fechas.append(fila["fecha"])
+    if fechas and len(fechas) != len(montos):
+        raise ValueError("Todas las compras deben tener fecha o ninguna.")
+    return {"montos_compra": montos, "fechas": fechas or None}
+
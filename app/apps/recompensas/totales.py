@@ -0,0 +1,156 @@
+"""Totales materializados de recompensas por (organizacion, usuario, moneda) y por regla.
+
+Cada camino que inserta ``AplicacionRecompensa`` llama a ``acumular_totales`` antes de confirmar: los
+totales se agrupan en memoria y se suman con un ``INSERT ... ON CONFLICT DO UPDATE`` por tabla, en orden
+de clave para que dos transacciones no se bloqueen mutuamente. ``reconstruir_totales`` los recalcula
+desde ``aplicaciones_recompensa`` (``scripts/reconstruir_totales_recompensas.py``).
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Iterable
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.apps.recompensas.models import AplicacionRecompensa, TotalRecompensaRegla, TotalRecompensaUsuario
+
+
+CAMPOS_ACUMULADOS = ("cantidad_aplicaciones", "monto_compra_total", "monto_recompensa_total")
+
+
+def _insert(db: Session, modelo: type) -> Any:
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialecto.insert(modelo)
+
+
+def _sumar(acumulado: dict[str, Any], aplicacion: AplicacionRecompensa) -> None:
+    acumulado["cantidad_aplicaciones"] += 1
+    acumulado["monto_compra_total"] += aplicacion.monto_compra
+    acumulado["monto_recompensa_total"] += aplicacion.monto_recompensa
+    acumulado["fecha_ultima_aplicacion"] = max(acumulado["fecha_ultima_aplicacion"], aplicacion.fecha_creacion)
+
+
+def _upsert(db: Session, modelo: type, claves: list[str], filas: list[dict[str, Any]]) -> None:
+    sentencia = _insert(db, modelo)
+    # Una transaccion que confirma despues no necesariamente aplico despues: se conserva la fecha mayor.
+    mayor = func.greatest if db.get_bind().dialect.name == "postgresql" else func.max
+    db.execute(
+        sentencia.on_conflict_do_update(
+            index_elements=claves,
+            set_={
+                **{campo: getattr(modelo, campo) + getattr(sentencia.excluded, campo) for campo in CAMPOS_ACUMULADOS},
+                "fecha_ultima_aplicacion": mayor(
+                    modelo.fecha_ultima_aplicacion, sentencia.excluded.fecha_ultima_aplicacion
+                ),
+            },
+        ),
+        filas,
+    )
+
+
+def acumular_totales(db: Session, aplicaciones: Iterable[AplicacionRecompensa]) -> None:
+    """Suma aplicaciones ya insertadas (con ``fecha_creacion``) a los totales, en la transaccion en curso."""
+    por_usuario: dict[tuple[UUID, UUID, str], dict[str, Any]] = {}
+    por_regla: dict[tuple[UUID, str], dict[str, Any]] = {}
+    for aplicacion in aplicaciones:
+        vacio = {
+            "cantidad_aplicaciones": 0,
+            "monto_compra_total": Decimal("0.00"),
+            "monto_recompensa_total": Decimal("0.00"),
+            "fecha_ultima_aplicacion": aplicacion.fecha_creacion,
+        }
+        clave = (aplicacion.organizacion_id, aplicacion.usuario_id, aplicacion.moneda_recompensa.value)
+        usuario = por_usuario.setdefault(
+            clave,
+            {
+                "organizacion_id": aplicacion.organizacion_id,
+                "usuario_id": aplicacion.usuario_id,
+                "moneda_recompensa": aplicacion.moneda_recompensa,
+                **vacio,
+            },
+        )
+        _sumar(usuario, aplicacion)
+        regla = por_regla.setdefault(
+            (aplicacion.regla_id, aplicacion.moneda_recompensa.value),
+            {
+                "regla_id": aplicacion.regla_id,
+                "organizacion_id": aplicacion.organizacion_id,
+                "moneda_recompensa": aplicacion.moneda_recompensa,
+                **vacio,
+            },
+        )
+        _sumar(regla, aplicacion)
+    if not por_usuario:
+        return
+    _upsert(
+        db,
+        TotalRecompensaUsuario,
+        ["organizacion_id", "usuario_id", "moneda_recompensa"],
+        [por_usuario[clave] for clave in sorted(por_usuario, key=lambda clave: tuple(map(str, clave)))],
+    )
+    _upsert(
+        db,
+        TotalRecompensaRegla,
+        ["regla_id", "moneda_recompensa"],
+        [por_regla[clave] for clave in sorted(por_regla, key=lambda clave: tuple(map(str, clave)))],
+    )
+
+
+def reconstruir_totales(db: Session, organizacion_id: UUID | None = None) -> tuple[int, int]:
+    """Recalcula los totales (de una organizacion o de todas) y confirma. Devuelve las filas de cada tabla."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Las aplicaciones concurrentes esperan al commit y suman su delta sobre los totales ya reconstruidos.
+        db.execute(text("LOCK TABLE recompensa_totales_usuario, recompensa_totales_regla IN EXCLUSIVE MODE"))
+    filtro = [AplicacionRecompensa.organizacion_id == organizacion_id] if organizacion_id is not None else []
+    for modelo in (TotalRecompensaUsuario, TotalRecompensaRegla):
+        borrado = delete(modelo)
+        if organizacion_id is not None:
+            borrado = borrado.where(modelo.organizacion_id == organizacion_id)
+        db.execute(borrado)
+
+    acumulados = (
+        func.count().label("cantidad_aplicaciones"),
+        func.sum(AplicacionRecompensa.monto_compra).label("monto_compra_total"),
+        func.sum(AplicacionRecompensa.monto_recompensa).label("monto_recompensa_total"),
+        func.max(AplicacionRecompensa.fecha_creacion).label("fecha_ultima_aplicacion"),
+    )
+    usuarios = db.execute(
+        TotalRecompensaUsuario.__table__.insert().from_select(
+            ["organizacion_id", "usuario_id", "moneda_recompensa", *CAMPOS_ACUMULADOS, "fecha_ultima_aplicacion"],
+            select(
+                AplicacionRecompensa.organizacion_id,
+                AplicacionRecompensa.usuario_id,
+                AplicacionRecompensa.moneda_recompensa,
+                *acumulados,
+            )
+            .where(*filtro)
+            .group_by(
+                AplicacionRecompensa.organizacion_id,
+                AplicacionRecompensa.usuario_id,
+                AplicacionRecompensa.moneda_recompensa,
+            ),
+        )
+    ).rowcount
+    reglas = db.execute(
+        TotalRecompensaRegla.__table__.insert().from_select(
+            ["regla_id", "moneda_recompensa", "organizacion_id", *CAMPOS_ACUMULADOS, "fecha_ultima_aplicacion"],
+            select(
+                AplicacionRecompensa.regla_id,
+                AplicacionRecompensa.moneda_recompensa,
+                AplicacionRecompensa.organizacion_id,
+                *acumulados,
+            )
+            .where(*filtro)
+            .group_by(
+                AplicacionRecompensa.regla_id,
+                AplicacionRecompensa.moneda_recompensa,
+                AplicacionRecompensa.organizacion_id,
+            ),
+        )
+    ).rowcount
+    db.commit()
+    return usuarios, reglas
+
@@ -0,0 +1,242 @@
+"""Vencimiento de puntos otorgados como recompensa, FIFO por wallet.
+
+Los puntos de una aplicacion ``PUNTOS`` vencen ``RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES`` meses despues de
+otorgados. Cada debito de la wallet (canjes, reversas y vencimientos anteriores) consume primero los
+puntos mas viejos, asi que lo que vence al corte ``t`` es::
+
+    min(saldo, puntos otorgados hasta t - todo lo debitado de la wallet)
+
+Los creditos que no son recompensas no vencen y se consideran consumidos al final. El resultado no depende
+de corridas anteriores: una wallet ya vencida da cero, y correr dos veces (o en paralelo) no vence dos veces.
+
+El job recorre las aplicaciones nuevas desde la ultima corrida con el indice
+``(fecha_creacion, moneda_recompensa)`` en tramos de un dia. Las wallets de cada tramo se procesan en
+lotes de ``RECOMPENSAS_VENCIMIENTO_LOTE``, bloqueadas en orden de id, con un commit por lote; cada
+vencimiento es un ``ajuste_admin`` de debito, reversible como cualquier ajuste. ``procesado_hasta`` se
+guarda al cerrar cada tramo: una corrida cortada se retoma desde ahi.
+
+Como los demas debitos, el vencimiento no toca wallets congeladas, inactivas ni cerradas. Sus puntos no se
+pierden del calculo: vencen la proxima vez que la wallet entre en un tramo (al recibir puntos nuevos).
+
+Uso: ``python -m app.apps.recompensas.vencimientos [--meses N] [--corte ISO]`` (por ejemplo, desde cron).
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Sequence
+from uuid import UUID, uuid4
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.apps.auditoria.services import registrar_evento_sistema
+from app.apps.movimientos.models import Movimiento
+from app.apps.recompensas.models import AplicacionRecompensa, EjecucionVencimientoPuntos
+from app.apps.recompensas.services import _amount, _as_utc, _now
+from app.apps.wallets.models import Wallet
+from app.core import database as database_module
+from app.core.config import settings
+from app.core.logging import configure_logging
+from app.shared.enums import EstadoMovimiento, EstadoWallet, MonedaRecompensa, TipoMovimiento
+
+
+logger = logging.getLogger(__name__)
+
+TRAMO = timedelta(days=1)
+MOTIVO = "vencimiento_puntos"
+# Los debitos revertidos siguen consumiendo puntos: la reversa acredita puntos nuevos, que no vencen.
+ESTADOS_DEBITO = (EstadoMovimiento.aprobada, EstadoMovimiento.revertida)
+
+
+def restar_meses(fecha: datetime, meses: int) -> datetime:
+    """Misma fecha ``meses`` meses antes; el dia se ajusta al ultimo del mes si no existe."""
+    total = fecha.year * 12 + fecha.month - 1 - meses
+    anio, mes = divmod(total, 12)
+    dia = min(fecha.day, calendar.monthrange(anio, mes + 1)[1])
+    return fecha.replace(year=anio, month=mes + 1, day=dia)
+
+
+def calcular_corte(meses: int | None = None, *, ahora: datetime | None = None) -> datetime:
+    meses = settings.RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES if meses is None else meses
+    if meses <= 0:
+        raise ValueError("El vencimiento de puntos esta desactivado (RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES=0).")
+    return restar_meses(ahora or _now(), meses)
+
+
+def _puntos_vencibles(db: Session, wallet_ids: Sequence[UUID], hasta: datetime) -> dict[UUID, Decimal]:
+    otorgados = dict(
+        db.execute(
+            select(AplicacionRecompensa.wallet_destino_id, func.sum(AplicacionRecompensa.monto_recompensa))
+            .where(
+                AplicacionRecompensa.wallet_destino_id.in_(wallet_ids),
+                AplicacionRecompensa.moneda_recompensa == MonedaRecompensa.PUNTOS,
+                AplicacionRecompensa.fecha_creacion <= hasta,
+            )
+            .group_by(AplicacionRecompensa.wallet_destino_id)
+        ).all()
+    )
+    debitados = dict(
+        db.execute(
+            select(Movimiento.wallet_origen_id, func.sum(Movimiento.monto))
+            .where(Movimiento.wallet_origen_id.in_(wallet_ids), Movimiento.estado.in_(ESTADOS_DEBITO))
+            .group_by(Movimiento.wallet_origen_id)
+        ).all()
+    )
+    return {
+        wallet_id: _amount(otorgado) - _amount(debitados.get(wallet_id) or 0)
+        for wallet_id, otorgado in otorgados.items()
+    }
+
+
+def vencer_lote(
+    db: Session,
+    wallet_ids: Sequence[UUID],
+    *,
+    hasta: datetime,
+    ejecucion: EjecucionVencimientoPuntos,
+) -> None:
+    """Vence los puntos otorgados hasta ``hasta`` en estas wallets; no confirma."""
+    # Bloqueo en orden de id antes de leer saldos y debitos: un canje concurrente espera o ya esta sumado.
+    wallets = db.scalars(select(Wallet).where(Wallet.id.in_(wallet_ids)).order_by(Wallet.id).with_for_update()).all()
+    vencibles = _puntos_vencibles(db, wallet_ids, hasta)
+    movimientos: list[Movimiento] = []
+    for wallet in wallets:
+        if wallet.estado != EstadoWallet.activa:
+            logger.info("Vencimiento de puntos omitido en la wallet %s (%s)", wallet.id, wallet.estado.value)
+            continue
+        monto = min(_amount(wallet.saldo), vencibles.get(wallet.id, Decimal("0.00")))
+        if monto <= 0:
+            continue
+        wallet.saldo = _amount(wallet.saldo) - monto
+        movimientos.append(
+            Movimiento(
+                id=uuid4(),
+                wallet_origen_id=wallet.id,
+                wallet_destino_id=None,
+                organizacion_id=wallet.organizacion_id,
+                monto=monto,
+                moneda=wallet.moneda,
+                tipo=TipoMovimiento.ajuste_admin,
+                estado=EstadoMovimiento.aprobada,
+                descripcion="Vencimiento de puntos",
+                referencia_externa=f"vencimiento-puntos:{hasta.date().isoformat()}",
+                metadata_movimiento={
+                    "operacion": "debito",
+                    "motivo": MOTIVO,
+                    "otorgados_hasta": hasta.isoformat(),
+                    "ejecucion_id": str(ejecucion.id),
+                },
+                es_reversa=False,
+            )
+        )
+        ejecucion.wallets_vencidas += 1
+        ejecucion.puntos_vencidos = _amount(ejecucion.puntos_vencidos) + monto
+    # Por el ORM, para que el evento after_insert registre cada vencimiento en movimiento_cambios.
+    db.add_all(movimientos)
+
+
+def _inicio(db: Session, corte: datetime) -> datetime | None:
+    desde = db.scalar(select(func.max(EjecucionVencimientoPuntos.procesado_hasta)))
+    if desde is not None:
+        return _as_utc(desde)
+    primera = db.scalar(
+        select(func.min(AplicacionRecompensa.fecha_creacion)).where(
+            AplicacionRecompensa.fecha_creacion <= corte,
+            AplicacionRecompensa.moneda_recompensa == MonedaRecompensa.PUNTOS,
+        )
+    )
+    return _as_utc(primera) - timedelta(microseconds=1) if primera is not None else None
+
+
+def vencer_puntos(
+    db: Session,
+    *,
+    corte: datetime | None = None,
+    tamano_lote: int | None = None,
+) -> EjecucionVencimientoPuntos:
+    """Vence los puntos otorgados hasta ``corte`` (por defecto, hace ``RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES``)."""
+    corte = _as_utc(corte) if corte is not None else calcular_corte()
+    tamano_lote = tamano_lote or settings.RECOMPENSAS_VENCIMIENTO_LOTE
+    inicio = _inicio(db, corte)
+    ejecucion = EjecucionVencimientoPuntos(
+        id=uuid4(),
+        corte=corte,
+        desde=inicio,
+        wallets_vencidas=0,
+        puntos_vencidos=Decimal("0.00"),
+        fecha_inicio=_now(),
+    )
+    db.add(ejecucion)
+    db.commit()
+
+    while inicio is not None and inicio < corte:
+        fin = min(inicio + TRAMO, corte)
+        wallet_ids = db.scalars(
+            select(AplicacionRecompensa.wallet_destino_id)
+            .where(
+                AplicacionRecompensa.fecha_creacion > inicio,
+                AplicacionRecompensa.fecha_creacion <= fin,
+                AplicacionRecompensa.moneda_recompensa == MonedaRecompensa.PUNTOS,
+            )
+            .distinct()
+            .order_by(AplicacionRecompensa.wallet_destino_id)
+        ).all()
+        for posicion in range(0, len(wallet_ids), tamano_lote):
+            vencer_lote(db, wallet_ids[posicion : posicion + tamano_lote], hasta=fin, ejecucion=ejecucion)
+            db.commit()
+        ejecucion.procesado_hasta = fin
+        db.commit()
+        inicio = fin
+
+    ejecucion.procesado_hasta = corte
+    ejecucion.fecha_fin = _now()
+    db.commit()
+    registrar_evento_sistema(
+        db,
+        organizacion_id=None,
+        evento="recompensas.puntos_vencidos",
+        mensaje="Vencimiento de puntos ejecutado.",
+        metadata={
+            "ejecucion_id": str(ejecucion.id),
+            "corte": corte.isoformat(),
+            "wallets_vencidas": ejecucion.wallets_vencidas,
+            "puntos_vencidos": str(ejecucion.puntos_vencidos),
+        },
+    )
+    logger.info(
+        "Vencimiento de puntos al %s: %s wallets, %s puntos",
+        corte.isoformat(),
+        ejecucion.wallets_vencidas,
+        ejecucion.puntos_vencidos,
+    )
+    return ejecucion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vence los puntos de recompensa otorgados hace N meses.")
+    parser.add_argument("--meses", type=int, default=None, help="Meses de vigencia (por defecto, la configuracion).")
+    parser.add_argument(
+        "--corte",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Vence lo otorgado hasta esta fecha ISO (en lugar de --meses).",
+    )
+    parser.add_argument("--tamano-lote", type=int, default=None, help="Wallets por transaccion.")
+    args = parser.parse_args()
+
+    configure_logging()
+    try:
+        corte = args.corte or calcular_corte(args.meses)
+    except ValueError as exc:
+        parser.error(str(exc))
+    with database_module.SessionLocal() as db:
+        ejecucion = vencer_puntos(db, corte=corte, tamano_lote=args.tamano_lote)
+        print(f"Wallets vencidas: {ejecucion.wallets_vencidas} Puntos vencidos: {ejecucion.puntos_vencidos}")
+
+
+if __name__ == "__main__":
+    main()
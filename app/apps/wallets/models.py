@@ -4,12 +4,14 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from uuid import UUID, uuid4
 
-from sqlalchemy import Boolean, CheckConstraint, DateTime, Enum, ForeignKey, Numeric, String, Uuid
+from sqlalchemy import Boolean, CheckConstraint, DateTime, Enum, ForeignKey, Index, Numeric, String, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
 from app.shared.enums import EstadoWallet, MonedaWallet, OwnerTypeWallet, TipoWallet
 
+WALLET_PRINCIPAL_ABIERTA = "es_principal AND estado <> 'cerrada'"
+
 
 class Wallet(Base):
     __tablename__ = "wallets"
@@ -22,6 +24,14 @@ class Wallet(Base):
             ")",
             name="ck_wallet_owner_consistency",
         ),
+        # Una wallet principal abierta por usuario; permite crearla con INSERT ... ON CONFLICT DO NOTHING.
+        Index(
+            "ux_wallets_principal_usuario",
+            "usuario_id",
+            unique=True,
+            postgresql_where=text(WALLET_PRINCIPAL_ABIERTA),
+            sqlite_where=text(WALLET_PRINCIPAL_ABIERTA),
+        ),
     )
 
     id: Mapped[UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid4, index=True)
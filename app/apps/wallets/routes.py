@@ -50,7 +50,7 @@ def post_wallet(
     encolar_webhook_evento(
         evento="wallet.creada",
         organizacion_id=wallet.organizacion_id,
-        data=wallet.model_dump(mode="json"),
+        data=lambda: wallet.model_dump(mode="json"),
         db=db,
         background_tasks=background_tasks,
     )
@@ -69,7 +69,7 @@ def post_wallet_organizacion(
     encolar_webhook_evento(
         evento="wallet.creada",
         organizacion_id=wallet.organizacion_id,
-        data=wallet.model_dump(mode="json"),
+        data=lambda: wallet.model_dump(mode="json"),
         db=db,
         background_tasks=background_tasks,
     )
@@ -24,6 +24,8 @@ WEAK_SECRET_KEYS = {
     "wallet-saas",
 }
 ALLOWED_LOG_LEVELS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+ALLOWED_RATE_LIMIT_BACKENDS = {"memory", "database"}
+ALLOWED_WEBHOOK_WORKER_ENGINES = {"thread", "async"}
 
 
 def _is_weak_secret_key(value: str) -> bool:
@@ -39,6 +41,7 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     DEBUG: bool = False
     DATABASE_URL: str = DEFAULT_DATABASE_URL
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS: int = 60
     MONGO_URI: str = "mongodb://localhost:27017"
     MONGO_DB: str = "wallet_saas_logs"
     SECRET_KEY: str = "change-me"
@@ -52,6 +55,7 @@ class Settings(BaseSettings):
     MAIL_STARTTLS: bool = True
     MAIL_SSL_TLS: bool = False
     EMAILS_ENABLED: bool = False
+    EMAIL_TEMPLATES_RELOAD: bool = False
     RUN_DEMO_SEED: bool = False
     ALLOW_DEMO_SEED: bool = False
     FRONTEND_URL: str = "http://127.0.0.1:5173"
@@ -59,6 +63,56 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = "INFO"
     ENABLE_HSTS: bool = False
     CORS_ORIGINS: Annotated[list[str], NoDecode] = DEFAULT_CORS_ORIGINS
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    WEBHOOK_TIMEOUT_SECONDS: float = 2.0
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    WEBHOOK_MAX_CONNECTIONS_PER_HOST: int = 10
+    WEBHOOK_KEEPALIVE_SECONDS: float = 30.0
+    WEBHOOK_HTTP2: bool = True
+    WEBHOOK_WORKER_ENABLED: bool = False
+    WEBHOOK_MAX_ATTEMPTS: int = 8
+    WEBHOOK_RETRY_BASE_SECONDS: float = 10.0
+    WEBHOOK_RETRY_MAX_SECONDS: float = 3600.0
+    WEBHOOK_WORKER_CONCURRENCY: int = 16
+    WEBHOOK_WORKER_BATCH_SIZE: int = 100
+    WEBHOOK_WORKER_POLL_SECONDS: float = 1.0
+    WEBHOOK_WORKER_LEASE_SECONDS: int = 60
+    WEBHOOK_WORKER_ENGINE: str = "thread"
+    WEBHOOK_ASYNC_CONCURRENCY: int = 1000
+    WEBHOOK_MAX_IN_FLIGHT_PER_ENDPOINT: int = 10
+    WEBHOOK_RESULT_FLUSH_SIZE: int = 200
+    WEBHOOK_RESULT_FLUSH_SECONDS: float = 0.5
+    WEBHOOK_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    WEBHOOK_CIRCUIT_OPEN_SECONDS: int = 60
+    WEBHOOK_SUBSCRIPTION_CACHE_SECONDS: float = 30.0
+    WEBHOOK_PAYLOAD_CACHE_SIZE: int = 1024
+    WEBHOOK_REPLAY_RATE_PER_SECOND: int = 50
+    WEBHOOK_SECRET_CACHE_SIZE: int = 1024
+    MOVIMIENTOS_FEED_POLL_SECONDS: float = 0.5
+    MOVIMIENTOS_FEED_MAX_WAIT_SECONDS: int = 30
+    MOVIMIENTOS_FEED_MAX_LAG_SECONDS: int = 60
+    MOVIMIENTOS_LOTE_CHUNK_SIZE: int = 200
+    ECOMMERCE_LOTE_MAX_ORDERS: int = 10000
+    ECOMMERCE_LOTE_CHUNK_SIZE: int = 500
+    ECOMMERCE_ORDER_WORKER_ENABLED: bool = False
+    ECOMMERCE_WORKER_CONCURRENCY: int = 8
+    ECOMMERCE_WORKER_BATCH_SIZE: int = 50
+    ECOMMERCE_WORKER_POLL_SECONDS: float = 1.0
+    ECOMMERCE_WORKER_LEASE_SECONDS: int = 120
+    ECOMMERCE_WORKER_MAX_ATTEMPTS: int = 5
+    ECOMMERCE_WORKER_RETRY_BASE_SECONDS: float = 10.0
+    ECOMMERCE_ORDER_STUCK_SECONDS: int = 300
+    ECOMMERCE_IDENTITY_CACHE_SIZE: int = 10000
+    ECOMMERCE_IDENTITY_CACHE_SECONDS: float = 300.0
+    RECOMPENSAS_REGLAS_CACHE_SECONDS: float = 30.0
+    RECOMPENSAS_SIMULACION_MAX_COMPRAS: int = 1_000_000
+    RECOMPENSAS_BACKTEST_CHUNK_SIZE: int = 5000
+    RECOMPENSAS_BACKTEST_PROCESOS: int = 0
+    RECOMPENSAS_LOTE_CHUNK_SIZE: int = 500
+    RECOMPENSAS_LOTE_MAX_ITEMS: int = 10000
+    RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES: int = 0
+    RECOMPENSAS_VENCIMIENTO_LOTE: int = 1000
 
     @field_validator("DEBUG", mode="before")
     @classmethod
@@ -92,6 +146,24 @@ class Settings(BaseSettings):
             raise ValueError(f"LOG_LEVEL debe ser uno de: {allowed}.")
         return level
 
+    @field_validator("RATE_LIMIT_BACKEND", mode="before")
+    @classmethod
+    def normalize_rate_limit_backend(cls, value: str) -> str:
+        backend = str(value or "memory").strip().lower()
+        if backend not in ALLOWED_RATE_LIMIT_BACKENDS:
+            allowed = ", ".join(sorted(ALLOWED_RATE_LIMIT_BACKENDS))
+            raise ValueError(f"RATE_LIMIT_BACKEND debe ser uno de: {allowed}.")
+        return backend
+
+    @field_validator("WEBHOOK_WORKER_ENGINE", mode="before")
+    @classmethod
+    def normalize_webhook_worker_engine(cls, value: str) -> str:
+        engine = str(value or "thread").strip().lower()
+        if engine not in ALLOWED_WEBHOOK_WORKER_ENGINES:
+            allowed = ", ".join(sorted(ALLOWED_WEBHOOK_WORKER_ENGINES))
+            raise ValueError(f"WEBHOOK_WORKER_ENGINE debe ser uno de: {allowed}.")
+        return engine
+
     @field_validator("CORS_ORIGINS", mode="before")
     @classmethod
     def parse_cors_origins(cls, value: str | list[str] | tuple[str, ...] | None) -> list[str]:
@@ -14,7 +14,12 @@ class Base(DeclarativeBase):
 def _engine_kwargs(database_url: str) -> dict[str, object]:
     if database_url.startswith("sqlite"):
         return {"connect_args": {"check_same_thread": False}}
-    return {"pool_pre_ping": True}
+    kwargs: dict[str, object] = {"pool_pre_ping": True}
+    if database_url.startswith("postgresql") and settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS > 0:
+        # Una sesion olvidada en una transaccion retiene el horizonte del feed de movimientos para todos.
+        timeout_ms = settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS * 1000
+        kwargs["connect_args"] = {"options": f"-c idle_in_transaction_session_timeout={timeout_ms}"}
+    return kwargs
 
 
 engine = create_engine(settings.DATABASE_URL, future=True, **_engine_kwargs(settings.DATABASE_URL))
@@ -6,15 +6,21 @@ from sqlalchemy.exc import SQLAlchemyError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 
-def error_response(status_code: int, detail: object, error_type: str) -> JSONResponse:
+def error_response(
+    status_code: int,
+    detail: object,
+    error_type: str,
+    headers: dict[str, str] | None = None,
+) -> JSONResponse:
     return JSONResponse(
         status_code=status_code,
         content={"success": False, "error": error_type, "detail": detail},
+        headers=headers,
     )
 
 
 async def http_exception_handler(request: Request, exc: StarletteHTTPException) -> JSONResponse:
-    return error_response(exc.status_code, exc.detail, "HTTPException")
+    return error_response(exc.status_code, exc.detail, "HTTPException", getattr(exc, "headers", None))
 
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
@@ -1,4 +1,6 @@
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
@@ -13,7 +15,9 @@ from app.apps.ecommerce.routes import ext_router as ecommerce_ext_router
 from app.apps.ecommerce.routes import router as ecommerce_router
 from app.apps.integraciones.routes import ext_router as integraciones_ext_router
 from app.apps.integraciones.routes import router as integraciones_router
+from app.apps.integraciones.webhook_dispatcher import abrir_cliente_http, cerrar_cliente_http
 from app.apps.movimientos.routes import router as movimientos_router
+from app.apps.notificaciones.email_service import cargar_plantillas
 from app.apps.notificaciones.routes import router as notificaciones_router
 from app.apps.onboarding.routes import router as onboarding_router
 from app.apps.organizaciones.routes import router as organizaciones_router
@@ -33,6 +37,17 @@ from app.middlewares.security_headers import SecurityHeadersMiddleware
 configure_logging()
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    abrir_cliente_http()
+    cargar_plantillas()
+    try:
+        yield
+    finally:
+        cerrar_cliente_http()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
@@ -41,6 +56,7 @@ app = FastAPI(
         "API multi-tenant para Wallet SaaS. Incluye configuracion de branding "
         "y preparacion white-label por organizacion."
     ),
+    lifespan=lifespan,
 )
 
 app.add_middleware(
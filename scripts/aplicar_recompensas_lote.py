@@ -0,0 +1,83 @@
+"""Aplica recompensas desde un archivo de compras (CSV con encabezado, NDJSON o arreglo JSON).
+
+Guarda en ``--progreso`` el indice de la primera compra sin procesar despues de cada tramo confirmado;
+si el proceso se corta o un tramo falla, la siguiente corrida retoma desde ahi. Las compras ya aplicadas
+antes del corte se informan como ``duplicada`` por su ``referencia_externa``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from uuid import UUID
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from sqlalchemy import select
+
+from app.apps.auth.schemas import DatosUsuarioToken
+from app.apps.recompensas.lotes import aplicar_recompensas_lote, leer_aplicaciones_lote
+from app.apps.usuarios.models import Usuario
+from app.core.database import SessionLocal
+from app.shared.utils import normalize_email
+
+
+CONTENT_TYPES = {".csv": "text/csv", ".ndjson": "application/x-ndjson", ".jsonl": "application/x-ndjson"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Aplica recompensas en lote desde un archivo de compras.")
+    parser.add_argument("--archivo", type=Path, required=True, help="CSV, NDJSON o JSON con las compras.")
+    parser.add_argument("--actor-email", required=True, help="Usuario administrativo al que se atribuye el lote.")
+    parser.add_argument("--organizacion-id", type=UUID, default=None, help="Obligatoria si el actor es super_admin.")
+    parser.add_argument(
+        "--progreso",
+        type=Path,
+        default=None,
+        help="Archivo de avance (por defecto <archivo>.progreso).",
+    )
+    args = parser.parse_args()
+
+    progreso = args.progreso or args.archivo.with_name(f"{args.archivo.name}.progreso")
+    desde = int(progreso.read_text().strip() or 0) if progreso.exists() else 0
+    compras = leer_aplicaciones_lote(
+        args.archivo.read_bytes(),
+        CONTENT_TYPES.get(args.archivo.suffix.lower(), "application/json"),
+        max_items=0,
+    )
+
+    def guardar_progreso(siguiente: int) -> None:
+        progreso.write_text(str(siguiente))
+        print(f"Compras procesadas: {siguiente}/{len(compras)}", flush=True)
+
+    with SessionLocal() as db:
+        actor = db.scalar(select(Usuario).where(Usuario.email == normalize_email(args.actor_email)))
+        if actor is None:
+            parser.error("No existe un usuario con ese email.")
+        current_user = DatosUsuarioToken(
+            id=actor.id,
+            email=actor.email,
+            nombre=actor.nombre,
+            rol=actor.rol,
+            organizacion_id=actor.organizacion_id,
+        )
+        resultado = aplicar_recompensas_lote(
+            compras,
+            current_user,
+            db,
+            args.organizacion_id,
+            desde=desde,
+            al_confirmar_tramo=guardar_progreso,
+        )
+    respuesta = resultado.respuesta
+    print(f"Aplicadas: {respuesta.aplicadas} Duplicadas: {respuesta.duplicadas} Errores: {respuesta.errores}")
+    for item in respuesta.resultados:
+        if item.status == "error":
+            print(f"  #{item.indice} {item.referencia_externa or '-'}: {item.error}")
+
+
+if __name__ == "__main__":
+    main()
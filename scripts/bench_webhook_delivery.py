@@ -0,0 +1,177 @@
+"""Benchmark de envio de webhooks contra un servidor HTTP stub local.
+
+Compara un cliente httpx nuevo por delivery, el cliente compartido con pool keep-alive y el motor
+asyncio (``--async-concurrency``) que mantiene muchas deliveries en vuelo sin un thread por request.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.integraciones import webhook_dispatcher
+
+
+async def _handle_stub_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    latency_seconds: float,
+) -> None:
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value.strip())
+            await reader.readexactly(length)
+            if latency_seconds:
+                await asyncio.sleep(latency_seconds)
+            writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def _start_stub_server(latency_seconds: float) -> tuple[Callable[[], None], str]:
+    """Stub HTTP/1.1 keep-alive sobre asyncio en un thread propio; no limita la concurrencia medida."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    stopped = threading.Event()
+    state: dict[str, object] = {}
+
+    async def _serve() -> None:
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_stub_connection(reader, writer, latency_seconds),
+            "127.0.0.1",
+            0,
+            backlog=4096,
+        )
+        state["port"] = server.sockets[0].getsockname()[1]
+        state["task"] = asyncio.current_task()
+        ready.set()
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+        stopped.set()
+
+    threading.Thread(target=lambda: loop.run_until_complete(_serve()), daemon=True).start()
+    ready.wait()
+
+    def _shutdown() -> None:
+        loop.call_soon_threadsafe(state["task"].cancel)
+        stopped.wait(timeout=5)
+
+    return _shutdown, f"http://127.0.0.1:{state['port']}/hook"
+
+
+def _payload() -> dict[str, object]:
+    return webhook_dispatcher.construir_payload_evento(
+        "movimiento.creado",
+        uuid4(),
+        {"id": str(uuid4()), "monto": "125.50", "moneda": "ARS", "tipo": "deposito"},
+    )
+
+
+def _headers(payload: dict[str, object]) -> dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "X-Wallet-Signature": webhook_dispatcher.firmar_payload(payload, "secret-webhook-123"),
+        "X-Wallet-Event": "movimiento.creado",
+        "X-Wallet-Delivery-Id": str(uuid4()),
+    }
+
+
+def _send_with_new_client(url: str) -> None:
+    payload = _payload()
+    with httpx.Client(timeout=2.0) as client:
+        client.post(url, json=payload, headers=_headers(payload)).raise_for_status()
+
+
+def _send_with_shared_client(url: str) -> None:
+    payload = _payload()
+    body = webhook_dispatcher.codificar_payload(payload)
+    webhook_dispatcher._post_webhook(url, body, _headers(payload)).raise_for_status()
+
+
+def _run_async(url: str, *, deliveries: int, concurrency: int) -> float:
+    from app.apps.integraciones.webhook_async import crear_cliente_http_async
+
+    async def _send_all() -> None:
+        slots = asyncio.Semaphore(concurrency)
+        async with crear_cliente_http_async(concurrency) as client:
+
+            async def _send() -> None:
+                payload = _payload()
+                body = webhook_dispatcher.codificar_payload(payload)
+                async with slots:
+                    response = await client.post(url, content=body, headers=_headers(payload))
+                response.raise_for_status()
+
+            await asyncio.gather(*(_send() for _ in range(deliveries)))
+
+    started_at = time.perf_counter()
+    asyncio.run(_send_all())
+    elapsed = time.perf_counter() - started_at
+    rate = deliveries / elapsed
+    print(f"{'motor async':<22} {deliveries:>7} deliveries  {elapsed:8.2f}s  {rate:10.1f} deliveries/s", flush=True)
+    return rate
+
+
+def _run(name: str, send: Callable[[str], None], url: str, *, deliveries: int, concurrency: int) -> float:
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(send, url) for _ in range(deliveries)]:
+            future.result()
+    elapsed = time.perf_counter() - started_at
+    rate = deliveries / elapsed
+    print(f"{name:<22} {deliveries:>7} deliveries  {elapsed:8.2f}s  {rate:10.1f} deliveries/s", flush=True)
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mide deliveries por segundo contra un stub HTTP local.")
+    parser.add_argument("--deliveries", type=int, default=2000, help="Cantidad de deliveries por escenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads enviando en paralelo.")
+    parser.add_argument("--async-concurrency", type=int, default=0, help="Deliveries en vuelo del motor async (0 omite).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia simulada del endpoint stub.")
+    args = parser.parse_args()
+
+    shutdown, url = _start_stub_server(args.latency_ms / 1000)
+    try:
+        print(f"Stub HTTP en {url}; concurrencia={args.concurrency}", flush=True)
+        options = {"deliveries": args.deliveries, "concurrency": args.concurrency}
+        baseline = _run("cliente por delivery", _send_with_new_client, url, **options)
+        webhook_dispatcher.abrir_cliente_http()
+        try:
+            pooled = _run("cliente compartido", _send_with_shared_client, url, **options)
+        finally:
+            webhook_dispatcher.cerrar_cliente_http()
+        print(f"Mejora: x{pooled / baseline:.2f}", flush=True)
+        if args.async_concurrency:
+            motor = _run_async(url, deliveries=args.deliveries, concurrency=args.async_concurrency)
+            print(f"Mejora async vs compartido: x{motor / pooled:.2f}", flush=True)
+    finally:
+        shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark de fan-out de un payload grande a muchos endpoints (solo CPU, sin red).
+
+Compara el camino anterior (firma sobre JSON canonico + ``json=`` que httpx vuelve a serializar por
+endpoint) contra codificar una vez, firmar esos bytes y enviarlos con ``content=``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.integraciones import webhook_dispatcher
+
+
+URL = "https://example.com/hook"
+
+
+def _large_payload(items: int) -> dict[str, object]:
+    return webhook_dispatcher.construir_payload_evento(
+        "ecommerce.order_paid",
+        uuid4(),
+        {
+            "order_id": str(uuid4()),
+            "items": [
+                {"sku": f"SKU-{index:06d}", "nombre": f"Producto {index}", "cantidad": index % 7 + 1, "precio": "1999.90"}
+                for index in range(items)
+            ],
+        },
+    )
+
+
+def _fanout_serializando_por_endpoint(payload: dict[str, object], secrets: list[str]) -> None:
+    for secret in secrets:
+        signature = webhook_dispatcher.firmar_payload(payload, secret)
+        httpx.Request("POST", URL, json=payload, headers={"X-Wallet-Signature": signature})
+
+
+def _fanout_bytes_compartidos(payload: dict[str, object], secrets: list[str]) -> None:
+    for secret in secrets:
+        body = webhook_dispatcher.codificar_payload(payload)
+        signature = webhook_dispatcher.firmar_body(body, secret)
+        httpx.Request("POST", URL, content=body, headers={"X-Wallet-Signature": signature})
+
+
+def _run(name: str, fanout: Callable[[dict[str, object], list[str]], None], *, events: int, items: int, endpoints: int) -> float:
+    secrets = [f"secret-webhook-{index:04d}-abcdef" for index in range(endpoints)]
+    payloads = [_large_payload(items) for _ in range(events)]
+    started_at = time.perf_counter()
+    for payload in payloads:
+        fanout(payload, secrets)
+    elapsed = time.perf_counter() - started_at
+    rate = events * endpoints / elapsed
+    print(f"{name:<26} {events * endpoints:>7} deliveries  {elapsed:8.2f}s  {rate:10.1f} deliveries/s", flush=True)
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mide el costo de CPU del fan-out de payloads grandes.")
+    parser.add_argument("--events", type=int, default=50, help="Eventos a distribuir.")
+    parser.add_argument("--items", type=int, default=2000, help="Items por payload (define el tamano).")
+    parser.add_argument("--endpoints", type=int, default=20, help="Endpoints suscritos por evento.")
+    args = parser.parse_args()
+
+    size = len(webhook_dispatcher.codificar_payload(_large_payload(args.items)))
+    print(f"Payload ~{size / 1024:.0f} KiB; {args.endpoints} endpoints por evento", flush=True)
+    options = {"events": args.events, "items": args.items, "endpoints": args.endpoints}
+    baseline = _run("serializacion por endpoint", _fanout_serializando_por_endpoint, **options)
+    shared = _run("bytes compartidos", _fanout_bytes_compartidos, **options)
+    print(f"Mejora: x{shared / baseline:.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
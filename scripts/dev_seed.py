@@ -28,6 +28,7 @@ from app.apps.ecommerce.models import EcommerceOrderEvent  # noqa: F401
 from app.apps.integraciones.models import APIKey, WebhookDelivery, WebhookEndpoint  # noqa: F401
 from app.apps.integraciones.services import encrypt_webhook_secret
 from app.apps.movimientos.models import Movimiento
+from app.apps.notificaciones.contadores import reconstruir_contadores
 from app.apps.notificaciones.models import Notificacion
 from app.apps.organizaciones.models import Organizacion
 from app.apps.planes.services import asegurar_planes_base, obtener_plan_por_codigo
@@ -654,6 +655,8 @@ def seed_demo(db: Session) -> dict[str, str]:
     admin_wallet.saldo = DEMO_ADMIN_BALANCE
 
     db.commit()
+    # Las notificaciones demo se reescriben como no leidas; los contadores se recalculan en lugar de sumarse.
+    reconstruir_contadores(db)
     return {
         "organizacion_id": str(organizacion.id),
         "super_admin_id": str(users["super_admin"].id),
@@ -0,0 +1,31 @@
+"""Recalcula los contadores materializados de notificaciones desde ``notificaciones``.
+
+Los contadores se mantienen en cada alta y lectura; este comando sirve para repararlos (por ejemplo despues
+de editar notificaciones a mano) o para verificarlos. En PostgreSQL bloquea las tablas de contadores
+mientras corre, asi que las altas y lecturas concurrentes esperan en lugar de perderse.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.notificaciones.contadores import reconstruir_contadores
+from app.core.database import SessionLocal
+
+
+def main() -> None:
+    argparse.ArgumentParser(description="Reconstruye los contadores materializados de notificaciones.").parse_args()
+
+    with SessionLocal() as db:
+        organizaciones, usuarios = reconstruir_contadores(db)
+    print(f"Contadores por organizacion: {organizaciones} Contadores por usuario: {usuarios}")
+
+
+if __name__ == "__main__":
+    main()
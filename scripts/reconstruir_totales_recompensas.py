@@ -0,0 +1,39 @@
+"""Recalcula los totales materializados de recompensas desde ``aplicaciones_recompensa``.
+
+Los totales se mantienen en cada aplicacion; este comando sirve para repararlos (por ejemplo despues de
+corregir aplicaciones a mano) o para verificarlos. En PostgreSQL bloquea las tablas de totales mientras
+corre, asi que las aplicaciones concurrentes esperan en lugar de perderse.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from uuid import UUID
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.recompensas.totales import reconstruir_totales
+from app.core.database import SessionLocal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconstruye los totales materializados de recompensas.")
+    parser.add_argument(
+        "--organizacion-id",
+        type=UUID,
+        default=None,
+        help="Reconstruye solo esta organizacion (por defecto, todas).",
+    )
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        usuarios, reglas = reconstruir_totales(db, args.organizacion_id)
+    print(f"Totales por usuario: {usuarios} Totales por regla: {reglas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Recifra con Fernet los webhook secrets que todavia usan el cifrado XOR legacy.
+
+Se corre una vez por entorno; cuando devuelve 0 en todos, se puede quitar el fallback legacy de
+``decrypt_webhook_secret``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.integraciones.services import recifrar_secrets_legacy
+from app.core.database import SessionLocal
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recifra webhook secrets legacy (XOR) con Fernet.")
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta los secrets legacy, sin modificarlos.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Endpoints leidos y commiteados por lote.")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        cantidad, omitidos = recifrar_secrets_legacy(db, dry_run=args.dry_run, batch_size=args.batch_size)
+    accion = "encontrados" if args.dry_run else "recifrados"
+    print(f"Webhook secrets legacy {accion}: {cantidad}")
+    if omitidos:
+        # Tipicamente tokens Fernet de una SECRET_KEY anterior: hay que reconfigurar esos secrets.
+        print(f"Webhook secrets omitidos (no descifran): {len(omitidos)}")
+        for endpoint_id in omitidos:
+            print(f"  {endpoint_id}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Simula las reglas de recompensa de una organizacion sobre un archivo de compras.
+
+El archivo es un CSV con encabezado (``monto_compra`` y ``fecha`` opcional) o un NDJSON con las mismas
+claves. Imprime el mismo resumen que ``POST /recompensas/simular/lote``, sin limite de compras.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from uuid import UUID
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.apps.recompensas.schemas import SimularRecompensaLoteRequest
+from app.apps.recompensas.simulacion import leer_compras, simular_lote
+from app.core.database import SessionLocal
+from app.shared.enums import TipoRecompensa
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simula reglas de recompensa sobre un lote de compras.")
+    parser.add_argument("--organizacion-id", type=UUID, required=True, help="Organizacion duena de las reglas.")
+    parser.add_argument("--archivo", type=Path, required=True, help="CSV o NDJSON con monto_compra y fecha.")
+    parser.add_argument(
+        "--regla-id",
+        type=UUID,
+        action="append",
+        dest="regla_ids",
+        help="Evalua esta regla por separado (repetible). Sin reglas se usa la primera aplicable.",
+    )
+    parser.add_argument("--tipo", choices=[tipo.value for tipo in TipoRecompensa], default=None)
+    parser.add_argument("--buckets", type=int, default=10, help="Cantidad de buckets de la distribucion.")
+    args = parser.parse_args()
+
+    datos = SimularRecompensaLoteRequest.model_validate(
+        {**leer_compras(args.archivo), "regla_ids": args.regla_ids, "tipo": args.tipo, "buckets": args.buckets}
+    )
+    with SessionLocal() as db:
+        resultado = simular_lote(db, args.organizacion_id, datos, max_compras=0)
+    print(resultado.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
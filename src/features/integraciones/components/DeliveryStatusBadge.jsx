@@ -1,13 +1,21 @@
 import { Badge } from "../../../shared/components/ui/Badge";
 
 const statusLabels = {
+  acumulando: "Acumulando",
+  en_lote: "En lote",
+  reenvio: "En reenvio",
   pendiente: "Pendiente",
+  diferido: "Diferido",
   enviado: "Enviado",
   fallido: "Fallido",
 };
 
 const statusTones = {
+  acumulando: "neutral",
+  en_lote: "warning",
+  reenvio: "neutral",
   pendiente: "warning",
+  diferido: "neutral",
   enviado: "success",
   fallido: "danger",
 };
@@ -21,6 +21,31 @@ function ActiveBadge({ active }) {
   return <Badge tone={active ? "success" : "neutral"}>{active ? "Activo" : "Inactivo"}</Badge>;
 }
 
+const circuitLabels = {
+  cerrado: "Cerrado",
+  abierto: "Abierto",
+  semiabierto: "Semiabierto",
+};
+
+const circuitTones = {
+  cerrado: "success",
+  abierto: "danger",
+  semiabierto: "warning",
+};
+
+function CircuitBadge({ webhook }) {
+  const state = webhook.circuito_estado || "cerrado";
+  const title =
+    state === "cerrado"
+      ? `${webhook.fallos_consecutivos || 0} fallos consecutivos`
+      : `Reintenta desde ${formatDateTime(webhook.circuito_abierto_hasta)}`;
+  return (
+    <span title={title}>
+      <Badge tone={circuitTones[state] || "neutral"}>{circuitLabels[state] || state}</Badge>
+    </span>
+  );
+}
+
 export function WebhooksTable({
   webhooks = [],
   loading = false,
@@ -52,13 +77,14 @@ export function WebhooksTable({
 
   return (
     <div className="overflow-x-auto">
-      <table className="min-w-[1040px] w-full border-separate border-spacing-0 text-left text-sm">
+      <table className="min-w-[1140px] w-full border-separate border-spacing-0 text-left text-sm">
         <thead>
           <tr className="text-xs uppercase text-slate-400">
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">Nombre</th>
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">URL</th>
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">Eventos</th>
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">Estado</th>
+            <th className="border-b border-slate-200 px-3 py-3 font-semibold">Circuito</th>
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">Creacion</th>
             <th className="border-b border-slate-200 px-3 py-3 font-semibold">Actualizacion</th>
             <th className="border-b border-slate-200 px-3 py-3 text-right font-semibold">Acciones</th>
@@ -83,6 +109,9 @@ export function WebhooksTable({
               <td className="border-b border-slate-100 px-3 py-3">
                 <ActiveBadge active={webhook.activo} />
               </td>
+              <td className="border-b border-slate-100 px-3 py-3">
+                <CircuitBadge webhook={webhook} />
+              </td>
               <td className="border-b border-slate-100 px-3 py-3 whitespace-nowrap">{formatDateTime(webhook.fecha_creacion)}</td>
               <td className="border-b border-slate-100 px-3 py-3 whitespace-nowrap">{formatDateTime(webhook.fecha_actualizacion)}</td>
               <td className="border-b border-slate-100 px-3 py-3">
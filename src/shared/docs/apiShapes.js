@@ -84,6 +84,12 @@
  * @property {string} url
  * @property {string[]} eventos
  * @property {boolean} activo
+ * @property {"cerrado"|"abierto"|"semiabierto"} circuito_estado
+ * @property {number} fallos_consecutivos
+ * @property {string|null} circuito_abierto_hasta
+ * @property {boolean} modo_lote
+ * @property {number} lote_max_eventos
+ * @property {number} lote_max_segundos
  */
 
 export const apiShapes = {};
@@ -1,24 +1,29 @@
 from __future__ import annotations
 
+import json
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from uuid import UUID
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.models import AuditLog
+from app.apps.ecommerce import worker as ecommerce_worker
+from app.apps.ecommerce.identidades import identidades_clientes
 from app.apps.ecommerce.models import EcommerceOrderEvent
 from app.apps.integraciones.models import APIKey, WebhookDelivery, WebhookEndpoint
 from app.apps.integraciones.services import encrypt_webhook_secret
 from app.apps.movimientos.models import Movimiento
 from app.apps.notificaciones.models import Notificacion
-from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa
+from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa, TotalRecompensaUsuario
 from app.apps.usuarios.models import Usuario
 from app.apps.wallets.models import Wallet
 from app.shared.enums import (
     CanalNotificacion,
+    EstadoWallet,
     EstadoReglaRecompensa,
     MonedaRecompensa,
     MonedaWallet,
@@ -139,6 +144,8 @@ def test_order_paid_aplica_recompensa_crea_cliente_wallet_movimiento_notificacio
     assert wallet is not None
     assert wallet.moneda == MonedaWallet.ARS
     assert wallet.saldo == Decimal("2000.00")
+    total = db_session.get(TotalRecompensaUsuario, (org.id, usuario.id, MonedaRecompensa.ARS))
+    assert (total.cantidad_aplicaciones, total.monto_recompensa_total) == (1, Decimal("2000.00"))
 
     event = db_session.get(EcommerceOrderEvent, UUID(data["event"]["id"]))
     aplicacion = db_session.get(AplicacionRecompensa, UUID(data["recompensa_aplicada"]["id"]))
@@ -250,6 +257,60 @@ def test_order_paid_valida_amount_y_currency(client: TestClient, db_session: Ses
     assert bad_currency.json()["detail"] == "Moneda no soportada para ecommerce: EUR."
 
 
+def test_order_paid_cachea_identidad_del_cliente_y_la_invalida_si_cambia_la_wallet(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    _store_rule(db_session, org)
+    raw_key = _create_api_key(client, owner, ["ecommerce:write"])
+    email = "comprador@example.com"
+
+    def comprar(external_order_id: str) -> dict:
+        response = client.post(
+            "/api/v1/ext/ecommerce/order-paid",
+            headers={"X-API-Key": raw_key},
+            json=_order_payload(external_order_id=external_order_id),
+        )
+        assert response.status_code == 201, response.text
+        return api_data(response)
+
+    primera = comprar("order-identidad-1")
+    identidad = identidades_clientes.obtener(org.id, email)
+    assert identidad is not None
+    wallet_id = UUID(primera["movimiento"]["wallet_destino_id"])
+    assert identidad.wallet_principal_id == wallet_id
+    assert identidad.wallet_recompensa(MonedaWallet.ARS) == wallet_id
+    assert comprar("order-identidad-2")["movimiento"]["wallet_destino_id"] == str(wallet_id)
+
+    # Congelar la wallet desde la API invalida el cache en este proceso.
+    usuario = db_session.scalar(select(Usuario).where(Usuario.email == email))
+    congelar = client.patch(
+        f"/api/v1/wallets/{wallet_id}/estado",
+        headers=auth_headers(owner),
+        json={"estado": "congelada"},
+    )
+    assert congelar.status_code == 200, congelar.text
+    assert identidades_clientes.obtener(org.id, email) is None
+    tercera = comprar("order-identidad-3")
+    wallet_recompensas_id = UUID(tercera["movimiento"]["wallet_destino_id"])
+    assert wallet_recompensas_id != wallet_id
+
+    # Un cambio hecho por otro proceso no pasa por el cache: la wallet cacheada se revalida al bloquearla.
+    db_session.execute(update(Wallet).where(Wallet.id == wallet_recompensas_id).values(estado=EstadoWallet.cerrada))
+    db_session.execute(update(Usuario).where(Usuario.id == usuario.id).values(es_activo=False))
+    db_session.commit()
+    assert identidades_clientes.obtener(org.id, email).wallet_recompensa(MonedaWallet.ARS) == wallet_recompensas_id
+    cuarta = comprar("order-identidad-4")
+
+    assert cuarta["movimiento"] is None
+    assert cuarta["event"]["error_procesamiento"] == "El cliente esta inactivo."
+    assert identidades_clientes.obtener(org.id, email) is None
+    db_session.expire_all()
+    assert db_session.scalar(select(func.count()).select_from(Usuario).where(Usuario.email == email)) == 1
+
+
 def test_endpoints_internos_listan_por_permisos_y_organizacion(client: TestClient, db_session: Session) -> None:
     org_a = create_org(db_session)
     org_b = create_org(db_session)
@@ -292,3 +353,219 @@ def test_endpoints_internos_listan_por_permisos_y_organizacion(client: TestClien
     assert [item["id"] for item in api_data(soporte_list)] == [str(event_a.id)]
     assert cliente_list.status_code == 403
     assert cross_get.status_code == 404
+
+
+def test_order_paid_lote_ndjson_deduplica_resuelve_clientes_y_aplica_recompensas(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.enviar_webhook_delivery", lambda delivery_id: None)
+    monkeypatch.setattr("app.apps.ecommerce.lotes.settings.ECOMMERCE_LOTE_CHUNK_SIZE", 2)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    ajeno = create_user(db_session, create_org(db_session), RolUsuario.cliente)
+    _store_rule(db_session, org)
+    raw_key = _create_api_key(client, owner, ["ecommerce:write"])
+    db_session.add(
+        WebhookEndpoint(
+            organizacion_id=org.id,
+            nombre="Ecommerce hook",
+            url="https://example.com/ecommerce",
+            eventos=["ecommerce.order_paid", "recompensa.aplicada"],
+            secret_encrypted=encrypt_webhook_secret("secret-ecommerce-123"),
+            activo=True,
+        )
+    )
+    db_session.commit()
+    ordenes = [
+        _order_payload(external_order_id="o-1", amount="20000.00"),
+        _order_payload(external_order_id="o-2", amount="5000.00"),
+        _order_payload(external_order_id="o-1", amount="20000.00"),
+        _order_payload(external_order_id="o-3", amount="100.00"),
+        _order_payload(external_order_id="o-4", customer_email=ajeno.email),
+        _order_payload(external_order_id="o-5", currency="XYZ"),
+        {"external_order_id": "o-6"},
+    ]
+    ndjson = "\n".join(json.dumps(orden) for orden in ordenes) + "\n"
+
+    primera = client.post(
+        "/api/v1/ext/ecommerce/order-paid/lote",
+        headers={"X-API-Key": raw_key, "Content-Type": "application/x-ndjson"},
+        content=ndjson,
+    )
+    segunda = client.post("/api/v1/ext/ecommerce/order-paid/lote", headers={"X-API-Key": raw_key}, json=ordenes[:2])
+
+    assert primera.status_code == 200, primera.text
+    lote = api_data(primera)
+    assert [item["status"] for item in lote["resultados"]] == [
+        "procesada",
+        "procesada",
+        "duplicada",
+        "fallida",
+        "fallida",
+        "error",
+        "error",
+    ]
+    assert (lote["procesadas"], lote["fallidas"], lote["duplicadas"], lote["errores"]) == (2, 2, 1, 2)
+    assert lote["resultados"][3]["error"] == "No hay regla de recompensa aplicable"
+    assert lote["resultados"][4]["error"] == "El email pertenece a otra organizacion."
+    assert lote["resultados"][5]["error"] == "Moneda no soportada para ecommerce: XYZ."
+    assert lote["resultados"][6]["error"].startswith("customer_email")
+    assert [item["status"] for item in api_data(segunda)["resultados"]] == ["duplicada", "duplicada"]
+
+    db_session.expire_all()
+    usuarios = db_session.scalars(select(Usuario).where(Usuario.email == "comprador@example.com")).all()
+    assert len(usuarios) == 1
+    wallet = db_session.scalar(select(Wallet).where(Wallet.usuario_id == usuarios[0].id))
+    assert wallet.saldo == Decimal("2500.00")
+    eventos = db_session.scalars(select(EcommerceOrderEvent).where(EcommerceOrderEvent.organizacion_id == org.id)).all()
+    assert len(eventos) == 4
+    assert all(evento.procesado for evento in eventos)
+    aplicaciones = db_session.scalars(select(AplicacionRecompensa).where(AplicacionRecompensa.organizacion_id == org.id)).all()
+    assert {evento.recompensa_aplicada_id for evento in eventos} - {None} == {aplicacion.id for aplicacion in aplicaciones}
+    total = db_session.get(TotalRecompensaUsuario, (org.id, usuarios[0].id, MonedaRecompensa.ARS))
+    assert (total.cantidad_aplicaciones, total.monto_recompensa_total) == (2, Decimal("2500.00"))
+    assert len(db_session.scalars(select(Notificacion).where(Notificacion.usuario_id == usuarios[0].id)).all()) == 2
+    deliveries = db_session.scalars(select(WebhookDelivery).where(WebhookDelivery.organizacion_id == org.id)).all()
+    assert sorted(delivery.evento for delivery in deliveries) == ["ecommerce.order_paid"] * 4 + ["recompensa.aplicada"] * 2
+    assert db_session.scalar(select(AuditLog).where(AuditLog.evento == "ecommerce.cliente_creado_automaticamente"))
+
+
+def test_order_paid_lote_crea_cada_cliente_con_su_propio_hash(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    _store_rule(db_session, org)
+    raw_key = _create_api_key(client, owner, ["ecommerce:write"])
+    emails = ["cliente-a@example.com", "cliente-b@example.com"]
+
+    response = client.post(
+        "/api/v1/ext/ecommerce/order-paid/lote",
+        headers={"X-API-Key": raw_key},
+        json=[_order_payload(external_order_id=f"o-{email}", customer_email=email) for email in emails],
+    )
+
+    assert response.status_code == 200, response.text
+    assert api_data(response)["procesadas"] == 2
+    hashes = db_session.scalars(select(Usuario.hashed_password).where(Usuario.email.in_(emails))).all()
+    assert len(set(hashes)) == 2
+
+
+def test_order_paid_asincrono_responde_202_y_el_worker_reintenta_hasta_procesar(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("app.apps.ecommerce.routes.settings.ECOMMERCE_ORDER_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    _store_rule(db_session, org)
+    raw_key = _create_api_key(client, owner, ["ecommerce:write", "ecommerce:read"])
+
+    response = client.post(
+        "/api/v1/ext/ecommerce/order-paid",
+        headers={"X-API-Key": raw_key},
+        json=_order_payload(external_order_id="order-async"),
+    )
+
+    assert response.status_code == 202, response.text
+    data = api_data(response)
+    assert data["estado"] == "pendiente"
+    event_id = data["event"]["id"]
+    assert db_session.scalar(select(AplicacionRecompensa)) is None
+
+    original = ecommerce_worker.procesar_order_paid
+
+    def _falla(*args, **kwargs):
+        raise RuntimeError("base de datos no disponible")
+
+    monkeypatch.setattr(ecommerce_worker, "procesar_order_paid", _falla)
+    [reclamada] = ecommerce_worker.reclamar_ordenes(db_session, limit=10)
+    ecommerce_worker.procesar_orden(reclamada)
+    reintento = client.get(f"/api/v1/ext/ecommerce/order-paid/{event_id}", headers={"X-API-Key": raw_key})
+
+    assert api_data(reintento)["estado"] == "reintentando"
+    assert api_data(reintento)["intentos"] == 1
+    assert api_data(reintento)["event"]["error_procesamiento"] == "base de datos no disponible"
+
+    monkeypatch.setattr(ecommerce_worker, "procesar_order_paid", original)
+    db_session.expire_all()
+    event = db_session.get(EcommerceOrderEvent, UUID(event_id))
+    event.fecha_proximo_intento = event.fecha_creacion
+    db_session.commit()
+    assert ecommerce_worker.ejecutar_worker(once=True, concurrency=1) == 1
+    final = client.get(f"/api/v1/ext/ecommerce/order-paid/{event_id}", headers={"X-API-Key": raw_key})
+
+    assert api_data(final)["estado"] == "procesado"
+    assert api_data(final)["intentos"] == 2
+    assert api_data(final)["event"]["recompensa_aplicada_id"] is not None
+
+
+def test_worker_no_pisa_una_orden_que_otro_proceso_ya_cerro(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("app.apps.ecommerce.routes.settings.ECOMMERCE_ORDER_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    raw_key = _create_api_key(client, owner, ["ecommerce:write", "ecommerce:read"])
+    response = client.post(
+        "/api/v1/ext/ecommerce/order-paid",
+        headers={"X-API-Key": raw_key},
+        json=_order_payload(external_order_id="order-carrera"),
+    )
+    assert response.status_code == 202, response.text
+    event_id = UUID(api_data(response)["event"]["id"])
+    original = ecommerce_worker.procesar_order_paid
+
+    def _cerrada_por_otro_worker(event, datos, context, session):
+        # Otro worker con el lease vencido confirma la orden mientras este todavia no termino.
+        session.execute(update(EcommerceOrderEvent).where(EcommerceOrderEvent.id == event.id).values(procesado=True))
+        session.commit()
+        return original(event, datos, context, session)
+
+    monkeypatch.setattr(ecommerce_worker, "procesar_order_paid", _cerrada_por_otro_worker)
+    [reclamada] = ecommerce_worker.reclamar_ordenes(db_session, limit=10)
+    ecommerce_worker.procesar_orden(reclamada)
+
+    db_session.expire_all()
+    event = db_session.get(EcommerceOrderEvent, event_id)
+    assert event.procesado is True
+    assert event.error_procesamiento is None
+    assert db_session.scalar(select(AuditLog).where(AuditLog.evento == "ecommerce.order_paid_error")) is None
+
+
+def test_barrido_retoma_ordenes_trabadas_sin_procesar(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    _create_api_key(client, owner, ["ecommerce:write"])
+    api_key = db_session.scalar(select(APIKey).where(APIKey.organizacion_id == org.id))
+    antigua = datetime.now(timezone.utc) - timedelta(hours=1)
+    trabada = EcommerceOrderEvent(
+        organizacion_id=org.id,
+        proveedor="generic",
+        external_order_id="order-trabada",
+        customer_email="comprador@example.com",
+        amount=Decimal("20000.00"),
+        currency="ARS",
+        raw_payload=_order_payload(external_order_id="order-trabada"),
+        procesado=False,
+        api_key_id=api_key.id,
+        fecha_creacion=antigua,
+    )
+    reciente = EcommerceOrderEvent(
+        organizacion_id=org.id,
+        proveedor="generic",
+        external_order_id="order-en-curso",
+        customer_email="comprador@example.com",
+        amount=Decimal("20000.00"),
+        currency="ARS",
+        procesado=False,
+        api_key_id=api_key.id,
+    )
+    db_session.add_all([trabada, reciente])
+    db_session.commit()
+
+    assert ecommerce_worker.barrer_ordenes_trabadas(db_session) == 1
+    assert ecommerce_worker.reclamar_ordenes(db_session, limit=10) == [trabada.id]
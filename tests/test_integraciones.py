@@ -1,22 +1,60 @@
 from __future__ import annotations
 
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from uuid import UUID
+from uuid import UUID, uuid4
 
+import httpx
+import pytest
+from cryptography.fernet import InvalidToken
 from fastapi import BackgroundTasks
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.models import AuditLog
-from app.apps.integraciones.models import APIKey, WebhookDelivery, WebhookEndpoint
-from app.apps.integraciones.services import decrypt_webhook_secret, encrypt_webhook_secret
-from app.apps.integraciones.webhook_dispatcher import encolar_webhook_evento, enviar_webhook_delivery, firmar_payload
+from app.apps.integraciones import webhook_async, webhook_dispatcher
+from app.apps.integraciones.models import (
+    APIKey,
+    APIRateLimitBucket,
+    WebhookBatch,
+    WebhookDelivery,
+    WebhookEndpoint,
+    WebhookEvent,
+    WebhookReplay,
+)
+from app.apps.integraciones import services as integraciones_services
+from app.apps.integraciones.services import (
+    _legacy_encrypt_secret,
+    decrypt_webhook_secret,
+    encrypt_webhook_secret,
+    es_secret_legacy,
+    recifrar_secrets_legacy,
+    webhook_secret,
+)
+from app.apps.integraciones.subscriptions import SubscriptionIndex
+from app.apps.integraciones.webhook_batches import formar_lotes
+from app.apps.integraciones.webhook_replays import alimentar_reenvios
+from app.apps.integraciones.webhook_dispatcher import (
+    calcular_backoff,
+    encolar_webhook_evento,
+    encolar_webhook_eventos,
+    enviar_webhook_delivery,
+    firmar_body,
+    firmar_payload,
+    preparar_envios,
+)
+from app.apps.integraciones.webhook_worker import ejecutar_worker, ejecutar_worker_async
+from app.apps.movimientos import services as movimientos_services
+from app.apps.movimientos.models import Movimiento, MovimientoCambio
 from app.apps.organizaciones.models import Organizacion
 from app.apps.planes.models import Plan
 from app.apps.planes.services import asegurar_planes_base, obtener_plan_por_codigo
 from app.apps.wallets.models import Wallet
-from app.shared.enums import RolUsuario
+from app.main import app
+from app.shared.enums import RolUsuario, TipoMovimiento
 from tests.conftest import api_data, auth_headers, create_org, create_user, create_wallet
 
 
@@ -53,6 +91,7 @@ def _store_webhook_endpoint(
     eventos: list[str],
     secret: str = "secret-webhook-123",
     activo: bool = True,
+    **campos,
 ) -> WebhookEndpoint:
     endpoint = WebhookEndpoint(
         organizacion_id=org.id,
@@ -61,6 +100,7 @@ def _store_webhook_endpoint(
         eventos=eventos,
         secret_encrypted=encrypt_webhook_secret(secret),
         activo=activo,
+        **campos,
     )
     db.add(endpoint)
     db.commit()
@@ -79,8 +119,12 @@ def _store_webhook_delivery(
     delivery = WebhookDelivery(
         organizacion_id=org.id,
         webhook_endpoint_id=endpoint.id,
+        webhook_event=WebhookEvent(
+            organizacion_id=org.id,
+            evento="wallet.creada",
+            payload={"evento": "wallet.creada", "data": {"id": "w1"}},
+        ),
         evento="wallet.creada",
-        payload={"evento": "wallet.creada", "data": {"id": "w1"}},
         status=status,
         intentos=intentos,
     )
@@ -217,6 +261,104 @@ def test_endpoint_externo_cashback_registra_auditoria_con_api_key(
     assert movement_audit.actor_usuario_id is None
 
 
+def test_cashback_en_lote_devuelve_resultado_por_item_y_es_idempotente(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.movimientos.services.settings.MOVIMIENTOS_LOTE_CHUNK_SIZE", 2)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    otra = create_wallet(db_session, create_user(db_session, create_org(db_session)))
+    raw_key, _ = _create_api_key(client, owner, ["movimientos:write"])
+    items = [
+        {"wallet_destino_id": str(wallet.id), "monto": "5.00", "referencia_externa": "pos-1"},
+        {"wallet_destino_id": str(otra.id), "monto": "3.00", "referencia_externa": "pos-2"},
+        {"wallet_destino_id": str(wallet.id), "monto": "5.00", "referencia_externa": "pos-1"},
+        {"wallet_destino_id": str(wallet.id), "monto": "2.50", "referencia_externa": "pos-3"},
+    ]
+
+    primera = client.post("/api/v1/ext/movimientos/cashback/lote", headers={"X-API-Key": raw_key}, json={"items": items})
+    segunda = client.post("/api/v1/ext/movimientos/cashback/lote", headers={"X-API-Key": raw_key}, json={"items": items})
+    excedido = client.post(
+        "/api/v1/ext/movimientos/cashback/lote",
+        headers={"X-API-Key": raw_key},
+        json={"items": items * 251},
+    )
+
+    assert primera.status_code == 200, primera.text
+    lote = api_data(primera)
+    assert (lote["creados"], lote["duplicados"], lote["errores"]) == (2, 1, 1)
+    assert [item["status"] for item in lote["resultados"]] == ["creado", "error", "duplicado", "creado"]
+    assert lote["resultados"][1]["error"] == "No se puede operar entre organizaciones."
+    assert lote["resultados"][2]["movimiento"]["id"] == lote["resultados"][0]["movimiento"]["id"]
+    assert [item["status"] for item in api_data(segunda)["resultados"]] == ["duplicado", "error", "duplicado", "duplicado"]
+    assert excedido.status_code == 422
+    db_session.expire_all()
+    assert db_session.get(Wallet, wallet.id).saldo == Decimal("7.50")
+    audits = db_session.scalars(select(AuditLog).where(AuditLog.evento == "movimiento_registrado")).all()
+    assert len(audits) == 2
+    assert {audit.actor_tipo for audit in audits} == {"api_key"}
+    assert db_session.scalar(select(func.count()).select_from(MovimientoCambio)) == 2
+
+
+def test_lote_concurrente_con_la_misma_referencia_informa_duplicado(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    otra = create_wallet(db_session, owner)
+    raw_key, _ = _create_api_key(client, owner, ["movimientos:write"])
+    original = movimientos_services.cupo_movimientos_mes
+    concurrente_id = uuid4()
+    concurrentes: list[Movimiento] = []
+
+    def _lote_concurrente(db: Session, organizacion_id):
+        # Otro lote acredita la misma referencia en otra wallet despues de la busqueda de duplicados.
+        if not concurrentes:
+            concurrentes.append(
+                Movimiento(
+                    id=concurrente_id,
+                    wallet_destino_id=otra.id,
+                    organizacion_id=org.id,
+                    monto=Decimal("5.00"),
+                    moneda=otra.moneda,
+                    tipo=TipoMovimiento.deposito,
+                    referencia_externa="pos-9",
+                )
+            )
+            db.add(concurrentes[0])
+            db.commit()
+        return original(db, organizacion_id)
+
+    monkeypatch.setattr(movimientos_services, "cupo_movimientos_mes", _lote_concurrente)
+    response = client.post(
+        "/api/v1/ext/movimientos/deposito/lote",
+        headers={"X-API-Key": raw_key},
+        json={"items": [{"wallet_destino_id": str(wallet.id), "monto": "5.00", "referencia_externa": "pos-9"}]},
+    )
+
+    assert response.status_code == 200, response.text
+    [resultado] = api_data(response)["resultados"]
+    assert resultado["status"] == "duplicado"
+    assert resultado["movimiento"]["id"] == str(concurrente_id)
+    db_session.expire_all()
+    assert db_session.get(Wallet, wallet.id).saldo == Decimal("0.00")
+
+    individual = client.post(
+        "/api/v1/ext/movimientos/deposito",
+        headers={"X-API-Key": raw_key},
+        json={"wallet_destino_id": str(wallet.id), "monto": "5.00", "referencia_externa": "pos-9"},
+    )
+    assert individual.status_code == 409, individual.text
+    db_session.expire_all()
+    assert db_session.get(Wallet, wallet.id).saldo == Decimal("0.00")
+
+
 def test_api_key_no_opera_wallets_de_otra_organizacion(client: TestClient, db_session: Session) -> None:
     org_a = create_org(db_session)
     org_b = create_org(db_session)
@@ -320,17 +462,11 @@ def test_delivery_se_crea_y_firma_al_disparar_evento_wallet(
         def __init__(self, *args, **kwargs) -> None:
             pass
 
-        def __enter__(self):
-            return self
-
-        def __exit__(self, *args) -> None:
-            return None
-
-        def post(self, url, json, headers):
-            calls.append({"url": url, "json": json, "headers": headers})
+        def post(self, url, content, headers):
+            calls.append({"url": url, "content": content, "headers": headers})
             return DummyResponse()
 
-    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.httpx.Client", FakeClient)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
     webhook = client.post(
         "/api/v1/integraciones/webhooks",
         headers=auth_headers(owner),
@@ -353,6 +489,8 @@ def test_delivery_se_crea_y_firma_al_disparar_evento_wallet(
     assert headers["X-Wallet-Event"] == "wallet.creada"
     assert headers["X-Wallet-Delivery-Id"] == str(delivery.id)
     assert headers["X-Wallet-Signature"] == firmar_payload(delivery.payload, secret)
+    assert headers["X-Wallet-Signature"] == firmar_body(calls[0]["content"], secret)
+    assert json.loads(calls[0]["content"]) == delivery.payload
     audit = db_session.scalar(select(AuditLog).where(AuditLog.evento == "webhook_enviado"))
     assert audit is not None
     assert audit.actor_tipo == "sistema"
@@ -370,16 +508,10 @@ def test_fallo_de_webhook_no_rompe_movimiento(client: TestClient, db_session: Se
         def __init__(self, *args, **kwargs) -> None:
             pass
 
-        def __enter__(self):
-            return self
-
-        def __exit__(self, *args) -> None:
-            return None
-
-        def post(self, url, json, headers):
+        def post(self, url, content, headers):
             raise RuntimeError("endpoint down")
 
-    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.httpx.Client", FailingClient)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FailingClient)
     webhook = client.post(
         "/api/v1/integraciones/webhooks",
         headers=auth_headers(owner),
@@ -440,16 +572,10 @@ def test_webhook_delivery_se_envia_usando_sesion_nueva(db_session: Session, monk
         def __init__(self, *args, **kwargs) -> None:
             pass
 
-        def __enter__(self):
-            return self
-
-        def __exit__(self, *args) -> None:
-            return None
-
-        def post(self, url, json, headers):
+        def post(self, url, content, headers):
             return DummyResponse()
 
-    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.httpx.Client", FakeClient)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
 
     enviar_webhook_delivery(delivery.id)
 
@@ -474,16 +600,10 @@ def test_delivery_fallido_puede_reenviarse(client: TestClient, db_session: Sessi
         def __init__(self, *args, **kwargs) -> None:
             pass
 
-        def __enter__(self):
-            return self
-
-        def __exit__(self, *args) -> None:
-            return None
-
-        def post(self, url, json, headers):
+        def post(self, url, content, headers):
             return DummyResponse()
 
-    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.httpx.Client", FakeClient)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
 
     response = client.post(
         f"/api/v1/integraciones/webhooks/deliveries/{delivery.id}/reenviar",
@@ -543,3 +663,827 @@ def test_owner_no_puede_reenviar_delivery_de_otra_organizacion(
     )
 
     assert response.status_code == 404
+
+
+def test_rate_limit_por_api_key_devuelve_headers_y_429(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    response = client.post(
+        "/api/v1/integraciones/api-keys",
+        headers=auth_headers(owner),
+        json={"nombre": "ERP", "scopes": ["wallets:read"], "limite_requests_minuto": 2},
+    )
+    assert response.status_code == 201, response.text
+    raw_key = str(api_data(response)["api_key"])
+
+    first = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers={"X-API-Key": raw_key})
+    second = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers={"X-API-Key": raw_key})
+    blocked = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers={"X-API-Key": raw_key})
+
+    assert first.status_code == 200, first.text
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert second.headers["RateLimit-Remaining"] == "0"
+    assert blocked.status_code == 429
+    assert blocked.json()["detail"] == "Limite de requests excedido."
+    assert blocked.headers["RateLimit-Remaining"] == "0"
+    assert int(blocked.headers["Retry-After"]) >= 1
+
+
+def test_rate_limit_por_plan_con_backend_compartido(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    plan = _assign_plan(db_session, org, "free")
+    plan.limite_requests_minuto = 1
+    db_session.add(plan)
+    db_session.commit()
+    monkeypatch.setattr("app.apps.integraciones.rate_limit.settings.RATE_LIMIT_BACKEND", "database")
+    raw_key_a, _ = _create_api_key(client, owner, ["wallets:read"])
+    raw_key_b, _ = _create_api_key(client, owner, ["wallets:read"])
+
+    allowed = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers={"X-API-Key": raw_key_a})
+    blocked = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers={"X-API-Key": raw_key_b})
+
+    assert allowed.status_code == 200, allowed.text
+    assert allowed.headers["RateLimit-Policy"] == "1;w=60"
+    assert blocked.status_code == 429
+    bucket = db_session.get(APIRateLimitBucket, f"organizacion:{org.id}")
+    assert bucket is not None
+    assert bucket.tokens < 1
+
+
+def test_rate_limit_rechazado_por_plan_no_consume_el_bucket_de_la_api_key(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    plan = _assign_plan(db_session, org, "free")
+    plan.limite_requests_minuto = 1
+    db_session.add(plan)
+    db_session.commit()
+    monkeypatch.setattr("app.apps.integraciones.rate_limit.settings.RATE_LIMIT_BACKEND", "database")
+    response = client.post(
+        "/api/v1/integraciones/api-keys",
+        headers=auth_headers(owner),
+        json={"nombre": "ERP", "scopes": ["wallets:read"], "limite_requests_minuto": 5},
+    )
+    assert response.status_code == 201, response.text
+    created = api_data(response)
+    headers = {"X-API-Key": str(created["api_key"])}
+
+    assert client.get(f"/api/v1/ext/wallets/{wallet.id}", headers=headers).status_code == 200
+    for _ in range(3):
+        blocked = client.get(f"/api/v1/ext/wallets/{wallet.id}", headers=headers)
+        assert blocked.status_code == 429
+        assert blocked.headers["RateLimit-Limit"] == "1"
+
+    db_session.expire_all()
+    bucket = db_session.get(APIRateLimitBucket, f"api_key:{created['id']}")
+    assert 4 <= bucket.tokens < 5
+
+
+def test_cliente_http_de_webhooks_se_comparte_y_cierra_con_lifespan() -> None:
+    with TestClient(app):
+        shared = webhook_dispatcher.obtener_cliente_http()
+        assert webhook_dispatcher.obtener_cliente_http() is shared
+        assert not shared.is_closed
+
+    assert shared.is_closed
+    assert webhook_dispatcher._http_client is None
+
+
+def test_con_worker_habilitado_el_request_solo_inserta_delivery(db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    background_tasks = BackgroundTasks()
+
+    deliveries = encolar_webhook_evento(
+        evento="wallet.creada",
+        organizacion_id=org.id,
+        data={"wallet_id": "w1"},
+        db=db_session,
+        background_tasks=background_tasks,
+    )
+
+    assert len(deliveries) == 1
+    assert background_tasks.tasks == []
+    assert deliveries[0].status == "pendiente"
+    assert deliveries[0].next_attempt_at is not None
+
+
+def test_worker_reintenta_con_backoff_y_marca_fallido_al_agotar_intentos(
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_MAX_ATTEMPTS", 2)
+    org = create_org(db_session)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    delivery = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0)
+    delivery.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db_session.add(delivery)
+    db_session.commit()
+
+    class FailingClient:
+        def post(self, url, content, headers):
+            raise RuntimeError("endpoint down")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FailingClient)
+    monkeypatch.setattr("app.apps.integraciones.webhook_worker._log_metricas", lambda db: None)
+
+    assert ejecutar_worker(concurrency=2, once=True) == 1
+    db_session.expire_all()
+    stored = db_session.get(WebhookDelivery, delivery.id)
+    assert stored.status == "pendiente"
+    assert stored.intentos == 1
+    retry_at = stored.next_attempt_at.replace(tzinfo=timezone.utc)
+    assert retry_at > datetime.now(timezone.utc)
+    assert ejecutar_worker(concurrency=2, once=True) == 0
+
+    stored.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db_session.add(stored)
+    db_session.commit()
+    assert ejecutar_worker(concurrency=2, once=True) == 1
+    db_session.expire_all()
+    stored = db_session.get(WebhookDelivery, delivery.id)
+    assert stored.status == "fallido"
+    assert stored.intentos == 2
+    assert stored.next_attempt_at is None
+
+
+def test_backoff_crece_exponencialmente_con_tope() -> None:
+    assert 5.0 <= calcular_backoff(1) <= 10.0
+    assert 20.0 <= calcular_backoff(3) <= 40.0
+    assert calcular_backoff(30) <= 3600.0
+
+
+def test_metricas_de_cola_de_webhooks(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    vencida = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=1)
+    vencida.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=30)
+    db_session.add(vencida)
+    db_session.commit()
+    _store_webhook_delivery(db_session, org, endpoint, status="fallido", intentos=8)
+
+    response = client.get("/api/v1/integraciones/webhooks/cola", headers=auth_headers(owner))
+
+    assert response.status_code == 200, response.text
+    data = api_data(response)
+    assert data["pendientes"] == 1
+    assert data["vencidos"] == 1
+    assert data["en_reintento"] == 1
+    assert data["fallidos"] == 1
+    assert data["lag_segundos"] >= 29
+
+
+def test_worker_async_respeta_limite_por_endpoint_y_escribe_resultados_en_lote(
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.webhook_worker._log_metricas", lambda db: None)
+    monkeypatch.setattr("app.apps.integraciones.webhook_async.settings.WEBHOOK_MAX_IN_FLIGHT_PER_ENDPOINT", 2)
+    monkeypatch.setattr("app.apps.integraciones.webhook_async.settings.WEBHOOK_RESULT_FLUSH_SIZE", 1000)
+    org = create_org(db_session)
+    ok_endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    failing_endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    failing_endpoint.url = "https://example.com/failing"
+    db_session.add(failing_endpoint)
+    db_session.commit()
+    deliveries = [
+        _store_webhook_delivery(db_session, org, ok_endpoint, status="pendiente", intentos=0) for _ in range(6)
+    ]
+    deliveries.append(_store_webhook_delivery(db_session, org, failing_endpoint, status="pendiente", intentos=0))
+    for delivery in deliveries:
+        delivery.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db_session.add(delivery)
+    db_session.commit()
+
+    in_flight: dict[str, int] = {}
+    max_in_flight: dict[str, int] = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        in_flight[path] = in_flight.get(path, 0) + 1
+        max_in_flight[path] = max(max_in_flight.get(path, 0), in_flight[path])
+        await asyncio.sleep(0.01)
+        in_flight[path] -= 1
+        return httpx.Response(500 if path == "/failing" else 200, text="ok")
+
+    writes: list[int] = []
+    original_aplicar = webhook_async.aplicar_resultados
+
+    def counting_aplicar(db: Session, resultados: list) -> None:
+        writes.append(len(resultados))
+        original_aplicar(db, resultados)
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_async.aplicar_resultados", counting_aplicar)
+
+    async def run() -> int:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ejecutar_worker_async(concurrency=50, once=True, client=client)
+
+    assert asyncio.run(run()) == 7
+    assert max_in_flight["/hook"] == 2
+    assert writes == [7]
+    db_session.expire_all()
+    statuses = {db_session.get(WebhookDelivery, delivery.id).status for delivery in deliveries[:6]}
+    assert statuses == {"enviado"}
+    failed = db_session.get(WebhookDelivery, deliveries[-1].id)
+    assert failed.status == "pendiente"
+    assert failed.intentos == 1
+    assert failed.error == "HTTP 500"
+
+
+def test_circuit_breaker_difiere_deliveries_y_se_cierra_con_sonda_exitosa(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.circuit_breaker.settings.WEBHOOK_CIRCUIT_FAILURE_THRESHOLD", 2)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    calls: list[str] = []
+    respuestas = {"status": 503}
+
+    class FakeClient:
+        def post(self, url, content, headers):
+            calls.append(headers["X-Wallet-Delivery-Id"])
+            return httpx.Response(respuestas["status"], text="down")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
+    fallidas = [_store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0) for _ in range(2)]
+    for delivery in fallidas:
+        enviar_webhook_delivery(delivery.id)
+
+    db_session.expire_all()
+    assert db_session.get(WebhookEndpoint, endpoint.id).circuito_estado == "abierto"
+    diferida = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0)
+    audits_antes = db_session.scalar(select(func.count()).select_from(AuditLog))
+    enviar_webhook_delivery(diferida.id)
+
+    db_session.expire_all()
+    assert len(calls) == 2
+    stored = db_session.get(WebhookDelivery, diferida.id)
+    assert stored.status == "diferido"
+    assert stored.intentos == 0
+    assert db_session.scalar(select(func.count()).select_from(AuditLog)) == audits_antes
+    response = client.get("/api/v1/integraciones/webhooks", headers=auth_headers(owner))
+    assert response.status_code == 200, response.text
+    listed = api_data(response)[0]
+    assert listed["circuito_estado"] == "abierto"
+    assert listed["fallos_consecutivos"] == 2
+    assert listed["circuito_abierto_hasta"] is not None
+
+    stored_endpoint = db_session.get(WebhookEndpoint, endpoint.id)
+    stored_endpoint.circuito_abierto_hasta = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db_session.add(stored_endpoint)
+    db_session.commit()
+    fecha_actualizacion = stored_endpoint.fecha_actualizacion
+    respuestas["status"] = 200
+    sonda = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0)
+    enviar_webhook_delivery(sonda.id)
+
+    db_session.expire_all()
+    stored_endpoint = db_session.get(WebhookEndpoint, endpoint.id)
+    assert stored_endpoint.circuito_estado == "cerrado"
+    assert stored_endpoint.fallos_consecutivos == 0
+    assert stored_endpoint.fecha_actualizacion == fecha_actualizacion
+    assert db_session.get(WebhookDelivery, sonda.id).status == "enviado"
+    liberada = db_session.get(WebhookDelivery, diferida.id)
+    assert liberada.status == "pendiente"
+    assert liberada.next_attempt_at is not None
+
+
+def test_sin_worker_el_circuito_abierto_no_difiere_y_su_cierre_envia_las_diferidas(
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    org = create_org(db_session)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    endpoint.circuito_estado = "abierto"
+    endpoint.fallos_consecutivos = 5
+    endpoint.circuito_abierto_hasta = datetime.now(timezone.utc) + timedelta(minutes=5)
+    db_session.add(endpoint)
+    db_session.commit()
+    # Diferida mientras el worker estaba habilitado; sin worker solo la libera el cierre del circuito.
+    diferida = _store_webhook_delivery(db_session, org, endpoint, status="diferido", intentos=0)
+    calls: list[str] = []
+
+    class FakeClient:
+        def post(self, url, content, headers):
+            calls.append(headers["X-Wallet-Delivery-Id"])
+            return httpx.Response(200, text="ok")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
+    delivery = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0)
+    enviar_webhook_delivery(delivery.id)
+
+    db_session.expire_all()
+    assert calls == [str(delivery.id), str(diferida.id)]
+    assert db_session.get(WebhookEndpoint, endpoint.id).circuito_estado == "cerrado"
+    assert db_session.get(WebhookDelivery, delivery.id).status == "enviado"
+    assert db_session.get(WebhookDelivery, diferida.id).status == "enviado"
+
+
+def test_sonda_fallida_reabre_el_circuito(db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    endpoint.circuito_estado = "abierto"
+    endpoint.fallos_consecutivos = 5
+    endpoint.circuito_abierto_hasta = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db_session.add(endpoint)
+    db_session.commit()
+
+    class FailingClient:
+        def post(self, url, content, headers):
+            raise RuntimeError("endpoint down")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FailingClient)
+    sonda = _store_webhook_delivery(db_session, org, endpoint, status="pendiente", intentos=0)
+    enviar_webhook_delivery(sonda.id)
+
+    db_session.expire_all()
+    stored_endpoint = db_session.get(WebhookEndpoint, endpoint.id)
+    assert stored_endpoint.circuito_estado == "abierto"
+    assert stored_endpoint.fallos_consecutivos == 6
+    assert stored_endpoint.circuito_abierto_hasta.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    assert db_session.get(WebhookDelivery, sonda.id).intentos == 1
+
+
+def test_indice_de_suscripciones_evita_consultas_y_payload_sin_webhooks(db_session: Session, monkeypatch) -> None:
+    org = create_org(db_session)
+    cargas: list[UUID] = []
+    original_cargar = SubscriptionIndex._cargar
+
+    def counting_cargar(db: Session, organizacion_id: UUID) -> dict:
+        cargas.append(organizacion_id)
+        return original_cargar(db, organizacion_id)
+
+    monkeypatch.setattr(SubscriptionIndex, "_cargar", staticmethod(counting_cargar))
+
+    def payload_no_usado() -> dict:
+        raise AssertionError("No deberia construirse el payload sin suscriptores.")
+
+    for evento in ("movimiento.creado", "pago_organizacion.creado", "movimiento.creado"):
+        assert encolar_webhook_evento(evento=evento, organizacion_id=org.id, data=payload_no_usado, db=db_session) == []
+    assert cargas == [org.id]
+
+
+def test_indice_de_suscripciones_se_invalida_al_desactivar_webhook(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["movimiento.creado", "pago_organizacion.creado"])
+
+    deliveries = encolar_webhook_eventos(
+        eventos=["movimiento.creado", "pago_organizacion.creado"],
+        organizacion_id=org.id,
+        data={"id": "m1"},
+        db=db_session,
+    )
+    assert [delivery.evento for delivery in deliveries] == ["movimiento.creado", "pago_organizacion.creado"]
+
+    response = client.delete(f"/api/v1/integraciones/webhooks/{endpoint.id}", headers=auth_headers(owner))
+    assert response.status_code == 200, response.text
+
+    assert encolar_webhook_evento(evento="movimiento.creado", organizacion_id=org.id, data={"id": "m2"}, db=db_session) == []
+
+
+def test_payload_se_codifica_una_vez_para_todos_los_endpoints(db_session: Session, monkeypatch) -> None:
+    org = create_org(db_session)
+    for secret in ("secret-webhook-aaa-123", "secret-webhook-bbb-456"):
+        _store_webhook_endpoint(db_session, org, eventos=["movimiento.creado"], secret=secret)
+    deliveries = encolar_webhook_evento(
+        evento="movimiento.creado",
+        organizacion_id=org.id,
+        data={"id": "m1", "items": list(range(50))},
+        db=db_session,
+    )
+    codificaciones: list[dict] = []
+    original = webhook_dispatcher._canonical_payload
+
+    def counting(payload: dict) -> bytes:
+        codificaciones.append(payload)
+        return original(payload)
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher._canonical_payload", counting)
+
+    envios, resultados = preparar_envios(db_session, [delivery.id for delivery in deliveries])
+
+    assert resultados == []
+    assert len(envios) == 2
+    assert len(codificaciones) == 1
+    assert envios[0].body is envios[1].body
+    assert envios[0].headers["X-Wallet-Signature"] != envios[1].headers["X-Wallet-Signature"]
+    assert json.loads(envios[0].body)["id"] == deliveries[0].payload["id"]
+
+
+def test_payload_se_guarda_una_vez_por_evento(db_session: Session) -> None:
+    org = create_org(db_session)
+    for _ in range(3):
+        _store_webhook_endpoint(db_session, org, eventos=["movimiento.creado"])
+
+    deliveries = encolar_webhook_evento(
+        evento="movimiento.creado",
+        organizacion_id=org.id,
+        data={"id": "m1", "monto": "10.00"},
+        db=db_session,
+    )
+
+    assert len(deliveries) == 3
+    events = db_session.scalars(select(WebhookEvent).where(WebhookEvent.organizacion_id == org.id)).all()
+    assert len(events) == 1
+    assert {delivery.webhook_event_id for delivery in deliveries} == {events[0].id}
+    assert events[0].payload["id"] == str(events[0].id)
+    assert deliveries[0].payload["data"] == {"id": "m1", "monto": "10.00"}
+
+
+def test_modo_lote_envia_un_post_firmado_con_varios_eventos(db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.webhook_worker._log_metricas", lambda db: None)
+    org = create_org(db_session)
+    _store_webhook_endpoint(db_session, org, eventos=["movimiento.creado"], modo_lote=True, lote_max_eventos=3)
+    deliveries = [
+        delivery
+        for monto in ("1.00", "2.00", "3.00")
+        for delivery in encolar_webhook_evento(
+            evento="movimiento.creado",
+            organizacion_id=org.id,
+            data={"monto": monto},
+            db=db_session,
+        )
+    ]
+    assert {delivery.status for delivery in deliveries} == {"acumulando"}
+    posts: list[tuple[bytes, dict]] = []
+
+    class FakeClient:
+        def post(self, url, content, headers):
+            posts.append((content, headers))
+            return httpx.Response(200, text="ok")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
+
+    assert ejecutar_worker(concurrency=2, once=True) == 1
+
+    assert len(posts) == 1
+    body, headers = posts[0]
+    lote = json.loads(body)
+    assert [evento["data"]["monto"] for evento in lote["eventos"]] == ["1.00", "2.00", "3.00"]
+    assert body == webhook_dispatcher._canonical_payload(lote)
+    assert headers["X-Wallet-Signature"] == firmar_body(body, "secret-webhook-123")
+    assert headers["X-Wallet-Batch-Id"] == lote["id"]
+    db_session.expire_all()
+    batch = db_session.get(WebhookBatch, UUID(lote["id"]))
+    assert batch.status == "enviado"
+    assert batch.cantidad_eventos == 3
+    for delivery in deliveries:
+        stored = db_session.get(WebhookDelivery, delivery.id)
+        assert stored.status == "enviado"
+        assert stored.webhook_batch_id == batch.id
+        assert stored.intentos == 1
+
+
+def test_modo_lote_sin_worker_se_rechaza_y_los_endpoints_existentes_entregan_uno_por_uno(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    _assign_plan(db_session, org, "pro")
+    datos = {
+        "nombre": "ERP",
+        "url": "https://example.com/hook",
+        "eventos": ["movimiento.creado"],
+        "secret": "secret-webhook-123",
+        "modo_lote": True,
+    }
+
+    creado = client.post("/api/v1/integraciones/webhooks", headers=auth_headers(owner), json=datos)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["movimiento.creado"])
+    actualizado = client.patch(
+        f"/api/v1/integraciones/webhooks/{endpoint.id}",
+        headers=auth_headers(owner),
+        json={"modo_lote": True},
+    )
+
+    assert creado.status_code == 409, creado.text
+    assert actualizado.status_code == 409, actualizado.text
+    db_session.expire_all()
+    assert db_session.get(WebhookEndpoint, endpoint.id).modo_lote is False
+    # Un endpoint que ya estaba en modo lote cuando se apago el worker no deja eventos acumulando.
+    endpoint.modo_lote = True
+    db_session.commit()
+    [delivery] = encolar_webhook_evento(
+        evento="movimiento.creado",
+        organizacion_id=org.id,
+        data={"monto": "1.00"},
+        db=db_session,
+    )
+    assert delivery.status == "pendiente"
+    assert delivery.next_attempt_at is not None
+
+
+def test_lote_incompleto_sale_por_edad_y_reintenta_como_lote(db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.webhook_worker._log_metricas", lambda db: None)
+    org = create_org(db_session)
+    _store_webhook_endpoint(
+        db_session,
+        org,
+        eventos=["movimiento.creado"],
+        modo_lote=True,
+        lote_max_eventos=100,
+        lote_max_segundos=5,
+    )
+    [delivery] = encolar_webhook_evento(
+        evento="movimiento.creado",
+        organizacion_id=org.id,
+        data={"monto": "1.00"},
+        db=db_session,
+    )
+
+    assert formar_lotes(db_session) == []
+    delivery.fecha_creacion = datetime.now(timezone.utc) - timedelta(seconds=6)
+    db_session.add(delivery)
+    db_session.commit()
+    [lote_id] = formar_lotes(db_session)
+
+    class FailingClient:
+        def post(self, url, content, headers):
+            return httpx.Response(503, text="down")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FailingClient)
+
+    assert ejecutar_worker(concurrency=2, once=True) == 1
+    db_session.expire_all()
+    batch = db_session.get(WebhookBatch, lote_id)
+    stored = db_session.get(WebhookDelivery, delivery.id)
+    assert batch.status == "pendiente"
+    assert batch.intentos == 1
+    assert batch.next_attempt_at is not None
+    assert stored.status == "en_lote"
+    assert stored.intentos == 1
+    assert stored.status_code == 503
+    fallidos = select(func.count()).select_from(AuditLog).where(AuditLog.evento == "webhook_lote_fallido")
+    assert db_session.scalar(fallidos) == 1
+
+
+def test_reenvio_masivo_marca_en_un_update_y_libera_a_la_tasa_pedida(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.services.settings.WEBHOOK_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    otro = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    fallidas = [_store_webhook_delivery(db_session, org, endpoint) for _ in range(5)]
+    enviada = _store_webhook_delivery(db_session, org, endpoint, status="enviado")
+    de_otro_endpoint = _store_webhook_delivery(db_session, org, otro)
+
+    response = client.post(
+        "/api/v1/integraciones/webhooks/reenvios",
+        json={"webhook_endpoint_id": str(endpoint.id), "evento": "wallet.creada", "tasa_por_segundo": 2},
+        headers=auth_headers(owner),
+    )
+
+    assert response.status_code == 202, response.text
+    reenvio = api_data(response)
+    assert reenvio["total"] == 5
+    assert reenvio["en_curso"] == 5
+    db_session.expire_all()
+    assert db_session.get(WebhookDelivery, enviada.id).status == "enviado"
+    assert db_session.get(WebhookDelivery, de_otro_endpoint.id).status == "fallido"
+    assert {db_session.get(WebhookDelivery, d.id).status for d in fallidas} == {"reenvio"}
+
+    replay = db_session.get(WebhookReplay, UUID(reenvio["id"]))
+    inicio = replay.fecha_creacion.replace(tzinfo=timezone.utc)
+    assert alimentar_reenvios(db_session, now=inicio + timedelta(seconds=1)) == 2
+    assert alimentar_reenvios(db_session, now=inicio + timedelta(seconds=1.2)) == 0
+    # Un worker detenido no acumula mas de un segundo de cupo.
+    assert alimentar_reenvios(db_session, now=inicio + timedelta(seconds=60)) == 2
+    assert alimentar_reenvios(db_session, now=inicio + timedelta(seconds=61)) == 1
+
+    progreso = client.get(f"/api/v1/integraciones/webhooks/reenvios/{reenvio['id']}", headers=auth_headers(owner))
+    assert progreso.status_code == 200, progreso.text
+    data = api_data(progreso)
+    assert data["status"] == "completado"
+    assert data["encoladas"] == 5
+    assert data["en_curso"] == 5
+    db_session.expire_all()
+    assert {db_session.get(WebhookDelivery, d.id).status for d in fallidas} == {"pendiente"}
+
+
+def test_reenvio_masivo_reinicia_intentos_de_deliveries_agotadas(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.services.settings.WEBHOOK_WORKER_ENABLED", True)
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.settings.WEBHOOK_MAX_ATTEMPTS", 3)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    agotada = _store_webhook_delivery(db_session, org, endpoint, intentos=3)
+
+    class FakeClient:
+        def post(self, url, content, headers):
+            return httpx.Response(503, text="down")
+
+    monkeypatch.setattr("app.apps.integraciones.webhook_dispatcher.obtener_cliente_http", FakeClient)
+    response = client.post(
+        "/api/v1/integraciones/webhooks/reenvios",
+        json={"webhook_endpoint_id": str(endpoint.id)},
+        headers=auth_headers(owner),
+    )
+    assert response.status_code == 202, response.text
+    db_session.expire_all()
+    assert db_session.get(WebhookDelivery, agotada.id).intentos == 0
+
+    replay = db_session.get(WebhookReplay, UUID(api_data(response)["id"]))
+    inicio = replay.fecha_creacion.replace(tzinfo=timezone.utc)
+    assert alimentar_reenvios(db_session, now=inicio + timedelta(seconds=1)) == 1
+    enviar_webhook_delivery(agotada.id)
+
+    db_session.expire_all()
+    stored = db_session.get(WebhookDelivery, agotada.id)
+    assert stored.intentos == 1
+    assert stored.status == "pendiente"
+    assert stored.next_attempt_at is not None
+
+
+def test_reenvio_masivo_requiere_worker(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+
+    response = client.post("/api/v1/integraciones/webhooks/reenvios", json={}, headers=auth_headers(owner))
+
+    assert response.status_code == 409
+
+
+def test_secret_descifrado_se_cachea_hasta_que_cambia_el_endpoint(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    org = create_org(db_session)
+    _assign_plan(db_session, org, "pro")
+    owner = create_user(db_session, org, RolUsuario.owner)
+    endpoint = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"], secret="secret-webhook-viejo-1")
+    descifrados: list[str] = []
+    original = integraciones_services.decrypt_webhook_secret
+
+    def counting(encrypted: str) -> str:
+        descifrados.append(encrypted)
+        return original(encrypted)
+
+    monkeypatch.setattr("app.apps.integraciones.services.decrypt_webhook_secret", counting)
+
+    assert webhook_secret(endpoint) == "secret-webhook-viejo-1"
+    assert webhook_secret(endpoint) == "secret-webhook-viejo-1"
+    assert len(descifrados) == 1
+
+    response = client.patch(
+        f"/api/v1/integraciones/webhooks/{endpoint.id}",
+        json={"secret": "secret-webhook-nuevo-2"},
+        headers=auth_headers(owner),
+    )
+    assert response.status_code == 200, response.text
+    db_session.expire_all()
+    endpoint = db_session.get(WebhookEndpoint, endpoint.id)
+
+    assert webhook_secret(endpoint) == "secret-webhook-nuevo-2"
+    assert len(descifrados) == 2
+
+
+def test_recifrar_secrets_legacy_conserva_el_secret(db_session: Session) -> None:
+    org = create_org(db_session)
+    legacy = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    legacy.secret_encrypted = _legacy_encrypt_secret("secret-legacy-xor-123")
+    db_session.add(legacy)
+    db_session.commit()
+    moderno = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"], secret="secret-fernet-456")
+    cifrado_moderno = moderno.secret_encrypted
+    fecha_legacy = legacy.fecha_actualizacion
+
+    assert recifrar_secrets_legacy(db_session, dry_run=True) == (1, [])
+    assert recifrar_secrets_legacy(db_session, batch_size=1) == (1, [])
+    assert recifrar_secrets_legacy(db_session) == (0, [])
+
+    db_session.expire_all()
+    legacy = db_session.get(WebhookEndpoint, legacy.id)
+    assert not es_secret_legacy(legacy.secret_encrypted)
+    assert decrypt_webhook_secret(legacy.secret_encrypted) == "secret-legacy-xor-123"
+    assert legacy.fecha_actualizacion == fecha_legacy
+    assert db_session.get(WebhookEndpoint, moderno.id).secret_encrypted == cifrado_moderno
+
+
+def test_recifrar_secrets_omite_tokens_fernet_de_otra_secret_key(db_session: Session, monkeypatch) -> None:
+    org = create_org(db_session)
+    rotado = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"], secret="secret-clave-vieja-1")
+    cifrado_rotado = rotado.secret_encrypted
+    roto = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    roto.secret_encrypted = "abc"
+    db_session.add(roto)
+    legacy = _store_webhook_endpoint(db_session, org, eventos=["wallet.creada"])
+    db_session.commit()
+    monkeypatch.setattr("app.apps.integraciones.services.settings.SECRET_KEY", "secret-key-rotada-para-tests-000000")
+    legacy.secret_encrypted = _legacy_encrypt_secret("secret-legacy-xor-123")
+    db_session.add(legacy)
+    db_session.commit()
+
+    assert es_secret_legacy(legacy.secret_encrypted)
+    assert not es_secret_legacy(cifrado_rotado)
+    recifrados, omitidos = recifrar_secrets_legacy(db_session, batch_size=1)
+
+    assert recifrados == 1
+    assert set(omitidos) == {rotado.id, roto.id}
+    db_session.expire_all()
+    assert db_session.get(WebhookEndpoint, rotado.id).secret_encrypted == cifrado_rotado
+    recifrado = db_session.get(WebhookEndpoint, legacy.id).secret_encrypted
+    assert decrypt_webhook_secret(recifrado) == "secret-legacy-xor-123"
+    with pytest.raises(InvalidToken):
+        decrypt_webhook_secret(cifrado_rotado)
+
+
+def test_feed_de_cambios_de_movimientos_con_cursor_y_long_poll(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr("app.apps.integraciones.routes.settings.MOVIMIENTOS_FEED_POLL_SECONDS", 0.05)
+    org = create_org(db_session)
+    owner = create_user(db_session, org, RolUsuario.owner)
+    wallet = create_wallet(db_session, owner)
+    raw_key, _ = _create_api_key(client, owner, ["movimientos:write", "movimientos:read"])
+    headers = {"X-API-Key": raw_key}
+    ids = [
+        api_data(
+            client.post(
+                "/api/v1/ext/movimientos/deposito",
+                headers=headers,
+                json={"wallet_destino_id": str(wallet.id), "monto": monto},
+            )
+        )["id"]
+        for monto in ("10.00", "20.00")
+    ]
+
+    primera = client.get("/api/v1/ext/movimientos/cambios", headers=headers, params={"limit": 1})
+    assert primera.status_code == 200, primera.text
+    pagina = api_data(primera)
+    assert [cambio["movimiento"]["id"] for cambio in pagina["cambios"]] == [ids[0]]
+    assert pagina["hay_mas"] is True
+
+    reversa = client.post(
+        f"/api/v1/movimientos/{ids[0]}/reversa",
+        headers=auth_headers(owner),
+        json={"motivo_reversa": "error operativo"},
+    )
+    assert reversa.status_code == 201, reversa.text
+
+    resto = api_data(
+        client.get("/api/v1/ext/movimientos/cambios", headers=headers, params={"cursor": pagina["cursor"]})
+    )
+    assert [(cambio["tipo"], cambio["movimiento"]["id"]) for cambio in resto["cambios"]] == [
+        ("creado", ids[1]),
+        ("creado", api_data(reversa)["id"]),
+        ("estado", ids[0]),
+    ]
+    assert resto["cambios"][-1]["movimiento"]["estado"] == "revertida"
+    assert resto["hay_mas"] is False
+    cursores = [cambio["cursor"] for cambio in resto["cambios"]]
+    assert cursores == sorted(cursores) and cursores[0] > pagina["cursor"]
+
+    vacia = client.get(
+        "/api/v1/ext/movimientos/cambios",
+        headers=headers,
+        params={"cursor": resto["cursor"], "espera": 1},
+    )
+    assert vacia.status_code == 200, vacia.text
+    assert api_data(vacia) == {"cambios": [], "cursor": resto["cursor"], "hay_mas": False}
+
+    desconocido = client.get(
+        "/api/v1/ext/movimientos/cambios",
+        headers=headers,
+        params={"cursor": resto["cursor"] + 1000},
+    )
+    assert desconocido.status_code == 400, desconocido.text
@@ -1,28 +1,62 @@
 from __future__ import annotations
 
 import inspect
+import os
+from decimal import Decimal
 from pathlib import Path
+from uuid import uuid4
 
 from fastapi import BackgroundTasks
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.models import AuditLog
 from app.apps.movimientos.routes import post_deposito
-from app.apps.notificaciones.models import Notificacion
-from app.apps.notificaciones.services import crear_notificacion_interna
+from app.apps.movimientos.schemas import MovimientoResponse
+from app.apps.notificaciones import email_service
+from app.apps.notificaciones.contadores import fragmento, reconstruir_contadores
+from app.apps.notificaciones.models import (
+    ContadorNotificacionesOrganizacion,
+    ContadorNotificacionesUsuario,
+    Notificacion,
+)
+from app.apps.notificaciones.services import (
+    _marcadas_por_destinatario,
+    crear_notificacion_email,
+    crear_notificacion_interna,
+    notificar_movimiento,
+)
 from app.apps.onboarding.routes import post_registro_organizacion
 from app.apps.wallets.routes import post_wallet
 from app.core.config import settings
 from app.shared.enums import CanalNotificacion, RolUsuario, TipoNotificacion
-from tests.conftest import api_data, auth_headers, create_org, create_user, create_wallet, onboarding_payload
+from tests.conftest import (
+    api_data,
+    auth_headers,
+    create_org,
+    create_user,
+    create_wallet,
+    engine_test,
+    onboarding_payload,
+)
 
 
 def _notificaciones(db: Session) -> list[Notificacion]:
     return db.scalars(select(Notificacion).order_by(Notificacion.fecha_creacion.asc())).all()
 
 
+def _contadores(db: Session) -> set[tuple[object, ...]]:
+    return {
+        (fila.organizacion_id, fila.fragmento, fila.total, fila.no_leidas)
+        for fila in db.scalars(select(ContadorNotificacionesOrganizacion)).all()
+    } | {
+        (fila.usuario_id, fila.total, fila.no_leidas)
+        for fila in db.scalars(select(ContadorNotificacionesUsuario)).all()
+    }
+
+
 def test_onboarding_crea_notificacion_interna_y_no_envia_email_real(
     client: TestClient,
     db_session: Session,
@@ -91,6 +125,55 @@ def test_movimiento_genera_notificacion(client: TestClient, db_session: Session)
     assert notification is not None
 
 
+def test_notificar_movimiento_crea_todas_las_filas_en_un_commit_con_consultas_in(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    emisor = create_user(db_session, org)
+    receptor = create_user(db_session, org)
+    origen = create_wallet(db_session, emisor, saldo=Decimal("50.00"))
+    destino = create_wallet(db_session, receptor)
+    response = client.post(
+        "/api/v1/movimientos/transferencia",
+        headers=auth_headers(admin),
+        json={"wallet_origen_id": str(origen.id), "wallet_destino_id": str(destino.id), "monto": "10.00"},
+    )
+    assert response.status_code == 201, response.text
+    movimiento = MovimientoResponse.model_validate(api_data(response))
+    antes = set(db_session.scalars(select(Notificacion.id)).all())
+    admin_id = admin.id
+    db_session.expire_all()
+
+    tareas = BackgroundTasks()
+    commits: list[int] = []
+    consultas: list[str] = []
+    on_commit = lambda session: commits.append(1)  # noqa: E731
+    on_query = lambda conn, cursor, statement, *args: consultas.append(statement)  # noqa: E731
+    event.listen(db_session, "after_commit", on_commit)
+    event.listen(engine_test, "before_cursor_execute", on_query)
+    try:
+        notificar_movimiento(movimiento, db_session, tareas, actor_usuario_id=admin_id)
+    finally:
+        event.remove(db_session, "after_commit", on_commit)
+        event.remove(engine_test, "before_cursor_execute", on_query)
+
+    nuevas = db_session.scalars(select(Notificacion).where(Notificacion.id.not_in(antes))).all()
+    assert sorted((item.usuario_id, item.canal) for item in nuevas) == sorted(
+        (usuario.id, canal)
+        for usuario in (emisor, receptor)
+        for canal in (CanalNotificacion.interna, CanalNotificacion.email)
+    )
+    auditorias = db_session.scalars(select(AuditLog).where(AuditLog.evento == "notificacion_creada")).all()
+    assert {log.metadata_log["notificacion_id"] for log in auditorias} >= {str(item.id) for item in nuevas}
+    assert commits == [1]
+    assert [tarea.args[1] for tarea in tareas.tasks] == [emisor.email, receptor.email]
+    assert sum("FROM wallets" in consulta for consulta in consultas) == 1
+    assert sum("FROM usuarios" in consulta for consulta in consultas) == 1
+    assert sum("FROM organizaciones" in consulta for consulta in consultas) == 1
+
+
 def test_listar_notificaciones_respeta_usuario_y_organizacion(client: TestClient, db_session: Session) -> None:
     org = create_org(db_session)
     admin = create_user(db_session, org, RolUsuario.admin)
@@ -192,6 +275,140 @@ def test_contar_no_leidas(client: TestClient, db_session: Session) -> None:
     assert api_data(response) == 1
 
 
+def test_contadores_materializados_sirven_el_badge_y_marcar_todas_es_un_update(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    user = create_user(db_session, org)
+    otro = create_user(db_session, org)
+    for titulo in ("Uno", "Dos", "Tres"):
+        crear_notificacion_interna(
+            organizacion_id=org.id,
+            usuario_id=user.id,
+            tipo=TipoNotificacion.seguridad,
+            titulo=titulo,
+            mensaje=titulo,
+            db=db_session,
+        )
+    crear_notificacion_interna(
+        organizacion_id=org.id,
+        usuario_id=otro.id,
+        tipo=TipoNotificacion.seguridad,
+        titulo="Otro",
+        mensaje="Otro",
+        db=db_session,
+    )
+    crear_notificacion_interna(
+        organizacion_id=org.id,
+        usuario_id=None,
+        tipo=TipoNotificacion.seguridad,
+        titulo="Organizacion",
+        mensaje="Sin usuario",
+        db=db_session,
+    )
+    crear_notificacion_email(
+        organizacion_id=org.id,
+        usuario_id=user.id,
+        tipo=TipoNotificacion.seguridad,
+        titulo="Email",
+        mensaje="No cuenta",
+        destinatario=user.email,
+        template_name="base.html",
+        db=db_session,
+    )
+    primera = db_session.scalar(select(Notificacion).where(Notificacion.titulo == "Uno"))
+    for _ in range(2):
+        response = client.patch(f"/api/v1/notificaciones/{primera.id}/leida", headers=auth_headers(user))
+        assert response.status_code == 200, response.text
+
+    consultas: list[str] = []
+    on_query = lambda conn, cursor, statement, *args: consultas.append(statement)  # noqa: E731
+    event.listen(engine_test, "before_cursor_execute", on_query)
+    try:
+        conteo = client.get("/api/v1/notificaciones/no-leidas/count", headers=auth_headers(user))
+        listado_user = client.get("/api/v1/notificaciones?limit=1", headers=auth_headers(user))
+        listado_admin = client.get("/api/v1/notificaciones?limit=1", headers=auth_headers(admin))
+    finally:
+        event.remove(engine_test, "before_cursor_execute", on_query)
+
+    assert api_data(conteo) == 2
+    assert (api_data(listado_user)["total"], api_data(listado_user)["no_leidas"]) == (3, 2)
+    assert len(api_data(listado_user)["items"]) == 1
+    assert (api_data(listado_admin)["total"], api_data(listado_admin)["no_leidas"]) == (5, 4)
+    assert not any("count(" in consulta.lower() and "notificaciones" in consulta for consulta in consultas)
+
+    consultas.clear()
+    event.listen(engine_test, "before_cursor_execute", on_query)
+    try:
+        response = client.patch("/api/v1/notificaciones/marcar-todas-leidas", headers=auth_headers(user))
+    finally:
+        event.remove(engine_test, "before_cursor_execute", on_query)
+
+    assert response.status_code == 200, response.text
+    assert api_data(response) == 2
+    assert sum(consulta.startswith("UPDATE notificaciones SET") for consulta in consultas) == 1
+    assert not any(consulta.startswith("SELECT") and "FROM notificaciones" in consulta for consulta in consultas)
+    assert api_data(client.get("/api/v1/notificaciones/no-leidas/count", headers=auth_headers(user))) == 0
+    assert api_data(client.get("/api/v1/notificaciones/no-leidas/count", headers=auth_headers(admin))) == 2
+
+    esperados = _contadores(db_session)
+    assert reconstruir_contadores(db_session) == (1, 2)
+    db_session.expire_all()
+    assert _contadores(db_session) == esperados
+
+
+def test_contador_de_organizacion_fragmentado_por_usuario_suma_al_leer(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    usuarios = [create_user(db_session, org) for _ in range(6)]
+    for usuario in usuarios:
+        crear_notificacion_interna(
+            organizacion_id=org.id,
+            usuario_id=usuario.id,
+            tipo=TipoNotificacion.seguridad,
+            titulo="Aviso",
+            mensaje="Aviso",
+            db=db_session,
+        )
+
+    fragmentos = db_session.scalars(
+        select(ContadorNotificacionesOrganizacion.fragmento).where(
+            ContadorNotificacionesOrganizacion.organizacion_id == org.id
+        )
+    ).all()
+    assert sorted(fragmentos) == sorted({fragmento(usuario.id) for usuario in usuarios})
+
+    # Como quedan los contadores migrados: todo en el fragmento 0.
+    db_session.execute(delete(ContadorNotificacionesOrganizacion))
+    db_session.add(ContadorNotificacionesOrganizacion(organizacion_id=org.id, fragmento=0, total=6, no_leidas=6))
+    db_session.commit()
+    lector = next(usuario for usuario in usuarios if fragmento(usuario.id) != 0)
+    response = client.patch("/api/v1/notificaciones/marcar-todas-leidas", headers=auth_headers(lector))
+    assert api_data(response) == 1
+    listado_admin = client.get("/api/v1/notificaciones?limit=1", headers=auth_headers(admin))
+    assert (api_data(listado_admin)["total"], api_data(listado_admin)["no_leidas"]) == (6, 5)
+
+
+def test_marcar_todas_agrupa_el_delta_del_contador_en_postgres() -> None:
+    marcar = (
+        update(Notificacion)
+        .where(Notificacion.leida.is_(False))
+        .values(leida=True)
+        .returning(Notificacion.organizacion_id, Notificacion.usuario_id)
+    )
+
+    sql = " ".join(str(_marcadas_por_destinatario(marcar).compile(dialect=postgresql.dialect())).split())
+
+    assert sql.startswith("WITH marcadas AS (UPDATE notificaciones SET")
+    assert "count(*)" in sql
+    assert sql.endswith("FROM marcadas GROUP BY marcadas.organizacion_id, marcadas.usuario_id")
+
+
 def test_error_de_email_no_rompe_operacion_principal(client: TestClient, db_session: Session, monkeypatch) -> None:
     org = create_org(db_session)
     owner = create_user(db_session, org, RolUsuario.owner)
@@ -233,3 +450,61 @@ def test_templates_html_existen() -> None:
     }
 
     assert expected <= {item.name for item in template_dir.iterdir()}
+
+
+def test_plantillas_compiladas_con_branding_por_version_y_alternativa_de_texto(tmp_path: Path, monkeypatch) -> None:
+    for plantilla in ("base.html", "base.txt", "movimiento.html"):
+        (tmp_path / plantilla).write_text(
+            (email_service.TEMPLATE_DIR / plantilla).read_text(encoding="utf-8"), encoding="utf-8"
+        )
+    monkeypatch.setattr(email_service, "TEMPLATE_DIR", tmp_path)
+    monkeypatch.setattr(email_service, "_PLANTILLAS", {})
+    monkeypatch.setattr(email_service, "_BRANDING", {})
+    monkeypatch.setattr(settings, "EMAIL_TEMPLATES_RELOAD", False)
+    email_service.cargar_plantillas()
+    context = {
+        "organizacion_id": "org-1",
+        "version_organizacion": "v1",
+        "asunto": "Deposito",
+        "titulo": "Deposito <acreditado>",
+        "mensaje": "Recibiste 10 & mas.",
+        "nombre_organizacion": "Tienda & Co",
+        "color_primario": "#112233",
+        "logo_url": "https://cdn.example.com/logo.png",
+    }
+
+    html_body = email_service._render_template("movimiento.html", context)
+    assert "Deposito &lt;acreditado&gt;" in html_body
+    assert 'alt="Tienda &amp; Co"' in html_body
+    assert "border-top:4px solid #112233" in html_body
+    assert "$" not in html_body
+    texto = email_service._render_texto(context)
+    assert texto.startswith("Deposito <acreditado>\n\nRecibiste 10 & mas.")
+    assert "Tienda & Co" in texto
+
+    # Misma version: el fragmento de branding sale del cache; una version nueva lo vuelve a armar.
+    renombrada = {**context, "nombre_organizacion": "Otro nombre"}
+    assert "Tienda &amp; Co" in email_service._render_template("movimiento.html", renombrada)
+    nueva_version = {**renombrada, "version_organizacion": "v2"}
+    assert "Otro nombre" in email_service._render_template("movimiento.html", nueva_version)
+
+    contenido = tmp_path / "movimiento.html"
+    contenido.write_text("<p>$mensaje (editada)</p>", encoding="utf-8")
+    os.utime(contenido, (contenido.stat().st_atime, contenido.stat().st_mtime + 10))
+    assert "(editada)" not in email_service._render_template("movimiento.html", context)
+    monkeypatch.setattr(settings, "EMAIL_TEMPLATES_RELOAD", True)
+    assert "Recibiste 10 &amp; mas. (editada)" in email_service._render_template("movimiento.html", context)
+
+    enviados: list[tuple] = []
+    monkeypatch.setattr(settings, "EMAILS_ENABLED", True)
+    monkeypatch.setattr(settings, "ENVIRONMENT", "development")
+    monkeypatch.setattr(settings, "MAIL_FROM", "wallet@example.com")
+    monkeypatch.setattr(settings, "MAIL_SERVER", "smtp.example.com")
+    monkeypatch.setattr(email_service, "enviar_email", lambda *args: enviados.append(args))
+    monkeypatch.setattr(email_service, "_with_session", lambda callback: None)
+    email_service.enviar_email_template(uuid4(), "cliente@example.com", "Deposito", "movimiento.html", context)
+    [(destinatario, asunto, html_enviado, texto_enviado)] = enviados
+    assert destinatario == "cliente@example.com"
+    assert "(editada)" in html_enviado
+    assert texto_enviado == texto
+
@@ -141,3 +141,14 @@ def test_dev_scripts_accept_docker_compose_database_host(monkeypatch: pytest.Mon
 
     assert dev_seed._database_safety_issues() == []
     assert reset_local_db._database_safety_issues() == []
+
+
+def test_engine_postgres_corta_sesiones_idle_in_transaction(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.core import database
+
+    url = "postgresql+psycopg2://app:app@db:5432/wallet"
+    monkeypatch.setattr(database.settings, "DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS", 45)
+    assert database._engine_kwargs(url)["connect_args"] == {"options": "-c idle_in_transaction_session_timeout=45000"}
+
+    monkeypatch.setattr(database.settings, "DB_IDLE_IN_TRANSACTION_TIMEOUT_SECONDS", 0)
+    assert "connect_args" not in database._engine_kwargs(url)
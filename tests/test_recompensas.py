@@ -1,27 +1,49 @@
-from decimal import Decimal
-from uuid import UUID
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from uuid import UUID, uuid4
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import select
+from sqlalchemy import event, func, select
 from sqlalchemy.orm import Session
 
 from app.apps.auditoria.models import AuditLog
+from app.apps.auth.schemas import DatosUsuarioToken
 from app.apps.integraciones.models import WebhookDelivery, WebhookEndpoint
 from app.apps.integraciones.services import encrypt_webhook_secret
-from app.apps.movimientos.models import Movimiento
+from app.apps.ecommerce.models import EcommerceOrderEvent
+from app.apps.movimientos.models import Movimiento, MovimientoCambio
 from app.apps.notificaciones.models import Notificacion
-from app.apps.recompensas.models import AplicacionRecompensa, ReglaRecompensa
+from app.apps.recompensas import lotes
+from app.apps.recompensas import services as recompensas_services
+from app.apps.recompensas import simulacion
+from app.apps.recompensas.backtest import ejecutar_backtest
+from app.apps.recompensas.models import (
+    AplicacionRecompensa,
+    EjecucionVencimientoPuntos,
+    ReglaRecompensa,
+    TotalRecompensaRegla,
+    TotalRecompensaUsuario,
+)
+from app.apps.recompensas.motor import ConjuntoReglas, compilar_regla, reglas_organizacion
+from app.apps.recompensas.schemas import AplicarRecompensaRequest, BacktestReglasRequest
+from app.apps.recompensas.totales import acumular_totales, reconstruir_totales
+from app.apps.recompensas.vencimientos import calcular_corte, restar_meses, vencer_puntos
 from app.apps.wallets.models import Wallet
+from app.core.config import settings
 from app.shared.enums import (
     CanalNotificacion,
     EstadoReglaRecompensa,
+    EstadoWallet,
+    MonedaRecompensa,
     MonedaWallet,
     RolUsuario,
     TipoMovimiento,
     TipoNotificacion,
+    TipoRecompensa,
 )
-from tests.conftest import api_data, auth_headers, create_org, create_user, create_wallet
+from tests.conftest import api_data, auth_headers, create_org, create_user, create_wallet, engine_test
 
 
 def _rule_payload(**overrides: object) -> dict[str, object]:
@@ -407,3 +429,770 @@ def test_cliente_puede_ver_sus_aplicaciones(client: TestClient, db_session: Sess
     assert [item["id"] for item in api_data(mine)] == [api_data(applied)["aplicacion"]["id"]]
     assert admin_list.status_code == 200, admin_list.text
     assert [item["id"] for item in api_data(admin_list)] == [api_data(applied)["aplicacion"]["id"]]
+
+
+def test_motor_de_reglas_elige_la_misma_regla_y_monto_que_la_evaluacion_lineal() -> None:
+    rng = random.Random(42)
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    reglas: list[ReglaRecompensa] = []
+    for indice in range(60):
+        porcentaje = Decimal(rng.randint(1, 10000)) / 100 if rng.random() < 0.7 else None
+        inicio = base + timedelta(days=rng.randint(-10, 10)) if rng.random() < 0.4 else None
+        reglas.append(
+            ReglaRecompensa(
+                id=uuid4(),
+                nombre=f"Regla {indice}",
+                tipo=rng.choice(list(TipoRecompensa)),
+                estado=EstadoReglaRecompensa.pausada if rng.random() < 0.3 else EstadoReglaRecompensa.activa,
+                porcentaje_cashback=porcentaje,
+                monto_fijo=Decimal(rng.randint(1, 50000)) / 100 if porcentaje is None else None,
+                moneda_recompensa=MonedaRecompensa.ARS,
+                monto_minimo_compra=Decimal(rng.randint(0, 500000)) / 100 if rng.random() < 0.6 else None,
+                monto_maximo_recompensa=Decimal(rng.randint(1, 300000)) / 100 if rng.random() < 0.5 else None,
+                fecha_inicio=inicio,
+                fecha_fin=(inicio or base) + timedelta(days=rng.randint(0, 15)) if rng.random() < 0.4 else None,
+            )
+        )
+    conjunto = ConjuntoReglas(
+        [compilada for prioridad, regla in enumerate(reglas) if (compilada := compilar_regla(regla, prioridad))]
+    )
+
+    for _ in range(3000):
+        monto = Decimal(rng.choice([rng.randint(0, 100), rng.randint(0, 1_000_000)])) / 100
+        now = base + timedelta(days=rng.randint(-15, 30), seconds=rng.randint(0, 86399))
+        tipo = rng.choice([None, *TipoRecompensa])
+        lineal = next(
+            (
+                resultado
+                for regla in reglas
+                if tipo is None or regla.tipo == tipo
+                if (resultado := recompensas_services._evaluate_rule(regla, monto, now=now)).aplica
+            ),
+            None,
+        )
+        compilada = conjunto.seleccionar(monto, now, tipo=tipo)
+
+        assert (compilada.id if compilada else None) == (lineal.regla_id if lineal else None)
+        if compilada is not None:
+            assert compilada.calcular_recompensa(monto) == lineal.monto_recompensa
+
+
+def test_simulacion_usa_reglas_compiladas_sin_consultas_y_se_invalida_al_pausar(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    rule = _create_rule(client, auth_headers(admin))
+
+    def simular() -> dict[str, object]:
+        response = client.post(
+            "/api/v1/recompensas/simular",
+            headers=auth_headers(admin),
+            json={"monto_compra": "15000.00"},
+        )
+        assert response.status_code == 200, response.text
+        return api_data(response)
+
+    assert simular()["regla_id"] == rule["id"]
+    organizacion_id = org.id
+    consultas: list[str] = []
+    listener = lambda conn, cursor, statement, *args: consultas.append(statement)  # noqa: E731
+    event.listen(engine_test, "before_cursor_execute", listener)
+    try:
+        conjunto = reglas_organizacion(db_session, organizacion_id)
+        regla = conjunto.seleccionar(Decimal("15000.00"), datetime.now(timezone.utc))
+    finally:
+        event.remove(engine_test, "before_cursor_execute", listener)
+    assert consultas == []
+    assert regla is not None and str(regla.id) == rule["id"]
+
+    pausada = client.patch(
+        f"/api/v1/recompensas/reglas/{rule['id']}",
+        headers=auth_headers(admin),
+        json={"estado": "pausada"},
+    )
+    assert pausada.status_code == 200, pausada.text
+    assert simular()["aplica"] is False
+
+
+@pytest.mark.parametrize("con_numpy", [True, False])
+def test_simulacion_en_lote_coincide_con_la_simulacion_individual(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+    con_numpy: bool,
+) -> None:
+    if con_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(simulacion, "_numpy", lambda: None)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cashback = _create_rule(client, auth_headers(admin))
+    fijo = _create_rule(
+        client,
+        auth_headers(admin),
+        nombre="Fijo",
+        porcentaje_cashback=None,
+        monto_fijo="750.00",
+        monto_minimo_compra="50.00",
+        monto_maximo_recompensa=None,
+    )
+    pausada = _create_rule(
+        client,
+        auth_headers(admin),
+        nombre="Campana 3,5%",
+        porcentaje_cashback="3.50",
+        monto_minimo_compra=None,
+        monto_maximo_recompensa=None,
+    )
+    pausar = client.patch(
+        f"/api/v1/recompensas/reglas/{pausada['id']}",
+        headers=auth_headers(admin),
+        json={"estado": "pausada"},
+    )
+    assert pausar.status_code == 200, pausar.text
+    rng = random.Random(7)
+    montos = [str(Decimal(rng.randint(15, rng.choice([200_000, 5_000_000]))) / 100) for _ in range(120)]
+    montos += ["0.14", "50.00", "1000.00", "20000.05"]
+
+    response = client.post(
+        "/api/v1/recompensas/simular/lote",
+        headers=auth_headers(admin),
+        json={"montos_compra": montos, "buckets": 4},
+    )
+    assert response.status_code == 200, response.text
+    lote = api_data(response)
+    assert lote["modo"] == "primera_aplicable"
+    assert lote["motor"] == ("numpy" if con_numpy else "python")
+
+    individuales = []
+    for monto in montos:
+        simulada = client.post("/api/v1/recompensas/simular", headers=auth_headers(admin), json={"monto_compra": monto})
+        assert simulada.status_code == 200, simulada.text
+        individuales.append(api_data(simulada))
+    por_regla = {item["regla_id"]: item for item in lote["reglas"]}
+    assert set(por_regla) == {cashback["id"], fijo["id"]}
+    for regla_id, resumen in por_regla.items():
+        recompensas = sorted(Decimal(item["monto_recompensa"]) for item in individuales if item["regla_id"] == regla_id)
+        assert resumen["compras_aplicadas"] == len(recompensas)
+        assert Decimal(resumen["monto_recompensa_total"]) == sum(recompensas)
+        assert Decimal(resumen["recompensa_minima"]) == recompensas[0]
+        assert Decimal(resumen["recompensa_maxima"]) == recompensas[-1]
+        for bucket in resumen["distribucion"]:
+            desde, hasta = Decimal(bucket["desde"]), Decimal(bucket["hasta"])
+            assert bucket["cantidad"] == sum(desde <= recompensa <= hasta for recompensa in recompensas)
+        assert sum(bucket["cantidad"] for bucket in resumen["distribucion"]) == len(recompensas)
+    con_tope = sum(Decimal(monto) > Decimal("20000.00") for monto in montos)
+    assert por_regla[cashback["id"]]["compras_con_tope"] == con_tope
+    assert lote["compras_con_recompensa"] == sum(item["aplica"] for item in individuales)
+
+    response = client.post(
+        "/api/v1/recompensas/simular/lote",
+        headers=auth_headers(admin),
+        json={"montos_compra": montos, "regla_ids": [pausada["id"]]},
+    )
+    assert response.status_code == 200, response.text
+    campana = api_data(response)["reglas"][0]
+    esperadas = sorted(
+        recompensa
+        for monto in montos
+        if (recompensa := (Decimal(monto) * Decimal("0.035")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) > 0
+    )
+    assert campana["compras_aplicadas"] == len(esperadas) == len(montos) - 1
+    assert Decimal(campana["monto_recompensa_total"]) == sum(esperadas)
+    assert Decimal(campana["percentil_50"]) == esperadas[(len(esperadas) + 1) // 2 - 1]
+
+    otra = create_org(db_session)
+    ajena = create_user(db_session, otra, RolUsuario.admin)
+    response = client.post(
+        "/api/v1/recompensas/simular/lote",
+        headers=auth_headers(ajena),
+        json={"montos_compra": montos, "regla_ids": [pausada["id"]]},
+    )
+    assert response.status_code == 404
+
+
+def test_backtest_de_reglas_borrador_sobre_ordenes_ecommerce_combina_tramos_en_paralelo(db_session: Session) -> None:
+    org = create_org(db_session)
+    otra = create_org(db_session)
+    base = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    rng = random.Random(11)
+    ordenes = [
+        (Decimal(rng.randint(100, 4_000_000)) / 100, base + timedelta(hours=indice), f"cliente{indice % 7}@example.com")
+        for indice in range(45)
+    ]
+    db_session.add_all(
+        EcommerceOrderEvent(
+            organizacion_id=org.id,
+            proveedor="generic",
+            external_order_id=f"order-{indice}",
+            customer_email=email,
+            amount=monto,
+            status="paid",
+            fecha_creacion=fecha,
+        )
+        for indice, (monto, fecha, email) in enumerate(ordenes)
+    )
+    db_session.add_all(
+        [
+            EcommerceOrderEvent(
+                organizacion_id=otra.id,
+                proveedor="generic",
+                external_order_id="ajena",
+                customer_email="ajeno@example.com",
+                amount=Decimal("99999.00"),
+                fecha_creacion=base + timedelta(hours=1),
+            ),
+            EcommerceOrderEvent(
+                organizacion_id=org.id,
+                proveedor="generic",
+                external_order_id="anterior",
+                customer_email="viejo@example.com",
+                amount=Decimal("99999.00"),
+                fecha_creacion=base - timedelta(days=1),
+            ),
+        ]
+    )
+    db_session.commit()
+    lanzamiento = base + timedelta(hours=20)
+    datos = BacktestReglasRequest.model_validate(
+        {
+            "desde": base,
+            "reglas": [
+                _rule_payload(),
+                _rule_payload(
+                    nombre="Puntos desde el lanzamiento",
+                    tipo="puntos",
+                    porcentaje_cashback=None,
+                    monto_fijo="150.00",
+                    moneda_recompensa="PUNTOS",
+                    monto_minimo_compra=None,
+                    monto_maximo_recompensa=None,
+                    fecha_inicio=lanzamiento.isoformat(),
+                ),
+            ],
+        }
+    )
+
+    en_linea = ejecutar_backtest(db_session, org.id, datos, procesos=1, tamano_tramo=7)
+    en_paralelo = ejecutar_backtest(db_session, org.id, datos, procesos=2, tamano_tramo=5)
+
+    assert (en_linea.tramos, en_paralelo.tramos, en_paralelo.procesos) == (7, 9, 2)
+    excluir = {"tramos", "procesos"}
+    assert en_paralelo.model_dump(exclude=excluir) == en_linea.model_dump(exclude=excluir)
+    cashback = [
+        min((monto * Decimal("0.10")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP), Decimal("2000.00"))
+        for monto, _, _ in ordenes
+        if monto >= Decimal("1000.00")
+    ]
+    puntos = [
+        (fecha, email) for monto, fecha, email in ordenes if monto < Decimal("1000.00") and fecha >= lanzamiento
+    ]
+    assert en_linea.eventos == len(ordenes)
+    assert en_linea.clientes == 7
+    assert en_linea.compras_con_recompensa == len(cashback) + len(puntos)
+    resumen_cashback, resumen_puntos = en_linea.reglas
+    assert resumen_cashback.compras_aplicadas == resumen_cashback.compras_elegibles == len(cashback)
+    assert resumen_cashback.monto_recompensa_total == sum(cashback)
+    assert resumen_puntos.compras_aplicadas == len(puntos)
+    assert resumen_puntos.compras_elegibles == sum(fecha >= lanzamiento for _, fecha, _ in ordenes)
+    assert resumen_puntos.porcentaje_aplicadas == (Decimal(len(puntos) * 100) / len(ordenes)).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP
+    )
+    assert {item.moneda_recompensa: item.monto_total for item in en_linea.pasivo} == {
+        MonedaRecompensa.ARS: sum(cashback),
+        MonedaRecompensa.PUNTOS: Decimal("150.00") * len(puntos),
+    }
+
+
+def test_aplicar_recompensas_en_lote_desde_csv_agrupa_por_wallet_y_se_puede_reenviar(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "RECOMPENSAS_LOTE_CHUNK_SIZE", 2)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    otro = create_user(db_session, org)
+    wallet = create_wallet(db_session, cliente)
+    wallet_otro = create_wallet(db_session, otro)
+    rule = _create_rule(client, auth_headers(admin))
+    filas = [
+        "usuario_id,wallet_destino_id,monto_compra,regla_id,referencia_externa,metadata",
+        f"{cliente.id},{wallet.id},15000.00,,lote-1,\"{{\"\"ticket\"\": \"\"A-1\"\"}}\"",
+        f"{cliente.id},{wallet.id},50000.00,{rule['id']},lote-2,",
+        f"{otro.id},{wallet_otro.id},2000.00,,lote-3,",
+        f"{cliente.id},{wallet.id},2000.00,,lote-1,",
+        f"{otro.id},{wallet.id},2000.00,,lote-4,",
+        f"{otro.id},{wallet_otro.id},999.99,,lote-5,",
+        f"{cliente.id},{wallet.id},3000.00,,,",
+    ]
+
+    def enviar() -> dict[str, object]:
+        response = client.post(
+            "/api/v1/recompensas/aplicar/lote",
+            headers={**auth_headers(admin), "Content-Type": "text/csv"},
+            content="\n".join(filas).encode(),
+        )
+        assert response.status_code == 200, response.text
+        return api_data(response)
+
+    lote = enviar()
+
+    assert (lote["aplicadas"], lote["duplicadas"], lote["errores"]) == (3, 1, 3)
+    estados = {item["indice"]: (item["status"], item["error"]) for item in lote["resultados"]}
+    assert estados[3] == ("duplicada", "Ya existe una recompensa aplicada con esa referencia externa.")
+    assert estados[4] == ("error", "La wallet destino no pertenece al usuario.")
+    assert estados[5] == ("error", "No hay reglas aplicables.")
+    assert estados[6] == ("error", "referencia_externa es obligatoria en la aplicacion en lote.")
+    assert _saldo_db(db_session, wallet.id) == Decimal("3500.00")
+    assert _saldo_db(db_session, wallet_otro.id) == Decimal("200.00")
+    aplicaciones = db_session.scalars(
+        select(AplicacionRecompensa).where(AplicacionRecompensa.organizacion_id == org.id)
+    ).all()
+    assert sorted(aplicacion.referencia_externa for aplicacion in aplicaciones) == ["lote-1", "lote-2", "lote-3"]
+    assert next(a for a in aplicaciones if a.referencia_externa == "lote-1").metadata_aplicacion == {"ticket": "A-1"}
+    movimiento_ids = [aplicacion.movimiento_id for aplicacion in aplicaciones]
+    cambios = db_session.scalars(
+        select(MovimientoCambio.movimiento_id).where(MovimientoCambio.movimiento_id.in_(movimiento_ids))
+    ).all()
+    assert sorted(cambios) == sorted(movimiento_ids)
+    assert db_session.scalar(
+        select(func.count()).select_from(Notificacion).where(Notificacion.tipo == TipoNotificacion.recompensa_aplicada)
+    ) == 3
+
+    reenviado = enviar()
+
+    assert (reenviado["aplicadas"], reenviado["duplicadas"]) == (0, 4)
+    assert _saldo_db(db_session, wallet.id) == Decimal("3500.00")
+
+
+def test_lote_con_tramo_fallido_no_avanza_el_progreso_y_se_retoma(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "RECOMPENSAS_LOTE_CHUNK_SIZE", 2)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    wallet = create_wallet(db_session, cliente)
+    _create_rule(client, auth_headers(admin))
+    actor = DatosUsuarioToken(
+        id=admin.id,
+        email=admin.email,
+        nombre=admin.nombre,
+        rol=admin.rol,
+        organizacion_id=org.id,
+    )
+    compras = [
+        AplicarRecompensaRequest(
+            usuario_id=cliente.id,
+            wallet_destino_id=wallet.id,
+            monto_compra="1000.00",
+            referencia_externa=f"reanudable-{indice}",
+        )
+        for indice in range(6)
+    ]
+    aplicar_tramo = lotes._aplicar_tramo
+
+    def falla_segundo_tramo(tramo, **kwargs):
+        if tramo[0].indice == 2:
+            raise RuntimeError("conexion perdida")
+        return aplicar_tramo(tramo, **kwargs)
+
+    progreso: list[int] = []
+    monkeypatch.setattr(lotes, "_aplicar_tramo", falla_segundo_tramo)
+    primera = lotes.aplicar_recompensas_lote(compras, actor, db_session, al_confirmar_tramo=progreso.append).respuesta
+
+    assert (primera.aplicadas, primera.errores) == (4, 2)
+    # El avance queda en la primera compra del tramo fallido, aunque el tramo siguiente se confirmo.
+    assert progreso == [2]
+
+    monkeypatch.setattr(lotes, "_aplicar_tramo", aplicar_tramo)
+    retomada = lotes.aplicar_recompensas_lote(
+        compras, actor, db_session, desde=progreso[-1], al_confirmar_tramo=progreso.append
+    ).respuesta
+
+    assert (retomada.aplicadas, retomada.duplicadas, retomada.errores) == (2, 2, 0)
+    assert progreso == [2, 4, 6]
+    assert db_session.scalar(
+        select(func.count()).select_from(AplicacionRecompensa).where(AplicacionRecompensa.organizacion_id == org.id)
+    ) == 6
+
+
+def test_lote_audita_y_emite_webhook_de_cada_notificacion_en_el_mismo_tramo(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("app.apps.recompensas.lotes.settings.WEBHOOK_WORKER_ENABLED", True)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    wallet = create_wallet(db_session, cliente)
+    _create_rule(client, auth_headers(admin))
+    db_session.add(
+        WebhookEndpoint(
+            organizacion_id=org.id,
+            nombre="Notificaciones",
+            url="https://example.com/notificaciones",
+            eventos=["notificacion.creada"],
+            secret_encrypted=encrypt_webhook_secret("secret-notificaciones-123"),
+            activo=True,
+        )
+    )
+    db_session.commit()
+
+    response = client.post(
+        "/api/v1/recompensas/aplicar/lote",
+        headers=auth_headers(admin),
+        json=[
+            {
+                "usuario_id": str(cliente.id),
+                "wallet_destino_id": str(wallet.id),
+                "monto_compra": "1000.00",
+                "referencia_externa": f"notificada-{indice}",
+            }
+            for indice in range(2)
+        ],
+    )
+
+    assert response.status_code == 200, response.text
+    assert api_data(response)["aplicadas"] == 2
+    notificaciones = {
+        str(notificacion_id)
+        for notificacion_id in db_session.scalars(
+            select(Notificacion.id).where(Notificacion.tipo == TipoNotificacion.recompensa_aplicada)
+        )
+    }
+    auditadas = {
+        log.metadata_log["notificacion_id"]
+        for log in db_session.scalars(select(AuditLog).where(AuditLog.evento == "notificacion_creada"))
+    }
+    enviadas = {
+        delivery.payload["data"]["id"]
+        for delivery in db_session.scalars(
+            select(WebhookDelivery).where(WebhookDelivery.evento == "notificacion.creada")
+        )
+    }
+    assert len(notificaciones) == 2
+    assert auditadas == notificaciones
+    assert enviadas == notificaciones
+
+
+def test_lote_escribe_el_change_log_de_movimientos_con_un_insert_por_flush(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    wallet = create_wallet(db_session, cliente)
+    _create_rule(client, auth_headers(admin))
+    actor = DatosUsuarioToken(
+        id=admin.id,
+        email=admin.email,
+        nombre=admin.nombre,
+        rol=admin.rol,
+        organizacion_id=org.id,
+    )
+    compras = [
+        AplicarRecompensaRequest(
+            usuario_id=cliente.id,
+            wallet_destino_id=wallet.id,
+            monto_compra="1000.00",
+            referencia_externa=f"change-log-{indice}",
+        )
+        for indice in range(4)
+    ]
+    consultas: list[str] = []
+    listener = lambda conn, cursor, statement, *args: consultas.append(statement)  # noqa: E731
+    event.listen(engine_test, "before_cursor_execute", listener)
+    try:
+        resultado = lotes.aplicar_recompensas_lote(compras, actor, db_session)
+    finally:
+        event.remove(engine_test, "before_cursor_execute", listener)
+
+    assert resultado.respuesta.aplicadas == 4
+    assert sum(consulta.startswith("INSERT INTO movimiento_cambios") for consulta in consultas) == 1
+    movimiento_ids = [aplicada.movimiento.id for aplicada in resultado.aplicadas]
+    cambios = db_session.scalars(
+        select(MovimientoCambio.movimiento_id)
+        .where(MovimientoCambio.movimiento_id.in_(movimiento_ids))
+        .order_by(MovimientoCambio.id)
+    ).all()
+    assert cambios == movimiento_ids
+
+
+def test_totales_materializados_coinciden_con_las_aplicaciones_y_se_reconstruyen(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    otro = create_user(db_session, org)
+    ajeno = create_user(db_session, create_org(db_session), RolUsuario.admin)
+    wallet = create_wallet(db_session, cliente)
+    wallet_otro = create_wallet(db_session, otro)
+    wallet_puntos = create_wallet(db_session, cliente, moneda=MonedaWallet.PUNTOS)
+    cashback = _create_rule(client, auth_headers(admin))
+    puntos = _create_rule(
+        client,
+        auth_headers(admin),
+        nombre="Puntos",
+        tipo="puntos",
+        porcentaje_cashback=None,
+        monto_fijo="25.00",
+        moneda_recompensa="PUNTOS",
+        monto_minimo_compra=None,
+        monto_maximo_recompensa=None,
+    )
+    for monto, referencia in (("15000.00", "t-1"), ("4000.00", "t-2")):
+        response = client.post(
+            "/api/v1/recompensas/aplicar",
+            headers=auth_headers(admin),
+            json={
+                "usuario_id": str(cliente.id),
+                "wallet_destino_id": str(wallet.id),
+                "monto_compra": monto,
+                "referencia_externa": referencia,
+            },
+        )
+        assert response.status_code == 201, response.text
+    filas = [
+        "usuario_id,wallet_destino_id,monto_compra,regla_id,referencia_externa,metadata",
+        f"{otro.id},{wallet_otro.id},3000.00,,t-3,",
+        f"{cliente.id},{wallet_puntos.id},2500.00,{puntos['id']},t-4,",
+        f"{cliente.id},{wallet.id},4000.00,,t-1,",
+    ]
+    lote = client.post(
+        "/api/v1/recompensas/aplicar/lote",
+        headers={**auth_headers(admin), "Content-Type": "text/csv"},
+        content="\n".join(filas).encode(),
+    )
+    assert lote.status_code == 200, lote.text
+    assert (api_data(lote)["aplicadas"], api_data(lote)["duplicadas"]) == (2, 1)
+
+    usuarios = api_data(client.get("/api/v1/recompensas/totales/usuarios", headers=auth_headers(admin)))
+    reglas = api_data(client.get("/api/v1/recompensas/totales/reglas", headers=auth_headers(admin)))
+    mis_totales = api_data(client.get("/api/v1/recompensas/totales/me", headers=auth_headers(cliente)))
+    solo_puntos = api_data(
+        client.get("/api/v1/recompensas/totales/usuarios?moneda=PUNTOS", headers=auth_headers(admin))
+    )
+
+    esperado: dict[tuple[str, str], list[object]] = {}
+    aplicaciones = db_session.scalars(
+        select(AplicacionRecompensa).where(AplicacionRecompensa.organizacion_id == org.id)
+    ).all()
+    for aplicacion in aplicaciones:
+        clave = (str(aplicacion.usuario_id), aplicacion.moneda_recompensa.value)
+        fila = esperado.setdefault(clave, [0, Decimal("0")])
+        fila[0] += 1
+        fila[1] += aplicacion.monto_recompensa
+    assert {
+        (item["usuario_id"], item["moneda_recompensa"]): [
+            item["cantidad_aplicaciones"],
+            Decimal(item["monto_recompensa_total"]),
+        ]
+        for item in usuarios
+    } == esperado
+    assert esperado[(str(cliente.id), "ARS")] == [2, Decimal("1900.00")]
+    assert [Decimal(item["monto_recompensa_total"]) for item in usuarios] == sorted(
+        (Decimal(item["monto_recompensa_total"]) for item in usuarios), reverse=True
+    )
+    assert {(item["nombre_regla"], item["cantidad_aplicaciones"], item["monto_compra_total"]) for item in reglas} == {
+        ("Cashback 10%", 3, "22000.00"),
+        ("Puntos", 1, "2500.00"),
+    }
+    assert {item["moneda_recompensa"] for item in mis_totales} == {"ARS", "PUNTOS"}
+    assert [item["usuario_id"] for item in solo_puntos] == [str(cliente.id)]
+    assert api_data(client.get("/api/v1/recompensas/totales/usuarios", headers=auth_headers(ajeno))) == []
+    assert client.get("/api/v1/recompensas/totales/reglas", headers=auth_headers(cliente)).status_code == 403
+
+    total = db_session.get(TotalRecompensaUsuario, (org.id, cliente.id, MonedaRecompensa.ARS))
+    total.monto_recompensa_total = Decimal("1.00")
+    db_session.delete(db_session.get(TotalRecompensaRegla, (UUID(puntos["id"]), MonedaRecompensa.PUNTOS)))
+    db_session.commit()
+
+    assert reconstruir_totales(db_session, org.id) == (3, 2)
+
+    db_session.expire_all()
+    total = db_session.get(TotalRecompensaUsuario, (org.id, cliente.id, MonedaRecompensa.ARS))
+    assert total.monto_recompensa_total == Decimal("1900.00")
+    regla_puntos = db_session.get(TotalRecompensaRegla, (UUID(puntos["id"]), MonedaRecompensa.PUNTOS))
+    assert (regla_puntos.cantidad_aplicaciones, regla_puntos.monto_recompensa_total) == (1, Decimal("25.00"))
+    assert db_session.get(TotalRecompensaRegla, (UUID(cashback["id"]), MonedaRecompensa.ARS)).cantidad_aplicaciones == 3
+
+
+def test_totales_conservan_la_fecha_de_aplicacion_mas_reciente(client: TestClient, db_session: Session) -> None:
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    regla = _create_rule(client, auth_headers(admin))
+    reciente = datetime(2026, 6, 2, 12, tzinfo=timezone.utc)
+    for fecha in (reciente, reciente - timedelta(days=1)):
+        acumular_totales(
+            db_session,
+            [
+                AplicacionRecompensa(
+                    organizacion_id=org.id,
+                    regla_id=UUID(regla["id"]),
+                    usuario_id=cliente.id,
+                    moneda_recompensa=MonedaRecompensa.ARS,
+                    monto_compra=Decimal("100.00"),
+                    monto_recompensa=Decimal("10.00"),
+                    fecha_creacion=fecha,
+                )
+            ],
+        )
+        db_session.commit()
+
+    db_session.expire_all()
+    total = db_session.get(TotalRecompensaUsuario, (org.id, cliente.id, MonedaRecompensa.ARS))
+    regla_total = db_session.get(TotalRecompensaRegla, (UUID(regla["id"]), MonedaRecompensa.ARS))
+    assert total.cantidad_aplicaciones == 2
+    assert total.fecha_ultima_aplicacion.replace(tzinfo=timezone.utc) == reciente
+    assert regla_total.fecha_ultima_aplicacion.replace(tzinfo=timezone.utc) == reciente
+
+
+def test_vencimiento_de_puntos_consume_fifo_por_wallet_en_lotes_y_no_vence_dos_veces(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES", 12)
+    ahora = datetime.now(timezone.utc)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    cliente = create_user(db_session, org)
+    otro = create_user(db_session, org)
+    wallet = create_wallet(db_session, cliente, moneda=MonedaWallet.PUNTOS)
+    wallet_otro = create_wallet(db_session, otro, moneda=MonedaWallet.PUNTOS)
+    _create_rule(
+        client,
+        auth_headers(admin),
+        nombre="Puntos 10%",
+        moneda_recompensa="PUNTOS",
+        monto_minimo_compra=None,
+        monto_maximo_recompensa=None,
+    )
+    compras = [
+        (cliente, wallet, "1000.00", restar_meses(ahora, 14)),
+        (cliente, wallet, "500.00", restar_meses(ahora, 13)),
+        (cliente, wallet, "300.00", restar_meses(ahora, 1)),
+        (otro, wallet_otro, "400.00", restar_meses(ahora, 14)),
+    ]
+    for indice, (usuario, destino, monto, fecha) in enumerate(compras):
+        response = client.post(
+            "/api/v1/recompensas/aplicar",
+            headers=auth_headers(admin),
+            json={
+                "usuario_id": str(usuario.id),
+                "wallet_destino_id": str(destino.id),
+                "monto_compra": monto,
+                "referencia_externa": f"venc-{indice}",
+            },
+        )
+        assert response.status_code == 201, response.text
+        aplicacion = db_session.get(AplicacionRecompensa, UUID(api_data(response)["aplicacion"]["id"]))
+        aplicacion.fecha_creacion = fecha
+    db_session.commit()
+    canje = client.post(
+        "/api/v1/movimientos/ajuste-admin",
+        headers=auth_headers(admin),
+        json={"wallet_id": str(wallet.id), "monto": "120.00", "operacion": "debito", "motivo": "canje"},
+    )
+    assert canje.status_code == 201, canje.text
+
+    # 150 puntos viejos, 120 ya canjeados (FIFO): vencen 30 y quedan los 30 recientes.
+    ejecucion = vencer_puntos(db_session, tamano_lote=1)
+
+    assert (ejecucion.wallets_vencidas, ejecucion.puntos_vencidos) == (2, Decimal("70.00"))
+    assert ejecucion.procesado_hasta is not None and ejecucion.fecha_fin is not None
+    assert _saldo_db(db_session, wallet.id) == Decimal("30.00")
+    assert _saldo_db(db_session, wallet_otro.id) == Decimal("0.00")
+    vencimientos = db_session.scalars(
+        select(Movimiento).where(Movimiento.descripcion == "Vencimiento de puntos").order_by(Movimiento.monto)
+    ).all()
+    assert [(m.wallet_origen_id, m.monto) for m in vencimientos] == [
+        (wallet.id, Decimal("30.00")),
+        (wallet_otro.id, Decimal("40.00")),
+    ]
+    assert all(m.tipo == TipoMovimiento.ajuste_admin for m in vencimientos)
+    assert all(m.metadata_movimiento["operacion"] == "debito" for m in vencimientos)
+    assert db_session.scalar(
+        select(func.count())
+        .select_from(MovimientoCambio)
+        .where(MovimientoCambio.movimiento_id.in_([m.id for m in vencimientos]))
+    ) == 2
+
+    # Revertir un vencimiento devuelve puntos que no vuelven a vencer; otra corrida no vence nada.
+    reversa = client.post(
+        f"/api/v1/movimientos/{vencimientos[0].id}/reversa",
+        headers=auth_headers(admin),
+        json={"motivo_reversa": "cortesia"},
+    )
+    assert reversa.status_code == 201, reversa.text
+    repetida = vencer_puntos(db_session, corte=calcular_corte(12) + timedelta(days=1))
+    assert (repetida.wallets_vencidas, repetida.puntos_vencidos) == (0, Decimal("0.00"))
+    assert repetida.desde is not None
+
+    # Al cumplirse la vigencia de los puntos recientes, la corrida siguiente los vence.
+    posterior = vencer_puntos(db_session, corte=ahora)
+    assert (posterior.wallets_vencidas, posterior.puntos_vencidos) == (1, Decimal("30.00"))
+    assert _saldo_db(db_session, wallet.id) == Decimal("30.00")
+    assert db_session.scalar(select(func.count()).select_from(EjecucionVencimientoPuntos)) == 3
+
+
+def test_vencimiento_de_puntos_omite_wallets_que_no_estan_activas(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "RECOMPENSAS_PUNTOS_VENCIMIENTO_MESES", 12)
+    ahora = datetime.now(timezone.utc)
+    org = create_org(db_session)
+    admin = create_user(db_session, org, RolUsuario.admin)
+    _create_rule(
+        client,
+        auth_headers(admin),
+        nombre="Puntos 10%",
+        moneda_recompensa="PUNTOS",
+        monto_minimo_compra=None,
+        monto_maximo_recompensa=None,
+    )
+    wallets = {}
+    for estado in (EstadoWallet.activa, EstadoWallet.congelada, EstadoWallet.cerrada):
+        cliente = create_user(db_session, org)
+        wallet = create_wallet(db_session, cliente, moneda=MonedaWallet.PUNTOS)
+        response = client.post(
+            "/api/v1/recompensas/aplicar",
+            headers=auth_headers(admin),
+            json={
+                "usuario_id": str(cliente.id),
+                "wallet_destino_id": str(wallet.id),
+                "monto_compra": "1000.00",
+                "referencia_externa": f"venc-{estado.value}",
+            },
+        )
+        assert response.status_code == 201, response.text
+        aplicacion = db_session.get(AplicacionRecompensa, UUID(api_data(response)["aplicacion"]["id"]))
+        aplicacion.fecha_creacion = restar_meses(ahora, 13)
+        wallet.estado = estado
+        wallets[estado] = wallet.id
+    db_session.commit()
+
+    ejecucion = vencer_puntos(db_session)
+
+    assert (ejecucion.wallets_vencidas, ejecucion.puntos_vencidos) == (1, Decimal("100.00"))
+    assert _saldo_db(db_session, wallets[EstadoWallet.activa]) == Decimal("0.00")
+    assert _saldo_db(db_session, wallets[EstadoWallet.congelada]) == Decimal("100.00")
+    assert _saldo_db(db_session, wallets[EstadoWallet.cerrada]) == Decimal("100.00")
+    assert db_session.scalars(
+        select(Movimiento.wallet_origen_id).where(Movimiento.descripcion == "Vencimiento de puntos")
+    ).all() == [wallets[EstadoWallet.activa]]